@@ -0,0 +1,647 @@
+"""Archive module for compressing folders and extracting archives.
+
+Zip creation is parallel the way pigz does it: every file is cut into 1 MiB
+chunks that are deflated independently on a thread pool (zlib releases the
+GIL), each chunk primed with the 32 KiB before it so the ratio stays close
+to a single stream. All but the last chunk of a file end on a sync flush,
+so the compressed chunks are simply concatenated. Chunk CRCs are merged
+with crc32_combine, and an ordered writer streams everything into the
+archive through a bounded window of pending chunks. With LZMA, whole
+members are compressed in parallel instead. Already-compressed media and
+archives are stored as they are.
+
+Extraction streams each member to disk in blocks. Zip members are
+decompressed on several threads, each with its own handle on the archive.
+Member paths that would escape the destination are refused.
+"""
+
+import functools
+import logging
+import lzma
+import os
+import shutil
+import stat
+import struct
+import tarfile
+import tempfile
+import threading
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from utils.database import get_db_manager
+from utils.file_query import FileQuery
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+WINDOW_SIZE = 32 * 1024
+COPY_BUFFER = 1024 * 1024
+SPOOL_SIZE = 8 * 1024 * 1024
+DEFAULT_LEVEL = 6
+DEFAULT_WORKERS = os.cpu_count() or 1
+ARCHIVE_METHODS = ("deflate", "lzma")
+
+# Formats that are already compressed; deflating them again wastes CPU
+STORED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".flac", ".ogg", ".aac", ".m4a",
+    ".mp4", ".mkv", ".avi", ".mov", ".webm",
+    ".docx", ".xlsx", ".pptx", ".odt", ".jar", ".apk", ".whl",
+}
+
+ProgressCallback = Callable[[int, int], None]
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_FLAG_LZMA_EOS = 0x02
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_CREATE_SYSTEM = 0 if os.name == "nt" else 3
+
+
+# -- CRC-32 combination (zlib's crc32_combine, which Python does not expose) --
+
+def _gf2_times(matrix: Sequence[int], vector: int) -> int:
+    """Multiply a GF(2) 32x32 matrix by a vector."""
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+
+def _gf2_square(matrix: Sequence[int]) -> List[int]:
+    """Square a GF(2) 32x32 matrix."""
+    return [_gf2_times(matrix, row) for row in matrix]
+
+
+@functools.lru_cache(maxsize=64)
+def _crc32_shift(length: int) -> Tuple[int, ...]:
+    """Get the GF(2) operator appending length zero bytes to a CRC-32.
+
+    Chunks mostly share one length, so the operator is cached.
+    """
+    # Operator for one zero bit, then two and four bits
+    odd = [0xEDB88320] + [1 << i for i in range(31)]
+    even = _gf2_square(odd)
+    odd = _gf2_square(even)
+    # Compose the operators of the set bits of length, squaring for each bit
+    result = [1 << i for i in range(32)]
+    while True:
+        even = _gf2_square(odd)
+        if length & 1:
+            result = [_gf2_times(even, row) for row in result]
+        length >>= 1
+        if not length:
+            break
+        odd = _gf2_square(even)
+        if length & 1:
+            result = [_gf2_times(odd, row) for row in result]
+        length >>= 1
+        if not length:
+            break
+    return tuple(result)
+
+
+def crc32_combine(crc1: int, crc2: int, len2: int) -> int:
+    """Get the CRC-32 of two concatenated blocks from their CRCs.
+
+    Args:
+        crc1: CRC-32 of the first block
+        crc2: CRC-32 of the second block
+        len2: Length of the second block in bytes
+
+    Returns:
+        int: CRC-32 of the concatenation
+    """
+    if len2 <= 0:
+        return crc1
+    return (_gf2_times(_crc32_shift(len2), crc1) ^ crc2) & 0xFFFFFFFF
+
+
+# -- Zip writing --
+
+class _Member(NamedTuple):
+    """A file or directory to be archived."""
+
+    path: str
+    name: str
+    stat: os.stat_result
+    is_dir: bool
+    method: int
+
+
+class _Chunk(NamedTuple):
+    """Compressed output of one piece of a member."""
+
+    data: Any
+    crc: int
+    raw_length: int
+
+
+def _dos_datetime(timestamp: float) -> Tuple[int, int]:
+    """Convert a timestamp into zip DOS time and date fields."""
+    t = time.localtime(timestamp)
+    if t.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def _compress_chunk(path: str, offset: int, length: int, last: bool, level: int) -> _Chunk:
+    """Deflate one chunk of a file, primed with the data before it."""
+    start = max(0, offset - WINDOW_SIZE)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(offset - start + length)
+    window, raw = data[:offset - start], data[offset - start:]
+    if window:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=window)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    flush = zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+    return _Chunk(compressor.compress(raw) + compressor.flush(flush), zlib.crc32(raw), len(raw))
+
+
+def _store_chunk(path: str, offset: int, length: int) -> _Chunk:
+    """Read one chunk of a file that is stored uncompressed."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        raw = f.read(length)
+    return _Chunk(raw, zlib.crc32(raw), len(raw))
+
+
+def _compress_lzma(path: str) -> _Chunk:
+    """LZMA-compress a whole file into a spooled temporary file."""
+    compressor = zipfile.LZMACompressor()
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    crc = 0
+    length = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(COPY_BUFFER)
+            if not block:
+                break
+            crc = zlib.crc32(block, crc)
+            length += len(block)
+            spool.write(compressor.compress(block))
+    spool.write(compressor.flush())
+    spool.seek(0)
+    return _Chunk(spool, crc, length)
+
+
+class ZipStreamWriter:
+    """Writes zip members whose sizes are only known after their data.
+
+    Every member uses a data descriptor, and Zip64 records are added as
+    needed, so archives and members of any size can be streamed.
+    """
+
+    def __init__(self, fileobj):
+        """Initialize the writer.
+
+        Args:
+            fileobj: Binary file opened for writing
+        """
+        self.fp = fileobj
+        self.offset = 0
+        self.entries: List[Dict[str, Any]] = []
+        self._current: Optional[Dict[str, Any]] = None
+
+    def _write(self, data: bytes) -> None:
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def begin(self, member: _Member) -> None:
+        """Write the local header of a member."""
+        name = member.name.encode("utf-8")
+        dos_time, dos_date = _dos_datetime(member.stat.st_mtime)
+        flags = _FLAG_UTF8
+        if not member.is_dir:
+            flags |= _FLAG_DATA_DESCRIPTOR
+        if member.method == zipfile.ZIP_LZMA:
+            flags |= _FLAG_LZMA_EOS
+        # A compressed member may be slightly larger than its input
+        zip64 = not member.is_dir and member.stat.st_size > _ZIP64_LIMIT - (1 << 24)
+        extra = struct.pack("<HHQQ", 1, 16, 0, 0) if zip64 else b""
+        size_field = _ZIP64_LIMIT if zip64 else 0
+        needed = 63 if member.method == zipfile.ZIP_LZMA else (45 if zip64 else 20)
+        entry = {
+            "name": name, "flags": flags, "method": member.method, "time": dos_time,
+            "date": dos_date, "needed": needed, "zip64": zip64, "offset": self.offset,
+            "crc": 0, "compress_size": 0, "file_size": 0,
+            "external_attr": ((member.stat.st_mode & 0xFFFF) << 16) | (0x10 if member.is_dir else 0),
+        }
+        self._write(struct.pack(
+            "<IHHHHHIIIHH", 0x04034B50, needed, flags, member.method, dos_time, dos_date,
+            0, size_field, size_field, len(name), len(extra),
+        ) + name + extra)
+        self._current = entry
+        if member.is_dir:
+            self.entries.append(entry)
+            self._current = None
+
+    def write(self, chunk: _Chunk) -> None:
+        """Append a compressed chunk of the current member."""
+        entry = self._current
+        if isinstance(chunk.data, (bytes, bytearray)):
+            self._write(chunk.data)
+            written = len(chunk.data)
+        else:
+            written = 0
+            with chunk.data:
+                while True:
+                    block = chunk.data.read(COPY_BUFFER)
+                    if not block:
+                        break
+                    self._write(block)
+                    written += len(block)
+        if entry["file_size"]:
+            entry["crc"] = crc32_combine(entry["crc"], chunk.crc, chunk.raw_length)
+        else:
+            entry["crc"] = chunk.crc
+        entry["compress_size"] += written
+        entry["file_size"] += chunk.raw_length
+
+    def end(self) -> None:
+        """Write the data descriptor of the current member."""
+        entry = self._current
+        if entry["zip64"]:
+            descriptor = struct.pack("<IIQQ", 0x08074B50, entry["crc"],
+                                     entry["compress_size"], entry["file_size"])
+        else:
+            descriptor = struct.pack("<IIII", 0x08074B50, entry["crc"],
+                                     entry["compress_size"], entry["file_size"])
+        self._write(descriptor)
+        self.entries.append(entry)
+        self._current = None
+
+    def close(self) -> None:
+        """Write the central directory and end records."""
+        cd_start = self.offset
+        for entry in self.entries:
+            fields = []
+            file_size, compress_size, offset = entry["file_size"], entry["compress_size"], entry["offset"]
+            if file_size >= _ZIP64_LIMIT:
+                fields.append(file_size)
+                file_size = _ZIP64_LIMIT
+            if compress_size >= _ZIP64_LIMIT:
+                fields.append(compress_size)
+                compress_size = _ZIP64_LIMIT
+            if offset >= _ZIP64_LIMIT:
+                fields.append(offset)
+                offset = _ZIP64_LIMIT
+            extra = b""
+            needed = entry["needed"]
+            if fields:
+                extra = struct.pack(f"<HH{len(fields)}Q", 1, 8 * len(fields), *fields)
+                needed = max(needed, 45)
+            self._write(struct.pack(
+                "<IHHHHHHIIIHHHHHII", 0x02014B50, (_CREATE_SYSTEM << 8) | max(needed, 20),
+                needed, entry["flags"], entry["method"], entry["time"], entry["date"],
+                entry["crc"], compress_size, file_size, len(entry["name"]), len(extra),
+                0, 0, 0, entry["external_attr"], offset,
+            ) + entry["name"] + extra)
+        cd_size = self.offset - cd_start
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_size >= _ZIP64_LIMIT or cd_start >= _ZIP64_LIMIT:
+            zip64_end = self.offset
+            self._write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0,
+                                    count, count, cd_size, cd_start))
+            self._write(struct.pack("<IIQI", 0x07064B50, 0, zip64_end, 1))
+            self._write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, min(count, 0xFFFF),
+                                    min(count, 0xFFFF), min(cd_size, _ZIP64_LIMIT),
+                                    min(cd_start, _ZIP64_LIMIT), 0))
+        else:
+            self._write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count,
+                                    cd_size, cd_start, 0))
+
+
+def _collect_members(root: str, skip: str, method: str) -> List[_Member]:
+    """List the directories and files to archive, in walk order."""
+    members = []
+    query = FileQuery(use_default_excludes=False, ignore_files=())
+    for rel_path, entry in query.walk(root, yield_dirs=True):
+        if entry.path == skip:
+            continue
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            members.append(_Member(entry.path, rel_path + "/", st, True, zipfile.ZIP_STORED))
+        elif stat.S_ISREG(st.st_mode):
+            if os.path.splitext(entry.name)[1].lower() in STORED_EXTENSIONS:
+                compress = zipfile.ZIP_STORED
+            elif method == "lzma":
+                compress = zipfile.ZIP_LZMA
+            else:
+                compress = zipfile.ZIP_DEFLATED
+            members.append(_Member(entry.path, rel_path, st, False, compress))
+    return members
+
+
+def write_zip(folder: str, archive: str, method: str = "deflate", level: int = DEFAULT_LEVEL,
+              max_workers: int = DEFAULT_WORKERS,
+              progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Compress a folder into a zip archive using several threads.
+
+    The archive is written to a temporary name and renamed into place, so
+    an interrupted run never leaves a truncated archive behind.
+
+    Args:
+        folder: Folder to compress
+        archive: Path of the zip file to create
+        method: "deflate" or "lzma"
+        level: Compression level
+        max_workers: Number of compression threads
+        progress: Optional callback receiving (bytes done, bytes total)
+
+    Returns:
+        Dict[str, Any]: Number of files, bytes in, bytes out and seconds
+
+    Raises:
+        ValueError: If the method is unknown or a path is outside the workspace
+        OSError: If the archive cannot be written
+    """
+    if method not in ARCHIVE_METHODS:
+        raise ValueError(f"Unknown compression method: {method}")
+    start = time.perf_counter()
+    root = str(ensure_safe_path(folder))
+    target = str(ensure_safe_path(archive))
+    members = _collect_members(root, target, method)
+    total = sum(m.stat.st_size for m in members if not m.is_dir)
+    partial = target + ".part"
+
+    def tasks(executor: ThreadPoolExecutor) -> Iterator[Tuple[str, Any]]:
+        """Yield writer events in archive order, submitting work lazily."""
+        for member in members:
+            yield "begin", member
+            if member.is_dir:
+                continue
+            if member.method == zipfile.ZIP_LZMA:
+                yield "chunk", executor.submit(_compress_lzma, member.path)
+            else:
+                size = member.stat.st_size
+                offsets = range(0, size, CHUNK_SIZE) if size else [0]
+                for offset in offsets:
+                    length = min(CHUNK_SIZE, size - offset)
+                    if member.method == zipfile.ZIP_STORED:
+                        future = executor.submit(_store_chunk, member.path, offset, length)
+                    else:
+                        future = executor.submit(_compress_chunk, member.path, offset, length,
+                                                 offset + length >= size, level)
+                    yield "chunk", future
+            yield "end", member
+
+    done = 0
+    try:
+        with open(partial, "wb") as f, ThreadPoolExecutor(max_workers=max_workers) as executor:
+            writer = ZipStreamWriter(f)
+            # Keep a bounded number of chunks in flight ahead of the writer
+            window: deque = deque()
+            events = tasks(executor)
+            limit = max_workers * 4
+
+            def drain_one() -> None:
+                nonlocal done
+                kind, item = window.popleft()
+                if kind == "begin":
+                    writer.begin(item)
+                elif kind == "end":
+                    writer.end()
+                else:
+                    chunk = item.result()
+                    writer.write(chunk)
+                    done += chunk.raw_length
+                    if progress is not None:
+                        progress(done, total)
+
+            pending = 0
+            for kind, item in events:
+                window.append((kind, item))
+                if kind == "chunk":
+                    pending += 1
+                while pending >= limit:
+                    if window[0][0] == "chunk":
+                        pending -= 1
+                    drain_one()
+            while window:
+                drain_one()
+            writer.close()
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+
+    return {
+        "files": sum(1 for m in members if not m.is_dir),
+        "bytes_in": total,
+        "bytes_out": os.path.getsize(target),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+# -- Extraction --
+
+def _safe_target(destination: Path, name: str) -> Path:
+    """Resolve a member name inside the destination, refusing escapes."""
+    target = (destination / name).resolve()
+    if target != destination and destination not in target.parents:
+        raise ValueError(f"Archive member {name} would be extracted outside {destination}")
+    return target
+
+
+def _extract_zip(archive: str, destination: Path, max_workers: int,
+                 progress: Optional[ProgressCallback]) -> int:
+    """Extract a zip archive, decompressing members on several threads."""
+    with zipfile.ZipFile(archive) as zf:
+        members = zf.infolist()
+    total = sum(info.file_size for info in members)
+    targets = [(info, _safe_target(destination, info.filename)) for info in members]
+
+    local = threading.local()
+    handles = []
+    lock = threading.Lock()
+    done = 0
+
+    def extract(info: zipfile.ZipInfo, target: Path) -> None:
+        nonlocal done
+        if info.is_dir():
+            target.mkdir(parents=True, exist_ok=True)
+            return
+        zf = getattr(local, "zf", None)
+        if zf is None:
+            zf = local.zf = zipfile.ZipFile(archive)
+            with lock:
+                handles.append(zf)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with zf.open(info) as src, open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst, COPY_BUFFER)
+        mode = (info.external_attr >> 16) & 0o777
+        if mode:
+            os.chmod(target, mode)
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(target, (mtime, mtime))
+        with lock:
+            done += info.file_size
+            if progress is not None:
+                progress(done, total)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # Larger members first so one big file does not finish last alone
+            order = sorted(targets, key=lambda item: item[0].file_size, reverse=True)
+            for future in [executor.submit(extract, info, target) for info, target in order]:
+                future.result()
+    finally:
+        for zf in handles:
+            zf.close()
+    return sum(1 for info in members if not info.is_dir())
+
+
+def _extract_tar(archive: str, destination: Path,
+                 progress: Optional[ProgressCallback]) -> int:
+    """Extract a tar archive member by member as it is read."""
+    total = os.path.getsize(archive)
+    count = 0
+    with open(archive, "rb") as raw, tarfile.open(fileobj=raw, mode="r|*") as tf:
+        for member in tf:
+            _safe_target(destination, member.name)
+            if member.issym() or member.islnk():
+                _safe_target(destination, os.path.join(os.path.dirname(member.name),
+                                                        member.linkname))
+            if hasattr(tarfile, "data_filter"):
+                tf.extract(member, destination, filter="data")
+            else:
+                tf.extract(member, destination)
+            if member.isfile():
+                count += 1
+            if progress is not None:
+                progress(raw.tell(), total)
+    return count
+
+
+def extract(archive: str, destination: Optional[str] = None,
+            max_workers: int = DEFAULT_WORKERS,
+            progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+    """Extract a zip or tar archive, streaming members to disk.
+
+    Args:
+        archive: Archive to extract
+        destination: Folder to extract into; defaults to a folder named
+            after the archive next to it
+        max_workers: Number of zip members decompressed concurrently
+        progress: Optional callback receiving (bytes done, bytes total)
+
+    Returns:
+        Dict[str, Any]: Destination, number of files and seconds
+
+    Raises:
+        ValueError: If a path is outside the workspace, the format is not
+            supported or a member would escape the destination
+        OSError: If the archive cannot be read or written
+    """
+    start = time.perf_counter()
+    source = str(ensure_safe_path(archive))
+    if destination is None:
+        base = os.path.basename(source)
+        for suffix in (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".zip"):
+            if base.lower().endswith(suffix):
+                base = base[:-len(suffix)]
+                break
+        destination = os.path.join(os.path.dirname(source), base)
+    target = ensure_safe_path(destination)
+    target.mkdir(parents=True, exist_ok=True)
+
+    if zipfile.is_zipfile(source):
+        count = _extract_zip(source, target, max_workers, progress)
+    elif tarfile.is_tarfile(source):
+        count = _extract_tar(source, target, progress)
+    else:
+        raise ValueError(f"{archive} is not a zip or tar archive")
+    return {"destination": str(target), "files": count,
+            "seconds": time.perf_counter() - start}
+
+
+# -- Commands --
+
+def _print_progress(label: str) -> ProgressCallback:
+    """Make a progress callback printing every ten percent."""
+    last = [-1]
+
+    def report(done: int, total: int) -> None:
+        percent = 100 if total == 0 else done * 100 // total
+        if percent // 10 != last[0]:
+            last[0] = percent // 10
+            print(f"{label}: {percent}%")
+
+    return report
+
+
+def compress_folder(folder: str, archive: Optional[str] = None,
+                    method: str = "deflate") -> str:
+    """Compress a folder into a zip archive next to it.
+
+    Args:
+        folder: Folder to compress
+        archive: Optional archive path, defaults to "<folder>.zip"
+        method: "deflate" or "lzma"
+
+    Returns:
+        str: Status message
+    """
+    try:
+        source = ensure_safe_path(folder)
+        if not source.is_dir():
+            return f"{folder} is not a folder."
+        archive = archive or str(source) + ".zip"
+        if os.path.exists(archive):
+            return f"{os.path.basename(archive)} already exists."
+        result = write_zip(str(source), archive, method,
+                           progress=_print_progress(f"Compressing {source.name}"))
+        get_db_manager().log_operation("COMPRESS", str(source), archive, "SUCCESS")
+        ratio = result["bytes_out"] / result["bytes_in"] * 100 if result["bytes_in"] else 100
+        return (f"Compressed {result['files']} file(s) into {os.path.basename(archive)} "
+                f"({ratio:.0f}% of the original size) in {result['seconds']:.1f}s.")
+    except (ValueError, lzma.LZMAError) as e:
+        return f"Cannot compress {folder}: {str(e)}"
+    except OSError as e:
+        logger.error("Error compressing %s: %s", folder, str(e))
+        return f"Failed to compress {folder}: {str(e)}"
+
+
+def extract_archive(archive: str, destination: Optional[str] = None) -> str:
+    """Extract an archive into a folder.
+
+    Args:
+        archive: Zip or tar archive to extract
+        destination: Optional folder, defaults to one named after the archive
+
+    Returns:
+        str: Status message
+    """
+    try:
+        if not os.path.isfile(archive):
+            return f"Archive {archive} does not exist."
+        result = extract(archive, destination,
+                         progress=_print_progress(f"Extracting {os.path.basename(archive)}"))
+        get_db_manager().log_operation("EXTRACT", archive, result["destination"], "SUCCESS")
+        return (f"Extracted {result['files']} file(s) to "
+                f"{os.path.basename(result['destination'])} in {result['seconds']:.1f}s.")
+    except (ValueError, zipfile.BadZipFile, tarfile.TarError) as e:
+        return f"Cannot extract {archive}: {str(e)}"
+    except OSError as e:
+        logger.error("Error extracting %s: %s", archive, str(e))
+        return f"Failed to extract {archive}: {str(e)}"
@@ -1,6 +1,8 @@
 import os
 import shutil
 
+from utils.file_query import FileQuery
+
 # Define categories and extensions
 FILE_CATEGORIES = {
     "Images": [".png", ".jpg", ".jpeg", ".gif", ".bmp"],
@@ -18,11 +20,9 @@ def auto_sort_files(source_folder="."):
 
     files_moved = 0
 
-    for file_name in os.listdir(source_folder):
-        file_path = os.path.join(source_folder, file_name)
-
-        if not os.path.isfile(file_path):
-            continue
+    # Files excluded by .gitignore/.jarvisignore in the folder are left alone
+    for file_name, entry in FileQuery().walk(source_folder, recursive=False):
+        file_path = entry.path
 
         _, ext = os.path.splitext(file_name)
         ext = ext.lower()
@@ -0,0 +1,290 @@
+"""Automatic versioning of files and folders when they change.
+
+Marked paths are kept in the database and watched through the shared file
+watcher. A changed file is versioned once it has been quiet for
+QUIET_SECONDS, so the burst of writes and renames of one editor save
+makes a single version, and at the latest MAX_WAIT_SECONDS after its
+first change, so a file written continuously is still versioned. Files
+whose size and mtime match their latest version are skipped without being
+read, and files whose chunks hash the same as it are skipped without
+storing anything.
+
+Versions are saved by one worker thread at the lowest scheduling
+priority, which on Linux also lowers its I/O priority, so saving large
+files does not slow down the voice loop.
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.database import get_db_manager
+from utils.file_query import FileQuery
+from utils.file_watcher import DELETED, RESCAN, ChangeEvent, get_file_watcher
+from .file_manager import ensure_safe_path
+from .file_versioning import VersionStore, get_version_store
+
+logger = logging.getLogger(__name__)
+
+QUIET_SECONDS = 5.0
+MAX_WAIT_SECONDS = 60.0
+# Niceness of the worker thread, the lowest priority
+WORKER_NICENESS = 19
+
+
+def _lower_thread_priority() -> None:
+    """Give the calling thread the lowest CPU (and, on Linux, I/O) priority."""
+    try:
+        # On Linux the niceness of a thread id applies to that thread only
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), WORKER_NICENESS)
+    except (AttributeError, OSError) as e:
+        logger.debug("Could not lower the versioning priority: %s", str(e))
+
+
+def _under(path: str, root: str) -> bool:
+    """Check whether a path is a folder or lies inside it."""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+class AutoVersioner:
+    """Versions marked files and folders in the background when they change."""
+
+    def __init__(self, store: Optional[VersionStore] = None,
+                 quiet: float = QUIET_SECONDS, max_wait: float = MAX_WAIT_SECONDS):
+        """Initialize the versioner; it starts watching with start().
+
+        Args:
+            store: Version store to save to; defaults to the global one
+            quiet: Seconds a file must be unchanged before it is versioned
+            max_wait: Longest time in seconds a changed file waits
+        """
+        self._store = store
+        self.quiet = quiet
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._targets: Dict[str, int] = {}
+        # Path -> (first change, due time), monotonic
+        self._pending: Dict[str, Tuple[float, float]] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = False
+        self.saved = 0
+        self.skipped = 0
+
+    @property
+    def store(self) -> VersionStore:
+        return self._store or get_version_store()
+
+    def start(self) -> None:
+        """Watch every marked path and start the worker thread."""
+        for path in get_db_manager().get_auto_versioned_paths():
+            if os.path.exists(path):
+                self._watch(path)
+            else:
+                logger.warning("Auto-versioned path %s no longer exists", path)
+        with self._cond:
+            if self._thread is None:
+                self._stop = False
+                self._thread = threading.Thread(target=self._run, name="auto-versioning",
+                                                daemon=True)
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching and stop the worker; pending changes are dropped."""
+        with self._cond:
+            targets = list(self._targets.values())
+            self._targets.clear()
+            self._pending.clear()
+            self._stop = True
+            self._cond.notify_all()
+            thread, self._thread = self._thread, None
+        for sub_id in targets:
+            get_file_watcher().unsubscribe(sub_id)
+        if thread is not None:
+            thread.join()
+
+    def _watch(self, path: str) -> None:
+        """Subscribe to the changes of a file (through its folder) or folder."""
+        with self._cond:
+            if path in self._targets:
+                return
+        root = path if os.path.isdir(path) else os.path.dirname(path)
+        sub_id = get_file_watcher().subscribe(root, self.queue_changes)
+        with self._cond:
+            self._targets[path] = sub_id
+
+    def enable(self, path: str) -> str:
+        """Mark a file or folder for automatic versioning.
+
+        Args:
+            path: File or folder to version whenever it changes
+
+        Returns:
+            str: Status message
+        """
+        try:
+            target = str(ensure_safe_path(path))
+            if not os.path.exists(target):
+                return f"{path} does not exist."
+            get_db_manager().add_auto_versioned_path(target, time.time())
+            self._watch(target)
+            if os.path.isfile(target):
+                # The first version is the baseline later changes are compared to
+                self.queue_paths([target], delay=0)
+            return f"Versioning {os.path.basename(target) or target} automatically."
+        except (OSError, ValueError) as e:
+            logger.error("Failed to enable auto-versioning: %s", str(e))
+            return f"Error enabling auto-versioning: {str(e)}"
+
+    def disable(self, path: str) -> str:
+        """Stop versioning a file or folder automatically.
+
+        Args:
+            path: Marked file or folder
+
+        Returns:
+            str: Status message
+        """
+        try:
+            target = str(ensure_safe_path(path))
+        except ValueError as e:
+            return f"Error disabling auto-versioning: {str(e)}"
+        if not get_db_manager().remove_auto_versioned_path(target):
+            return f"{path} is not versioned automatically."
+        with self._cond:
+            sub_id = self._targets.pop(target, None)
+            for pending in [p for p in self._pending if self._target_for(p) is None]:
+                del self._pending[pending]
+        if sub_id is not None:
+            get_file_watcher().unsubscribe(sub_id)
+        return f"Stopped versioning {os.path.basename(target) or target} automatically."
+
+    def _target_for(self, path: str) -> Optional[str]:
+        """Get the marked file, or marked folder, a path falls under; call locked."""
+        for target in self._targets:
+            if path == target or (_under(path, target) and os.path.isdir(target)):
+                return target
+        return None
+
+    def _excluded(self, path: str, target: str) -> bool:
+        """Skip the database and default-excluded folders such as the chunk store."""
+        if path.startswith(os.path.abspath(get_db_manager().db_path)):
+            return True
+        if path == target:
+            return False
+        excluded = FileQuery().exclude
+        parts = os.path.relpath(path, target).split(os.sep)
+        return any(excluded.match("/".join(parts[:i]), i < len(parts))
+                   for i in range(1, len(parts) + 1))
+
+    def queue_paths(self, paths: Iterable[str], delay: Optional[float] = None) -> None:
+        """Schedule files to be versioned, pushing back ones already scheduled.
+
+        Args:
+            paths: Absolute file paths
+            delay: Seconds to wait; defaults to the quiet time
+        """
+        delay = self.quiet if delay is None else delay
+        now = time.monotonic()
+        with self._cond:
+            for path in paths:
+                first = self._pending.get(path, (now, 0.0))[0]
+                self._pending[path] = (first, min(now + delay, first + self.max_wait))
+            self._cond.notify_all()
+
+    def queue_changes(self, events: List[ChangeEvent]) -> None:
+        """File watcher callback: schedule the changed files that are marked."""
+        changed = []
+        for event in events:
+            if event.kind == RESCAN:
+                changed.extend(self._files_under(event.path))
+            elif event.kind == DELETED:
+                with self._cond:
+                    self._pending.pop(event.path, None)
+            elif not event.is_dir:
+                with self._cond:
+                    target = self._target_for(event.path)
+                if target is not None and not self._excluded(event.path, target):
+                    changed.append(event.path)
+        if changed:
+            self.queue_paths(changed)
+
+    def _files_under(self, root: str) -> List[str]:
+        """List the marked files under a folder that lost events."""
+        with self._cond:
+            targets = [t for t in self._targets if _under(t, root) or _under(root, t)]
+        files = []
+        for target in targets:
+            if os.path.isfile(target):
+                files.append(target)
+                continue
+            top = root if _under(root, target) else target
+            files.extend(entry.path for _, entry in FileQuery().walk(top, True, False)
+                         if not self._excluded(entry.path, target))
+        return files
+
+    def _save(self, path: str) -> None:
+        """Version one file unless it is unchanged."""
+        try:
+            if not os.path.isfile(path):
+                return
+            if self.store.save(path, skip_unchanged=True) is None:
+                self.skipped += 1
+            else:
+                self.saved += 1
+        except (OSError, ValueError) as e:
+            logger.error("Failed to auto-version %s: %s", path, str(e))
+
+    def _take_due(self, everything: bool = False) -> List[str]:
+        """Remove and return the scheduled files that are due; call locked."""
+        now = time.monotonic()
+        due = [path for path, (_, at) in self._pending.items() if everything or at <= now]
+        for path in due:
+            del self._pending[path]
+        return sorted(due)
+
+    def flush(self) -> int:
+        """Version every scheduled file now, in the calling thread.
+
+        Returns:
+            int: Number of files checked
+        """
+        with self._cond:
+            due = self._take_due(everything=True)
+        for path in due:
+            self._save(path)
+        return len(due)
+
+    def _run(self) -> None:
+        """Worker thread: version scheduled files as they fall due."""
+        _lower_thread_priority()
+        while True:
+            with self._cond:
+                while not self._stop:
+                    due = self._take_due()
+                    if due:
+                        break
+                    wait = min((at for _, at in self._pending.values()), default=None)
+                    self._cond.wait(None if wait is None else max(0.0, wait - time.monotonic()))
+                if self._stop:
+                    return
+            for path in due:
+                self._save(path)
+
+
+# Global instance
+_auto_versioner = None
+
+
+def get_auto_versioner() -> AutoVersioner:
+    """Get the global AutoVersioner instance."""
+    global _auto_versioner
+    if _auto_versioner is None:
+        _auto_versioner = AutoVersioner()
+    return _auto_versioner
+
+
+def list_auto_versioned() -> List[str]:
+    """List the files and folders versioned automatically."""
+    return get_db_manager().get_auto_versioned_paths()
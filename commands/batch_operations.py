@@ -0,0 +1,318 @@
+"""Batch file operations module.
+
+Applies delete, move, copy and tag to every file matching a glob or regex
+selector. The whole operation set is planned in one pass and checked for
+collisions before anything is touched, independent operations then run
+concurrently, and every completed step is journaled so a failure rolls the
+entire batch back.
+"""
+
+import fnmatch
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from utils.database import get_db_manager
+from utils.file_identity import get_identity_map
+from utils.file_query import FileQuery
+from utils.retry import Transaction
+from .file_manager import ensure_safe_path, tag_manager
+from .recycle_bin import get_recycle_bin
+
+logger = logging.getLogger(__name__)
+
+BATCH_ACTIONS = ("delete", "move", "copy", "tag")
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+class BatchOperation(NamedTuple):
+    """A single planned step of a batch.
+
+    The target is the destination path for move/copy, the tag for tag and
+    None for delete.
+    """
+
+    action: str
+    source: Path
+    target: Union[Path, str, None]
+
+
+def compile_selector(pattern: str, use_regex: bool = False) -> Callable[[str], bool]:
+    """Compile a glob or regex selector into a name matcher.
+
+    Args:
+        pattern: Glob (e.g. "*.pdf") or regular expression
+        use_regex: Treat the pattern as a regular expression
+
+    Returns:
+        Callable[[str], bool]: Function returning True for matching names
+    """
+    if use_regex:
+        regex = re.compile(pattern, re.IGNORECASE)
+        return lambda name: regex.search(name) is not None
+    regex = re.compile(fnmatch.translate(pattern), re.IGNORECASE)
+    return lambda name: regex.match(name) is not None
+
+
+def selector_from_words(words: str) -> str:
+    """Turn a spoken file description into a glob.
+
+    "pdfs", "pdf files" and ".pdf" all become "*.pdf"; "all" or "files"
+    become "*".
+
+    Args:
+        words: Spoken description of the files
+
+    Returns:
+        str: Glob pattern
+    """
+    words = words.strip().lower().replace(" files", "").replace(" file", "")
+    if words in ("", "all", "files", "everything"):
+        return "*"
+    if any(char in words for char in "*?["):
+        return words
+    ext = words.lstrip(".")
+    if ext.endswith("s") and len(ext) > 3:
+        ext = ext[:-1]
+    return f"*.{ext}"
+
+
+def select_files(directory: str, pattern: str, use_regex: bool = False,
+                 recursive: bool = False) -> List[Path]:
+    """Select the files in a directory matching a selector.
+
+    Args:
+        directory: Directory to select from
+        pattern: Glob or regex matched against file names
+        use_regex: Treat the pattern as a regular expression
+        recursive: Also select files in subdirectories
+
+    Returns:
+        List[Path]: Matching file paths
+    """
+    root = ensure_safe_path(directory)
+    matches = compile_selector(pattern, use_regex)
+    return [Path(entry.path) for _, entry in FileQuery().walk(str(root), recursive=recursive)
+            if matches(entry.name)]
+
+
+def plan_batch(action: str, sources: List[Path],
+               target: Optional[str] = None) -> List[BatchOperation]:
+    """Plan a batch and check it for collisions before anything runs.
+
+    Args:
+        action: One of BATCH_ACTIONS
+        sources: Files to operate on
+        target: Destination folder for move/copy, or the tag for tag
+
+    Returns:
+        List[BatchOperation]: The planned operations
+
+    Raises:
+        ValueError: If the action is unknown, the target is missing or any
+            planned destination collides with an existing or planned file
+    """
+    if action not in BATCH_ACTIONS:
+        raise ValueError(f"Unknown batch action: {action}")
+    if action != "delete" and not target:
+        raise ValueError(f"A target is required to {action} files")
+
+    if action in ("delete", "tag"):
+        tag = target if action == "tag" else None
+        return [BatchOperation(action, source, tag) for source in sources]
+
+    target_dir = ensure_safe_path(target)
+    if target_dir.exists() and not target_dir.is_dir():
+        raise ValueError(f"Target {target} is not a directory")
+
+    plan = []
+    planned = set()
+    collisions = []
+    for source in sources:
+        destination = target_dir / source.name
+        if destination == source:
+            continue
+        if destination in planned or destination.exists():
+            collisions.append(str(destination))
+            continue
+        planned.add(destination)
+        plan.append(BatchOperation(action, source, destination))
+
+    if collisions:
+        shown = ", ".join(collisions[:3])
+        more = f" and {len(collisions) - 3} more" if len(collisions) > 3 else ""
+        raise ValueError(f"{len(collisions)} destination(s) already exist: {shown}{more}")
+    return plan
+
+
+def _remove(path: Path) -> None:
+    """Remove a file or folder."""
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+
+
+def _apply(operation: BatchOperation) -> Any:
+    """Apply one planned operation and return what is needed to undo it."""
+    if operation.action == "delete":
+        return get_recycle_bin().trash_item(operation.source, record=False)
+    if operation.action == "move":
+        try:
+            os.rename(operation.source, operation.target)
+        except OSError:
+            shutil.move(str(operation.source), str(operation.target))
+        return None
+    if operation.action == "copy":
+        if operation.source.is_dir():
+            shutil.copytree(operation.source, operation.target)
+        else:
+            shutil.copy2(operation.source, operation.target)
+        return None
+    raise ValueError(f"Unknown batch action: {operation.action}")
+
+
+def _undo(operation: BatchOperation, undo_info: Any) -> None:
+    """Undo one applied operation."""
+    if operation.action == "delete":
+        get_recycle_bin().restore_entry(undo_info)
+    elif operation.action == "move":
+        shutil.move(str(operation.target), str(operation.source))
+    elif operation.action == "copy":
+        _remove(operation.target)
+
+
+def _rollback(journal: List[tuple]) -> None:
+    """Undo journaled operations in reverse order."""
+    for operation, undo_info in reversed(journal):
+        try:
+            _undo(operation, undo_info)
+        except Exception as e:
+            logger.error("Error rolling back %s of %s: %s",
+                         operation.action, operation.source, str(e))
+
+
+def execute_batch(plan: List[BatchOperation], transaction: Optional[Transaction] = None,
+                  max_workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """Run a planned batch as a single all-or-nothing transaction.
+
+    Args:
+        plan: Operations returned by plan_batch
+        transaction: Optional enclosing transaction; the batch registers one
+            operation with it that undoes the whole batch on rollback
+        max_workers: Maximum number of concurrent operations
+
+    Returns:
+        Dict[str, Any]: The action, number of operations, duration in
+        seconds and throughput in operations per second
+
+    Raises:
+        Exception: The first error raised by an operation, after every
+            completed operation has been rolled back
+    """
+    start = time.perf_counter()
+    journal: List[tuple] = []
+    action = plan[0].action if plan else None
+
+    if action == "tag":
+        tag = plan[0].target
+        added = tag_manager.add_tag_to_files([str(op.source) for op in plan], tag)
+        undo_batch = lambda: tag_manager.remove_tag_from_files(added, tag)
+    elif plan:
+        lock = threading.Lock()
+
+        def run(operation: BatchOperation) -> None:
+            undo_info = _apply(operation)
+            with lock:
+                journal.append((operation, undo_info))
+
+        error = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run, operation) for operation in plan]
+            for future in as_completed(futures):
+                if future.exception() is not None:
+                    error = future.exception()
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    break
+
+        if error is not None:
+            _rollback(journal)
+            _log_batch(plan, "ROLLED_BACK", str(error))
+            raise error
+
+        if action == "delete":
+            get_recycle_bin().record_entries([undo_info for _, undo_info in journal])
+        # Tags, metadata and versions follow moved files
+        moves = [(str(op.source), str(op.target)) for op, _ in journal if action == "move"]
+        get_identity_map().moved_many(moves)
+
+        def undo_batch() -> None:
+            _rollback(journal)
+            get_identity_map().moved_many([(new, old) for old, new in reversed(moves)])
+    else:
+        undo_batch = lambda: None
+
+    if transaction is not None:
+        transaction.add_operation(lambda: None, undo_batch)
+
+    duration = time.perf_counter() - start
+    _log_batch(plan, "SUCCESS")
+    return {
+        "action": action,
+        "count": len(plan),
+        "seconds": duration,
+        "ops_per_sec": len(plan) / duration if duration > 0 else float(len(plan)),
+    }
+
+
+def _log_batch(plan: List[BatchOperation], status: str, error: Optional[str] = None) -> None:
+    """Record every operation of a batch in the operation log at once."""
+    try:
+        get_db_manager().log_operations([
+            (f"BATCH_{op.action.upper()}", str(op.source),
+             str(op.target) if op.target is not None else None, status, error)
+            for op in plan
+        ])
+    except Exception as e:
+        logger.error("Failed to log batch operations: %s", str(e))
+
+
+def batch_operation(action: str, directory: str, pattern: str, target: Optional[str] = None,
+                    use_regex: bool = False, recursive: bool = False,
+                    transaction: Optional[Transaction] = None) -> str:
+    """Select, plan and run a batch file operation.
+
+    Args:
+        action: One of "delete", "move", "copy" or "tag"
+        directory: Directory to select files from
+        pattern: Glob or regex matched against file names
+        target: Destination folder for move/copy, or the tag for tag
+        use_regex: Treat the pattern as a regular expression
+        recursive: Also select files in subdirectories
+        transaction: Optional enclosing transaction
+
+    Returns:
+        str: Status message including the throughput
+    """
+    try:
+        sources = select_files(directory, pattern, use_regex, recursive)
+        if not sources:
+            return f"No files matching '{pattern}' in {directory}."
+        plan = plan_batch(action, sources, target)
+        if action in ("move", "copy"):
+            os.makedirs(ensure_safe_path(target), exist_ok=True)
+        result = execute_batch(plan, transaction)
+        verb = {"delete": "Deleted", "move": "Moved", "copy": "Copied", "tag": "Tagged"}[action]
+        return (f"{verb} {result['count']} file(s) in {result['seconds']:.2f}s "
+                f"({result['ops_per_sec']:.0f} ops/sec).")
+    except ValueError as e:
+        return f"Cannot {action} files: {str(e)}"
+    except Exception as e:
+        logger.error("Batch %s failed: %s", action, str(e))
+        return f"Batch {action} failed and was rolled back: {str(e)}"
@@ -0,0 +1,363 @@
+"""Batch rename module.
+
+Renames every file matching a selector using a regex substitution or a
+name template such as "{date:%Y-%m-%d}_{n:03}". The new name of every file
+is computed in one pass and the plan is checked before anything is
+touched: invalid names, two files getting the same name and names taken by
+files outside the batch are all refused. Renames are then ordered so each
+target is free when its turn comes. A chain (a->b, b->c) runs from its end,
+and a cycle (a->b, b->a) is broken by parking one file under a temporary
+name. The batch is applied as a whole: a failure undoes every rename done
+so far, and the enclosing transaction can undo the batch later.
+"""
+
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from utils.database import get_db_manager
+from utils.file_identity import get_identity_map
+from utils.retry import Transaction
+from .batch_operations import select_files
+from .metadata_extractor import extract_metadata
+
+logger = logging.getLogger(__name__)
+
+DATE_FORMAT = "%Y-%m-%d_%H%M%S"
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+TEMP_PREFIX = ".jarvis-rename-"
+DATE_CHUNK = 256
+# Extensions whose Exif date is preferred over the modification time
+EXIF_EXTENSIONS = (".jpg", ".jpeg")
+
+_TEMPLATE_FIELD = re.compile(r"\{(\w*)")
+
+
+class RenameStep(NamedTuple):
+    """One rename of an ordered plan."""
+
+    source: str
+    target: str
+
+
+class _Date(datetime):
+    """A datetime that formats as DATE_FORMAT when no format is given."""
+
+    def __format__(self, spec: str) -> str:
+        return super().__format__(spec or DATE_FORMAT)
+
+
+def file_date(path: Path) -> datetime:
+    """Get when a photo was taken, or else when the file was last modified."""
+    if path.suffix.lower() in EXIF_EXTENSIONS:
+        taken = extract_metadata(str(path)).get("taken")
+        if taken:
+            return datetime.fromisoformat(taken)
+    return datetime.fromtimestamp(path.stat().st_mtime)
+
+
+def _natural_key(name: str) -> List[Any]:
+    """Sort key putting "img2" before "img10"."""
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", name.lower())]
+
+
+def _check_name(name: str) -> Optional[str]:
+    """Describe what is wrong with a new file name, or None if it is valid."""
+    if not name or name in (".", ".."):
+        return "an empty name"
+    if "/" in name or os.sep in name or "\0" in name:
+        return f"'{name}' is not a plain file name"
+    return None
+
+
+def new_names(sources: List[Path], template: str,
+              pattern: Optional[str] = None, number_duplicates: bool = False,
+              max_workers: int = DEFAULT_WORKERS) -> List[Tuple[Path, Path]]:
+    """Compute the new path of every file.
+
+    Without "{" in the template and with a pattern, the first match of the
+    pattern in each name is replaced by the template, with "\\1"-style
+    references. Otherwise the template is formatted with the fields
+    {name} (stem), {ext}, {n} (position, from 1), {date} and {parent}, plus
+    {0}, {1}... for the pattern's match and groups. Numbering follows the
+    date when {date} is used, and the natural name order otherwise. The
+    original extension is kept when the template gives none.
+
+    Args:
+        sources: Files to rename
+        template: Replacement or name template
+        pattern: Optional regex; files whose name does not match are skipped
+        number_duplicates: Add "_2", "_3"... to names given more than once,
+            e.g. photos taken in the same second
+        max_workers: Number of files whose date is read at once
+
+    Returns:
+        List[Tuple[Path, Path]]: (source, target) pairs in numbering order
+
+    Raises:
+        ValueError: If the pattern or template is invalid, or gives a file
+            an invalid name
+    """
+    try:
+        regex = re.compile(pattern, re.IGNORECASE) if pattern else None
+    except re.error as e:
+        raise ValueError(f"Invalid pattern '{pattern}': {str(e)}")
+    if regex is not None:
+        sources = [source for source in sources if regex.search(source.name)]
+    fields = set(_TEMPLATE_FIELD.findall(template)) if "{" in template else set()
+
+    if "date" in fields:
+        # Headers are tiny: hand each worker a run of files, not one future each
+        chunks = [sources[i:i + DATE_CHUNK] for i in range(0, len(sources), DATE_CHUNK)]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            dates = [date for chunk in executor.map(lambda paths: [file_date(p) for p in paths],
+                                                    chunks)
+                     for date in chunk]
+        order = sorted(range(len(sources)),
+                       key=lambda i: (dates[i], _natural_key(sources[i].name)))
+    else:
+        dates = [None] * len(sources)
+        order = sorted(range(len(sources)), key=lambda i: _natural_key(sources[i].name))
+
+    literal = re.sub(r"\{[^}]*\}", "", template)
+    keep_ext = "ext" not in fields and "." not in literal
+    renames = []
+    given: Dict[str, int] = {}
+    for n, i in enumerate(order, 1):
+        source = sources[i]
+        match = regex.search(source.name) if regex is not None else None
+        try:
+            if not fields and match is not None:
+                name = source.name[:match.start()] + match.expand(template) \
+                    + source.name[match.end():]
+            else:
+                groups = [match.group(0), *match.groups()] if match is not None else []
+                date = _Date.fromtimestamp(dates[i].timestamp()) if dates[i] else None
+                name = template.format(
+                    *groups, name=source.stem, ext=source.suffix.lstrip("."), n=n,
+                    date=date, parent=source.parent.name,
+                )
+                if keep_ext:
+                    name += source.suffix
+        except (IndexError, KeyError, ValueError, re.error) as e:
+            raise ValueError(f"Invalid template '{template}': {str(e)}")
+        name = name.strip()
+        problem = _check_name(name)
+        if problem is not None:
+            raise ValueError(f"{source.name} would get {problem}")
+        if number_duplicates:
+            given[name] = given.get(name, 0) + 1
+            if given[name] > 1:
+                stem, ext = os.path.splitext(name)
+                name = f"{stem}_{given[name]}{ext}"
+        renames.append((source, source.with_name(name)))
+    return renames
+
+
+def plan_renames(renames: List[Tuple[Path, Path]]) -> List[RenameStep]:
+    """Check a set of renames and order them so each target is free in turn.
+
+    Args:
+        renames: (source, target) pairs
+
+    Returns:
+        List[RenameStep]: Renames in a safe order, with temporary names
+        breaking cycles
+
+    Raises:
+        ValueError: If a name is invalid, two files get the same name or a
+            target is taken by a file outside the batch
+    """
+    # Plain strings: hashing tens of thousands of Paths dominates otherwise
+    mapping: Dict[str, str] = {}
+    problems = []
+    for source, target in renames:
+        source, target = str(source), str(target)
+        if target == source:
+            continue
+        problem = _check_name(os.path.basename(target))
+        if problem is not None:
+            problems.append(f"{os.path.basename(source)} would get {problem}")
+            continue
+        mapping[source] = target
+
+    # One listing per folder instead of a stat per target
+    listings: Dict[str, set] = {}
+    incoming: Dict[str, str] = {}
+    for source, target in mapping.items():
+        folder, name = os.path.split(target)
+        if folder not in listings:
+            try:
+                listings[folder] = set(os.listdir(folder))
+            except OSError:
+                listings[folder] = set()
+        if target in incoming:
+            problems.append(f"{os.path.basename(incoming[target])} and "
+                            f"{os.path.basename(source)} would both become {name}")
+        elif target not in mapping and name in listings[folder] and \
+                not _same_file(source, target):
+            problems.append(f"{name} already exists")
+        incoming[target] = source
+    if problems:
+        shown = "; ".join(problems[:3])
+        more = f" and {len(problems) - 3} more" if len(problems) > 3 else ""
+        raise ValueError(f"{len(problems)} problem(s): {shown}{more}")
+
+    steps: List[RenameStep] = []
+    done = set()
+    # A rename is ready once its target is not waiting to be renamed itself;
+    # doing it frees its source for the rename that points at it
+    ready = [source for source, target in mapping.items() if target not in mapping]
+    while ready:
+        source = ready.pop()
+        steps.append(RenameStep(source, mapping[source]))
+        done.add(source)
+        previous = incoming.get(source)
+        if previous is not None:
+            ready.append(previous)
+
+    # Whatever is left forms cycles
+    for start in mapping:
+        if start in done:
+            continue
+        temp = _temp_name(start)
+        steps.append(RenameStep(start, temp))
+        current = start
+        while incoming[current] != start:
+            current = incoming[current]
+            steps.append(RenameStep(current, mapping[current]))
+            done.add(current)
+        steps.append(RenameStep(temp, mapping[start]))
+        done.add(start)
+    return steps
+
+
+def _same_file(source: str, target: str) -> bool:
+    """Check whether a target is the source itself, e.g. a case-only rename."""
+    try:
+        return os.path.samefile(source, target)
+    except OSError:
+        return False
+
+
+def _temp_name(path: str) -> str:
+    """Pick an unused temporary name next to a file."""
+    folder, name = os.path.split(path)
+    count = 0
+    while True:
+        temp = os.path.join(folder, f"{TEMP_PREFIX}{count}-{name}")
+        if not os.path.lexists(temp):
+            return temp
+        count += 1
+
+
+def execute_renames(steps: List[RenameStep],
+                    transaction: Optional[Transaction] = None) -> Dict[str, Any]:
+    """Apply an ordered rename plan as a single all-or-nothing operation.
+
+    Args:
+        steps: Renames returned by plan_renames
+        transaction: Optional enclosing transaction; the batch registers one
+            operation with it that undoes every rename on rollback
+
+    Returns:
+        Dict[str, Any]: Number of renamed files, duration in seconds and
+        throughput in renames per second
+
+    Raises:
+        OSError: The first failed rename, after the others were undone
+    """
+    start = time.perf_counter()
+    journal: List[RenameStep] = []
+
+    def undo() -> None:
+        for step in reversed(journal):
+            try:
+                os.rename(step.target, step.source)
+            except OSError as e:
+                logger.error("Error undoing rename of %s: %s", step.source, str(e))
+
+    try:
+        for step in steps:
+            # os.rename replaces silently on POSIX; never clobber a file that
+            # appeared after planning
+            if os.path.lexists(step.target) and not _same_file(step.source, step.target):
+                raise FileExistsError(f"{os.path.basename(step.target)} appeared while renaming")
+            os.rename(step.source, step.target)
+            journal.append(step)
+    except OSError as e:
+        undo()
+        _log_renames(steps, "ROLLED_BACK", str(e))
+        raise
+
+    # Tags, metadata and versions follow the renamed files
+    moves = [(step.source, step.target) for step in steps]
+    get_identity_map().moved_many(moves)
+
+    def undo_batch() -> None:
+        undo()
+        get_identity_map().moved_many([(new, old) for old, new in reversed(moves)])
+
+    if transaction is not None:
+        transaction.add_operation(lambda: None, undo_batch)
+    _log_renames(steps, "SUCCESS")
+    duration = time.perf_counter() - start
+    count = sum(1 for step in steps
+                if not os.path.basename(step.target).startswith(TEMP_PREFIX))
+    return {
+        "count": count,
+        "seconds": duration,
+        "ops_per_sec": count / duration if duration > 0 else float(count),
+    }
+
+
+def _log_renames(steps: List[RenameStep], status: str, error: Optional[str] = None) -> None:
+    """Record every rename of a batch in the operation log at once."""
+    try:
+        get_db_manager().log_operations([
+            ("BATCH_RENAME", step.source, step.target, status, error)
+            for step in steps
+        ])
+    except Exception as e:
+        logger.error("Failed to log batch renames: %s", str(e))
+
+
+def batch_rename(directory: str, template: str, selector: str = "*",
+                 pattern: Optional[str] = None, recursive: bool = False,
+                 number_duplicates: bool = False,
+                 transaction: Optional[Transaction] = None) -> str:
+    """Select, plan and run a batch rename.
+
+    Args:
+        directory: Directory to select files from
+        template: Replacement or name template, see new_names
+        selector: Glob matched against file names
+        pattern: Optional regex the names must match, used by the template
+        recursive: Also rename files in subdirectories
+        number_duplicates: Number names the template gives more than once
+        transaction: Optional enclosing transaction
+
+    Returns:
+        str: Status message including the throughput
+    """
+    try:
+        sources = select_files(directory, selector, recursive=recursive)
+        renames = new_names(sources, template, pattern, number_duplicates)
+        if not renames:
+            return f"No files matching '{pattern or selector}' in {directory}."
+        steps = plan_renames(renames)
+        if not steps:
+            return "Those files already have those names."
+        result = execute_renames(steps, transaction)
+        return (f"Renamed {result['count']} file(s) in {result['seconds']:.2f}s "
+                f"({result['ops_per_sec']:.0f} renames/sec).")
+    except ValueError as e:
+        return f"Cannot rename files: {str(e)}"
+    except OSError as e:
+        logger.error("Batch rename failed: %s", str(e))
+        return f"Batch rename failed and was rolled back: {str(e)}"
@@ -0,0 +1,562 @@
+"""Trigram content index for repeated full-text searches.
+
+Every indexed file is split into the set of byte trigrams it contains, and
+each trigram keeps a sorted posting list of the files containing it. A
+substring query is answered by intersecting the posting lists of the
+query's trigrams, smallest first, and verifying only the surviving files.
+Text files larger than max_file_size are recorded without trigrams and are
+verified on every query.
+
+The index lives in a single file: a table of (path, mtime, size) records
+followed by the posting lists, delta-encoded as varints. Posting lists are
+decoded lazily, so loading the index and answering a query only touches
+the trigrams involved. ``update`` reindexes only files whose mtime or size
+changed; replaced entries are tombstoned and dropped when the index is
+compacted on save. ``watch`` subscribes to the file watcher so a watched
+tree is kept current without rescanning it before each query; changes
+from events are saved in batches, SAVE_DELAY_SECONDS after the first.
+"""
+
+import logging
+import os
+import struct
+import threading
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from utils.file_query import FileQuery
+from utils.file_watcher import DELETED, RESCAN, ChangeEvent, get_file_watcher
+from .content_search import DEFAULT_WORKERS, compile_query, is_binary, scan_file
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "content_index.bin"
+INDEX_MAGIC = b"JTRIGRM1"
+MAX_INDEXED_FILE_SIZE = 16 * 1024 * 1024
+# Changes applied from file events are saved together this long after the first
+SAVE_DELAY_SECONDS = 30.0
+
+
+def extract_trigrams(data: bytes) -> Set[int]:
+    """Get the set of lowercased byte trigrams in a buffer.
+
+    Args:
+        data: File contents
+
+    Returns:
+        Set[int]: Trigrams packed as 24-bit integers
+    """
+    data = data.lower()
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+def query_trigrams(query: str, ignore_case: bool = True) -> Set[int]:
+    """Get the trigrams every file matching a literal query must contain.
+
+    For case-insensitive queries only pure-ASCII trigrams are used, since
+    the index lowercases ASCII bytes only.
+
+    Args:
+        query: Literal search text
+        ignore_case: Whether the search ignores case
+
+    Returns:
+        Set[int]: Required trigrams, empty if the query is too short
+    """
+    data = query.encode("utf-8").lower()
+    trigrams = set()
+    for i in range(len(data) - 2):
+        a, b, c = data[i], data[i + 1], data[i + 2]
+        if ignore_case and max(a, b, c) >= 0x80:
+            continue
+        trigrams.add((a << 16) | (b << 8) | c)
+    return trigrams
+
+
+def encode_postings(doc_ids: Iterable[int]) -> bytes:
+    """Delta-encode a sorted list of ids as varints."""
+    out = bytearray()
+    previous = 0
+    for doc_id in doc_ids:
+        delta = doc_id - previous
+        previous = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7F) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> array:
+    """Decode a varint delta-encoded posting list."""
+    doc_ids = array("I")
+    value = shift = previous = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        doc_ids.append(previous)
+        value = shift = 0
+    return doc_ids
+
+
+def intersect(lists: List[array]) -> List[int]:
+    """Intersect sorted posting lists, starting from the smallest."""
+    lists = sorted(lists, key=len)
+    result = set(lists[0])
+    for doc_ids in lists[1:]:
+        if not result:
+            break
+        result.intersection_update(doc_ids)
+    return sorted(result)
+
+
+class TrigramIndex:
+    """Persistent trigram index over file contents."""
+
+    def __init__(self, index_file: str = INDEX_FILE,
+                 max_file_size: int = MAX_INDEXED_FILE_SIZE):
+        """Initialize the index, loading it from disk if it exists.
+
+        Args:
+            index_file: Path of the on-disk index
+            max_file_size: Files larger than this are not indexed
+        """
+        self.index_file = index_file
+        self.max_file_size = max_file_size
+        self.paths: List[Optional[str]] = []
+        self.docs: Dict[str, Tuple[int, int, int]] = {}
+        self.postings: Dict[int, Union[bytes, array]] = {}
+        self.roots: Set[str] = set()
+        # Files that could not be read, so have no record
+        self.unreadable: Set[str] = set()
+        # Files too large to index, so candidates of every query
+        self.oversized: Set[str] = set()
+        self._watches: Dict[str, int] = {}
+        self._save_timer: Optional[threading.Timer] = None
+        self._lock = threading.RLock()
+        self.load()
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def load(self) -> bool:
+        """Load the index from disk.
+
+        Returns:
+            bool: True if an index was loaded
+        """
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with open(self.index_file, "rb") as f:
+                data = f.read()
+            if data[:8] != INDEX_MAGIC:
+                raise ValueError("not a content index file")
+            pos = 8
+            (root_count,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            roots = set()
+            for _ in range(root_count):
+                (length,) = struct.unpack_from("<H", data, pos)
+                roots.add(data[pos + 2:pos + 2 + length].decode("utf-8"))
+                pos += 2 + length
+            (doc_count,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            paths, docs = [], {}
+            for doc_id in range(doc_count):
+                length, mtime_ns, size = struct.unpack_from("<Hqq", data, pos)
+                pos += 18
+                path = data[pos:pos + length].decode("utf-8", errors="surrogateescape")
+                pos += length
+                paths.append(path)
+                docs[path] = (doc_id, mtime_ns, size)
+            (trigram_count,) = struct.unpack_from("<I", data, pos)
+            pos += 4
+            postings = {}
+            for _ in range(trigram_count):
+                key_bytes, length = struct.unpack_from("<3sI", data, pos)
+                pos += 7
+                postings[int.from_bytes(key_bytes, "big")] = data[pos:pos + length]
+                pos += length
+        except (OSError, ValueError, struct.error, UnicodeDecodeError) as e:
+            logger.error("Error loading content index %s: %s", self.index_file, str(e))
+            return False
+
+        with self._lock:
+            self.roots, self.paths, self.docs, self.postings = roots, paths, docs, postings
+            self.oversized = {path for path, (_, _, size) in docs.items()
+                              if size > self.max_file_size}
+        return True
+
+    def save(self) -> bool:
+        """Write the index to disk, compacting away replaced entries.
+
+        Returns:
+            bool: True if the index was saved
+        """
+        with self._lock:
+            self._compact()
+            out = bytearray(INDEX_MAGIC)
+            out += struct.pack("<I", len(self.roots))
+            for root in sorted(self.roots):
+                encoded = root.encode("utf-8")
+                out += struct.pack("<H", len(encoded)) + encoded
+            out += struct.pack("<I", len(self.paths))
+            for path in self.paths:
+                _, mtime_ns, size = self.docs[path]
+                encoded = path.encode("utf-8", errors="surrogateescape")
+                out += struct.pack("<Hqq", len(encoded), mtime_ns, size) + encoded
+            out += struct.pack("<I", len(self.postings))
+            for key in sorted(self.postings):
+                value = self.postings[key]
+                encoded = value if isinstance(value, bytes) else encode_postings(value)
+                out += struct.pack("<3sI", key.to_bytes(3, "big"), len(encoded)) + encoded
+
+        try:
+            tmp_file = self.index_file + ".tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(out)
+            os.replace(tmp_file, self.index_file)
+            return True
+        except OSError as e:
+            logger.error("Error saving content index: %s", str(e))
+            return False
+
+    def _schedule_save(self) -> None:
+        """Save the index once SAVE_DELAY_SECONDS have passed, batching changes."""
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(SAVE_DELAY_SECONDS, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def flush(self) -> bool:
+        """Save changes waiting for a scheduled save now.
+
+        Returns:
+            bool: False if a save was due and failed
+        """
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+        if timer is None:
+            return True
+        timer.cancel()
+        return self.save()
+
+    def _get_postings(self, key: int) -> array:
+        """Get a posting list, decoding it on first use."""
+        value = self.postings.get(key)
+        if value is None:
+            return array("I")
+        if isinstance(value, bytes):
+            value = decode_postings(value)
+            self.postings[key] = value
+        return value
+
+    def _compact(self) -> None:
+        """Renumber live documents and drop tombstoned ids from postings."""
+        dead = sum(1 for path in self.paths if path is None)
+        if not dead:
+            return
+        remap = {}
+        live_paths = []
+        for old_id, path in enumerate(self.paths):
+            if path is not None:
+                remap[old_id] = len(live_paths)
+                live_paths.append(path)
+        for key in list(self.postings):
+            doc_ids = array("I", (remap[i] for i in self._get_postings(key) if i in remap))
+            if doc_ids:
+                self.postings[key] = doc_ids
+            else:
+                del self.postings[key]
+        self.paths = live_paths
+        self.docs = {path: (remap[doc_id], mtime_ns, size)
+                     for path, (doc_id, mtime_ns, size) in self.docs.items()}
+
+    def _remove(self, path: str) -> None:
+        """Tombstone a document."""
+        doc_id = self.docs.pop(path)[0]
+        self.paths[doc_id] = None
+        self.oversized.discard(path)
+
+    def _read_trigrams(self, path: str) -> Optional[Set[int]]:
+        """Read a file and extract its trigrams, None if it is skipped."""
+        try:
+            with open(path, "rb") as f:
+                data = f.read(self.max_file_size + 1)
+        except OSError as e:
+            logger.debug("Cannot index %s: %s", path, str(e))
+            return None
+        if len(data) > self.max_file_size or is_binary(data[:8192]):
+            return set()
+        return extract_trigrams(data)
+
+    def _reindex(self, changed: List[Tuple[str, int, int]],
+                 max_workers: int = DEFAULT_WORKERS) -> Dict[str, int]:
+        """Read changed files again and replace their postings."""
+        stats = {"added": 0, "updated": 0, "removed": 0}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            trigram_sets = executor.map(self._read_trigrams, [path for path, _, _ in changed])
+            with self._lock:
+                for (path, mtime_ns, size), trigrams in zip(changed, trigram_sets):
+                    was_indexed = path in self.docs
+                    if was_indexed:
+                        self._remove(path)
+                    if trigrams is None:
+                        self.unreadable.add(path)
+                        continue
+                    self.unreadable.discard(path)
+                    stats["updated" if was_indexed else "added"] += 1
+                    doc_id = len(self.paths)
+                    self.paths.append(path)
+                    self.docs[path] = (doc_id, mtime_ns, size)
+                    if size > self.max_file_size:
+                        self.oversized.add(path)
+                    for key in trigrams:
+                        doc_ids = self._get_postings(key)
+                        if not doc_ids:
+                            self.postings[key] = doc_ids
+                        doc_ids.append(doc_id)
+        return stats
+
+    def update(self, root: str, max_workers: int = DEFAULT_WORKERS) -> Dict[str, int]:
+        """Bring the index up to date for a directory tree.
+
+        Only files whose mtime or size changed since they were indexed are
+        read again.
+
+        Args:
+            root: Directory to index
+            max_workers: Number of files read concurrently
+
+        Returns:
+            Dict[str, int]: Number of files added, updated and removed
+        """
+        root = str(ensure_safe_path(root))
+        prefix = root.rstrip(os.sep) + os.sep
+        seen = set()
+        changed: List[Tuple[str, int, int]] = []
+        for _, entry in FileQuery().walk(root):
+            try:
+                stat_info = entry.stat()
+            except OSError:
+                continue
+            seen.add(entry.path)
+            known = self.docs.get(entry.path)
+            if known is None or known[1:] != (stat_info.st_mtime_ns, stat_info.st_size):
+                changed.append((entry.path, stat_info.st_mtime_ns, stat_info.st_size))
+
+        stats = self._reindex(changed, max_workers)
+        with self._lock:
+            for path in [p for p in self.docs if p.startswith(prefix) and p not in seen]:
+                self._remove(path)
+                stats["removed"] += 1
+            self.unreadable -= {p for p in self.unreadable
+                                if p.startswith(prefix) and p not in seen}
+            self.roots.add(root)
+        return stats
+
+    def covers(self, directory: str) -> bool:
+        """Check whether a directory lies inside an indexed root."""
+        directory = str(ensure_safe_path(directory))
+        return any(directory == root or directory.startswith(root.rstrip(os.sep) + os.sep)
+                   for root in self.roots)
+
+    def watch(self, root: str) -> None:
+        """Keep the index of a directory tree current from file change events.
+
+        Args:
+            root: Indexed directory to watch
+        """
+        root = str(ensure_safe_path(root))
+        with self._lock:
+            if root in self._watches:
+                return
+            self._watches[root] = get_file_watcher().subscribe(root, self.apply_changes)
+
+    def unwatch(self, root: Optional[str] = None) -> None:
+        """Stop watching a directory, or every watched directory."""
+        with self._lock:
+            roots = [str(ensure_safe_path(root))] if root is not None else list(self._watches)
+            sub_ids = [self._watches.pop(r) for r in roots if r in self._watches]
+        for sub_id in sub_ids:
+            get_file_watcher().unsubscribe(sub_id)
+        self.flush()
+
+    def is_current(self, directory: str) -> bool:
+        """Check whether a directory is kept current by a watch, so needs no rescan."""
+        directory = str(ensure_safe_path(directory))
+        return any(directory == root or directory.startswith(root.rstrip(os.sep) + os.sep)
+                   for root in self._watches)
+
+    def is_complete(self, directory: str) -> bool:
+        """Check whether the index holds a current record of every file in a directory.
+
+        Only a watched tree is current, and files that could not be read
+        have no record.
+        """
+        if not self.is_current(directory):
+            return False
+        prefix = str(ensure_safe_path(directory)).rstrip(os.sep) + os.sep
+        with self._lock:
+            return not any(path.startswith(prefix) for path in self.unreadable)
+
+    def apply_changes(self, events: List[ChangeEvent]) -> Dict[str, int]:
+        """Apply file change events to the index.
+
+        Args:
+            events: Coalesced events from the file watcher
+
+        Returns:
+            Dict[str, int]: Number of files added, updated and removed
+        """
+        excluded = FileQuery().exclude
+        changed: List[Tuple[str, int, int]] = []
+        deleted = []
+        rescan = []
+        for event in events:
+            if event.kind == RESCAN:
+                rescan.append(event.path)
+            elif event.kind == DELETED:
+                deleted.append(event.path)
+            elif not event.is_dir and not excluded.match(os.path.basename(event.path)):
+                try:
+                    stat_info = os.stat(event.path)
+                except OSError:
+                    deleted.append(event.path)
+                    continue
+                known = self.docs.get(event.path)
+                if known is None or known[1:] != (stat_info.st_mtime_ns, stat_info.st_size):
+                    changed.append((event.path, stat_info.st_mtime_ns, stat_info.st_size))
+
+        stats = self._reindex(changed)
+        with self._lock:
+            for path in deleted:
+                prefix = path.rstrip(os.sep) + os.sep
+                for doc in [p for p in self.docs if p == path or p.startswith(prefix)]:
+                    self._remove(doc)
+                    stats["removed"] += 1
+                self.unreadable -= {p for p in self.unreadable
+                                    if p == path or p.startswith(prefix)}
+        for root in rescan:
+            for key, count in self.update(root).items():
+                stats[key] += count
+        if any(stats.values()):
+            self._schedule_save()
+        return stats
+
+    def file_records(self, directory: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """Get the (path, mtime_ns, size) of every indexed file.
+
+        Args:
+            directory: Optional directory to restrict the records to
+
+        Returns:
+            List[Tuple[str, int, int]]: Records as of the last update
+        """
+        with self._lock:
+            records = [(path, mtime_ns, size)
+                       for path, (_, mtime_ns, size) in self.docs.items()]
+        if directory is not None:
+            prefix = str(ensure_safe_path(directory)).rstrip(os.sep) + os.sep
+            records = [record for record in records if record[0].startswith(prefix)]
+        return records
+
+    def candidates(self, query: str, directory: Optional[str] = None,
+                   ignore_case: bool = True) -> List[str]:
+        """Get the indexed files that may contain a literal query.
+
+        Files too large to index are always candidates.
+
+        Args:
+            query: Literal search text
+            directory: Optional directory to restrict the candidates to
+            ignore_case: Whether the search ignores case
+
+        Returns:
+            List[str]: Candidate file paths
+        """
+        trigrams = query_trigrams(query, ignore_case)
+        with self._lock:
+            if trigrams:
+                doc_ids = intersect([self._get_postings(key) for key in trigrams])
+                paths = [self.paths[doc_id] for doc_id in doc_ids]
+                paths.extend(sorted(self.oversized))
+            else:
+                paths = list(self.docs)
+        paths = [path for path in paths if path is not None]
+        if directory is not None:
+            prefix = str(ensure_safe_path(directory)).rstrip(os.sep) + os.sep
+            paths = [path for path in paths if path.startswith(prefix)]
+        return paths
+
+    def search(self, query: str, directory: Optional[str] = None, ignore_case: bool = True,
+               max_results: int = 50, context_lines: int = 1,
+               max_workers: int = DEFAULT_WORKERS) -> List[Dict[str, Any]]:
+        """Find indexed files containing a literal query.
+
+        Args:
+            query: Literal search text
+            directory: Optional directory to restrict the search to
+            ignore_case: Match case-insensitively
+            max_results: Maximum number of hits
+            context_lines: Number of lines of context around each hit
+            max_workers: Number of candidates verified concurrently
+
+        Returns:
+            List[Dict[str, Any]]: Hits with path, line_number, line, before and after
+        """
+        candidates = self.candidates(query, directory, ignore_case)
+        pattern = compile_query(query, ignore_case=ignore_case)
+        literal = None if ignore_case else query.encode("utf-8")
+        hits: List[Dict[str, Any]] = []
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for file_hits in executor.map(
+                    lambda path: scan_file(path, pattern, literal, context_lines), candidates):
+                hits.extend(file_hits)
+                if len(hits) >= max_results:
+                    break
+        return hits[:max_results]
+
+
+# Global instance
+_content_index = None
+
+
+def get_content_index() -> TrigramIndex:
+    """Get the global TrigramIndex instance."""
+    global _content_index
+    if _content_index is None:
+        _content_index = TrigramIndex()
+    return _content_index
+
+
+def index_folder(folder: str = ".", watch: bool = False) -> str:
+    """Build or refresh the content index for a folder.
+
+    Args:
+        folder: Folder to index
+        watch: Keep the folder's index current from file change events
+
+    Returns:
+        str: Status message
+    """
+    try:
+        index = get_content_index()
+        stats = index.update(folder)
+        if not index.save():
+            return "Error: Failed to save the content index"
+        if watch:
+            index.watch(folder)
+        return (f"Content index updated: {stats['added']} added, {stats['updated']} updated, "
+                f"{stats['removed']} removed, {len(index)} file(s) indexed.")
+    except (OSError, ValueError) as e:
+        logger.error("Error indexing %s: %s", folder, str(e))
+        return f"Error: Failed to index {folder} - {str(e)}"
@@ -0,0 +1,251 @@
+"""Content search module for finding files that contain a piece of text.
+
+Candidate files come from the shared file query walker and are scanned on a
+thread pool. Small files are read in one call, large ones are memory-mapped
+so the search runs over the page cache without copying. Files whose first
+block contains a NUL byte are treated as binary and skipped. Hits are
+yielded as soon as they are found, and the search stops once enough results
+have been collected or its time budget runs out.
+"""
+
+import logging
+import mmap
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from utils.file_query import FileQuery
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 8192
+MMAP_THRESHOLD = 1024 * 1024
+MAX_FILE_SIZE = 1024 ** 3
+DEFAULT_MAX_RESULTS = 50
+DEFAULT_TIME_BUDGET = 5.0
+MAX_MATCHES_PER_FILE = 20
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+
+def compile_query(query: str, use_regex: bool = False,
+                  ignore_case: bool = True) -> "re.Pattern[bytes]":
+    """Compile a text query into a bytes regular expression.
+
+    Args:
+        query: Literal text or regular expression
+        use_regex: Treat the query as a regular expression
+        ignore_case: Match case-insensitively
+
+    Returns:
+        re.Pattern[bytes]: Compiled pattern
+    """
+    source = query.encode("utf-8")
+    if not use_regex:
+        source = re.escape(source)
+    # ^ and $ match at line boundaries, like grep
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    return re.compile(source, flags)
+
+
+def is_binary(head: bytes) -> bool:
+    """Check whether the start of a file looks binary."""
+    return b"\0" in head
+
+
+def _find_offsets(data: Any, pattern: "re.Pattern[bytes]", literal: Optional[bytes],
+                  limit: int) -> List[int]:
+    """Find match offsets using bytes.find for literals and the regex otherwise."""
+    offsets = []
+    if literal is not None:
+        pos = data.find(literal)
+        while pos != -1 and len(offsets) < limit:
+            offsets.append(pos)
+            end = data.find(b"\n", pos)
+            if end == -1:
+                break
+            pos = data.find(literal, end + 1)
+        return offsets
+
+    for match in pattern.finditer(data):
+        offsets.append(match.start())
+        if len(offsets) >= limit:
+            break
+    return offsets
+
+
+def _line_bounds(data: Any, offset: int) -> tuple:
+    """Get the start and end of the line containing an offset."""
+    start = data.rfind(b"\n", 0, offset) + 1
+    end = data.find(b"\n", offset)
+    return start, len(data) if end == -1 else end
+
+
+def _decode(line: bytes) -> str:
+    """Decode a line for display."""
+    return line.decode("utf-8", errors="replace").rstrip("\r")
+
+
+def _context(data: Any, start: int, end: int, context_lines: int) -> tuple:
+    """Collect the lines around a matching line."""
+    before = []
+    pos = start
+    while len(before) < context_lines and pos > 0:
+        prev_start = data.rfind(b"\n", 0, pos - 1) + 1
+        before.insert(0, _decode(data[prev_start:pos - 1]))
+        pos = prev_start
+    after = []
+    pos = end
+    while len(after) < context_lines and pos + 1 < len(data):
+        next_end = data.find(b"\n", pos + 1)
+        next_end = len(data) if next_end == -1 else next_end
+        after.append(_decode(data[pos + 1:next_end]))
+        pos = next_end
+    return before, after
+
+
+def scan_file(path: str, pattern: "re.Pattern[bytes]", literal: Optional[bytes] = None,
+              context_lines: int = 1,
+              max_matches: int = MAX_MATCHES_PER_FILE) -> List[Dict[str, Any]]:
+    """Scan one file for a pattern.
+
+    Args:
+        path: File to scan
+        pattern: Compiled bytes pattern
+        literal: Exact bytes to look for with bytes.find instead of the regex
+        context_lines: Number of lines of context before and after each hit
+        max_matches: Maximum number of hits to report for the file
+
+    Returns:
+        List[Dict[str, Any]]: Hits with path, line_number, line, before and after
+    """
+    try:
+        size = os.path.getsize(path)
+        if size == 0 or size > MAX_FILE_SIZE:
+            return []
+        with open(path, "rb") as f:
+            head = f.read(min(size, SNIFF_BYTES))
+            if is_binary(head):
+                return []
+            if size <= MMAP_THRESHOLD:
+                data = head + f.read()
+                return _collect_hits(path, data, pattern, literal, context_lines, max_matches)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return _collect_hits(path, data, pattern, literal, context_lines, max_matches)
+    except (OSError, ValueError) as e:
+        logger.debug("Skipping %s: %s", path, str(e))
+        return []
+
+
+def _collect_hits(path: str, data: Any, pattern: "re.Pattern[bytes]",
+                  literal: Optional[bytes], context_lines: int,
+                  max_matches: int) -> List[Dict[str, Any]]:
+    """Turn match offsets into hits, counting lines incrementally."""
+    hits = []
+    line_number = 1
+    counted_to = 0
+    last_line_start = -1
+    for offset in _find_offsets(data, pattern, literal, max_matches * 4):
+        start, end = _line_bounds(data, offset)
+        if start == last_line_start:
+            continue
+        last_line_start = start
+        # mmap has no count(); slicing copies each gap between hits only once
+        line_number += data[counted_to:start].count(b"\n")
+        counted_to = start
+        before, after = _context(data, start, end, context_lines)
+        hits.append({
+            "path": path,
+            "line_number": line_number,
+            "line": _decode(data[start:end]),
+            "before": before,
+            "after": after,
+        })
+        if len(hits) >= max_matches:
+            break
+    return hits
+
+
+def iter_content_matches(directory: str, query: str, use_regex: bool = False,
+                         ignore_case: bool = True,
+                         include: Optional[Iterable[str]] = None,
+                         max_results: int = DEFAULT_MAX_RESULTS,
+                         time_budget: float = DEFAULT_TIME_BUDGET,
+                         context_lines: int = 1,
+                         max_workers: int = DEFAULT_WORKERS) -> Iterator[Dict[str, Any]]:
+    """Search the files under a directory for text, yielding hits as found.
+
+    Args:
+        directory: Directory to search
+        query: Literal text or regular expression
+        use_regex: Treat the query as a regular expression
+        ignore_case: Match case-insensitively
+        include: Optional glob patterns restricting which files are scanned
+        max_results: Stop after this many hits
+        time_budget: Stop after this many seconds
+        context_lines: Number of lines of context around each hit
+        max_workers: Number of files scanned concurrently
+
+    Yields:
+        Dict[str, Any]: Hits with path, line_number, line, before and after
+    """
+    root = ensure_safe_path(directory)
+    pattern = compile_query(query, use_regex, ignore_case)
+    literal = None if use_regex or ignore_case else query.encode("utf-8")
+    deadline = time.monotonic() + time_budget
+    candidates = FileQuery(include=include).walk(str(root))
+    found = 0
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = set()
+    exhausted = False
+    try:
+        while True:
+            # Keep a bounded number of files in flight so an early stop
+            # does not leave a long queue of scans behind
+            while not exhausted and len(pending) < max_workers * 4:
+                try:
+                    _, entry = next(candidates)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(scan_file, entry.path, pattern, literal,
+                                            context_lines))
+            if not pending:
+                return
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.info("Content search for %r hit its time budget", query)
+                return
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                for hit in future.result():
+                    yield hit
+                    found += 1
+                    if found >= max_results:
+                        return
+    finally:
+        # Return without waiting for scans already running; their results
+        # are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def search_file_contents(directory: str, query: str, **kwargs) -> List[Dict[str, Any]]:
+    """Find files containing text.
+
+    Args:
+        directory: Directory to search
+        query: Literal text or regular expression
+        **kwargs: Options accepted by iter_content_matches
+
+    Returns:
+        List[Dict[str, Any]]: Hits with path, line_number, line, before and after
+    """
+    try:
+        return list(iter_content_matches(directory, query, **kwargs))
+    except (OSError, ValueError, re.error) as e:
+        logger.error("Content search for %r failed: %s", query, str(e))
+        return []
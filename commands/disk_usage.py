@@ -0,0 +1,270 @@
+"""Disk usage module for answering "what is using my disk space?".
+
+Directories are scanned in parallel. For every directory the analyzer keeps
+the size of its own files, a per-category breakdown, its largest files and
+the names of its subdirectories, keyed by the directory's modification time.
+A rerun only lists directories whose mtime changed; the subtree totals are
+then summed again in memory from the cached records.
+
+A directory's mtime changes when entries are added, removed or renamed,
+which covers most saves since editors usually write a new file and rename
+it over the old one. A file rewritten in place keeps its old size until its
+directory changes or a full rescan is requested.
+"""
+
+import heapq
+import logging
+import os
+import stat
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.database import get_db_manager
+from .auto_sort import FILE_CATEGORIES
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) * 4)
+# Largest files remembered per directory; bounds the exact top-N answer
+LARGEST_PER_DIR = 10
+OTHER_CATEGORY = "Others"
+
+_CATEGORY_BY_EXTENSION = {
+    ext: category for category, extensions in FILE_CATEGORIES.items() for ext in extensions
+}
+
+
+def file_category(name: str) -> str:
+    """Get the auto-sort category of a file name."""
+    return _CATEGORY_BY_EXTENSION.get(os.path.splitext(name)[1].lower(), OTHER_CATEGORY)
+
+
+class UsageReport:
+    """Disk usage of a directory tree."""
+
+    def __init__(self, root: str, records: Dict[str, Dict[str, Any]],
+                 rescanned: int, seconds: float):
+        """Build the report from per-directory records.
+
+        Args:
+            root: Absolute path of the scanned directory
+            records: Per-directory records keyed by path
+            rescanned: Number of directories that had to be listed
+            seconds: Duration of the scan
+        """
+        self.root = root
+        self.records = records
+        self.rescanned = rescanned
+        self.seconds = seconds
+        self.totals: Dict[str, int] = {}
+        # Deepest directories first, so children are summed before parents
+        for path in sorted(records, key=lambda p: p.count(os.sep), reverse=True):
+            record = records[path]
+            self.totals[path] = record["file_bytes"] + sum(
+                self.totals.get(os.path.join(path, name), 0) for name in record["subdirs"]
+            )
+
+    @property
+    def total_bytes(self) -> int:
+        """Total size of the tree."""
+        return self.totals.get(self.root, 0)
+
+    @property
+    def file_count(self) -> int:
+        """Number of files in the tree."""
+        return sum(record["file_count"] for record in self.records.values())
+
+    def largest_dirs(self, n: int = 10, exclude_root: bool = True) -> List[Tuple[str, int]]:
+        """Get the largest directories by subtree size.
+
+        Args:
+            n: Number of directories
+            exclude_root: Leave the scanned directory itself out
+
+        Returns:
+            List[Tuple[str, int]]: (path, bytes) pairs, largest first
+        """
+        items = ((path, size) for path, size in self.totals.items()
+                 if not (exclude_root and path == self.root))
+        return heapq.nlargest(n, items, key=lambda item: item[1])
+
+    def largest_files(self, n: int = 10) -> List[Tuple[str, int]]:
+        """Get the largest files in the tree.
+
+        Exact for n up to LARGEST_PER_DIR.
+
+        Args:
+            n: Number of files
+
+        Returns:
+            List[Tuple[str, int]]: (path, bytes) pairs, largest first
+        """
+        items = ((os.path.join(path, name), size)
+                 for path, record in self.records.items()
+                 for name, size in record["largest"])
+        return heapq.nlargest(n, items, key=lambda item: item[1])
+
+    def by_category(self) -> Dict[str, int]:
+        """Get the total size per auto-sort category, largest first."""
+        totals: Dict[str, int] = defaultdict(int)
+        for record in self.records.values():
+            for category, size in record["categories"].items():
+                totals[category] += size
+        return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def _list_dir(path: str, st: os.stat_result) -> Dict[str, Any]:
+    """List one directory and summarize its own files."""
+    file_bytes = 0
+    file_count = 0
+    subdirs = []
+    categories: Dict[str, int] = defaultdict(int)
+    files = []
+    with os.scandir(path) as it:
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                    continue
+                entry_st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            if not stat.S_ISREG(entry_st.st_mode):
+                continue
+            size = entry_st.st_size
+            file_bytes += size
+            file_count += 1
+            categories[file_category(entry.name)] += size
+            files.append((entry.name, size))
+    return {
+        "path": path,
+        "mtime_ns": st.st_mtime_ns,
+        "file_bytes": file_bytes,
+        "file_count": file_count,
+        "subdirs": sorted(subdirs),
+        "categories": dict(categories),
+        "largest": [list(item) for item in heapq.nlargest(LARGEST_PER_DIR, files,
+                                                          key=lambda item: item[1])],
+    }
+
+
+def _scan_dir(path: str, cached: Optional[Dict[str, Any]],
+              device: Optional[int]) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """Get the record of a directory, listing it only if it changed.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], bool]: The record (None if the
+        directory is unreadable or on another filesystem) and whether it
+        was listed
+    """
+    try:
+        st = os.stat(path, follow_symlinks=False)
+        if device is not None and st.st_dev != device:
+            return None, False
+        if cached is not None and cached["mtime_ns"] == st.st_mtime_ns:
+            return cached, False
+        return _list_dir(path, st), True
+    except OSError as e:
+        logger.debug("Cannot scan %s: %s", path, str(e))
+        return None, False
+
+
+def analyze_disk_usage(directory: str = ".", use_cache: bool = True,
+                       one_file_system: bool = True,
+                       max_workers: int = DEFAULT_WORKERS) -> UsageReport:
+    """Measure the disk usage of a directory tree.
+
+    Args:
+        directory: Directory to analyze
+        use_cache: Reuse records of unchanged directories and store new ones
+        one_file_system: Do not descend into other mounted filesystems
+        max_workers: Number of directories scanned concurrently
+
+    Returns:
+        UsageReport: Sizes per directory, largest files and categories
+    """
+    start = time.perf_counter()
+    root = str(ensure_safe_path(directory))
+    db = get_db_manager() if use_cache else None
+    cache = db.get_dir_usage(root) if db else {}
+    device = os.stat(root).st_dev if one_file_system else None
+
+    records: Dict[str, Dict[str, Any]] = {}
+    changed = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_scan_dir, root, cache.get(root), device): root}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                record, listed = future.result()
+                if record is None:
+                    continue
+                records[path] = record
+                if listed:
+                    changed.append(record)
+                for name in record["subdirs"]:
+                    child = os.path.join(path, name)
+                    pending[executor.submit(_scan_dir, child, cache.get(child), device)] = child
+
+    if db is not None:
+        removed = [path for path in cache if path not in records]
+        if changed or removed:
+            try:
+                db.save_dir_usage(changed, removed)
+            except Exception as e:
+                logger.error("Failed to cache disk usage: %s", str(e))
+
+    return UsageReport(root, records, len(changed), time.perf_counter() - start)
+
+
+def format_size(size: float) -> str:
+    """Format a byte count for speech."""
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "bytes" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def disk_usage_summary(directory: str = ".", top: int = 5) -> str:
+    """Describe what is using the disk space under a directory.
+
+    Args:
+        directory: Directory to analyze
+        top: Number of directories and files to list
+
+    Returns:
+        str: Spoken summary; the details are printed
+    """
+    try:
+        report = analyze_disk_usage(directory)
+    except (OSError, ValueError) as e:
+        logger.error("Disk usage analysis failed: %s", str(e))
+        return f"Could not analyze disk usage: {str(e)}"
+
+    print(f"{format_size(report.total_bytes)} in {report.file_count} file(s) "
+          f"under {report.root}")
+    print("Largest folders:")
+    for path, size in report.largest_dirs(top):
+        print(f"  {format_size(size):>10}  {os.path.relpath(path, report.root)}")
+    print("Largest files:")
+    for path, size in report.largest_files(top):
+        print(f"  {format_size(size):>10}  {os.path.relpath(path, report.root)}")
+    print("By category:")
+    for category, size in report.by_category().items():
+        print(f"  {format_size(size):>10}  {category}")
+
+    message = f"This folder uses {format_size(report.total_bytes)}."
+    largest = report.largest_dirs(1)
+    if largest:
+        path, size = largest[0]
+        message += f" The largest folder is {os.path.basename(path)} with {format_size(size)}."
+    categories = report.by_category()
+    if categories:
+        category, size = next(iter(categories.items()))
+        message += f" Most space goes to {category.lower()}, {format_size(size)}."
+    return message
@@ -0,0 +1,413 @@
+"""Duplicate file finder module.
+
+Duplicates are found in stages so that most files are never read in full:
+files are grouped by size, same-size files by a hash of their first and last
+64 KiB, and only files that still collide are hashed completely. Full hashes
+are computed over memory-mapped files in a process pool. Every hash is
+cached by (device, inode) together with the size and modification time, so
+a rerun only reads files that changed.
+
+Copies can be hardlinked to one file or moved to the recycle bin. Either
+way each file is stat'ed again right before it is touched, and files whose
+size or modification time changed since they were hashed are left alone.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import shutil
+import stat
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.database import get_db_manager
+from utils.file_query import FileQuery
+from utils.retry import Transaction
+from .batch_operations import execute_batch, plan_batch
+from .disk_usage import format_size
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_BYTES = 64 * 1024
+HASH_CHUNK = 8 * 1024 * 1024
+# Below this many bytes of full hashing, starting worker processes costs more
+# than it saves
+PROCESS_POOL_THRESHOLD = 64 * 1024 * 1024
+DEFAULT_PROCESSES = os.cpu_count() or 1
+DEFAULT_THREADS = min(16, (os.cpu_count() or 1) * 2)
+
+
+def partial_hash(path: str, size: int) -> Optional[str]:
+    """Hash the first and last PARTIAL_BYTES of a file.
+
+    Files no larger than twice PARTIAL_BYTES are hashed completely, so for
+    them the partial hash is also the full hash.
+
+    Args:
+        path: File to hash
+        size: Size of the file in bytes
+
+    Returns:
+        Optional[str]: Hex digest, or None if the file cannot be read
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, "rb") as f:
+            if size <= 2 * PARTIAL_BYTES:
+                digest.update(f.read())
+            else:
+                digest.update(f.read(PARTIAL_BYTES))
+                f.seek(-PARTIAL_BYTES, os.SEEK_END)
+                digest.update(f.read(PARTIAL_BYTES))
+    except OSError as e:
+        logger.debug("Cannot hash %s: %s", path, str(e))
+        return None
+    return digest.hexdigest()
+
+
+def full_hash(path: str) -> Optional[str]:
+    """Hash a whole file through a memory map.
+
+    Args:
+        path: File to hash
+
+    Returns:
+        Optional[str]: Hex digest, or None if the file cannot be read
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    try:
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                view = memoryview(data)
+                try:
+                    for offset in range(0, len(data), HASH_CHUNK):
+                        digest.update(view[offset:offset + HASH_CHUNK])
+                finally:
+                    view.release()
+    except (OSError, ValueError) as e:
+        logger.debug("Cannot hash %s: %s", path, str(e))
+        return None
+    return digest.hexdigest()
+
+
+def _full_hashes(paths: List[str], total_bytes: int,
+                 processes: int) -> List[Optional[str]]:
+    """Fully hash files, in a process pool when there is enough data."""
+    if processes <= 1 or len(paths) < 2 or total_bytes < PROCESS_POOL_THRESHOLD:
+        return [full_hash(path) for path in paths]
+    chunksize = max(1, len(paths) // (processes * 4))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(full_hash, paths, chunksize=chunksize))
+
+
+def _scan(directory: str, min_size: int,
+          include: Optional[Iterable[str]]) -> Dict[int, List[Tuple[str, os.stat_result]]]:
+    """Group regular files by size, keeping one path per inode."""
+    by_size: Dict[int, List[Tuple[str, os.stat_result]]] = defaultdict(list)
+    seen_inodes = set()
+    for _, entry in FileQuery(include=include).walk(directory):
+        try:
+            if entry.is_symlink():
+                continue
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        if not stat.S_ISREG(st.st_mode) or st.st_size < min_size:
+            continue
+        # Hardlinks of one file are not duplicates of each other
+        identity = (st.st_dev, st.st_ino)
+        if identity in seen_inodes:
+            continue
+        seen_inodes.add(identity)
+        by_size[st.st_size].append((entry.path, st))
+    return by_size
+
+
+def find_duplicates(directory: str = ".", min_size: int = 1,
+                    include: Optional[Iterable[str]] = None,
+                    processes: int = DEFAULT_PROCESSES,
+                    use_cache: bool = True) -> Dict[str, Any]:
+    """Find groups of files with identical content.
+
+    Args:
+        directory: Directory to search
+        min_size: Ignore files smaller than this many bytes
+        include: Optional glob patterns restricting which files are compared
+        processes: Worker processes used for full hashing
+        use_cache: Reuse and store hashes in the database
+
+    Returns:
+        Dict[str, Any]: "groups" (lists of paths, largest waste first),
+        "stamps" ((size, mtime_ns) of each grouped file when it was hashed),
+        "wasted_bytes", "files_scanned", "partial_hashed", "full_hashed",
+        "cache_hits" and "seconds"
+    """
+    start = time.perf_counter()
+    root = str(ensure_safe_path(directory))
+    by_size = _scan(root, min_size, include)
+    stats = {"files_scanned": sum(len(files) for files in by_size.values()),
+             "partial_hashed": 0, "full_hashed": 0, "cache_hits": 0}
+
+    db = get_db_manager() if use_cache else None
+    cache = db.get_file_hashes() if db else {}
+    updated: Dict[tuple, Dict[str, Any]] = {}
+
+    def cached(st: os.stat_result, field: str) -> Optional[str]:
+        row = updated.get((st.st_dev, st.st_ino)) or cache.get((st.st_dev, st.st_ino))
+        if row and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+            return row.get(field)
+        return None
+
+    def remember(st: os.stat_result, field: str, value: str) -> None:
+        key = (st.st_dev, st.st_ino)
+        row = updated.get(key)
+        if row is None:
+            previous = cache.get(key)
+            row = {"device": st.st_dev, "inode": st.st_ino, "size": st.st_size,
+                   "mtime_ns": st.st_mtime_ns, "partial_hash": None, "full_hash": None}
+            if previous and previous["size"] == st.st_size \
+                    and previous["mtime_ns"] == st.st_mtime_ns:
+                row.update(partial_hash=previous["partial_hash"],
+                           full_hash=previous["full_hash"])
+            updated[key] = row
+        row[field] = value
+
+    # Stage 2: head and tail hash of every file sharing its size
+    candidates = [item for files in by_size.values() if len(files) > 1 for item in files]
+    partials: Dict[str, Optional[str]] = {}
+    to_hash = []
+    for path, st in candidates:
+        value = cached(st, "partial_hash")
+        if value is None:
+            to_hash.append((path, st))
+        else:
+            partials[path] = value
+            stats["cache_hits"] += 1
+    with ThreadPoolExecutor(max_workers=DEFAULT_THREADS) as executor:
+        results = executor.map(lambda item: partial_hash(item[0], item[1].st_size), to_hash)
+        for (path, st), value in zip(to_hash, results):
+            if value is not None:
+                partials[path] = value
+                remember(st, "partial_hash", value)
+    stats["partial_hashed"] = len(to_hash)
+
+    by_partial: Dict[tuple, List[Tuple[str, os.stat_result]]] = defaultdict(list)
+    for path, st in candidates:
+        if partials.get(path) is not None:
+            by_partial[(st.st_size, partials[path])].append((path, st))
+
+    # Stage 3: full hash, only needed when the partial hash skipped bytes
+    groups: Dict[tuple, List[str]] = defaultdict(list)
+    to_hash = []
+    for (size, value), files in by_partial.items():
+        if len(files) < 2:
+            continue
+        for path, st in files:
+            if size <= 2 * PARTIAL_BYTES:
+                groups[(size, value)].append(path)
+                continue
+            cached_full = cached(st, "full_hash")
+            if cached_full is None:
+                to_hash.append((path, st))
+            else:
+                groups[(size, cached_full)].append(path)
+                stats["cache_hits"] += 1
+    total_bytes = sum(st.st_size for _, st in to_hash)
+    hashes = _full_hashes([path for path, _ in to_hash], total_bytes, processes)
+    for (path, st), value in zip(to_hash, hashes):
+        if value is not None:
+            groups[(st.st_size, value)].append(path)
+            remember(st, "full_hash", value)
+    stats["full_hashed"] = len(to_hash)
+
+    if db and updated:
+        try:
+            db.save_file_hashes(list(updated.values()))
+        except Exception as e:
+            logger.error("Failed to cache file hashes: %s", str(e))
+
+    duplicates = [(size, sorted(paths)) for (size, _), paths in groups.items() if len(paths) > 1]
+    duplicates.sort(key=lambda item: item[0] * (len(item[1]) - 1), reverse=True)
+    grouped = {path for _, paths in duplicates for path in paths}
+    stats.update(
+        groups=[paths for _, paths in duplicates],
+        stamps={path: (st.st_size, st.st_mtime_ns) for path, st in candidates
+                if path in grouped},
+        wasted_bytes=sum(size * (len(paths) - 1) for size, paths in duplicates),
+        seconds=time.perf_counter() - start,
+    )
+    return stats
+
+
+def _link_over(original: str, duplicate: str) -> None:
+    """Atomically replace a file with a hardlink to another."""
+    temp = f"{duplicate}.jarvis-link"
+    os.link(original, temp)
+    try:
+        os.replace(temp, duplicate)
+    except OSError:
+        os.unlink(temp)
+        raise
+
+
+def _changed(st: os.stat_result, path: str, stamps: Optional[Dict[str, tuple]],
+             size: int) -> bool:
+    """Check whether a file changed since it was hashed."""
+    if stamps is not None and path in stamps:
+        return (st.st_size, st.st_mtime_ns) != stamps[path]
+    return st.st_size != size
+
+
+def _unlink_copy(original: str, duplicate: str, st: os.stat_result) -> None:
+    """Turn a hardlink back into an independent copy with its old metadata."""
+    temp = f"{duplicate}.jarvis-unlink"
+    shutil.copyfile(original, temp)
+    os.chmod(temp, stat.S_IMODE(st.st_mode))
+    os.utime(temp, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(temp, duplicate)
+
+
+def hardlink_duplicates(groups: List[List[str]],
+                        transaction: Optional[Transaction] = None,
+                        stamps: Optional[Dict[str, tuple]] = None) -> Dict[str, int]:
+    """Replace duplicate copies with hardlinks to the first file of each group.
+
+    Files on a different device from the first file of their group are left
+    alone, and so are files that changed since they were hashed. If linking
+    fails, every link made so far is undone.
+
+    Args:
+        groups: Duplicate groups returned by find_duplicates
+        transaction: Optional enclosing transaction; rolling it back turns
+            the links back into independent copies
+        stamps: The "stamps" returned by find_duplicates; without them a
+            copy is only checked to still have the original's size
+
+    Returns:
+        Dict[str, int]: Number of files linked, skipped and bytes saved
+    """
+    journal: List[Tuple[str, str, os.stat_result]] = []
+
+    def undo() -> None:
+        for original, duplicate, st in reversed(journal):
+            try:
+                _unlink_copy(original, duplicate, st)
+            except OSError as e:
+                logger.error("Error restoring %s: %s", duplicate, str(e))
+
+    saved = skipped = 0
+    try:
+        for paths in groups:
+            original = paths[0]
+            for duplicate in paths[1:]:
+                # Re-stat right before linking: either file may have changed
+                original_st = os.stat(original)
+                st = os.stat(duplicate)
+                if st.st_dev != original_st.st_dev or st.st_ino == original_st.st_ino:
+                    continue
+                if (_changed(original_st, original, stamps, st.st_size)
+                        or _changed(st, duplicate, stamps, original_st.st_size)):
+                    logger.info("Not linking %s: it changed since it was hashed", duplicate)
+                    skipped += 1
+                    continue
+                _link_over(original, duplicate)
+                journal.append((original, duplicate, st))
+                saved += st.st_size
+    except OSError:
+        undo()
+        raise
+
+    if transaction is not None:
+        transaction.add_operation(lambda: None, undo)
+    get_db_manager().log_operations([
+        ("HARDLINK", duplicate, original, "SUCCESS", None)
+        for original, duplicate, _ in journal
+    ])
+    return {"linked": len(journal), "skipped": skipped, "bytes_saved": saved}
+
+
+def trash_duplicates(groups: List[List[str]],
+                     transaction: Optional[Transaction] = None,
+                     stamps: Optional[Dict[str, tuple]] = None) -> Dict[str, int]:
+    """Move every copy but the first file of each group to the recycle bin.
+
+    Copies that changed since they were hashed, or whose group's first file
+    did, are kept.
+
+    Args:
+        groups: Duplicate groups returned by find_duplicates
+        transaction: Optional enclosing transaction; rolling it back
+            restores the copies
+        stamps: The "stamps" returned by find_duplicates
+
+    Returns:
+        Dict[str, int]: Number of files trashed, skipped and bytes freed
+    """
+    copies = []
+    freed = skipped = 0
+    for paths in groups:
+        original = paths[0]
+        original_st = os.stat(original)
+        for duplicate in paths[1:]:
+            try:
+                st = os.stat(duplicate)
+            except FileNotFoundError:
+                continue
+            if (_changed(original_st, original, stamps, st.st_size)
+                    or _changed(st, duplicate, stamps, original_st.st_size)):
+                logger.info("Not trashing %s: it changed since it was hashed", duplicate)
+                skipped += 1
+                continue
+            copies.append(Path(duplicate))
+            freed += st.st_size
+    if copies:
+        execute_batch(plan_batch("delete", copies), transaction)
+    return {"trashed": len(copies), "skipped": skipped, "bytes_freed": freed}
+
+
+def find_duplicate_files(directory: str = ".", deduplicate: bool = False,
+                         transaction: Optional[Transaction] = None,
+                         remove_copies: bool = False) -> str:
+    """Find duplicate files and optionally hardlink or trash the copies.
+
+    Args:
+        directory: Directory to search
+        deduplicate: Replace copies with hardlinks to one file
+        transaction: Optional enclosing transaction
+        remove_copies: Move copies to the recycle bin instead
+
+    Returns:
+        str: Status message
+    """
+    try:
+        result = find_duplicates(directory)
+        groups = result["groups"]
+        if not groups:
+            return f"No duplicate files found in {directory}."
+        for paths in groups[:10]:
+            print("  " + "\n  ".join(paths) + "\n")
+        message = (f"Found {len(groups)} group(s) of duplicate files wasting "
+                   f"{format_size(result['wasted_bytes'])}.")
+        if remove_copies:
+            trashed = trash_duplicates(groups, transaction, result["stamps"])
+            message += (f" Moved {trashed['trashed']} copies to the recycle bin, freeing "
+                        f"{format_size(trashed['bytes_freed'])}.")
+            if trashed["skipped"]:
+                message += f" Kept {trashed['skipped']} that changed during the search."
+        elif deduplicate:
+            linked = hardlink_duplicates(groups, transaction, result["stamps"])
+            message += (f" Linked {linked['linked']} copies, saving "
+                        f"{format_size(linked['bytes_saved'])}.")
+            if linked["skipped"]:
+                message += f" Skipped {linked['skipped']} that changed during the search."
+        return message
+    except ValueError as e:
+        return f"Cannot search for duplicates: {str(e)}"
+    except OSError as e:
+        logger.error("Duplicate search failed: %s", str(e))
+        return f"Duplicate search failed: {str(e)}"
@@ -5,7 +5,7 @@ deleting, moving, copying files and folders, as well as searching and
 listing directory contents.
 """
 
-import json
+import heapq
 import logging
 import os
 import shutil
@@ -19,15 +19,14 @@ import tempfile
 import shutil
 from datetime import datetime
 
+from utils.file_identity import get_identity_map
+from utils.file_query import FileQuery
+from utils.tag_index import TagIndex
+from utils.xattr_tags import XATTRS_AVAILABLE, XattrTagIndex
+from .recycle_bin import get_recycle_bin
 
-logger = logging.getLogger(__name__)
-
-# Folder where deleted files/folders will be stored
-RECYCLE_BIN = ".recycle_bin"
 
-# Make sure recycle bin exists
-if not os.path.exists(RECYCLE_BIN):
-    os.makedirs(RECYCLE_BIN)
+logger = logging.getLogger(__name__)
 
 
 def ensure_safe_path(path: str) -> Path:
@@ -116,22 +115,7 @@ def move_to_recycle_bin(path: Path) -> bool:
     Returns:
         bool: True if move was successful, False otherwise
     """
-    try:
-        recycle_path = Path(RECYCLE_BIN) / path.name
-        # If item with same name exists in recycle bin, append timestamp
-        if recycle_path.exists():
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            recycle_path = Path(RECYCLE_BIN) / f"{path.stem}_{timestamp}{path.suffix}"
-        
-        if path.is_file():
-            shutil.move(str(path), str(recycle_path))
-        else:
-            shutil.move(str(path), str(recycle_path))
-        return True
-    except Exception as e:
-        logger.error("Failed to move item to recycle bin: %s", str(e))
-        return False
+    return get_recycle_bin().trash(path)
 
 
 def delete_file_or_folder(path: str, use_recycle_bin: bool = True) -> bool:
@@ -184,6 +168,7 @@ def rename_item(old_path: str, new_path: str) -> bool:
             logger.error("Permission denied for path: %s or %s", old_path, new_path)
             return False
         old_obj.rename(new_obj)
+        get_identity_map().moved(str(old_obj), str(new_obj))
         return True
     except (OSError, ValueError) as e:
         logger.error("Error renaming %s to %s: %s", old_path, new_path, str(e))
@@ -261,7 +246,7 @@ def list_items(folder: str = ".", include_hidden: bool = False) -> str:
         output.append("\nFiles:")
         if files:
             for item in files:
-            size = f"{item['size']:,} bytes"
+                size = f"{item['size']:,} bytes"
                 output.append(f"{item['permissions']} {item['name']:<30} {size:<15} {item['modified']}")
         else:
             output.append("No files")
@@ -301,7 +286,8 @@ def move_item(source: str, target: str) -> bool:
             return False
             
         # Use shutil.move which will handle cross-device moves
-        shutil.move(str(src_obj), str(tgt_obj))
+        destination = shutil.move(str(src_obj), str(tgt_obj))
+        get_identity_map().moved(str(src_obj), str(destination))
         return True
     except Exception as e:
         logger.error("Error moving %s to %s: %s", source, target, str(e))
@@ -349,37 +335,44 @@ def copy_item(source: str, target: str, preserve_metadata: bool = True) -> bool:
         return False
 
 
-def restore_item(item_name: str) -> str:
+def restore_item(item_name: str, target: Optional[str] = None) -> str:
     """Restore an item from the recycle bin.
     
     Args:
-        item_name: Name of the item to restore
+        item_name: Original path or name of the item to restore
+        target: Optional location to restore to instead of the original path
         
     Returns:
         str: Status message indicating success or failure
     """
-    try:
-        recycle_path = Path(RECYCLE_BIN) / item_name
-        if not recycle_path.exists():
-            return "No such item in recycle bin."
+    return get_recycle_bin().restore(item_name, target)
 
-        target_path = Path.cwd() / item_name
-        if target_path.exists():
-            return f"Cannot restore: {item_name} already exists in target location."
 
-        shutil.move(str(recycle_path), str(target_path))
-        return f"'{item_name}' restored successfully."
-    except (OSError, ValueError) as e:
-        logger.error("Failed to restore %s: %s", item_name, str(e))
-        return f"Failed to restore item: {str(e)}"
+def list_recycle_bin(limit: Optional[int] = None) -> List[dict]:
+    """List items in the recycle bin, most recently deleted first.
+    
+    Args:
+        limit: Optional maximum number of items to return
+        
+    Returns:
+        List[dict]: Entries with original path, deletion time, size and device
+    """
+    return get_recycle_bin().list_items(limit)
 
 
-def search_files(directory: str, name: Optional[str] = None) -> List[str]:
+def search_files(directory: str, name: Optional[str] = None,
+                 file_type: Optional[str] = None,
+                 modified_after: Optional[datetime] = None) -> List[str]:
     """Search for files in directory.
     
+    Directories excluded by default (.git, node_modules, virtualenvs, the
+    recycle bin, ...) or by .gitignore/.jarvisignore files are skipped.
+    
     Args:
         directory: The directory to search in
         name: Optional name pattern to filter files (case-insensitive)
+        file_type: Optional extension to filter files, with or without the dot
+        modified_after: Optional date files must have been modified after
         
     Returns:
         List[str]: List of file paths matching the search criteria
@@ -390,73 +383,79 @@ def search_files(directory: str, name: Optional[str] = None) -> List[str]:
             logger.error("Permission denied for directory: %s", directory)
             return []
             
+        name = name.lower() if name else None
+        ext = "." + file_type.lower().lstrip(".") if file_type else None
+        after = modified_after.timestamp() if modified_after else None
         results = []
-        for root, _, files in os.walk(str(dir_obj)):
-            for item in files:
-                if name is None or name.lower() in item.lower():
-                    results.append(os.path.join(root, item))
+        for _, entry in FileQuery().walk(str(dir_obj)):
+            entry_name = entry.name.lower()
+            if name is not None and name not in entry_name:
+                continue
+            if ext is not None and not entry_name.endswith(ext):
+                continue
+            if after is not None and entry.stat().st_mtime <= after:
+                continue
+            results.append(entry.path)
         return results
     except (OSError, ValueError) as e:
         logger.error("Error searching in %s: %s", directory, str(e))
         return []
 
 
-def sort_files(files: List[str], sort_by: str = "name", reverse: bool = False) -> List[str]:
+def sort_files(files: List[str], sort_by: str = "name", reverse: bool = False,
+               limit: Optional[int] = None) -> List[str]:
     """Sort files by specified criteria.
     
     Args:
         files: List of file paths to sort
         sort_by: Sorting criteria ("name", "date", or "size")
         reverse: Whether to sort in reverse order
+        limit: Only return the first files; selected with a bounded heap
+            instead of a full sort
         
     Returns:
         List[str]: Sorted list of file paths
     """
-    try:
-        if sort_by == "name":
-            return sorted(files, key=lambda x: os.path.basename(x).lower(), reverse=reverse)
-        elif sort_by == "date":
-            return sorted(files, key=os.path.getmtime, reverse=reverse)
-        elif sort_by == "size":
-            return sorted(files, key=os.path.getsize, reverse=reverse)
-        else:
+    if sort_by == "date":
+        key = os.path.getmtime
+    elif sort_by == "size":
+        key = os.path.getsize
+    else:
+        if sort_by != "name":
             logger.warning("Invalid sort criteria: %s, using default (name)", sort_by)
-            return sorted(files, key=lambda x: os.path.basename(x).lower(), reverse=reverse)
+        key = lambda x: os.path.basename(x).lower()
+    try:
+        if limit is not None:
+            select = heapq.nlargest if reverse else heapq.nsmallest
+            return select(limit, files, key=key)
+        return sorted(files, key=key, reverse=reverse)
     except OSError as e:
         logger.error("Error sorting files: %s", str(e))
         return files
 
 
 # -- tag files --
+# Tag file of earlier releases, imported into the tag index on first use
 TAG_FILE = "tags.json"
+# "index" keeps tags in the database only; "xattr" stores them on the files
+# (Linux) and keeps the database as a cache
+TAG_BACKEND = os.getenv("JARVIS_TAG_BACKEND", "index")
 
 
 class TagManager:
-    def __init__(self, tag_file: str = TAG_FILE):
+    def __init__(self, tag_file: str = TAG_FILE, index: Optional[TagIndex] = None):
         self.tag_file = tag_file
-        self.tags = self._load_tags()
-        
-    def _load_tags(self) -> dict:
-        """Load tags from file."""
-        try:
-            if os.path.exists(self.tag_file):
-                with open(self.tag_file, "r") as file:
-            return json.load(file)
-    return {}
-        except Exception as e:
-            logger.error("Error loading tags: %s", str(e))
-            return {}
+        self.index = index or TagIndex()
+
+    def _index(self) -> TagIndex:
+        """Get the tag index, importing a legacy tag file first."""
+        if os.path.exists(self.tag_file):
+            try:
+                self.index.import_json(self.tag_file)
+            except (OSError, ValueError) as e:
+                logger.error("Error importing tags: %s", str(e))
+        return self.index
 
-    def _save_tags(self) -> bool:
-        """Save tags to file."""
-        try:
-            with open(self.tag_file, "w") as file:
-                json.dump(self.tags, file, indent=4)
-            return True
-        except Exception as e:
-            logger.error("Error saving tags: %s", str(e))
-            return False
-            
     def add_tag(self, file_path: str, tag: str) -> str:
         """Add a tag to a file.
         
@@ -470,18 +469,10 @@ class TagManager:
         try:
             abs_path = ensure_safe_path(file_path)
             if not abs_path.exists():
-                return f"Error: File {file_path} does not exist"
-                
-            abs_path_str = str(abs_path)
-            if tag in self.tags:
-                if abs_path_str not in self.tags[tag]:
-                    self.tags[tag].append(abs_path_str)
-            else:
-                self.tags[tag] = [abs_path_str]
-                
-            if self._save_tags():
-                return f"Successfully tagged '{file_path}' as '{tag}'"
-            return "Error: Failed to save tags"
+                return f"Failed to tag {file_path}: file does not exist"
+            if self._index().add([str(abs_path)], tag):
+                get_identity_map().track([str(abs_path)])
+            return f"Tagged '{file_path}' as '{tag}'"
             
         except Exception as e:
             logger.error("Error adding tag: %s", str(e))
@@ -498,27 +489,44 @@ class TagManager:
             str: Status message
         """
         try:
-            abs_path = ensure_safe_path(file_path)
-            abs_path_str = str(abs_path)
-            
-            if tag not in self.tags:
+            abs_path_str = str(ensure_safe_path(file_path))
+            index = self._index()
+            if tag not in index.tag_counts():
                 return f"Error: Tag '{tag}' does not exist"
-                
-            if abs_path_str not in self.tags[tag]:
+            if not index.remove([abs_path_str], tag):
                 return f"Error: File '{file_path}' is not tagged with '{tag}'"
-                
-            self.tags[tag].remove(abs_path_str)
-            if not self.tags[tag]:  # Remove empty tag
-                del self.tags[tag]
-                
-            if self._save_tags():
-                return f"Successfully removed tag '{tag}' from '{file_path}'"
-            return "Error: Failed to save tags"
+            return f"Successfully removed tag '{tag}' from '{file_path}'"
             
         except Exception as e:
             logger.error("Error removing tag: %s", str(e))
             return f"Error: Failed to remove tag - {str(e)}"
             
+    def add_tag_to_files(self, file_paths: List[str], tag: str) -> List[str]:
+        """Add a tag to several files in a single transaction.
+        
+        Args:
+            file_paths: Paths of the files to tag
+            tag: Tag to apply to the files
+            
+        Returns:
+            List[str]: Absolute paths that were not tagged with the tag before
+            
+        Raises:
+            sqlite3.Error: If the tags could not be saved
+        """
+        added = self._index().add([str(ensure_safe_path(path)) for path in file_paths], tag)
+        get_identity_map().track(added)
+        return added
+
+    def remove_tag_from_files(self, file_paths: List[str], tag: str) -> None:
+        """Remove a tag from several files in a single transaction.
+        
+        Args:
+            file_paths: Absolute paths of the files
+            tag: Tag to remove
+        """
+        self._index().remove(file_paths, tag)
+
     def get_files_by_tag(self, tag: str) -> List[str]:
         """Get all files with a specific tag.
         
@@ -528,7 +536,22 @@ class TagManager:
         Returns:
             List[str]: List of file paths with the specified tag
         """
-        return self.tags.get(tag, [])
+        return self._index().paths_for(tag)
+
+    def find_files(self, query: str) -> List[str]:
+        """Get the files matching a boolean tag query.
+
+        Args:
+            query: Tags combined with and, or, not and parentheses,
+                e.g. "work and 2024 not draft"
+
+        Returns:
+            List[str]: Matching file paths
+
+        Raises:
+            ValueError: If the query is malformed
+        """
+        return self._index().query(query)
         
     def get_tags_for_file(self, file_path: str) -> List[str]:
         """Get all tags for a specific file.
@@ -540,10 +563,7 @@ class TagManager:
             List[str]: List of tags associated with the file
         """
         try:
-            abs_path = ensure_safe_path(file_path)
-            abs_path_str = str(abs_path)
-            return [tag for tag, files in self.tags.items() 
-                   if abs_path_str in files]
+            return self._index().tags_for(str(ensure_safe_path(file_path)))
         except Exception as e:
             logger.error("Error getting tags for file: %s", str(e))
             return []
@@ -554,10 +574,30 @@ class TagManager:
         Returns:
             List[str]: List of all tags
         """
-        return list(self.tags.keys())
+        return list(self._index().tag_counts())
+
+    def rebuild_index(self, folder: str) -> int:
+        """Refresh the tag index of a folder from the tags stored on its files.
+
+        Args:
+            folder: Folder to scan
+
+        Returns:
+            int: Number of tagged files found
+
+        Raises:
+            ValueError: If tags are not stored on the files
+        """
+        index = self._index()
+        if not isinstance(index, XattrTagIndex):
+            raise ValueError("tags are only kept in the index")
+        return index.rebuild(str(ensure_safe_path(folder)))
 
 # Initialize global tag manager
-tag_manager = TagManager()
+if TAG_BACKEND == "xattr" and XATTRS_AVAILABLE:
+    tag_manager = TagManager(index=XattrTagIndex())
+else:
+    tag_manager = TagManager()
 
 def tag_file(file_path: str, tag: str) -> str:
     """Tag a file with a label (wrapper for TagManager).
@@ -582,19 +622,75 @@ def get_files_by_tag(tag: str) -> List[str]:
     """
     return tag_manager.get_files_by_tag(tag)
 
+def find_tagged_files(query: str) -> str:
+    """Describe the files matching a boolean tag query.
+
+    Args:
+        query: Tags combined with and, or, not and parentheses
+
+    Returns:
+        str: Status message
+    """
+    try:
+        files = tag_manager.find_files(query)
+    except ValueError as e:
+        return f"I could not understand that tag query: {str(e)}"
+    for path in files:
+        print(path)
+    if not files:
+        return f"No files are tagged {query}."
+    return f"I found {len(files)} file(s) tagged {query}."
+
+def rebuild_tag_index(folder: str) -> str:
+    """Rebuild the tag index of a folder from its files (wrapper for TagManager).
+
+    Args:
+        folder: Folder to scan
+
+    Returns:
+        str: Status message
+    """
+    try:
+        count = tag_manager.rebuild_index(folder)
+    except (OSError, ValueError) as e:
+        logger.error("Error rebuilding tag index: %s", str(e))
+        return f"Could not rebuild the tag index: {str(e)}"
+    return f"Rebuilt the tag index of {folder}: {count} tagged file(s)."
+
 # private files
-private_files = {}  # { "filename": "PIN" }
+private_files = {}  # { "absolute path": "PIN" }
+
+
+def _private_key(filename):
+    """Key private markers by absolute path so they follow the file when it moves."""
+    return os.path.abspath(filename)
 
 
 def mark_file_private(filename, pin):
-    private_files[filename] = pin
+    key = _private_key(filename)
+    private_files[key] = pin
+    if os.path.exists(key):
+        get_identity_map().track([key])
     return f"{filename} is now marked as private."
 
 
 def access_private_file(filename, pin_attempt):
-    if filename in private_files:
-        if private_files[filename] == pin_attempt:
+    key = _private_key(filename)
+    if key in private_files:
+        if private_files[key] == pin_attempt:
             return f"Access granted to {filename}."
         else:
             return "Incorrect PIN. Access denied."
     return "File is not marked as private."
+
+
+def _on_paths_moved(moves):
+    """Re-key the tags and private markers held in memory after files moved."""
+    tag_manager.index.paths_moved(moves)
+    for old, new in moves:
+        below = old + os.sep
+        for key in [key for key in private_files if key == old or key.startswith(below)]:
+            private_files[new + key[len(old):]] = private_files.pop(key)
+
+
+get_identity_map().on_move(_on_paths_moved)
@@ -1,29 +1,141 @@
-def smart_search_files(query):
-    import os
+"""Smart search over file names, tags and extracted metadata."""
 
-    query = query.strip().lower()
-    matches = []
+import logging
+import re
+from typing import List, Optional, Tuple
+
+from utils.database import get_db_manager
+from .auto_sort import FILE_CATEGORIES
+from .file_manager import ensure_safe_path
+from .metadata_extractor import EXTRACTORS, TEXT_EXTENSIONS, refresh_metadata
+
+logger = logging.getLogger(__name__)
+
+# Spoken comparisons -> SQL operators
+COMPARISONS = {
+    "over": ">", "above": ">", "more than": ">", "greater than": ">", "longer than": ">",
+    "wider than": ">", "taller than": ">", "under": "<", "below": "<", "less than": "<",
+    "fewer than": "<", "shorter than": "<", "at least": ">=", "at most": "<=",
+    "exactly": "=", ">=": ">=", "<=": "<=", ">": ">", "<": "<", "=": "=",
+}
+
+# Spoken attribute names -> metadata keys
+ATTRIBUTES = {
+    "width": "width", "wide": "width", "pixels wide": "width",
+    "height": "height", "tall": "height", "pixels tall": "height",
+    "pages": "pages", "page": "pages", "lines": "lines", "line": "lines",
+    "duration": "duration", "seconds": "duration", "second": "duration",
+    "channels": "channels", "sample rate": "sample_rate",
+}
+
+# Comparisons that name their attribute, e.g. "photos wider than 1920"
+IMPLIED_ATTRIBUTES = {
+    "wider than": "width", "taller than": "height",
+    "longer than": "duration", "shorter than": "duration",
+}
+
+_COMPARISON = "|".join(sorted(map(re.escape, COMPARISONS), key=len, reverse=True))
+_ATTRIBUTE = "|".join(sorted(map(re.escape, ATTRIBUTES), key=len, reverse=True))
+# "width over 1000" or "more than 10 pages"
+FILTER_PATTERN = re.compile(
+    rf"\b(?:(?P<attr1>{_ATTRIBUTE})\s*(?P<op1>{_COMPARISON})\s*(?P<num1>\d+(?:\.\d+)?)"
+    rf"|(?P<op2>{_COMPARISON})\s*(?P<num2>\d+(?:\.\d+)?)\s*(?P<attr2>{_ATTRIBUTE})\b"
+    rf"|(?P<op3>{'|'.join(IMPLIED_ATTRIBUTES)})\s*(?P<num3>\d+(?:\.\d+)?))"
+)
+# Spoken kinds of file -> auto_sort categories
+CATEGORY_WORDS = {
+    "photos": "Images", "images": "Images", "pictures": "Images",
+    "documents": "Documents", "videos": "Videos", "songs": "Music", "music": "Music",
+    "recordings": "Music", "audio": "Music", "code": "Code",
+}
+FILLER_WORDS = re.compile(r"\b(?:files?|with|that|have|has|and|are|is)\b")
+
+
+def parse_search(query: str) -> Tuple[Optional[str], List[tuple]]:
+    """Split a spoken search into text and metadata filters.
+
+    Args:
+        query: e.g. "report with more than 10 pages"
+
+    Returns:
+        Tuple[Optional[str], List[tuple]]: Remaining text (None if empty) and
+        (attribute, operator, value) filters
+    """
+    filters = []
 
-    if not os.path.exists(TAG_FILE):
+    def take(match: re.Match) -> str:
+        operator = match.group("op1") or match.group("op2") or match.group("op3")
+        number = match.group("num1") or match.group("num2") or match.group("num3")
+        if match.group("op3"):
+            attribute = IMPLIED_ATTRIBUTES[operator]
+        else:
+            attribute = ATTRIBUTES[match.group("attr1") or match.group("attr2")]
+        value = float(number) if "." in number else int(number)
+        filters.append((attribute, COMPARISONS[operator], value))
+        return " "
+
+    text = FILTER_PATTERN.sub(take, query.strip().lower())
+    if filters:
+        text = FILLER_WORDS.sub(" ", text)
+    text = " ".join(text.split())
+    return text or None, filters
+
+
+def _extension(word: str) -> Optional[str]:
+    """Get the extension a word such as "pdf" or "pngs" names, if any."""
+    known = EXTRACTORS.keys() | TEXT_EXTENSIONS
+    for candidate in ("." + word, "." + word[:-1] if word.endswith("s") else None):
+        if candidate in known:
+            return candidate
+    return None
+
+
+def smart_search_files(query, directory="."):
+    """Search files by name, tags and metadata such as pages or dimensions.
+
+    The metadata of the folder is refreshed first; only files that changed
+    since the last search are read.
+
+    Args:
+        query: Spoken search, e.g. "photos wider than 1920" or "notes"
+        directory: Folder to search
+
+    Returns:
+        List[Tuple[str, str]]: (path, metadata summary), best matches first
+    """
+    text, filters = parse_search(query)
+    extensions = None
+    if text is not None and filters:
+        # "photos wider than 1920" or "pdfs with 10 pages": the kind of file
+        # narrows the results by extension
+        extensions, rest = set(), []
+        for word in text.split():
+            if word in CATEGORY_WORDS:
+                extensions.update(FILE_CATEGORIES[CATEGORY_WORDS[word]])
+            elif _extension(word):
+                extensions.add(_extension(word))
+            else:
+                rest.append(word)
+        extensions = extensions or None
+        text = " ".join(rest) or None
+    if text is None and not filters:
         return []
+    try:
+        root = str(ensure_safe_path(directory))
+        refresh_metadata(root)
+    except ValueError as e:
+        logger.error("Cannot refresh metadata of %s: %s", directory, str(e))
+        return []
+    records = get_db_manager().search_files(text, filters, root)
 
-    with open(TAG_FILE, "r") as f:
-        for line in f:
-            if "::" not in line:
-                continue
-            file_name, meta = line.strip().split("::", 1)
-            file_name_lower = file_name.lower()
-            meta_lower = meta.lower()
-
-            if query in file_name_lower or query in meta_lower:
-                # Score relevance
-                score = 0
-                if query in file_name_lower:
-                    score += 2
-                if query in meta_lower:
-                    score += 1
-                matches.append((score, file_name, meta))
-
-    # Sort by relevance score (higher = more relevant)
-    matches.sort(reverse=True)
-    return [(file, meta) for _, file, meta in matches]
+    matches = []
+    for record in records:
+        if extensions is not None and \
+                "." + (record["file_type"] or "") not in extensions:
+            continue
+        summary = ", ".join(f"{key} {value}" for key, value in record["metadata"].items())
+        # Name matches rank above tag and metadata matches
+        score = 2 if text is None or text in record["name"].lower() else 1
+        matches.append((score, record["path"], summary))
+    matches.sort(key=lambda match: (-match[0], match[1]))
+    return [(path, summary) for _, path, summary in matches]
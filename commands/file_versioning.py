@@ -1,81 +1,393 @@
-"""File versioning module for managing file versions."""
+"""File versioning module for managing file versions.
 
+A version records the chunks of a file, which live once each in a
+content-addressed chunk store (see utils.chunk_store), so saving a small
+edit to a large file writes a few chunks. Versions are indexed in the
+file_versions table by absolute path. Their ids are nanosecond timestamps,
+strictly increasing, so versions saved in the same second never collide
+and a file's history is one index range scan. Restoring streams the chunks
+back.
+
+A background collector thins out old versions following RETENTION_POLICY
+and deletes the chunks no version uses any more. Versions saved by earlier
+releases as files in VERSION_FOLDER are moved into the index on first use.
+"""
+
+import hashlib
+import json
+import logging
 import os
-import shutil
-from datetime import datetime
+import re
+import threading
 import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.chunk_store import Chunk, ChunkStore
+from utils.database import DatabaseManager, get_db_manager
+from utils.file_identity import get_identity_map
+from .disk_usage import format_size
+
+logger = logging.getLogger(__name__)
 
 VERSION_FOLDER = "file_versions"
+CHUNK_FOLDER = "file_chunks"
+# Manifest format of versions saved as files by an earlier release
+MANIFEST_MAGIC = b"JARVIS-VERSION 1\n"
+# (maximum age, one version kept per bucket of this many seconds), in
+# seconds; 0 keeps every version. Older versions are deleted, but the
+# newest version of a file is always kept.
+RETENTION_POLICY = [
+    (24 * 3600, 0),
+    (7 * 24 * 3600, 3600),
+    (30 * 24 * 3600, 24 * 3600),
+]
+GC_INTERVAL_SECONDS = 3600
+# Chunks younger than this are never collected: they may belong to a
+# version that is still being saved
+CHUNK_GRACE_SECONDS = 3600
+
+_LEGACY_NAME = re.compile(r"(.+)_(\d{14})$")
+
+
+def content_hash(chunks: List[Chunk]) -> str:
+    """Fingerprint a file's contents from its chunk list.
+
+    Chunking is deterministic, so equal contents give equal chunk lists.
+    """
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(bytes.fromhex(chunk.digest))
+    return digest.hexdigest()
+
+
+def expired_versions(versions: List[Tuple[int, str]], now_ns: int,
+                     policy: List[Tuple[int, int]] = RETENTION_POLICY) -> List[int]:
+    """Pick the versions a retention policy no longer keeps.
+
+    Args:
+        versions: (version_id, path) pairs ordered by path, then id
+        now_ns: Current time in nanoseconds
+        policy: Retention tiers, see RETENTION_POLICY
+
+    Returns:
+        List[int]: Ids of the versions to delete
+    """
+    expired = []
+    kept_buckets = set()
+    for index in range(len(versions) - 1, -1, -1):
+        version_id, path = versions[index]
+        newest = index == len(versions) - 1 or versions[index + 1][1] != path
+        if newest:
+            continue
+        age = (now_ns - version_id) / 1e9
+        tier = next(((limit, bucket) for limit, bucket in policy if age <= limit), None)
+        if tier is None:
+            expired.append(version_id)
+            continue
+        if tier[1] == 0:
+            continue
+        # Going newest first, the first version seen in a bucket is kept
+        key = (path, tier[1], version_id // (tier[1] * 10 ** 9))
+        if key in kept_buckets:
+            expired.append(version_id)
+        else:
+            kept_buckets.add(key)
+    return expired
+
+
+class VersionStore:
+    """Saves, lists, restores and collects file versions."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        """Initialize the store.
+
+        Args:
+            db: Database to use; defaults to the global database
+        """
+        self._db = db
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._gc_thread: Optional[threading.Thread] = None
+
+    @property
+    def db(self) -> DatabaseManager:
+        return self._db or get_db_manager()
+
+    @property
+    def chunks(self) -> ChunkStore:
+        return ChunkStore(CHUNK_FOLDER)
+
+    def save(self, file_path: str, skip_unchanged: bool = False) -> Optional[Dict[str, Any]]:
+        """Save a version of a file.
+
+        Args:
+            file_path: File to version
+            skip_unchanged: Save nothing if the contents match the latest
+                version; an unchanged size and mtime skip reading the file
+
+        Returns:
+            Optional[Dict[str, Any]]: version_id, chunks, new_chunks and
+            written, or None if skipped
+        """
+        self.import_legacy_versions()
+        path = os.path.abspath(file_path)
+        previous = self.db.get_latest_file_version(path)
+        previous_chunks = [Chunk(*chunk) for chunk in previous["chunks"]] if previous else None
+        st = os.stat(path)
+        if (skip_unchanged and previous is not None and previous["size"] == st.st_size
+                and previous["mtime_ns"] == st.st_mtime_ns):
+            return None
+        with self._lock:
+            chunks, stats = self.chunks.store_file(path, previous_chunks)
+            digest = content_hash(chunks)
+            # Unchanged chunks are matched by hash alone and none are written
+            if skip_unchanged and previous is not None and previous["content_hash"] == digest:
+                return None
+            version_id = self.db.add_file_version({
+                "path": path,
+                "size": st.st_size,
+                "mtime_ns": st.st_mtime_ns,
+                "mode": st.st_mode & 0o7777,
+                "content_hash": digest,
+                "chunks": [list(chunk) for chunk in chunks],
+            }, time.time_ns())
+        # The history follows the file when other programs move it
+        get_identity_map().track([path])
+        return {"version_id": version_id, "chunks": len(chunks), **stats}
+
+    def history(self, file_path: str) -> List[Dict[str, Any]]:
+        """List the versions of a file, oldest first.
+
+        Returns:
+            List[Dict[str, Any]]: Versions with version_id, size and saved_at
+        """
+        self.import_legacy_versions()
+        versions = self.db.get_file_versions(os.path.abspath(file_path))
+        for version in versions:
+            version["saved_at"] = datetime.fromtimestamp(version["version_id"] / 1e9)
+        return versions
+
+    def find(self, file_path: str, version: str) -> Optional[Dict[str, Any]]:
+        """Find a version of a file.
+
+        Args:
+            file_path: Versioned file
+            version: Version id, a 14-digit timestamp of an imported version,
+                or the position in the history counting from 1
+
+        Returns:
+            Optional[Dict[str, Any]]: The version with its chunks, or None
+        """
+        self.import_legacy_versions()
+        version = version.strip()
+        if not version.isdigit():
+            return None
+        path = os.path.abspath(file_path)
+        if len(version) <= 6:
+            versions = self.db.get_file_versions(path)
+            position = int(version)
+            if not 1 <= position <= len(versions):
+                return None
+            version_id = versions[position - 1]["version_id"]
+        elif len(version) == 14:
+            version_id = _legacy_version_id(version)
+        else:
+            version_id = int(version)
+        found = self.db.get_file_version(version_id)
+        return found if found is not None and found["path"] == path else None
+
+    def restore(self, version: Dict[str, Any], target: str) -> None:
+        """Write a version's contents to a file, replacing it atomically."""
+        target = os.path.abspath(target)
+        temp_path = os.path.join(os.path.dirname(target),
+                                 f".{os.path.basename(target)}.restore")
+        try:
+            with open(temp_path, "wb") as f:
+                for data in self.chunks.read_chunks(Chunk(*c) for c in version["chunks"]):
+                    f.write(data)
+            os.chmod(temp_path, version["mode"])
+            os.utime(temp_path, ns=(version["mtime_ns"], version["mtime_ns"]))
+            os.replace(temp_path, target)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def collect_garbage(self, now_ns: Optional[int] = None) -> Dict[str, int]:
+        """Apply the retention policy and delete unused chunks.
+
+        Args:
+            now_ns: Current time in nanoseconds
+
+        Returns:
+            Dict[str, int]: versions and chunks deleted, and bytes freed
+        """
+        now_ns = now_ns or time.time_ns()
+        with self._lock:
+            expired = expired_versions(self.db.list_all_file_versions(), now_ns)
+            if expired:
+                self.db.delete_file_versions(expired)
+            referenced = set()
+            for chunk_list in self.db.get_version_chunk_lists():
+                referenced.update(digest for digest, _ in json.loads(chunk_list))
+            chunks, freed = self.chunks.sweep(referenced, time.time() - CHUNK_GRACE_SECONDS)
+        if expired or chunks:
+            logger.info("Version cleanup removed %d version(s) and %d chunk(s)",
+                        len(expired), chunks)
+        return {"versions": len(expired), "chunks": chunks, "freed": freed}
+
+    def _gc_loop(self, interval: float) -> None:
+        """Collect garbage until stopped."""
+        while not self._stop_event.wait(interval):
+            try:
+                self.collect_garbage()
+            except Exception as e:
+                logger.error("Version cleanup failed: %s", str(e))
+
+    def start_gc_worker(self, interval: float = GC_INTERVAL_SECONDS) -> None:
+        """Start collecting garbage periodically in a background thread.
+
+        Args:
+            interval: Seconds between collections
+        """
+        if self._gc_thread is None:
+            self._stop_event.clear()
+            self._gc_thread = threading.Thread(target=self._gc_loop, args=(interval,))
+            self._gc_thread.daemon = True
+            self._gc_thread.start()
+
+    def stop_gc_worker(self) -> None:
+        """Stop the background collector thread."""
+        self._stop_event.set()
+        if self._gc_thread:
+            self._gc_thread.join()
+            self._gc_thread = None
+
+    def import_legacy_versions(self) -> int:
+        """Move versions saved as files in VERSION_FOLDER into the index.
+
+        Those versions were keyed by file name only; they are assigned to
+        the file of that name in the current folder.
+
+        Returns:
+            int: Number of versions imported
+        """
+        if not os.path.isdir(VERSION_FOLDER):
+            return 0
+        imported = 0
+        for name in sorted(os.listdir(VERSION_FOLDER)):
+            match = _LEGACY_NAME.match(name)
+            if not match:
+                continue
+            version_path = os.path.join(VERSION_FOLDER, name)
+            try:
+                chunks = _read_manifest(version_path)
+                st = os.stat(version_path)
+                with self._lock:
+                    if chunks is None:
+                        chunks, _ = self.chunks.store_file(version_path)
+                    self.db.add_file_version({
+                        "path": os.path.abspath(match.group(1)),
+                        "size": sum(chunk.length for chunk in chunks),
+                        "mtime_ns": st.st_mtime_ns,
+                        "mode": st.st_mode & 0o7777,
+                        "content_hash": content_hash(chunks),
+                        "chunks": [list(chunk) for chunk in chunks],
+                    }, _legacy_version_id(match.group(2)), keep_id=True)
+                os.remove(version_path)
+                imported += 1
+            except (OSError, ValueError, KeyError) as e:
+                logger.error("Failed to import version %s: %s", name, str(e))
+        if not os.listdir(VERSION_FOLDER):
+            os.rmdir(VERSION_FOLDER)
+        return imported
+
+
+def _legacy_version_id(timestamp: str) -> int:
+    """Turn a 14-digit version timestamp into a version id."""
+    return int(datetime.strptime(timestamp, "%Y%m%d%H%M%S").timestamp()) * 10 ** 9
+
+
+def _read_manifest(version_path: str) -> Optional[List[Chunk]]:
+    """Read the chunks of a legacy manifest, None for a plain copy."""
+    with open(version_path, "rb") as f:
+        if f.read(len(MANIFEST_MAGIC)) != MANIFEST_MAGIC:
+            return None
+        manifest = json.loads(f.read().decode("utf-8"))
+    return [Chunk(digest, length) for digest, length in manifest["chunks"]]
+
+
+# Global instance
+_version_store = None
+
+
+def get_version_store() -> VersionStore:
+    """Get the global VersionStore instance."""
+    global _version_store
+    if _version_store is None:
+        _version_store = VersionStore()
+    return _version_store
+
+
+def version_name(file_path: str, version_id: int) -> str:
+    """Name a version after its file and id."""
+    return f"{os.path.basename(file_path)}_{version_id}"
 
 
 def save_version(file_path: str) -> str:
     """Save a version of a file.
-    
+
     Args:
         file_path: Path to the file to version
-        
+
     Returns:
         str: Status message indicating success or failure
     """
     if not os.path.isfile(file_path):
         return "File does not exist."
-
-    # Create version folder if not exists
-    if not os.path.exists(VERSION_FOLDER):
-        os.makedirs(VERSION_FOLDER)
-
-    file_name = os.path.basename(file_path)
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    version_name = f"{file_name}_{timestamp}"
-    version_path = os.path.join(VERSION_FOLDER, version_name)
-
     try:
-        # Ensure we don't overwrite existing versions
-        while os.path.exists(version_path):
-            time.sleep(1)  # Wait a second to get a unique timestamp
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            version_name = f"{file_name}_{timestamp}"
-            version_path = os.path.join(VERSION_FOLDER, version_name)
-
-        shutil.copy2(file_path, version_path)
-        return f"Version saved: {version_name}"
-    except OSError as e:
+        result = get_version_store().save(file_path)
+        return (f"Version saved: {version_name(file_path, result['version_id'])} "
+                f"({result['new_chunks']} of {result['chunks']} chunk(s) new, "
+                f"{format_size(result['written'])} written)")
+    except (OSError, ValueError) as e:
         return f"Failed to save version: {str(e)}"
 
 
 def list_versions(file_name: str) -> list:
     """List all versions of a file.
-    
+
     Args:
         file_name: Name of the file to list versions for
-        
+
     Returns:
-        list: List of version names
+        list: List of version names, oldest first
     """
-    if not os.path.exists(VERSION_FOLDER):
+    try:
+        return [version_name(file_name, version["version_id"])
+                for version in get_version_store().history(file_name)]
+    except OSError as e:
+        logger.error("Failed to list versions of %s: %s", file_name, str(e))
         return []
 
-    return sorted([f for f in os.listdir(VERSION_FOLDER) if f.startswith(file_name + "_")])
-
 
 def restore_version(file_name: str, timestamp: str) -> str:
     """Restore a specific version of a file.
-    
+
     Args:
         file_name: Name of the file to restore
-        timestamp: Timestamp of the version to restore
-        
+        timestamp: Version id, 14-digit timestamp of an imported version, or
+            the version's position in the list counting from 1
+
     Returns:
         str: Status message indicating success or failure
     """
-    version_name = f"{file_name}_{timestamp}"
-    version_path = os.path.join(VERSION_FOLDER, version_name)
-    
-    if not os.path.exists(version_path):
-        return "Version not found."
-        
+    store = get_version_store()
     try:
-        shutil.copy2(version_path, file_name)
+        version = store.find(file_name, timestamp)
+        if version is None:
+            return "Version not found."
+        store.restore(version, file_name)
         return "Version restored successfully."
-    except OSError as e:
+    except (OSError, ValueError) as e:
         return f"Failed to restore version: {str(e)}"
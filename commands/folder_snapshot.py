@@ -0,0 +1,364 @@
+"""Point-in-time folder snapshots built as hard link farms.
+
+Each snapshot is a full copy of a folder tree under SNAPSHOT_FOLDER, so it
+can be browsed and restored with nothing but the file system. A file whose
+size, mtime and mode match its copy in the previous snapshot is hard
+linked to that copy instead of being copied, the way rsnapshot does it:
+an unchanged tree costs a stat and a link per file and no file data, and
+only changed files take up new space. Files are never linked to the
+source, so editing the source cannot change a snapshot. Copies keep the
+source mtime, which is what the next snapshot compares against.
+
+A snapshot is built under a ".partial" name and renamed when complete.
+Restoring copies files back, never links them, and moves files the
+snapshot does not have to the recycle bin. Jarvis's own database, chunk
+store, snapshots and trash are never snapshotted or restored.
+"""
+
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.database import get_db_manager
+from utils.file_query import FileQuery
+from .disk_usage import format_size
+from .file_manager import ensure_safe_path
+from .file_versioning import CHUNK_FOLDER, VERSION_FOLDER
+from .folder_sync import DEFAULT_WORKERS
+from .recycle_bin import RECYCLE_BIN, get_recycle_bin
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FOLDER = ".folder_snapshots"
+PARTIAL_SUFFIX = ".partial"
+# Snapshots kept per folder; older ones are deleted
+MAX_FOLDER_SNAPSHOTS = 30
+
+
+def snapshot_dir_for(root: str) -> str:
+    """Get the folder holding the snapshots of a folder."""
+    digest = hashlib.sha1(root.encode("utf-8", "surrogateescape")).hexdigest()[:8]
+    return os.path.abspath(os.path.join(SNAPSHOT_FOLDER,
+                                        f"{os.path.basename(root) or 'root'}-{digest}"))
+
+
+def _own_state(root: str) -> List[str]:
+    """Exclude patterns for Jarvis's own state inside a folder.
+
+    The database, chunk store, snapshots and trash must never be captured,
+    or restoring the folder would roll them back along with the user's files.
+    """
+    exclude = [".Trash-*/"]
+    stores = [(folder, True) for folder in
+              (SNAPSHOT_FOLDER, RECYCLE_BIN, CHUNK_FOLDER, VERSION_FOLDER)]
+    db_path = get_db_manager().db_path
+    stores += [(db_path + suffix, False) for suffix in ("", "-journal", "-wal", "-shm")]
+    for store, is_dir in stores:
+        store = os.path.abspath(store)
+        if store.startswith(root.rstrip(os.sep) + os.sep):
+            rel_path = os.path.relpath(store, root).replace(os.sep, "/")
+            exclude.append("/" + rel_path + ("/" if is_dir else ""))
+    return exclude
+
+
+def _walk(root: str, tree: Optional[str] = None):
+    """Walk a folder for snapshotting, skipping Jarvis's own state.
+
+    Args:
+        root: Snapshotted folder, which the excluded paths are relative to
+        tree: Folder to walk, e.g. a snapshot of root; defaults to root
+
+    Yields:
+        Tuple[str, os.DirEntry]: Relative path and entry of every file,
+        folder and symlink
+    """
+    query = FileQuery(exclude=_own_state(root), use_default_excludes=False, ignore_files=())
+    return query.walk(tree or root, yield_dirs=True)
+
+
+def _same_file(a: os.stat_result, b: os.stat_result) -> bool:
+    """Check whether two stats describe the same contents and mode."""
+    return (a.st_size == b.st_size and a.st_mtime_ns == b.st_mtime_ns
+            and stat.S_IMODE(a.st_mode) == stat.S_IMODE(b.st_mode))
+
+
+def _copy_file(source: str, destination: str) -> int:
+    """Copy a file with its mode and times, returning the bytes copied."""
+    shutil.copy2(source, destination, follow_symlinks=False)
+    return os.path.getsize(destination)
+
+
+def _copy_symlink(source: str, destination: str) -> None:
+    """Recreate a symlink."""
+    os.symlink(os.readlink(source), destination)
+
+
+def create_snapshot(folder: str, max_workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """Snapshot a folder, hard linking the files unchanged since the last snapshot.
+
+    Args:
+        folder: Folder to snapshot
+        max_workers: Number of changed files copied at once
+
+    Returns:
+        Dict[str, Any]: The snapshot record with files, linked, copied,
+        bytes_copied, errors and seconds
+
+    Raises:
+        ValueError: If the folder is unsafe or missing
+    """
+    start = time.perf_counter()
+    root = str(ensure_safe_path(folder))
+    if not os.path.isdir(root):
+        raise ValueError(f"{folder} is not a folder")
+    db = get_db_manager()
+    base = snapshot_dir_for(root)
+    os.makedirs(base, exist_ok=True)
+    for name in os.listdir(base):
+        if name.endswith(PARTIAL_SUFFIX):
+            # Left behind by an interrupted snapshot
+            shutil.rmtree(os.path.join(base, name), ignore_errors=True)
+
+    previous = next((s["path"] for s in reversed(db.get_folder_snapshots(root))
+                     if os.path.isdir(s["path"])), None)
+    created_at = time.time()
+    name = datetime.fromtimestamp(created_at).strftime("%Y-%m-%d_%H%M%S")
+    final = os.path.join(base, name)
+    suffix = 1
+    while os.path.exists(final):
+        suffix += 1
+        final = os.path.join(base, f"{name}_{suffix}")
+    partial = final + PARTIAL_SUFFIX
+    os.mkdir(partial)
+
+    files = linked = errors = 0
+    copies: List[Tuple[str, str]] = []
+    for rel_path, entry in _walk(root):
+        destination = os.path.join(partial, rel_path)
+        try:
+            st = entry.stat(follow_symlinks=False)
+            if stat.S_ISDIR(st.st_mode):
+                os.mkdir(destination)
+                continue
+            if stat.S_ISLNK(st.st_mode):
+                _copy_symlink(entry.path, destination)
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            files += 1
+            if previous is not None:
+                old = os.path.join(previous, rel_path)
+                try:
+                    if _same_file(st, os.lstat(old)):
+                        os.link(old, destination)
+                        linked += 1
+                        continue
+                except OSError as e:
+                    # Missing, or too many links / another file system: copy
+                    if e.errno not in (errno.ENOENT, errno.EMLINK, errno.EXDEV):
+                        raise
+            copies.append((entry.path, destination))
+        except OSError as e:
+            logger.error("Error snapshotting %s: %s", entry.path, str(e))
+            errors += 1
+
+    copied = bytes_copied = 0
+    if copies:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [(source, executor.submit(_copy_file, source, destination))
+                       for source, destination in copies]
+            for source, future in futures:
+                try:
+                    bytes_copied += future.result()
+                    copied += 1
+                except OSError as e:
+                    logger.error("Error snapshotting %s: %s", source, str(e))
+                    errors += 1
+
+    os.rename(partial, final)
+    snapshot = {"root": root, "path": final, "created_at": created_at, "files": files,
+                "linked": linked, "copied": copied, "bytes_copied": bytes_copied}
+    snapshot["id"] = db.add_folder_snapshot(snapshot)
+    _prune(root)
+    snapshot.update(errors=errors, seconds=time.perf_counter() - start)
+    return snapshot
+
+
+def _prune(root: str) -> None:
+    """Delete the oldest snapshots of a folder beyond MAX_FOLDER_SNAPSHOTS."""
+    db = get_db_manager()
+    snapshots = db.get_folder_snapshots(root)
+    for snapshot in snapshots[:max(0, len(snapshots) - MAX_FOLDER_SNAPSHOTS)]:
+        # Space is only freed for files no newer snapshot links to
+        shutil.rmtree(snapshot["path"], ignore_errors=True)
+        db.delete_folder_snapshot(snapshot["id"])
+
+
+def list_snapshots(folder: str) -> List[Dict[str, Any]]:
+    """List the snapshots of a folder that still exist, oldest first.
+
+    Returns:
+        List[Dict[str, Any]]: Snapshot records with created_at as a datetime
+    """
+    root = str(ensure_safe_path(folder))
+    snapshots = []
+    for snapshot in get_db_manager().get_folder_snapshots(root):
+        if os.path.isdir(snapshot["path"]):
+            snapshot["created_at"] = datetime.fromtimestamp(snapshot["created_at"])
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def restore_snapshot(folder: str, snapshot: Dict[str, Any],
+                     target: Optional[str] = None) -> Dict[str, Any]:
+    """Make a folder match a snapshot.
+
+    Args:
+        folder: Snapshotted folder
+        snapshot: Snapshot record from list_snapshots
+        target: Folder to restore into; defaults to the snapshotted folder
+
+    Returns:
+        Dict[str, Any]: restored, unchanged, removed and errors
+
+    Raises:
+        ValueError: If the target is unsafe
+    """
+    destination_root = str(ensure_safe_path(target or folder))
+    os.makedirs(destination_root, exist_ok=True)
+    source_root = snapshot["path"]
+    wanted = set()
+    restored = unchanged = errors = 0
+    # Snapshots taken before the state was excluded may hold a copy of it
+    for rel_path, entry in _walk(destination_root, source_root):
+        wanted.add(rel_path)
+        destination = os.path.join(destination_root, rel_path)
+        try:
+            st = entry.stat(follow_symlinks=False)
+            try:
+                current = os.lstat(destination)
+            except FileNotFoundError:
+                current = None
+            if stat.S_ISDIR(st.st_mode):
+                if current is not None and not stat.S_ISDIR(current.st_mode):
+                    get_recycle_bin().trash_item(destination)
+                os.makedirs(destination, exist_ok=True)
+                continue
+            if current is not None and stat.S_ISDIR(current.st_mode):
+                get_recycle_bin().trash_item(destination)
+                current = None
+            if stat.S_ISLNK(st.st_mode):
+                link = os.readlink(entry.path)
+                if current is not None and stat.S_ISLNK(current.st_mode) \
+                        and os.readlink(destination) == link:
+                    unchanged += 1
+                    continue
+                if current is not None:
+                    os.remove(destination)
+                os.symlink(link, destination)
+                restored += 1
+                continue
+            if current is not None and stat.S_ISREG(current.st_mode) and _same_file(st, current):
+                unchanged += 1
+                continue
+            # Copy, never link: editing the restored file must not change the snapshot
+            partial = destination + PARTIAL_SUFFIX
+            shutil.copy2(entry.path, partial)
+            os.replace(partial, destination)
+            restored += 1
+        except OSError as e:
+            logger.error("Error restoring %s: %s", destination, str(e))
+            errors += 1
+
+    removed = 0
+    # Folders are listed before their contents, which go with them
+    extra = [(rel_path, entry.path) for rel_path, entry in _walk(destination_root)
+             if rel_path not in wanted]
+    trashed = set()
+    for rel_path, path in extra:
+        parts = rel_path.split("/")
+        if any("/".join(parts[:i]) in trashed for i in range(1, len(parts))):
+            continue
+        try:
+            get_recycle_bin().trash_item(path)
+            trashed.add(rel_path)
+            removed += 1
+        except OSError as e:
+            logger.error("Error removing %s: %s", path, str(e))
+            errors += 1
+    return {"restored": restored, "unchanged": unchanged, "removed": removed, "errors": errors}
+
+
+def snapshot_folder(folder: str) -> str:
+    """Snapshot a folder.
+
+    Args:
+        folder: Folder to snapshot
+
+    Returns:
+        str: Status message
+    """
+    try:
+        result = create_snapshot(folder)
+        get_db_manager().log_operation("SNAPSHOT", folder, result["path"],
+                                       "SUCCESS" if not result["errors"] else "PARTIAL")
+        message = (f"Snapshot of {folder} taken: {result['files']} file(s), "
+                   f"{result['linked']} unchanged, {result['copied']} copied "
+                   f"({format_size(result['bytes_copied'])}) in {result['seconds']:.1f}s.")
+        if result["errors"]:
+            message += f" {result['errors']} file(s) failed."
+        return message
+    except (OSError, ValueError) as e:
+        logger.error("Error snapshotting %s: %s", folder, str(e))
+        return f"Failed to snapshot {folder}: {str(e)}"
+
+
+def describe_snapshots(folder: str) -> str:
+    """List the snapshots of a folder, numbered for restoring."""
+    try:
+        snapshots = list_snapshots(folder)
+    except ValueError as e:
+        return f"Cannot list snapshots of {folder}: {str(e)}"
+    if not snapshots:
+        return f"There are no snapshots of {folder}."
+    lines = [f"{len(snapshots)} snapshot(s) of {folder}:"]
+    for number, snapshot in enumerate(snapshots, 1):
+        lines.append(f"  {number}. {snapshot['created_at']:%Y-%m-%d %H:%M}, "
+                     f"{snapshot['files']} file(s), {snapshot['copied']} changed")
+    return "\n".join(lines)
+
+
+def restore_folder_snapshot(folder: str, number: str) -> str:
+    """Restore a folder from a snapshot.
+
+    Args:
+        folder: Snapshotted folder
+        number: Snapshot number as listed, counting from 1
+
+    Returns:
+        str: Status message
+    """
+    try:
+        snapshots = list_snapshots(folder)
+        if not number.strip().isdigit() or not 1 <= int(number) <= len(snapshots):
+            return "Snapshot not found."
+        snapshot = snapshots[int(number) - 1]
+        result = restore_snapshot(folder, snapshot)
+        get_db_manager().log_operation("RESTORE_SNAPSHOT", snapshot["path"], folder,
+                                       "SUCCESS" if not result["errors"] else "PARTIAL")
+        message = (f"Restored {folder} to {snapshot['created_at']:%Y-%m-%d %H:%M}: "
+                   f"{result['restored']} file(s) restored, {result['removed']} moved "
+                   f"to the recycle bin, {result['unchanged']} unchanged.")
+        if result["errors"]:
+            message += f" {result['errors']} file(s) failed."
+        return message
+    except (OSError, ValueError) as e:
+        logger.error("Error restoring %s: %s", folder, str(e))
+        return f"Failed to restore {folder}: {str(e)}"
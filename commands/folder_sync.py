@@ -0,0 +1,367 @@
+"""One-way folder sync that keeps a backup copy of a folder current.
+
+Each sync walks the source once and compares every file's (size, mtime)
+with the manifest saved by the previous sync of the same folder pair, so
+an unchanged tree costs one stat per file and nothing is read. New and
+small changed files are copied whole. Large changed files are updated the
+way rsync does it: the old copy is cut into blocks indexed by an Adler-32
+weak checksum, the new file is scanned with a rolling checksum to find
+those blocks at any offset, and only the bytes that match no block are
+read from the new file. The result is assembled in a temporary file next
+to the copy and renamed over it, so an interrupted sync never leaves a
+half-patched copy. Files are transferred on a thread pool. Files removed from the source since
+the last sync are removed from the target; files the sync never wrote are
+left alone.
+"""
+
+import logging
+import mmap
+import os
+import shutil
+import stat
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+from utils.database import get_db_manager
+from utils.file_query import FileQuery
+from .disk_usage import format_size
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+# Changed files at least this large on both sides are delta-transferred
+DELTA_THRESHOLD = 8 * 1024 * 1024
+# Unmatched bytes searched byte by byte before stepping a block at a time
+SEARCH_LIMIT = 1024 * 1024
+COPY_BUFFER = 1024 * 1024
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+TEMP_SUFFIX = ".jarvis-sync"
+
+_ADLER_MOD = 65521
+
+
+class DeltaOp(NamedTuple):
+    """One piece of the new file: a run of old bytes or of literal new bytes."""
+    position: int
+    length: int
+    # Offset in the old file, or -1 for literal bytes from the new file
+    old_offset: int
+
+
+def _find_block(source, position: int, block_size: int, target,
+                candidates: List[int]) -> int:
+    """Find a target block equal to the source block at a position, or -1."""
+    block = source[position:position + block_size]
+    for offset in candidates:
+        if target[offset:offset + block_size] == block:
+            return offset
+    return -1
+
+
+def compute_delta(source, target, block_size: int = BLOCK_SIZE) -> List[DeltaOp]:
+    """Describe a new file as runs of an old file's blocks and literal bytes.
+
+    Args:
+        source: Contents of the new file (bytes or mmap)
+        target: Contents of the old file (bytes or mmap)
+        block_size: Block size in bytes
+
+    Returns:
+        List[DeltaOp]: Operations covering the new file in order
+    """
+    n_source, n_target = len(source), len(target)
+    blocks: Dict[int, List[int]] = {}
+    for offset in range(0, n_target - block_size + 1, block_size):
+        blocks.setdefault(zlib.adler32(target[offset:offset + block_size]), []).append(offset)
+
+    ops: List[DeltaOp] = []
+
+    def emit(position: int, length: int, old_offset: int) -> None:
+        if ops:
+            last = ops[-1]
+            contiguous = (last.old_offset == -1) if old_offset == -1 else (
+                last.old_offset != -1 and last.old_offset + last.length == old_offset)
+            if contiguous and last.position + last.length == position:
+                ops[-1] = last._replace(length=last.length + length)
+                return
+        ops.append(DeltaOp(position, length, old_offset))
+
+    literal_start = 0
+    position = 0
+    expected = -1
+    while position + block_size <= n_source:
+        # After a match the next block usually follows it in the old file too
+        match = -1
+        if 0 <= expected <= n_target - block_size:
+            match = _find_block(source, position, block_size, target, [expected])
+        if match < 0:
+            weak = zlib.adler32(source[position:position + block_size])
+            match = _find_block(source, position, block_size, target, blocks.get(weak, []))
+        if match >= 0:
+            if position > literal_start:
+                emit(literal_start, position - literal_start, -1)
+            emit(position, block_size, match)
+            position += block_size
+            literal_start = position
+            expected = match + block_size
+            continue
+
+        expected = -1
+        end = min(n_source - block_size, literal_start + SEARCH_LIMIT)
+        if position >= end:
+            # Search budget spent: look for blocks at block steps only
+            position += block_size
+            continue
+        # Roll the checksum one byte at a time until a block matches
+        a, b = weak & 0xFFFF, weak >> 16
+        while position < end:
+            out_byte, in_byte = source[position], source[position + block_size]
+            a = (a - out_byte + in_byte) % _ADLER_MOD
+            b = (b - block_size * out_byte + a - 1) % _ADLER_MOD
+            position += 1
+            candidates = blocks.get((b << 16) | a)
+            if candidates:
+                expected = _find_block(source, position, block_size, target, candidates)
+                if expected >= 0:
+                    break
+
+    tail = n_source - position
+    if (0 < tail and position == literal_start and 0 <= expected
+            and source[position:] == target[expected:expected + tail]):
+        # The short last block is unchanged when it follows on from a match
+        emit(position, tail, expected)
+        literal_start = n_source
+    if n_source > literal_start:
+        emit(literal_start, n_source - literal_start, -1)
+    return ops
+
+
+def _copy_range(source_file, destination_file, offset: int, length: int) -> None:
+    """Copy a byte range from one open file to the current position of another."""
+    source_file.seek(offset)
+    while length > 0:
+        data = source_file.read(min(COPY_BUFFER, length))
+        if not data:
+            break
+        destination_file.write(data)
+        length -= len(data)
+
+
+def delta_copy(source: str, target: str, block_size: int = BLOCK_SIZE) -> Dict[str, Any]:
+    """Update an existing copy of a file, writing only what changed.
+
+    Args:
+        source: The new file
+        target: The old copy to bring up to date
+        block_size: Block size in bytes
+
+    Returns:
+        Dict[str, Any]: bytes_written to the copy, of which bytes_copied came
+        from the new file and bytes_matched from the old copy
+    """
+    with open(source, "rb") as src, open(target, "rb") as dst:
+        with mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as source_map, \
+                mmap.mmap(dst.fileno(), 0, access=mmap.ACCESS_READ) as target_map:
+            ops = compute_delta(source_map, target_map, block_size)
+            size = len(source_map)
+    literal = sum(op.length for op in ops if op.old_offset == -1)
+
+    partial = target + TEMP_SUFFIX
+    try:
+        with open(source, "rb") as src, open(target, "rb") as old, open(partial, "wb") as out:
+            for op in ops:
+                if op.old_offset == -1:
+                    _copy_range(src, out, op.position, op.length)
+                else:
+                    _copy_range(old, out, op.old_offset, op.length)
+        os.replace(partial, target)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return {"bytes_written": size, "bytes_copied": literal, "bytes_matched": size - literal}
+
+
+class _Transfer(NamedTuple):
+    """A source file that needs to be written to the target."""
+    rel_path: str
+    source: str
+    target: str
+    size: int
+    mtime_ns: int
+
+
+def _transfer(item: _Transfer) -> Tuple[int, bool]:
+    """Bring one target file up to date.
+
+    Returns:
+        Tuple[int, bool]: Bytes copied from the source and whether a delta was used
+    """
+    copied, delta = item.size, False
+    try:
+        target_size = os.path.getsize(item.target)
+    except OSError:
+        target_size = -1
+    if min(item.size, target_size) >= DELTA_THRESHOLD:
+        copied = delta_copy(item.source, item.target)["bytes_copied"]
+        delta = True
+    else:
+        os.makedirs(os.path.dirname(item.target), exist_ok=True)
+        partial = item.target + TEMP_SUFFIX
+        try:
+            shutil.copyfile(item.source, partial)
+            os.replace(partial, item.target)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+    shutil.copymode(item.source, item.target)
+    # Stamp the source time the manifest recorded so the pair stays comparable
+    os.utime(item.target, ns=(time.time_ns(), item.mtime_ns))
+    return copied, delta
+
+
+def _remove_empty_parents(path: str, root: str) -> None:
+    """Remove the directories above a deleted file that are now empty."""
+    parent = os.path.dirname(path)
+    while parent != root and parent.startswith(root + os.sep):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            return
+        parent = os.path.dirname(parent)
+
+
+def sync_folders(source: str, target: str, max_workers: int = DEFAULT_WORKERS,
+                 check_target: bool = True) -> Dict[str, Any]:
+    """Make a target folder a copy of a source folder.
+
+    Args:
+        source: Folder to copy from
+        target: Folder to bring up to date
+        max_workers: Number of files transferred at once
+        check_target: Also stat target files, so copies that were deleted or
+            edited in the target are noticed and written again
+
+    Returns:
+        Dict[str, Any]: copied, updated, deleted, unchanged, delta_files,
+        bytes_copied (read from the source), errors and seconds
+
+    Raises:
+        ValueError: If the folders are unsafe, the same, or the source is missing
+    """
+    start = time.perf_counter()
+    src_root, dst_root = str(ensure_safe_path(source)), str(ensure_safe_path(target))
+    if not os.path.isdir(src_root):
+        raise ValueError(f"{source} is not a folder")
+    if src_root == dst_root:
+        raise ValueError("source and target are the same folder")
+    os.makedirs(dst_root, exist_ok=True)
+
+    db = get_db_manager()
+    manifest = db.get_sync_manifest(src_root, dst_root)
+    seen = set()
+    transfers: List[_Transfer] = []
+    unchanged = 0
+    exclude = []
+    if dst_root.startswith(src_root + os.sep):
+        # Never copy the backup into itself
+        exclude.append("/" + os.path.relpath(dst_root, src_root).replace(os.sep, "/"))
+    query = FileQuery(exclude=exclude, use_default_excludes=False, ignore_files=())
+    for rel_path, entry in query.walk(src_root, yield_dirs=True):
+        if entry.name.endswith(TEMP_SUFFIX):
+            continue
+        destination = os.path.join(dst_root, rel_path)
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if stat.S_ISDIR(st.st_mode):
+            os.makedirs(destination, exist_ok=True)
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        seen.add(rel_path)
+        record = (st.st_size, st.st_mtime_ns)
+        if manifest.get(rel_path) == record:
+            if not check_target:
+                unchanged += 1
+                continue
+            try:
+                copy = os.stat(destination)
+                if (copy.st_size, copy.st_mtime_ns) == record:
+                    unchanged += 1
+                    continue
+            except OSError:
+                pass
+        transfers.append(_Transfer(rel_path, entry.path, destination, *record))
+
+    synced: List[tuple] = []
+    copied = updated = delta_files = bytes_copied = errors = 0
+    if transfers:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            futures = [(item, executor.submit(_transfer, item)) for item in transfers]
+            for item, future in futures:
+                try:
+                    size, delta = future.result()
+                except OSError as e:
+                    logger.error("Error syncing %s: %s", item.source, str(e))
+                    errors += 1
+                    continue
+                bytes_copied += size
+                delta_files += delta
+                if item.rel_path in manifest:
+                    updated += 1
+                else:
+                    copied += 1
+                synced.append((item.rel_path, item.size, item.mtime_ns))
+
+    removed = []
+    for rel_path in manifest.keys() - seen:
+        path = os.path.join(dst_root, rel_path)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error("Error removing %s: %s", path, str(e))
+            errors += 1
+            continue
+        _remove_empty_parents(path, dst_root)
+        removed.append(rel_path)
+
+    db.save_sync_manifest(src_root, dst_root, synced, removed)
+    return {"copied": copied, "updated": updated, "deleted": len(removed),
+            "unchanged": unchanged, "delta_files": delta_files, "bytes_copied": bytes_copied,
+            "errors": errors, "seconds": time.perf_counter() - start}
+
+
+def sync_folder(source: str, target: str) -> str:
+    """Sync a folder to a backup copy.
+
+    Args:
+        source: Folder to copy from
+        target: Folder to keep current
+
+    Returns:
+        str: Status message
+    """
+    try:
+        result = sync_folders(source, target)
+        get_db_manager().log_operation("SYNC", source, target,
+                                       "SUCCESS" if not result["errors"] else "PARTIAL")
+        message = (f"Synced {source} to {target}: {result['copied']} new, "
+                   f"{result['updated']} updated, {result['deleted']} removed, "
+                   f"{result['unchanged']} unchanged; copied "
+                   f"{format_size(result['bytes_copied'])} in {result['seconds']:.1f}s.")
+        if result["errors"]:
+            message += f" {result['errors']} file(s) could not be synced."
+        return message
+    except ValueError as e:
+        return f"Cannot sync {source}: {str(e)}"
+    except OSError as e:
+        logger.error("Error syncing %s to %s: %s", source, target, str(e))
+        return f"Failed to sync {source}: {str(e)}"
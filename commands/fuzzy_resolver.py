@@ -0,0 +1,342 @@
+"""Fuzzy file name resolver for names heard through speech recognition.
+
+Speech recognition rarely returns a file name verbatim: "report too" for
+``report2.docx`` or "meeting notes" for ``meeting_notes.txt``. Names are
+therefore indexed under a normalized key (lowercase, number words turned
+into digits, separators dropped) and a phonetic key. A query is answered
+from those exact-key tables when possible, and otherwise by gathering
+candidates from the rarest trigrams of its key and ranking them by edit
+distance. Resolvers follow file changes through the file watcher when
+inotify is available, and are rebuilt when a lookup misses otherwise.
+"""
+
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.file_query import FileQuery
+from utils.file_watcher import CREATED, DELETED, RESCAN, ChangeEvent, get_file_watcher
+
+logger = logging.getLogger(__name__)
+
+# Words speech recognition produces for digits and punctuation
+SPOKEN_WORDS = {
+    "zero": "0", "oh": "0",
+    "one": "1", "won": "1",
+    "two": "2", "too": "2", "to": "2",
+    "three": "3",
+    "four": "4", "for": "4",
+    "five": "5", "six": "6", "seven": "7", "eight": "8", "ate": "8",
+    "nine": "9", "ten": "10",
+    "dot": ".", "point": ".",
+    "underscore": "_", "dash": "-", "hyphen": "-",
+}
+# Number words that are also ordinary words ("notes for review"); in names
+# they only become digits at the end or before another number or symbol
+AMBIGUOUS_WORDS = {"oh", "won", "too", "to", "for", "ate"}
+
+MAX_CANDIDATES = 16
+RAREST_TRIGRAMS = 6
+MIN_SCORE = 0.5
+# Candidates tried in turn when the best match no longer exists
+RESOLVE_CANDIDATES = 5
+
+_SOUNDEX_CODES = str.maketrans(
+    "abcdefghijklmnopqrstuvwxyz",
+    "01230120022455012623010202",
+)
+
+
+def _spoken_words(words: List[str]) -> List[str]:
+    """Turn number and symbol words into digits and symbols where plausible."""
+    converted = []
+    for i, word in enumerate(words):
+        if word in AMBIGUOUS_WORDS:
+            following = words[i + 1] if i + 1 < len(words) else None
+            if following is not None and not following.isdigit() and (
+                    following not in SPOKEN_WORDS or following in AMBIGUOUS_WORDS):
+                converted.append(word)
+                continue
+        converted.append(SPOKEN_WORDS.get(word, word))
+    return converted
+
+
+def normalize_name(name: str) -> str:
+    """Get the matching key of a file name or spoken phrase.
+
+    Args:
+        name: File name or recognized speech
+
+    Returns:
+        str: Lowercase key with number words as digits and no separators
+    """
+    words = [word for word in re.split(r"[\s_\-]+", name.lower().strip()) if word]
+    words = _spoken_words(words)
+    return re.sub(r"[^0-9a-z]+", "", "".join(words))
+
+
+def phonetic_key(name: str) -> str:
+    """Get a Soundex-style key of a file name or spoken phrase.
+
+    Args:
+        name: File name or recognized speech
+
+    Returns:
+        str: Concatenated per-word phonetic codes; digits are kept
+    """
+    codes = []
+    for word in _spoken_words(re.findall(r"[a-z]+|[0-9]+", name.lower())):
+        if not word.isalpha():
+            codes.append(word)
+            continue
+        digits = word.translate(_SOUNDEX_CODES)
+        code = [word[0]]
+        previous = digits[0]
+        for digit in digits[1:]:
+            if digit != previous and digit != "0":
+                code.append(digit)
+            previous = digit
+        codes.append("".join(code)[:4])
+    return "".join(codes)
+
+
+def _trigrams(key: str) -> Set[str]:
+    """Get the trigrams of a key, padded so short keys still have some."""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: Optional[int] = None) -> int:
+    """Compute the Levenshtein distance between two strings.
+
+    Args:
+        a: First string
+        b: Second string
+        limit: Stop early and return limit + 1 once the distance exceeds it
+
+    Returns:
+        int: Edit distance
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b),
+            ))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class FuzzyResolver:
+    """Index of file names answering fuzzy lookups."""
+
+    def __init__(self, min_score: float = MIN_SCORE):
+        """Initialize an empty resolver.
+
+        Args:
+            min_score: Minimum similarity (0-1) for a candidate to be returned
+        """
+        self.min_score = min_score
+        self.roots: Set[str] = set()
+        # Whether file change events keep the index current
+        self.watched = False
+        self._paths: Dict[str, Set[str]] = defaultdict(set)
+        self._phonetic: Dict[str, Set[str]] = defaultdict(set)
+        self._trigrams: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return sum(len(paths) for paths in self._paths.values())
+
+    def _keys(self, name: str) -> Set[str]:
+        """Keys a file is indexed under: its full name and its stem."""
+        stem = os.path.splitext(name)[0]
+        return {key for key in (normalize_name(name), normalize_name(stem)) if key}
+
+    def add(self, path: str) -> None:
+        """Index a file path under its name."""
+        name = os.path.basename(path)
+        with self._lock:
+            for key in self._keys(name):
+                if not self._paths[key]:
+                    for trigram in _trigrams(key):
+                        self._trigrams[trigram].add(key)
+                self._paths[key].add(path)
+            self._phonetic[phonetic_key(os.path.splitext(name)[0])].add(path)
+
+    def remove(self, path: str) -> None:
+        """Drop a file path from the index."""
+        name = os.path.basename(path)
+        with self._lock:
+            for key in self._keys(name):
+                paths = self._paths.get(key)
+                if paths is None:
+                    continue
+                paths.discard(path)
+                if not paths:
+                    del self._paths[key]
+                    for trigram in _trigrams(key):
+                        self._trigrams[trigram].discard(key)
+            self._phonetic.get(phonetic_key(os.path.splitext(name)[0]), set()).discard(path)
+
+    def build(self, root: str) -> int:
+        """Index every file under a directory.
+
+        Args:
+            root: Directory to index
+
+        Returns:
+            int: Number of files indexed
+        """
+        count = 0
+        for _, entry in FileQuery().walk(root):
+            self.add(entry.path)
+            count += 1
+        self.roots.add(os.path.abspath(root))
+        return count
+
+    def rebuild(self) -> int:
+        """Index the roots again from scratch.
+
+        Returns:
+            int: Number of files indexed
+        """
+        with self._lock:
+            self._paths.clear()
+            self._phonetic.clear()
+            self._trigrams.clear()
+        return sum(self.build(root) for root in list(self.roots))
+
+    def apply_changes(self, events: List[ChangeEvent]) -> None:
+        """File watcher callback: index created files and drop deleted ones."""
+        excluded = FileQuery().exclude
+        for event in events:
+            if event.kind == RESCAN:
+                self.rebuild()
+                return
+            if event.kind == DELETED:
+                gone = {event.path}
+                if event.is_dir:
+                    # A folder moved away is reported once, not per file
+                    below = event.path + os.sep
+                    with self._lock:
+                        gone.update(path for paths in self._paths.values() for path in paths
+                                    if path.startswith(below))
+                for path in gone:
+                    self.remove(path)
+            elif (event.kind == CREATED and not event.is_dir
+                  and not excluded.match(os.path.basename(event.path))):
+                self.add(event.path)
+
+    def watch(self, root: str) -> None:
+        """Keep the index of a root current from file change events."""
+        get_file_watcher().subscribe(root, self.apply_changes)
+        self.watched = True
+
+    def resolve(self, spoken: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Find the files whose names best match a spoken name.
+
+        Args:
+            spoken: Recognized speech naming a file
+            limit: Maximum number of candidates
+
+        Returns:
+            List[Tuple[str, float]]: (path, score) pairs, best first; a score
+            of 1.0 means the normalized names are identical
+        """
+        key = normalize_name(spoken)
+        if not key:
+            return []
+
+        with self._lock:
+            exact = self._paths.get(key)
+            if exact:
+                return [(path, 1.0) for path in sorted(exact)][:limit]
+
+            scored: Dict[str, float] = {}
+            for path in self._phonetic.get(phonetic_key(spoken), ()):
+                scored[path] = 0.8
+
+            # Gather candidate keys from the rarest trigrams of the query only,
+            # which bounds the work on large indexes
+            postings = sorted((self._trigrams[t] for t in _trigrams(key) if self._trigrams.get(t)),
+                              key=len)
+            overlap: Dict[str, int] = defaultdict(int)
+            for keys in postings[:RAREST_TRIGRAMS]:
+                for candidate in keys:
+                    overlap[candidate] += 1
+            best = sorted(overlap, key=overlap.__getitem__, reverse=True)[:MAX_CANDIDATES]
+
+            max_distance = max(1, int(len(key) * (1 - self.min_score)))
+            for candidate in best:
+                distance = edit_distance(key, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                score = 1 - distance / max(len(key), len(candidate))
+                if score < self.min_score:
+                    continue
+                for path in self._paths[candidate]:
+                    scored[path] = max(scored.get(path, 0.0), score)
+
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+
+# Resolvers by root directory
+_resolvers: Dict[str, FuzzyResolver] = {}
+
+
+def get_resolver(root: str = ".") -> FuzzyResolver:
+    """Get the resolver for a directory, building it on first use.
+
+    With inotify the resolver is kept current by the file watcher; polling
+    a whole tree would cost more than rebuilding on a miss.
+    """
+    root = os.path.abspath(root)
+    resolver = _resolvers.get(root)
+    if resolver is None:
+        resolver = FuzzyResolver()
+        resolver.build(root)
+        if get_file_watcher().backend_name == "inotify":
+            resolver.watch(root)
+        _resolvers[root] = resolver
+    return resolver
+
+
+def resolve_path(spoken: str, root: str = ".") -> Optional[str]:
+    """Turn a spoken file name into an existing path.
+
+    Args:
+        spoken: Recognized speech naming a file
+        root: Directory whose files are candidates
+
+    Returns:
+        Optional[str]: The spoken path if it exists, otherwise the best fuzzy
+        match, or None if nothing is close enough
+    """
+    spoken = spoken.strip()
+    if os.path.exists(spoken):
+        return spoken
+    resolver = get_resolver(root)
+    for attempt in range(2):
+        for path, _ in resolver.resolve(spoken, limit=RESOLVE_CANDIDATES):
+            if os.path.exists(path):
+                return path
+            resolver.remove(path)
+        if resolver.watched or attempt:
+            break
+        # Files may have been created or renamed since the index was built
+        resolver.rebuild()
+    return None
@@ -0,0 +1,353 @@
+"""Metadata extraction that fills the metadata column of file_metadata.
+
+Only cheap attributes are pulled, and only from the bytes that hold them:
+image dimensions from the PNG, GIF, BMP and JPEG headers, when a photo was
+taken from its JPEG Exif segment, the duration of WAV files from their RIFF
+chunks, the page count of PDFs from the page tree near either end of the
+file, and line counts of text files. Files are
+processed on a thread pool and the results are written to the database in
+batches. A file is only read again when its size or modification time
+differs from the stored record.
+"""
+
+import logging
+import os
+import re
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional
+
+from utils.database import get_db_manager
+from utils.file_identity import get_identity_map
+from utils.file_query import FileQuery
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+BATCH_SIZE = 500
+# Bytes of each end of a PDF searched for the page tree
+PDF_SCAN_BYTES = 1024 * 1024
+# Text files larger than this get no line count
+TEXT_SCAN_LIMIT = 64 * 1024 * 1024
+READ_BUFFER = 1024 * 1024
+
+TEXT_EXTENSIONS = {
+    ".txt", ".md", ".rst", ".csv", ".tsv", ".log", ".json", ".xml", ".html", ".htm",
+    ".css", ".js", ".ts", ".py", ".java", ".c", ".h", ".cpp", ".go", ".rs", ".sh",
+    ".ini", ".cfg", ".conf", ".toml", ".yaml", ".yml", ".sql",
+}
+
+_PDF_PAGES = re.compile(
+    rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b"
+)
+_PDF_PAGE = re.compile(rb"/Type\s*/Page\b")
+
+
+def _png_info(f: BinaryIO) -> Dict[str, Any]:
+    """Read the dimensions from a PNG's IHDR chunk."""
+    header = f.read(24)
+    if len(header) < 24 or header[:8] != b"\x89PNG\r\n\x1a\n" or header[12:16] != b"IHDR":
+        return {}
+    width, height = struct.unpack(">II", header[16:24])
+    return {"width": width, "height": height}
+
+
+def _gif_info(f: BinaryIO) -> Dict[str, Any]:
+    """Read the dimensions from a GIF's logical screen descriptor."""
+    header = f.read(10)
+    if len(header) < 10 or header[:6] not in (b"GIF87a", b"GIF89a"):
+        return {}
+    width, height = struct.unpack("<HH", header[6:10])
+    return {"width": width, "height": height}
+
+
+def _bmp_info(f: BinaryIO) -> Dict[str, Any]:
+    """Read the dimensions from a BMP's info header."""
+    header = f.read(26)
+    if len(header) < 26 or header[:2] != b"BM":
+        return {}
+    width, height = struct.unpack("<ii", header[18:26])
+    return {"width": width, "height": abs(height)}
+
+
+def _exif_datetime(segment: bytes) -> Optional[str]:
+    """Find when a photo was taken in a JPEG's APP1 Exif segment.
+
+    Args:
+        segment: Contents of the APP1 segment
+
+    Returns:
+        Optional[str]: DateTimeOriginal, or DateTime, as an ISO timestamp
+    """
+    if not segment.startswith(b"Exif\x00\x00"):
+        return None
+    tiff = segment[6:]
+    order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if order is None:
+        return None
+
+    def entries(offset: int) -> Dict[int, bytes]:
+        """Map each tag of an IFD to its value, ASCII values resolved."""
+        (count,) = struct.unpack(order + "H", tiff[offset:offset + 2])
+        found = {}
+        for i in range(count):
+            start = offset + 2 + 12 * i
+            tag, kind, length = struct.unpack(order + "HHI", tiff[start:start + 8])
+            value = tiff[start + 8:start + 12]
+            if kind == 2 and length > 4:
+                (pointer,) = struct.unpack(order + "I", value)
+                value = tiff[pointer:pointer + length]
+            found[tag] = value
+        return found
+
+    (ifd0,) = struct.unpack(order + "I", tiff[4:8])
+    tags = entries(ifd0)
+    if 0x8769 in tags:
+        tags.update(entries(struct.unpack(order + "I", tags[0x8769])[0]))
+    value = tags.get(0x9003) or tags.get(0x0132)
+    if not value:
+        return None
+    try:
+        taken = datetime.strptime(value.rstrip(b"\x00 ").decode("ascii"), "%Y:%m:%d %H:%M:%S")
+    except (UnicodeDecodeError, ValueError):
+        return None
+    return taken.isoformat()
+
+
+def _jpeg_info(f: BinaryIO) -> Dict[str, Any]:
+    """Read the dimensions and Exif date from a JPEG's header segments."""
+    if f.read(2) != b"\xff\xd8":
+        return {}
+    info: Dict[str, Any] = {}
+    while True:
+        byte = f.read(1)
+        while byte and byte != b"\xff":
+            byte = f.read(1)
+        while byte == b"\xff":
+            byte = f.read(1)
+        if not byte:
+            return {}
+        marker = byte[0]
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of scan: no frame header before it
+            return {}
+        length = f.read(2)
+        if len(length) < 2:
+            return {}
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(5)
+            if len(frame) < 5:
+                return {}
+            _, height, width = struct.unpack(">BHH", frame)
+            info.update(width=width, height=height)
+            return info
+        size = struct.unpack(">H", length)[0] - 2
+        if marker == 0xE1 and "taken" not in info:
+            try:
+                taken = _exif_datetime(f.read(size))
+            except struct.error:
+                # A damaged Exif block should not hide the dimensions
+                taken = None
+            if taken:
+                info["taken"] = taken
+        else:
+            f.seek(size, os.SEEK_CUR)
+
+
+def _wav_info(f: BinaryIO) -> Dict[str, Any]:
+    """Read the format and duration from a WAV file's RIFF chunks."""
+    header = f.read(12)
+    if len(header) < 12 or header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+        return {}
+    info: Dict[str, Any] = {}
+    byte_rate = 0
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return info
+        chunk_id, size = chunk[:4], struct.unpack("<I", chunk[4:])[0]
+        if chunk_id == b"fmt ":
+            fmt = f.read(size)
+            if len(fmt) < 16:
+                return {}
+            _, channels, sample_rate, byte_rate = struct.unpack("<HHII", fmt[:12])
+            info.update(channels=channels, sample_rate=sample_rate)
+            if size % 2:
+                f.seek(1, os.SEEK_CUR)
+        elif chunk_id == b"data":
+            if byte_rate:
+                info["duration"] = round(size / byte_rate, 3)
+            return info
+        else:
+            # Chunks are padded to an even length
+            f.seek(size + size % 2, os.SEEK_CUR)
+
+
+def _pdf_info(f: BinaryIO) -> Dict[str, Any]:
+    """Find a PDF's page count in the page tree near either end of the file."""
+    head = f.read(PDF_SCAN_BYTES)
+    if not head.startswith(b"%PDF-"):
+        return {}
+    info: Dict[str, Any] = {"pdf_version": head[5:8].decode("ascii", "replace")}
+    size = f.seek(0, os.SEEK_END)
+    if size > PDF_SCAN_BYTES:
+        f.seek(max(PDF_SCAN_BYTES, size - PDF_SCAN_BYTES))
+        windows = [head, f.read()]
+    else:
+        windows = [head]
+    # The root of the page tree has the largest count
+    counts = [int(a or b) for window in windows for a, b in _PDF_PAGES.findall(window)]
+    if counts:
+        info["pages"] = max(counts)
+    elif size <= PDF_SCAN_BYTES:
+        # The whole file was read: count the page objects instead
+        info["pages"] = len(_PDF_PAGE.findall(head))
+    return info
+
+
+def _text_info(f: BinaryIO) -> Dict[str, Any]:
+    """Count the lines of a text file."""
+    lines = 0
+    last = b"\n"
+    while True:
+        data = f.read(READ_BUFFER)
+        if not data:
+            break
+        lines += data.count(b"\n")
+        last = data[-1:]
+    if last != b"\n":
+        lines += 1
+    return {"lines": lines}
+
+
+EXTRACTORS: Dict[str, Callable[[BinaryIO], Dict[str, Any]]] = {
+    ".png": _png_info,
+    ".gif": _gif_info,
+    ".bmp": _bmp_info,
+    ".jpg": _jpeg_info,
+    ".jpeg": _jpeg_info,
+    ".wav": _wav_info,
+    ".pdf": _pdf_info,
+}
+
+
+def extract_metadata(path: str, size: Optional[int] = None) -> Dict[str, Any]:
+    """Extract the cheap metadata of one file.
+
+    Args:
+        path: File to read
+        size: File size if already known
+
+    Returns:
+        Dict[str, Any]: Extracted attributes, empty if none apply
+    """
+    extension = os.path.splitext(path)[1].lower()
+    extractor = EXTRACTORS.get(extension)
+    if extractor is None and extension in TEXT_EXTENSIONS:
+        if size is None:
+            size = os.path.getsize(path)
+        if size <= TEXT_SCAN_LIMIT:
+            extractor = _text_info
+    if extractor is None:
+        return {}
+    try:
+        with open(path, "rb") as f:
+            return extractor(f)
+    except (OSError, struct.error, ValueError) as e:
+        logger.debug("Cannot read metadata of %s: %s", path, str(e))
+        return {}
+
+
+def _record(path: str, name: str, st: os.stat_result, modified_at: str) -> Dict[str, Any]:
+    """Build the file_metadata record of one file."""
+    return {
+        "path": path,
+        "name": name,
+        "size": st.st_size,
+        "created_at": datetime.fromtimestamp(st.st_ctime).isoformat(),
+        "modified_at": modified_at,
+        "file_type": os.path.splitext(name)[1].lower().lstrip(".") or None,
+        "is_directory": False,
+        "metadata": extract_metadata(path, st.st_size),
+    }
+
+
+def refresh_metadata(directory: str = ".", include: Optional[Iterable[str]] = None,
+                     max_workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """Bring the stored metadata of the files under a folder up to date.
+
+    Args:
+        directory: Folder to scan
+        include: Optional glob patterns a file must match
+        max_workers: Number of files read at once
+
+    Returns:
+        Dict[str, Any]: extracted, unchanged, removed and seconds
+    """
+    start = time.perf_counter()
+    root = str(ensure_safe_path(directory))
+    db = get_db_manager()
+    stamps = db.get_metadata_stamps(root)
+
+    seen = set()
+    pending = []
+    for _, entry in FileQuery(include=include).walk(root):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        seen.add(entry.path)
+        modified_at = datetime.fromtimestamp(st.st_mtime).isoformat()
+        if stamps.get(entry.path) != (st.st_size, modified_at):
+            pending.append((entry.path, entry.name, st, modified_at))
+
+    if pending:
+        # Records follow their files when other programs move them
+        identities = get_identity_map()
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            batch = []
+            for record in executor.map(lambda item: _record(*item), pending):
+                batch.append(record)
+                if len(batch) >= BATCH_SIZE:
+                    db.save_file_metadata(batch)
+                    identities.track([r["path"] for r in batch])
+                    batch = []
+            if batch:
+                db.save_file_metadata(batch)
+                identities.track([r["path"] for r in batch])
+
+    # Only prune records of the part of the tree that was walked
+    removed = [path for path in stamps if path not in seen and not os.path.exists(path)]
+    if removed:
+        db.remove_file_metadata(removed)
+    return {"extracted": len(pending), "unchanged": len(seen) - len(pending),
+            "removed": len(removed), "seconds": time.perf_counter() - start}
+
+
+def extract_folder_metadata(directory: str = ".") -> str:
+    """Extract the metadata of the files in a folder.
+
+    Args:
+        directory: Folder to scan
+
+    Returns:
+        str: Status message
+    """
+    try:
+        if not os.path.isdir(directory):
+            return f"{directory} is not a folder."
+        result = refresh_metadata(directory)
+        return (f"Read metadata of {result['extracted']} file(s) in {directory}; "
+                f"{result['unchanged']} unchanged, {result['removed']} removed, "
+                f"in {result['seconds']:.1f}s.")
+    except ValueError as e:
+        return f"Cannot read metadata in {directory}: {str(e)}"
+    except Exception as e:
+        logger.error("Error extracting metadata in %s: %s", directory, str(e))
+        return f"Failed to read metadata in {directory}: {str(e)}"
@@ -6,6 +6,8 @@ import subprocess
 from pathlib import Path
 import logging
 
+from utils.file_query import FileQuery
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -121,19 +123,19 @@ class ApplicationManager:
         ]
         
         query = query.lower()
+        file_query = FileQuery()
         for location in search_locations:
             if os.path.exists(location):
-                # Search for exact matches first
-                for root, _, files in os.walk(location):
-                    for file in files:
-                        if query == file.lower():
-                            return os.path.join(root, file)
-                
-                # Then search for partial matches
-                for root, _, files in os.walk(location):
-                    for file in files:
-                        if query in file.lower():
-                            return os.path.join(root, file)
+                # Prefer exact matches, fall back to the first partial match
+                partial_match = None
+                for _, entry in file_query.walk(location):
+                    name = entry.name.lower()
+                    if query == name:
+                        return entry.path
+                    if partial_match is None and query in name:
+                        partial_match = entry.path
+                if partial_match:
+                    return partial_match
         return None
 
     def open_item(self, query: str) -> str:
@@ -0,0 +1,432 @@
+"""Recycle bin module for trashing and restoring files and folders.
+
+Every trashed item is recorded in the database with its original path,
+deletion time, size and device, so items can be looked up directly,
+restored to where they came from and purged oldest-first once the bin
+grows past its size or age limits. Trashing a folder is a single rename;
+its size is measured later, by the purge, rather than by walking it first.
+
+Items living on a different filesystem than the main bin are trashed into a
+freedesktop-style ``.Trash-<uid>`` folder at the top of their own mount
+point, so trashing is always a single rename instead of a copy and delete.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.database import DatabaseManager, get_db_manager
+
+logger = logging.getLogger(__name__)
+
+# Folder where deleted files/folders will be stored
+RECYCLE_BIN = ".recycle_bin"
+
+# Default purge limits
+MAX_BIN_BYTES = 5 * 1024 ** 3  # 5 GiB
+MAX_BIN_AGE_SECONDS = 30 * 24 * 3600  # 30 days
+PURGE_INTERVAL_SECONDS = 3600
+
+
+def get_trash_dir_name() -> str:
+    """Get the name of per-filesystem trash folders for the current user."""
+    getuid = getattr(os, "getuid", None)
+    return f".Trash-{getuid()}" if getuid else ".Trash"
+
+
+def find_mount_point(path: Path) -> Path:
+    """Find the mount point of the filesystem containing a path.
+
+    Args:
+        path: Existing path on the filesystem
+
+    Returns:
+        Path: Topmost ancestor of the path on the same device
+    """
+    path = Path(path).resolve()
+    device = path.stat().st_dev
+    while path.parent != path:
+        try:
+            if path.parent.stat().st_dev != device:
+                break
+        except OSError:
+            break
+        path = path.parent
+    return path
+
+
+def get_item_size(path: Path) -> int:
+    """Get the size in bytes of a file, or the total size of a folder.
+
+    Args:
+        path: Path to the file or folder
+
+    Returns:
+        int: Size in bytes
+    """
+    if not path.is_dir() or path.is_symlink():
+        return path.lstat().st_size
+
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                continue
+    return total
+
+
+class RecycleBin:
+    """Recycle bin backed by an index of trashed items."""
+
+    def __init__(self, bin_dir: str = RECYCLE_BIN, db: Optional[DatabaseManager] = None,
+                 max_bytes: Optional[int] = MAX_BIN_BYTES,
+                 max_age_seconds: Optional[float] = MAX_BIN_AGE_SECONDS):
+        """Initialize the recycle bin.
+
+        Args:
+            bin_dir: Folder where trashed items are stored
+            db: Database holding the recycle bin index (defaults to the global one)
+            max_bytes: Maximum total size of the bin, None for no limit
+            max_age_seconds: Maximum age of trashed items, None for no limit
+        """
+        self.bin_dir = bin_dir
+        self._db = db
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._trash_dirs: Dict[int, Path] = {}
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._purge_thread = None
+
+    @property
+    def db(self) -> DatabaseManager:
+        """Database holding the recycle bin index."""
+        if self._db is None:
+            self._db = get_db_manager()
+        return self._db
+
+    def _home_bin(self) -> Path:
+        """Get the main bin folder, creating it if needed."""
+        bin_path = Path(self.bin_dir).resolve()
+        bin_path.mkdir(parents=True, exist_ok=True)
+        return bin_path
+
+    def trash_dir_for(self, device: int, path: Path) -> Path:
+        """Get the trash folder on the same filesystem as a path.
+
+        Args:
+            device: Device id (st_dev) of the item
+            path: Path of the item
+
+        Returns:
+            Path: Trash folder for the device, or the main bin if the
+            filesystem has no usable trash folder
+        """
+        home = self._home_bin()
+        if home.stat().st_dev == device:
+            return home
+        if device in self._trash_dirs:
+            return self._trash_dirs[device]
+
+        trash_dir = home
+        try:
+            candidate = find_mount_point(path.parent) / get_trash_dir_name() / "files"
+            candidate.mkdir(mode=0o700, parents=True, exist_ok=True)
+            if os.access(candidate, os.W_OK) and candidate.stat().st_dev == device:
+                trash_dir = candidate
+        except OSError as e:
+            logger.warning("No trash folder on device %s, using %s: %s", device, home, str(e))
+        self._trash_dirs[device] = trash_dir
+        return trash_dir
+
+    def trash_dirs(self) -> List[Path]:
+        """Get all trash folders known to this bin, the main bin first."""
+        dirs = [Path(self.bin_dir).resolve()]
+        for entry in self.db.list_recycle_entries():
+            parent = Path(entry["trash_path"]).parent
+            if parent not in dirs:
+                dirs.append(parent)
+        for trash_dir in self._trash_dirs.values():
+            if trash_dir not in dirs:
+                dirs.append(trash_dir)
+        return dirs
+
+    def _trash_path_for(self, path: Path, device: int) -> Path:
+        """Pick a free location inside the item's trash folder."""
+        bin_path = self.trash_dir_for(device, path)
+        trash_path = bin_path / path.name
+        if trash_path.exists() or os.path.islink(trash_path):
+            trash_path = bin_path / f"{path.stem}_{time.time_ns()}{path.suffix}"
+        return trash_path
+
+    def trash(self, path: Path) -> bool:
+        """Move a file or folder into the recycle bin.
+
+        Args:
+            path: Path to the item to trash
+
+        Returns:
+            bool: True if the item was trashed, False otherwise
+        """
+        try:
+            return self.trash_item(path) is not None
+        except Exception as e:
+            logger.error("Failed to move item to recycle bin: %s", str(e))
+            return False
+
+    def trash_item(self, path: Path, record: bool = True) -> Dict[str, Any]:
+        """Move a file or folder into the recycle bin and return its entry.
+
+        Args:
+            path: Path to the item to trash
+            record: Whether to add the entry to the index right away; batch
+                callers pass False and record all entries at once
+
+        Returns:
+            Dict[str, Any]: The recycle bin entry for the item
+
+        Raises:
+            OSError: If the item could not be moved
+        """
+        path = Path(path).absolute()
+        stat_info = path.lstat()
+        is_directory = path.is_dir()
+        # Folders are measured by the next purge
+        size = None if is_directory and not path.is_symlink() else stat_info.st_size
+        with self._lock:
+            trash_path = self._trash_path_for(path, stat_info.st_dev)
+            if trash_path.parent.stat().st_dev == stat_info.st_dev:
+                os.rename(path, trash_path)
+            else:
+                shutil.move(str(path), str(trash_path))
+        entry = {
+            "trash_path": str(trash_path),
+            "original_path": str(path),
+            "name": path.name,
+            "deleted_at": time.time(),
+            "size": size,
+            "device": stat_info.st_dev,
+            "is_directory": is_directory,
+        }
+        if record:
+            entry["id"] = self.db.add_recycle_entry(entry)
+        return entry
+
+    def record_entries(self, entries: List[Dict[str, Any]]) -> None:
+        """Add entries of items trashed with record=False to the index.
+
+        Args:
+            entries: Entries returned by trash_item
+        """
+        self.db.add_recycle_entries(entries)
+
+    def find(self, key: str) -> Optional[Dict[str, Any]]:
+        """Find a trashed item by original path, bin path or name.
+
+        Args:
+            key: Original path (absolute or relative to cwd), bin path or name
+
+        Returns:
+            Optional[Dict[str, Any]]: The newest matching entry, or None
+        """
+        entry = self.db.find_recycle_entry(str(Path(key).absolute()))
+        if entry is None:
+            entry = self.db.find_recycle_entry(key)
+        return entry
+
+    def restore(self, key: str, target: Optional[str] = None) -> str:
+        """Restore a trashed item to its original location.
+
+        Args:
+            key: Original path, bin path or name of the item
+            target: Optional location to restore to instead of the original path
+
+        Returns:
+            str: Status message indicating success or failure
+        """
+        try:
+            entry = self.find(key)
+            if entry is None:
+                return self._restore_unindexed(key, target)
+
+            trash_path = Path(entry["trash_path"])
+            if not trash_path.exists() and not trash_path.is_symlink():
+                self.db.remove_recycle_entry(entry["id"])
+                return "No such item in recycle bin."
+
+            target_path = Path(target).absolute() if target else Path(entry["original_path"])
+            if target_path.exists():
+                return f"Cannot restore: {target_path} already exists in target location."
+
+            self.restore_entry(entry, target_path)
+            return f"'{entry['name']}' restored successfully to {target_path}."
+        except (OSError, ValueError) as e:
+            logger.error("Failed to restore %s: %s", key, str(e))
+            return f"Failed to restore item: {str(e)}"
+
+    def restore_entry(self, entry: Dict[str, Any], target: Optional[Path] = None) -> None:
+        """Move a trashed item back and drop its index entry.
+
+        Args:
+            entry: Recycle bin entry of the item
+            target: Optional location to restore to instead of the original path
+
+        Raises:
+            OSError: If the item could not be moved back
+        """
+        target_path = Path(target) if target else Path(entry["original_path"])
+        target_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.move(entry["trash_path"], str(target_path))
+        if entry.get("id") is not None:
+            self.db.remove_recycle_entry(entry["id"])
+        else:
+            self.db.remove_recycle_entry_by_path(entry["trash_path"])
+
+    def _restore_unindexed(self, item_name: str, target: Optional[str]) -> str:
+        """Restore an item that is in a trash folder but has no index entry."""
+        for trash_dir in self.trash_dirs():
+            recycle_path = trash_dir / item_name
+            if recycle_path.exists():
+                break
+        else:
+            return "No such item in recycle bin."
+
+        target_path = Path(target) if target else Path.cwd() / item_name
+        if target_path.exists():
+            return f"Cannot restore: {item_name} already exists in target location."
+
+        shutil.move(str(recycle_path), str(target_path))
+        return f"'{item_name}' restored successfully."
+
+    def list_items(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List trashed items, most recently deleted first.
+
+        Args:
+            limit: Optional maximum number of items
+
+        Returns:
+            List[Dict[str, Any]]: Recycle bin entries
+        """
+        return self.db.list_recycle_entries(limit=limit)
+
+    def _delete_entry(self, entry: Dict[str, Any]) -> Optional[int]:
+        """Permanently delete a trashed item and its index entry.
+
+        Returns:
+            Optional[int]: Bytes freed, or None if the item could not be deleted
+        """
+        trash_path = Path(entry["trash_path"])
+        try:
+            if trash_path.is_dir() and not trash_path.is_symlink():
+                shutil.rmtree(trash_path)
+            elif trash_path.exists() or trash_path.is_symlink():
+                trash_path.unlink()
+        except OSError as e:
+            logger.error("Failed to purge %s: %s", trash_path, str(e))
+            return None
+        self.db.remove_recycle_entry(entry["id"])
+        return entry["size"] or 0
+
+    def _measure_unsized(self) -> None:
+        """Record the sizes of trashed folders not measured yet."""
+        sizes = []
+        for entry in self.db.list_recycle_entries():
+            if entry["size"] is not None:
+                continue
+            try:
+                sizes.append((entry["id"], get_item_size(Path(entry["trash_path"]))))
+            except OSError as e:
+                logger.debug("Cannot measure %s: %s", entry["trash_path"], str(e))
+        if sizes:
+            self.db.set_recycle_entry_sizes(sizes)
+
+    def purge(self, max_bytes: Optional[int] = None,
+              max_age_seconds: Optional[float] = None) -> int:
+        """Permanently delete items, oldest first, until the bin is within limits.
+
+        Args:
+            max_bytes: Maximum total size (defaults to the bin's limit)
+            max_age_seconds: Maximum item age (defaults to the bin's limit)
+
+        Returns:
+            int: Number of items purged
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_seconds = self.max_age_seconds if max_age_seconds is None else max_age_seconds
+        if max_bytes is not None:
+            self._measure_unsized()
+
+        with self._lock:
+            total = self.db.get_recycle_bin_size()
+            cutoff = time.time() - max_age_seconds if max_age_seconds is not None else None
+            purged = 0
+            for entry in self.db.list_recycle_entries(oldest_first=True):
+                too_old = cutoff is not None and entry["deleted_at"] < cutoff
+                too_big = max_bytes is not None and total > max_bytes
+                if not too_old and not too_big:
+                    break
+                freed = self._delete_entry(entry)
+                if freed is None:
+                    # Still in the bin; move on to the next oldest
+                    continue
+                total -= freed
+                purged += 1
+        if purged:
+            logger.info("Purged %d item(s) from recycle bin", purged)
+        return purged
+
+    def empty(self) -> int:
+        """Permanently delete everything in the recycle bin.
+
+        Returns:
+            int: Number of items deleted
+        """
+        with self._lock:
+            entries = self.db.list_recycle_entries(oldest_first=True)
+            deleted = sum(1 for entry in entries if self._delete_entry(entry) is not None)
+        return deleted
+
+    def _purge_loop(self, interval: float) -> None:
+        """Run purges until stopped."""
+        while not self._stop_event.wait(interval):
+            try:
+                self.purge()
+            except Exception as e:
+                logger.error("Recycle bin purge failed: %s", str(e))
+
+    def start_purge_worker(self, interval: float = PURGE_INTERVAL_SECONDS) -> None:
+        """Start purging the bin periodically in a background thread.
+
+        Args:
+            interval: Seconds between purges
+        """
+        if self._purge_thread is None:
+            self._stop_event.clear()
+            self._purge_thread = threading.Thread(target=self._purge_loop, args=(interval,))
+            self._purge_thread.daemon = True
+            self._purge_thread.start()
+
+    def stop_purge_worker(self) -> None:
+        """Stop the background purge thread."""
+        self._stop_event.set()
+        if self._purge_thread:
+            self._purge_thread.join()
+            self._purge_thread = None
+
+
+# Global instance
+_recycle_bin = None
+
+
+def get_recycle_bin() -> RecycleBin:
+    """Get the global RecycleBin instance."""
+    global _recycle_bin
+    if _recycle_bin is None:
+        _recycle_bin = RecycleBin()
+    return _recycle_bin
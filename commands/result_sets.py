@@ -0,0 +1,336 @@
+"""Result sets that let follow-up commands reuse the last search or listing.
+
+Every search, listing or top-k query is kept as a compact record array:
+the paths plus two ``array('q')`` columns holding sizes and modification
+times. A cursor tracks the page being read out. Follow-ups such as
+"sort those by size", "tag those as work", "delete the first three" or
+"next page" then work on the stored records instead of walking the disk
+again. The store keeps the most recently used sets and evicts the least
+recently used ones.
+"""
+
+import logging
+import os
+import re
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.retry import Transaction
+from .batch_operations import execute_batch, plan_batch
+from .file_manager import ensure_safe_path, tag_manager
+from .fuzzy_resolver import SPOKEN_WORDS
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 10
+MAX_RESULT_SETS = 8
+# Size and mtime of records that have not been stat-ed yet
+UNKNOWN = -1
+
+ORDINALS = {
+    "first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+    "sixth": 6, "seventh": 7, "eighth": 8, "ninth": 9, "tenth": 10,
+}
+
+# Words that refer to the whole current result set
+ALL_WORDS = ("those", "them", "these", "all", "all of them", "all of those", "all those",
+             "results", "those files", "these files")
+
+FOLLOW_UP_PATTERN = re.compile(
+    r"^(?P<action>delete|remove|trash|tag|move|copy|sort|show|list)\s+(?P<selection>.+?)"
+    r"(?:\s+(?:as|to|into|by)\s+(?P<argument>.+))?$"
+)
+
+
+def _number(word: Optional[str]) -> Optional[int]:
+    """Parse a spoken count such as "3", "three" or "a"."""
+    if word is None or word in ("a", "an", "one"):
+        return 1
+    word = SPOKEN_WORDS.get(word, word)
+    return int(word) if word.isdigit() else None
+
+
+def parse_selection(words: str) -> Optional[slice]:
+    """Turn a spoken reference to results into a slice.
+
+    "those", "the first three", "last 2", "the second one" and "top five
+    files" are understood.
+
+    Args:
+        words: Spoken reference
+
+    Returns:
+        Optional[slice]: Slice of the result set, None if not a reference
+    """
+    words = re.sub(r"^the\s+", "", words.strip())
+    if words in ALL_WORDS:
+        return slice(None)
+    match = re.fullmatch(r"(first|top|last)(?:\s+(\w+))?(?:\s+(?:ones?|files?|results?))?",
+                         words)
+    if match:
+        count = _number(match.group(2))
+        if count is None:
+            return None
+        return slice(-count, None) if match.group(1) == "last" else slice(0, count)
+    match = re.fullmatch(r"(\w+)(?:\s+(?:one|file|result))", words)
+    if match and match.group(1) in ORDINALS:
+        index = ORDINALS[match.group(1)] - 1
+        return slice(index, index + 1)
+    return None
+
+
+def parse_follow_up(command: str) -> Optional[Tuple[str, slice, Optional[str]]]:
+    """Recognize a command that acts on the current result set.
+
+    Args:
+        command: Lowercase voice command
+
+    Returns:
+        Optional[Tuple[str, slice, Optional[str]]]: The action, the selected
+        slice and the action's argument (tag, folder or sort key), or None
+    """
+    match = FOLLOW_UP_PATTERN.match(command.strip())
+    if not match:
+        return None
+    selection = parse_selection(match.group("selection"))
+    if selection is None:
+        return None
+    action = {"remove": "delete", "trash": "delete", "list": "show"}.get(
+        match.group("action"), match.group("action"))
+    return action, selection, match.group("argument")
+
+
+class ResultSet:
+    """Paths with their sizes and modification times, and a read cursor."""
+
+    def __init__(self, paths: Iterable[str], sizes: Optional[Iterable[int]] = None,
+                 mtimes: Optional[Iterable[int]] = None, description: str = "",
+                 page_size: int = PAGE_SIZE):
+        """Initialize the result set.
+
+        Args:
+            paths: File paths
+            sizes: Sizes in bytes, or None to stat them when first needed
+            mtimes: Modification times in ns, or None to stat them when first needed
+            description: What produced the results, e.g. "search for report"
+            page_size: Number of results per page
+        """
+        self.paths: List[str] = list(paths)
+        count = len(self.paths)
+        self.sizes = array("q", sizes if sizes is not None else [UNKNOWN] * count)
+        self.mtimes = array("q", mtimes if mtimes is not None else [UNKNOWN] * count)
+        self.description = description
+        self.page_size = page_size
+        self.cursor = 0
+        self.created_at = time.time()
+
+    @classmethod
+    def from_records(cls, records: Iterable[Tuple[str, int, int]],
+                     description: str = "") -> "ResultSet":
+        """Build a result set from (path, mtime_ns, size) records."""
+        paths, mtimes, sizes = [], array("q"), array("q")
+        for path, mtime_ns, size in records:
+            paths.append(path)
+            mtimes.append(mtime_ns)
+            sizes.append(size)
+        return cls(paths, sizes, mtimes, description)
+
+    @classmethod
+    def from_directory(cls, directory: str) -> "ResultSet":
+        """Build a result set of the entries of a directory."""
+        path = ensure_safe_path(directory)
+        records = []
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                records.append((entry.path, st.st_mtime_ns, st.st_size))
+        records.sort(key=lambda record: os.path.basename(record[0]).lower())
+        return cls.from_records(records, f"listing of {directory}")
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def _ensure_stats(self) -> None:
+        """Stat the records whose size or mtime is still unknown, once."""
+        for i, path in enumerate(self.paths):
+            if self.sizes[i] == UNKNOWN or self.mtimes[i] == UNKNOWN:
+                try:
+                    st = os.stat(path)
+                    self.sizes[i], self.mtimes[i] = st.st_size, st.st_mtime_ns
+                except OSError:
+                    self.sizes[i], self.mtimes[i] = 0, 0
+
+    def sort(self, by: str = "name", reverse: bool = False) -> None:
+        """Reorder the records in place and rewind the cursor.
+
+        Args:
+            by: "name", "date" or "size"
+            reverse: Largest, newest or last name first
+        """
+        if by in ("date", "size"):
+            self._ensure_stats()
+            column = self.mtimes if by == "date" else self.sizes
+            key = column.__getitem__
+        else:
+            key = lambda i: os.path.basename(self.paths[i]).lower()
+        order = sorted(range(len(self.paths)), key=key, reverse=reverse)
+        self.paths = [self.paths[i] for i in order]
+        self.sizes = array("q", (self.sizes[i] for i in order))
+        self.mtimes = array("q", (self.mtimes[i] for i in order))
+        self.cursor = 0
+
+    def select(self, selection: slice) -> List[str]:
+        """Get the paths of a slice of the results."""
+        return self.paths[selection]
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """Get one record as a dict with path, size and mtime_ns."""
+        return {"path": self.paths[index], "size": self.sizes[index],
+                "mtime_ns": self.mtimes[index]}
+
+    def page(self) -> List[str]:
+        """Get the page at the cursor."""
+        return self.paths[self.cursor:self.cursor + self.page_size]
+
+    def next_page(self) -> List[str]:
+        """Advance the cursor and get the next page, empty at the end."""
+        if self.cursor + self.page_size < len(self.paths):
+            self.cursor += self.page_size
+            return self.page()
+        return []
+
+    def previous_page(self) -> List[str]:
+        """Move the cursor back and get the previous page."""
+        self.cursor = max(0, self.cursor - self.page_size)
+        return self.page()
+
+    def discard(self, paths: Iterable[str]) -> None:
+        """Drop paths, e.g. after they were deleted."""
+        gone = set(paths)
+        keep = [i for i, path in enumerate(self.paths) if path not in gone]
+        self.paths = [self.paths[i] for i in keep]
+        self.sizes = array("q", (self.sizes[i] for i in keep))
+        self.mtimes = array("q", (self.mtimes[i] for i in keep))
+        self.cursor = min(self.cursor, max(0, len(self.paths) - 1))
+
+    def rename(self, moves: Dict[str, str]) -> None:
+        """Point records at new paths, e.g. after they were moved."""
+        self.paths = [moves.get(path, path) for path in self.paths]
+
+
+class ResultSetStore:
+    """The result sets of a session, least recently used evicted first."""
+
+    def __init__(self, max_sets: int = MAX_RESULT_SETS):
+        """Initialize an empty store.
+
+        Args:
+            max_sets: Maximum number of result sets kept
+        """
+        if max_sets <= 0:
+            raise ValueError("max_sets must be positive")
+        self.max_sets = max_sets
+        self._sets: "OrderedDict[int, ResultSet]" = OrderedDict()
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._sets)
+
+    def add(self, result_set: ResultSet) -> int:
+        """Store a result set and make it the current one.
+
+        Returns:
+            int: Id of the result set
+        """
+        set_id = self._next_id
+        self._next_id += 1
+        self._sets[set_id] = result_set
+        while len(self._sets) > self.max_sets:
+            self._sets.popitem(last=False)
+        return set_id
+
+    def get(self, set_id: int) -> Optional[ResultSet]:
+        """Get a result set by id and mark it as most recently used."""
+        result_set = self._sets.get(set_id)
+        if result_set is not None:
+            self._sets.move_to_end(set_id)
+        return result_set
+
+    def current(self) -> Optional[ResultSet]:
+        """Get the most recently used result set."""
+        if not self._sets:
+            return None
+        return next(reversed(self._sets.values()))
+
+    def clear(self) -> None:
+        """Drop every result set."""
+        self._sets.clear()
+
+
+def apply_follow_up(result_set: ResultSet, action: str, selection: slice,
+                    argument: Optional[str] = None,
+                    transaction: Optional[Transaction] = None) -> str:
+    """Run a follow-up command on part of a result set.
+
+    Args:
+        result_set: The results the command refers to
+        action: "delete", "tag", "move", "copy", "sort" or "show"
+        selection: Slice of the results the command applies to
+        argument: Tag for tag, folder for move/copy, key for sort
+        transaction: Optional enclosing transaction
+
+    Returns:
+        str: Status message
+    """
+    if action == "sort":
+        words = (argument or "name").split()
+        by = next((word for word in words if word in ("name", "date", "size")), "name")
+        reverse = any(word in words for word in ("desc", "descending", "reverse"))
+        result_set.sort(by, reverse)
+        for path in result_set.page():
+            print(path)
+        return f"Sorted {len(result_set)} result(s) by {by}."
+
+    paths = result_set.select(selection)
+    if not paths:
+        return "There are no results to work with."
+
+    if action == "show":
+        for path in paths:
+            print(path)
+        return f"Here are {len(paths)} result(s)."
+
+    if action == "tag":
+        if not argument:
+            return "Please say the tag to add."
+        added = tag_manager.add_tag_to_files(paths, argument.strip())
+        if transaction is not None:
+            transaction.add_operation(
+                lambda: None, lambda: tag_manager.remove_tag_from_files(added, argument.strip()))
+        return f"Tagged {len(paths)} file(s) as {argument.strip()}."
+
+    try:
+        plan = plan_batch(action, [Path(path) for path in paths], argument)
+        if action in ("move", "copy"):
+            os.makedirs(ensure_safe_path(argument), exist_ok=True)
+        result = execute_batch(plan, transaction)
+    except ValueError as e:
+        return f"Cannot {action} those files: {str(e)}"
+    except Exception as e:
+        logger.error("Follow-up %s failed: %s", action, str(e))
+        return f"Failed to {action} those files: {str(e)}"
+
+    if action == "delete":
+        result_set.discard(paths)
+    elif action == "move":
+        result_set.rename({str(op.source): str(op.target) for op in plan})
+    verb = {"delete": "Deleted", "move": "Moved", "copy": "Copied"}[action]
+    return f"{verb} {result['count']} file(s)."
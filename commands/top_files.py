@@ -0,0 +1,137 @@
+"""Top-k file queries such as "show my 10 newest files".
+
+Instead of collecting and sorting every path, file records are streamed
+through a heap bounded to k entries while the tree is walked, so memory
+stays O(k) and each file is stat-ed once. When the content index keeps a
+current record of every file in the directory, its stored (mtime, size)
+records are used and nothing is walked.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.file_query import FileQuery
+from .content_index import get_content_index
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+# Order name -> (record field, whether larger values rank first)
+TOP_ORDERS = {
+    "largest": (2, True),
+    "smallest": (2, False),
+    "newest": (1, True),
+    "oldest": (1, False),
+}
+
+# Spoken synonyms of the orders
+ORDER_WORDS = {
+    "biggest": "largest",
+    "largest": "largest",
+    "smallest": "smallest",
+    "newest": "newest",
+    "latest": "newest",
+    "recent": "newest",
+    "oldest": "oldest",
+}
+
+DEFAULT_K = 10
+
+FileRecord = Tuple[str, int, int]
+
+
+def top_k(records: Iterable[FileRecord], k: int, order: str = "newest") -> List[FileRecord]:
+    """Select the top k records without sorting them all.
+
+    Args:
+        records: (path, mtime_ns, size) records, consumed lazily
+        k: Number of records to keep
+        order: One of TOP_ORDERS
+
+    Returns:
+        List[FileRecord]: The top k records, best first
+
+    Raises:
+        ValueError: If the order is unknown
+    """
+    if order not in TOP_ORDERS:
+        raise ValueError(f"Unknown order: {order}")
+    if k <= 0:
+        return []
+    field, descending = TOP_ORDERS[order]
+    sign = 1 if descending else -1
+    # Min-heap of (key, -sequence, record): the root is the weakest record
+    # kept so far, and on equal keys the record seen first wins
+    heap: List[Tuple[int, int, FileRecord]] = []
+    counter = itertools.count()
+    for record in records:
+        item = (sign * record[field], -next(counter), record)
+        if len(heap) < k:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+    return [record for _, _, record in sorted(heap, reverse=True)]
+
+
+def iter_file_records(directory: str, recursive: bool = True,
+                      include: Optional[Iterable[str]] = None) -> Iterator[FileRecord]:
+    """Walk a directory, yielding (path, mtime_ns, size) for each file.
+
+    Args:
+        directory: Directory to walk
+        recursive: Descend into subdirectories
+        include: Optional glob patterns a file must match
+
+    Yields:
+        FileRecord: One record per file
+    """
+    for _, entry in FileQuery(include=include).walk(directory, recursive=recursive):
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        yield entry.path, st.st_mtime_ns, st.st_size
+
+
+def top_files(directory: str = ".", k: int = DEFAULT_K, order: str = "newest",
+              recursive: bool = True, include: Optional[Iterable[str]] = None,
+              use_index: bool = True) -> List[Dict[str, Any]]:
+    """Find the k largest, smallest, newest or oldest files under a directory.
+
+    Args:
+        directory: Directory to search
+        k: Number of files
+        order: One of TOP_ORDERS
+        recursive: Include files in subdirectories
+        include: Optional glob patterns a file must match
+        use_index: Answer from the content index when it is current and
+            complete for the directory
+
+    Returns:
+        List[Dict[str, Any]]: Files with path, size and modified (datetime),
+        best first
+    """
+    root = str(ensure_safe_path(directory))
+    index = get_content_index() if use_index and recursive and include is None else None
+    if index is not None and index.is_complete(root):
+        records = index.file_records(root)
+        # Deletions reach the index after the watcher's debounce; drop files
+        # that have since disappeared
+        gone = set()
+        while True:
+            top = top_k((record for record in records if record[0] not in gone), k, order)
+            missing = [record[0] for record in top if not os.path.exists(record[0])]
+            if not missing:
+                break
+            gone.update(missing)
+    else:
+        top = top_k(iter_file_records(root, recursive, include), k, order)
+
+    return [
+        {"path": path, "size": size, "modified": datetime.fromtimestamp(mtime_ns / 1e9)}
+        for path, mtime_ns, size in top
+    ]
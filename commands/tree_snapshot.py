@@ -0,0 +1,477 @@
+"""Folder tree snapshots and Merkle diffs: "what changed since yesterday".
+
+A snapshot records the name, size, mtime and inode of every file and
+folder in a tree, without reading any contents. Each folder becomes a node
+whose hash covers its entries and the hashes of its subfolders, so equal
+hashes mean equal subtrees. Nodes are stored once by hash and shared
+between snapshots, which makes a snapshot of a mostly unchanged tree cost
+only the folders on the paths to its changes. A diff descends only into
+subtrees whose hashes differ, so comparing two snapshots takes time
+proportional to the changes. Moved folders and files are recognised by
+their inode.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from utils.database import get_db_manager
+from utils.file_query import FileQuery
+from .file_manager import ensure_safe_path
+
+logger = logging.getLogger(__name__)
+
+# Snapshots kept per folder; older ones are pruned
+MAX_SNAPSHOTS = 30
+HASH_SIZE = 16
+SHOWN_CHANGES = 10
+
+ADDED = "added"
+REMOVED = "removed"
+MODIFIED = "modified"
+MOVED = "moved"
+
+SINCE_PERIODS = {
+    "an hour ago": timedelta(hours=1),
+    "this morning": None,
+    "today": None,
+    "yesterday": timedelta(days=1),
+    "last week": timedelta(weeks=1),
+    "last month": timedelta(days=30),
+}
+
+_ENTRY = struct.Struct("<HBQqQ")
+_SINCE_AGO = re.compile(r"(\d+)\s+(minute|hour|day|week)s?\s+ago")
+
+
+class TreeEntry(NamedTuple):
+    """One file or folder of a snapshot node."""
+
+    name: str
+    is_dir: bool
+    size: int
+    mtime_ns: int
+    ino: int
+    # Node hash of a folder's contents, None for files
+    child: Optional[bytes] = None
+
+
+class TreeChange(NamedTuple):
+    """A difference between two trees, with paths relative to the root."""
+
+    kind: str
+    path: str
+    old_path: Optional[str] = None
+    is_dir: bool = False
+
+
+class Tree(NamedTuple):
+    """The state of a folder tree, with nodes serialized by hash."""
+
+    root: str
+    root_hash: bytes
+    nodes: Dict[bytes, bytes]
+    files: int
+    dirs: int
+
+
+def encode_node(entries: List[TreeEntry]) -> bytes:
+    """Serialize the entries of a folder, sorted by name."""
+    parts = []
+    for entry in sorted(entries):
+        name = entry.name.encode("utf-8", "surrogateescape")
+        parts.append(_ENTRY.pack(len(name), entry.is_dir, entry.size, entry.mtime_ns, entry.ino))
+        parts.append(name)
+        if entry.is_dir:
+            parts.append(entry.child)
+    return b"".join(parts)
+
+
+def decode_node(data: bytes) -> Dict[str, TreeEntry]:
+    """Deserialize the entries of a folder, keyed by name."""
+    entries = {}
+    offset = 0
+    while offset < len(data):
+        length, is_dir, size, mtime_ns, ino = _ENTRY.unpack_from(data, offset)
+        offset += _ENTRY.size
+        name = data[offset:offset + length].decode("utf-8", "surrogateescape")
+        offset += length
+        child = None
+        if is_dir:
+            child = data[offset:offset + HASH_SIZE]
+            offset += HASH_SIZE
+        entries[name] = TreeEntry(name, bool(is_dir), size, mtime_ns, ino, child)
+    return entries
+
+
+def node_hash(data: bytes) -> bytes:
+    """Hash a serialized node."""
+    return hashlib.blake2b(data, digest_size=HASH_SIZE).digest()
+
+
+def build_tree(root: str) -> Tree:
+    """Record the current state of a folder tree.
+
+    Args:
+        root: Folder to record
+
+    Returns:
+        Tree: Root hash and the serialized node of every folder
+    """
+    listings: Dict[str, List[TreeEntry]] = {root: []}
+    order = [root]
+    files = 0
+    for _, entry in FileQuery().walk(root, yield_dirs=True):
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except OSError:
+            continue
+        is_dir = entry.is_dir(follow_symlinks=False)
+        if is_dir:
+            listings[entry.path] = []
+            order.append(entry.path)
+        else:
+            files += 1
+        listings[os.path.dirname(entry.path)].append(
+            TreeEntry(entry.name, is_dir, 0 if is_dir else st.st_size,
+                      0 if is_dir else st.st_mtime_ns, st.st_ino))
+
+    # The walk yields folders before their contents: hash in reverse
+    nodes: Dict[bytes, bytes] = {}
+    hashes: Dict[str, bytes] = {}
+    for path in reversed(order):
+        entries = [entry._replace(child=hashes[os.path.join(path, entry.name)])
+                   if entry.is_dir else entry
+                   for entry in listings.pop(path)]
+        data = encode_node(entries)
+        digest = node_hash(data)
+        nodes[digest] = data
+        hashes[path] = digest
+    return Tree(root, hashes[root], nodes, files, len(order) - 1)
+
+
+class NodeStore:
+    """Loads nodes by hash from memory first, then from the database."""
+
+    def __init__(self, nodes: Optional[Dict[bytes, bytes]] = None):
+        """Initialize the store.
+
+        Args:
+            nodes: Serialized nodes already in memory, e.g. of a Tree
+        """
+        self.nodes = dict(nodes or {})
+        self._cache: Dict[bytes, Dict[str, TreeEntry]] = {}
+
+    def load(self, digest: bytes) -> Dict[str, TreeEntry]:
+        """Get the entries of a node.
+
+        Raises:
+            KeyError: If the node is not stored anywhere
+        """
+        entries = self._cache.get(digest)
+        if entries is None:
+            data = self.nodes.get(digest)
+            if data is None:
+                stored = get_db_manager().get_tree_node(digest)
+                if stored is None:
+                    raise KeyError(f"Snapshot node {digest.hex()} is missing")
+                data = zlib.decompress(stored)
+            entries = self._cache[digest] = decode_node(data)
+        return entries
+
+
+def diff_trees(old_hash: bytes, new_hash: bytes,
+               load: Callable[[bytes], Dict[str, TreeEntry]]) -> List[TreeChange]:
+    """Compare two trees, descending only into subtrees that differ.
+
+    Args:
+        old_hash: Root hash of the earlier tree
+        new_hash: Root hash of the later tree
+        load: Returns the entries of a node by hash
+
+    Returns:
+        List[TreeChange]: Changes sorted by path
+    """
+    changes: List[TreeChange] = []
+    added: Dict[str, TreeEntry] = {}
+    removed: Dict[str, TreeEntry] = {}
+
+    def compare(old: bytes, new: bytes, old_prefix: str, new_prefix: str) -> None:
+        stack = [(old, new, old_prefix, new_prefix)]
+        while stack:
+            old, new, old_prefix, new_prefix = stack.pop()
+            if old == new:
+                continue
+            old_entries, new_entries = load(old), load(new)
+            for name in old_entries.keys() | new_entries.keys():
+                before, after = old_entries.get(name), new_entries.get(name)
+                old_path = os.path.join(old_prefix, name) if old_prefix else name
+                new_path = os.path.join(new_prefix, name) if new_prefix else name
+                if before is not None and after is not None and before.is_dir == after.is_dir:
+                    if before.is_dir:
+                        stack.append((before.child, after.child, old_path, new_path))
+                    elif before[2:5] != after[2:5]:
+                        changes.append(TreeChange(MODIFIED, new_path))
+                    continue
+                if before is not None:
+                    removed[old_path] = before
+                if after is not None:
+                    added[new_path] = after
+
+    compare(old_hash, new_hash, "", "")
+
+    # Folders that vanished in one place and appeared in another, by inode
+    # or by identical contents, are moves; compare what is inside them
+    matched = True
+    while matched:
+        matched = False
+        gone: Dict[Any, str] = {}
+        for path, entry in removed.items():
+            if entry.is_dir:
+                if entry.ino:
+                    gone.setdefault(entry.ino, path)
+                gone.setdefault(entry.child, path)
+        for path, entry in list(added.items()):
+            if not entry.is_dir:
+                continue
+            old_path = gone.get(entry.ino) if entry.ino else None
+            old_path = old_path if old_path in removed else gone.get(entry.child)
+            if old_path not in removed:
+                continue
+            source = removed.pop(old_path)
+            del added[path]
+            changes.append(TreeChange(MOVED, path, old_path, True))
+            compare(source.child, entry.child, old_path, path)
+            matched = True
+
+    def expand(items: Dict[str, TreeEntry]) -> List[Tuple[str, TreeEntry]]:
+        """Replace folders with the files below them."""
+        pending = list(items.items())
+        result = []
+        while pending:
+            path, entry = pending.pop()
+            if entry.is_dir:
+                pending.extend((os.path.join(path, name), child)
+                               for name, child in load(entry.child).items())
+            else:
+                result.append((path, entry))
+        return result
+
+    added_files, removed_files = expand(added), expand(removed)
+    # A file keeps its inode, size and mtime when it is renamed
+    gone_files: Dict[tuple, List[str]] = {}
+    for path, entry in removed_files:
+        if entry.ino:
+            gone_files.setdefault((entry.ino, entry.size, entry.mtime_ns), []).append(path)
+    moved = set()
+    for path, entry in added_files:
+        candidates = gone_files.get((entry.ino, entry.size, entry.mtime_ns))
+        if entry.ino and candidates:
+            old_path = candidates.pop()
+            moved.add(old_path)
+            changes.append(TreeChange(MOVED, path, old_path))
+        else:
+            changes.append(TreeChange(ADDED, path))
+    changes.extend(TreeChange(REMOVED, path) for path, _ in removed_files if path not in moved)
+    changes.sort(key=lambda change: (change.path, change.kind))
+    return changes
+
+
+def _store_tree(tree: Tree) -> int:
+    """Save a snapshot, storing only the nodes the database lacks.
+
+    A stored node implies its whole subtree is stored, so the search for
+    new nodes stops at the first known hash on every path.
+    """
+    db = get_db_manager()
+    new_nodes = {}
+    level = [tree.root_hash]
+    while level:
+        known = db.get_existing_tree_nodes(level)
+        next_level = []
+        for digest in level:
+            if digest in known or digest in new_nodes:
+                continue
+            data = tree.nodes[digest]
+            new_nodes[digest] = zlib.compress(data)
+            next_level.extend(entry.child for entry in decode_node(data).values()
+                              if entry.is_dir)
+        level = next_level
+    snapshot_id = db.save_tree_snapshot(tree.root, tree.root_hash, new_nodes,
+                                        tree.files, tree.dirs, time.time())
+    _prune(tree.root)
+    return snapshot_id
+
+
+def _prune(root: str) -> None:
+    """Drop the oldest snapshots of a folder beyond MAX_SNAPSHOTS."""
+    db = get_db_manager()
+    snapshots = db.get_tree_snapshots(root)
+    if len(snapshots) <= MAX_SNAPSHOTS:
+        return
+    db.delete_tree_snapshots([s["id"] for s in snapshots[:-MAX_SNAPSHOTS]])
+
+    # Mark every node reachable from a remaining snapshot, then sweep
+    store = NodeStore()
+    reachable = set()
+    pending = db.get_tree_root_hashes()
+    while pending:
+        digest = pending.pop()
+        if digest in reachable:
+            continue
+        reachable.add(digest)
+        pending.extend(entry.child for entry in store.load(digest).values() if entry.is_dir)
+    db.delete_unreachable_tree_nodes(reachable)
+
+
+def take_snapshot(directory: str) -> Dict[str, Any]:
+    """Record the current state of a folder tree.
+
+    Args:
+        directory: Folder to record
+
+    Returns:
+        Dict[str, Any]: Snapshot id, files, dirs and seconds
+    """
+    start = time.perf_counter()
+    root = str(ensure_safe_path(directory))
+    tree = build_tree(root)
+    snapshot_id = _store_tree(tree)
+    return {"id": snapshot_id, "files": tree.files, "dirs": tree.dirs,
+            "seconds": time.perf_counter() - start}
+
+
+def find_snapshot(root: str, since: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """Pick the snapshot to compare against.
+
+    Args:
+        root: Absolute folder
+        since: Point in time; None for the latest snapshot
+
+    Returns:
+        Optional[Dict[str, Any]]: The last snapshot taken at or before the
+        time, else the oldest one; None if there are no snapshots
+    """
+    snapshots = get_db_manager().get_tree_snapshots(root)
+    if not snapshots:
+        return None
+    for snapshot in snapshots:
+        snapshot["created_at"] = datetime.fromtimestamp(snapshot["created_at"])
+    if since is None:
+        return snapshots[-1]
+    earlier = [s for s in snapshots if s["created_at"] <= since]
+    return earlier[-1] if earlier else snapshots[0]
+
+
+def changes_since(directory: str, since: Optional[datetime] = None
+                  ) -> Tuple[Optional[Dict[str, Any]], List[TreeChange]]:
+    """Diff the current state of a folder tree against a snapshot.
+
+    Args:
+        directory: Folder to compare
+        since: Point in time, see find_snapshot
+
+    Returns:
+        Tuple: The snapshot compared against (None if there is none) and
+        the changes since it
+    """
+    root = str(ensure_safe_path(directory))
+    snapshot = find_snapshot(root, since)
+    if snapshot is None:
+        return None, []
+    tree = build_tree(root)
+    return snapshot, diff_trees(snapshot["root_hash"], tree.root_hash,
+                                NodeStore(tree.nodes).load)
+
+
+def parse_since(text: str, now: Optional[datetime] = None) -> Optional[datetime]:
+    """Turn "yesterday", "last week" or "3 days ago" into a point in time.
+
+    Args:
+        text: Spoken period; empty for the latest snapshot
+        now: Current time
+
+    Returns:
+        Optional[datetime]: The point in time, None for the latest snapshot
+
+    Raises:
+        ValueError: If the period is not understood
+    """
+    now = now or datetime.now()
+    text = text.strip().lower()
+    if not text or text in ("last snapshot", "the last snapshot", "last time"):
+        return None
+    if text in SINCE_PERIODS:
+        period = SINCE_PERIODS[text]
+        if period is None:
+            return now.replace(hour=0, minute=0, second=0, microsecond=0)
+        return now - period
+    match = _SINCE_AGO.fullmatch(text)
+    if match:
+        return now - timedelta(**{match.group(2) + "s": int(match.group(1))})
+    raise ValueError(f"I don't know when '{text}' is")
+
+
+def snapshot_folder_state(directory: str = ".") -> str:
+    """Record the state of a folder for later "what changed" questions.
+
+    Args:
+        directory: Folder to record
+
+    Returns:
+        str: Status message
+    """
+    try:
+        if not os.path.isdir(directory):
+            return f"{directory} is not a folder."
+        result = take_snapshot(directory)
+        return (f"Recorded the state of {directory}: {result['files']} file(s) in "
+                f"{result['dirs']} folder(s), in {result['seconds']:.1f}s.")
+    except ValueError as e:
+        return f"Cannot record {directory}: {str(e)}"
+    except Exception as e:
+        logger.error("Error recording the state of %s: %s", directory, str(e))
+        return f"Failed to record the state of {directory}: {str(e)}"
+
+
+def describe_changes(directory: str = ".", since: str = "") -> str:
+    """Describe what changed in a folder since a snapshot.
+
+    Args:
+        directory: Folder to compare
+        since: Spoken period, see parse_since
+
+    Returns:
+        str: Summary of the changes
+    """
+    try:
+        snapshot, changes = changes_since(directory, parse_since(since))
+    except ValueError as e:
+        return f"Cannot compare {directory}: {str(e)}"
+    except Exception as e:
+        logger.error("Error comparing %s: %s", directory, str(e))
+        return f"Failed to compare {directory}: {str(e)}"
+    if snapshot is None:
+        return (f"I have no record of {directory} yet. "
+                f"Say 'track changes in {directory}' first.")
+    taken = snapshot["created_at"].strftime("%Y-%m-%d %H:%M")
+    if not changes:
+        return f"Nothing changed in {directory} since {taken}."
+    counts = {kind: sum(1 for c in changes if c.kind == kind)
+              for kind in (ADDED, REMOVED, MODIFIED, MOVED)}
+    lines = [f"Since {taken} in {directory}: "
+             + ", ".join(f"{count} {kind}" for kind, count in counts.items() if count) + "."]
+    for change in changes[:SHOWN_CHANGES]:
+        if change.kind == MOVED:
+            lines.append(f"  moved {change.old_path} -> {change.path}")
+        else:
+            lines.append(f"  {change.kind} {change.path}")
+    if len(changes) > SHOWN_CHANGES:
+        lines.append(f"  ...and {len(changes) - SHOWN_CHANGES} more")
+    return "\n".join(lines)
@@ -0,0 +1,320 @@
+"""Line-level diffs between file versions.
+
+Two versions are first compared by their chunk lists. Chunks present on
+both sides in the same order hold identical bytes, so only the regions
+between them need reading: each region is widened to whole lines by
+reading into the identical chunks around it until a newline, and two
+regions with no newline between them are merged.
+
+Within a region, lines are read as a stream and reduced to 8-byte hashes,
+so holding a region costs 8 bytes per line however long the lines are.
+The hash sequences are diffed after trimming their common ends. Matching
+needs several Python objects per line, so it is only done when both
+trimmed sides have at most MAX_MATCHED_LINES lines; a larger block is
+counted as replaced whole. A second pass over the stream picks out the
+text of the first changed lines for the summary.
+"""
+
+import hashlib
+import logging
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from itertools import accumulate
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+from utils.chunk_store import Chunk, ChunkStore
+from .content_search import is_binary
+from .file_versioning import VersionStore, get_version_store
+
+logger = logging.getLogger(__name__)
+
+# Changed lines quoted in a summary, per side
+SHOWN_LINES = 5
+# Longest quoted line, in characters
+SHOWN_LINE_LENGTH = 120
+# Chunks kept in memory per version while diffing
+CACHED_CHUNKS = 8
+# Longest changed block, in lines per side, matched line by line
+MAX_MATCHED_LINES = 20000
+
+
+class VersionDiff(NamedTuple):
+    """Summary of the line changes between two versions."""
+
+    added: int
+    removed: int
+    added_lines: List[str]
+    removed_lines: List[str]
+    regions: int
+    bytes_read: int
+    binary: bool = False
+
+
+class _Region(NamedTuple):
+    """Byte ranges that differ between two versions, in whole lines."""
+
+    old_start: int
+    old_end: int
+    new_start: int
+    new_end: int
+
+
+class _Reader:
+    """Reads byte ranges of a version from the chunk store, counting bytes read."""
+
+    def __init__(self, store: ChunkStore, chunks: List[Chunk]):
+        self.store = store
+        self.chunks = chunks
+        self.offsets = [0] + list(accumulate(chunk.length for chunk in chunks))
+        self.bytes_read = 0
+        # Recently read chunks; a region is read once to diff and again to quote
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def chunk(self, index: int) -> bytes:
+        digest = self.chunks[index].digest
+        data = self._cache.get(digest)
+        if data is None:
+            data = self.store.get(digest)
+            self.bytes_read += len(data)
+            self._cache[digest] = data
+            if len(self._cache) > CACHED_CHUNKS:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(digest)
+        return data
+
+    def read(self, start: int, end: int) -> Iterator[bytes]:
+        """Stream the bytes from start to end, a chunk at a time."""
+        index = max(0, _chunk_at(self.offsets, start))
+        while index < len(self.chunks) and self.offsets[index] < end:
+            data = self.chunk(index)
+            base = self.offsets[index]
+            yield data[max(0, start - base):end - base]
+            index += 1
+
+
+def _chunk_at(offsets: List[int], position: int) -> int:
+    """Index of the chunk containing a byte offset."""
+    return bisect_right(offsets, position) - 1
+
+
+def _lines(pieces: Iterator[bytes]) -> Iterator[bytes]:
+    """Split a stream of byte pieces into lines, newlines included."""
+    carry = b""
+    for piece in pieces:
+        carry += piece
+        lines = carry.split(b"\n")
+        carry = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if carry:
+        yield carry
+
+
+def _line_hashes(lines: Iterator[bytes]) -> array:
+    """Reduce lines to 8-byte hashes."""
+    hashes = array("Q")
+    for line in lines:
+        hashes.append(int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), "little"))
+    return hashes
+
+
+def _changed_regions(old: _Reader, new: _Reader) -> List[_Region]:
+    """Find the byte ranges that differ between two versions, widened to whole lines.
+
+    Args:
+        old: Reader of the older version
+        new: Reader of the newer version
+
+    Returns:
+        List[_Region]: Differing ranges in file order
+    """
+    matcher = SequenceMatcher(None, [c.digest for c in old.chunks],
+                              [c.digest for c in new.chunks], autojunk=False)
+    opcodes = matcher.get_opcodes()
+    regions: List[List[int]] = []
+    # Index in opcodes of the equal block after each region
+    following: List[Optional[int]] = []
+    for k, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == "equal":
+            continue
+        a0, a1, b0, b1 = old.offsets[i1], old.offsets[i2], new.offsets[j1], new.offsets[j2]
+        if k > 0:
+            # Back up to the start of the line, through chunks both sides share
+            _, p1, p2, _, _ = opcodes[k - 1]
+            back, found = 0, False
+            for index in range(p2 - 1, p1 - 1, -1):
+                data = old.chunk(index)
+                newline = data.rfind(b"\n")
+                if newline != -1:
+                    back += len(data) - newline - 1
+                    found = True
+                    break
+                back += len(data)
+            if not found and regions:
+                previous = regions.pop()
+                following.pop()
+                a0, b0 = previous[0], previous[2]
+            else:
+                a0, b0 = a0 - back, b0 - back
+        regions.append([a0, a1, b0, b1])
+        following.append(k + 1 if k + 1 < len(opcodes) else None)
+
+    for region, k in zip(regions, following):
+        if k is None:
+            continue
+        # Run on to the end of the line
+        _, p1, p2, _, _ = opcodes[k]
+        ahead = 0
+        for index in range(p1, p2):
+            data = old.chunk(index)
+            newline = data.find(b"\n")
+            if newline != -1:
+                ahead += newline + 1
+                break
+            ahead += len(data)
+        region[1] += ahead
+        region[3] += ahead
+    return [_Region(*region) for region in regions]
+
+
+def _quote(line: bytes) -> str:
+    """Shorten a changed line for a summary."""
+    text = line.decode("utf-8", errors="replace").rstrip("\r\n")
+    if len(text) > SHOWN_LINE_LENGTH:
+        text = text[:SHOWN_LINE_LENGTH - 3] + "..."
+    return text
+
+
+def _pick_lines(lines: Iterator[bytes], spans: List[Tuple[int, int]], limit: int) -> List[str]:
+    """Quote the lines at the given index spans, up to a limit."""
+    wanted = [i for start, end in spans for i in range(start, min(end, start + limit))][:limit]
+    picked = []
+    if not wanted:
+        return picked
+    target = iter(wanted)
+    next_index = next(target)
+    for index, line in enumerate(lines):
+        if index == next_index:
+            picked.append(_quote(line))
+            next_index = next(target, None)
+            if next_index is None:
+                break
+    return picked
+
+
+def _diff_lines(old: _Reader, new: _Reader, region: _Region) -> Tuple[int, int, List[str], List[str]]:
+    """Diff one region line by line.
+
+    Returns:
+        Tuple[int, int, List[str], List[str]]: Lines added and removed, and
+        the first added and removed lines
+    """
+    old_hashes = _line_hashes(_lines(old.read(region.old_start, region.old_end)))
+    new_hashes = _line_hashes(_lines(new.read(region.new_start, region.new_end)))
+    head = 0
+    limit = min(len(old_hashes), len(new_hashes))
+    while head < limit and old_hashes[head] == new_hashes[head]:
+        head += 1
+    tail = 0
+    while (tail < limit - head
+           and old_hashes[len(old_hashes) - 1 - tail] == new_hashes[len(new_hashes) - 1 - tail]):
+        tail += 1
+    old_end, new_end = len(old_hashes) - tail, len(new_hashes) - tail
+    if max(old_end, new_end) - head > MAX_MATCHED_LINES:
+        # Too large to match in memory: count every line between the common ends
+        removed_spans = [(head, old_end)] if old_end > head else []
+        added_spans = [(head, new_end)] if new_end > head else []
+    else:
+        matcher = SequenceMatcher(None, old_hashes[head:old_end].tolist(),
+                                  new_hashes[head:new_end].tolist(), autojunk=False)
+        removed_spans, added_spans = [], []
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+            if i2 > i1:
+                removed_spans.append((head + i1, head + i2))
+            if j2 > j1:
+                added_spans.append((head + j1, head + j2))
+    removed = sum(end - start for start, end in removed_spans)
+    added = sum(end - start for start, end in added_spans)
+    removed_lines = _pick_lines(_lines(old.read(region.old_start, region.old_end)),
+                                removed_spans, SHOWN_LINES)
+    added_lines = _pick_lines(_lines(new.read(region.new_start, region.new_end)),
+                              added_spans, SHOWN_LINES)
+    return added, removed, added_lines, removed_lines
+
+
+def diff_versions(old_chunks: List[Chunk], new_chunks: List[Chunk],
+                  store: Optional[ChunkStore] = None) -> VersionDiff:
+    """Diff two versions given their chunk lists.
+
+    Args:
+        old_chunks: Chunks of the older version
+        new_chunks: Chunks of the newer version
+        store: Chunk store holding both; defaults to the version store's
+
+    Returns:
+        VersionDiff: Line counts, the first changed lines, and the number
+        of regions compared and chunk bytes read
+    """
+    store = store or get_version_store().chunks
+    old, new = _Reader(store, old_chunks), _Reader(store, new_chunks)
+    regions = _changed_regions(old, new)
+    if any(is_binary(reader.chunk(0)[:8192]) for reader in (old, new) if reader.chunks):
+        return VersionDiff(0, 0, [], [], len(regions), old.bytes_read + new.bytes_read, True)
+    added = removed = 0
+    added_lines: List[str] = []
+    removed_lines: List[str] = []
+    for region in regions:
+        result = _diff_lines(old, new, region)
+        added += result[0]
+        removed += result[1]
+        added_lines.extend(result[2][:SHOWN_LINES - len(added_lines)])
+        removed_lines.extend(result[3][:SHOWN_LINES - len(removed_lines)])
+    return VersionDiff(added, removed, added_lines, removed_lines, len(regions),
+                       old.bytes_read + new.bytes_read)
+
+
+def describe_version_changes(file_name: str, version: str,
+                             store: Optional[VersionStore] = None) -> str:
+    """Describe what changed in a version compared with the one before it.
+
+    Args:
+        file_name: Versioned file
+        version: Version number as listed, or version id
+        store: Version store; defaults to the global one
+
+    Returns:
+        str: Summary of the added and removed lines
+    """
+    store = store or get_version_store()
+    try:
+        found = store.find(file_name, version)
+        if found is None:
+            return "Version not found."
+        ids = [v["version_id"] for v in store.history(file_name)]
+        position = ids.index(found["version_id"])
+        previous_chunks: List[Chunk] = []
+        if position > 0:
+            previous = store.db.get_file_version(ids[position - 1])
+            previous_chunks = [Chunk(*chunk) for chunk in previous["chunks"]]
+        result = diff_versions(previous_chunks, [Chunk(*c) for c in found["chunks"]],
+                               store.chunks)
+    except (OSError, ValueError) as e:
+        logger.error("Failed to diff version %s of %s: %s", version, file_name, str(e))
+        return f"Failed to compare versions: {str(e)}"
+
+    name = f"Version {position + 1}"
+    if result.binary:
+        return f"{name} changed binary contents in {result.regions} place(s)."
+    if not result.added and not result.removed:
+        return f"{name} has the same lines as the version before it."
+    against = "the version before it" if position > 0 else "an empty file"
+    lines = [f"{name} added {result.added} line(s) and removed "
+             f"{result.removed} line(s) compared with {against}."]
+    lines.extend(f"  + {line}" for line in result.added_lines)
+    lines.extend(f"  - {line}" for line in result.removed_lines)
+    return "\n".join(lines)
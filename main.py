@@ -10,6 +10,7 @@ from dotenv import load_dotenv
 from PySide6.QtWidgets import QApplication
 import random
 import logging
+import re
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +29,8 @@ from utils.database import get_db_manager
 from utils.memory_manager import get_memory_manager
 from utils.retry import retry, transactional, Transaction
 from utils.logging_config import setup_logging
+from utils.file_watcher import get_file_watcher
+from utils.file_identity import get_identity_map
 
 # Setup logging
 setup_logging()
@@ -56,16 +59,39 @@ from commands.file_manager import (
     move_item,
     copy_item,
     restore_item,
+    list_recycle_bin,
     search_files,
-    sort_files,
     tag_file,
-    get_files_by_tag,
+    find_tagged_files,
+    rebuild_tag_index,
     mark_file_private,
     access_private_file,
 )
-from commands.file_versioning import save_version, list_versions, restore_version
+from commands.file_versioning import (
+    get_version_store,
+    restore_version,
+    save_version,
+    version_name,
+)
+from commands.auto_versioning import get_auto_versioner, list_auto_versioned
+from commands.version_diff import describe_version_changes
 from commands.file_tagging import smart_search_files
 from commands.auto_sort import auto_sort_files
+from commands.recycle_bin import get_recycle_bin
+from commands.batch_operations import batch_operation, selector_from_words
+from commands.batch_rename import batch_rename
+from commands.content_search import iter_content_matches
+from commands.content_index import get_content_index, index_folder
+from commands.tree_snapshot import describe_changes, snapshot_folder_state
+from commands.folder_snapshot import describe_snapshots, restore_folder_snapshot, snapshot_folder
+from commands.fuzzy_resolver import SPOKEN_WORDS, resolve_path
+from commands.duplicate_finder import find_duplicate_files
+from commands.disk_usage import disk_usage_summary, format_size
+from commands.top_files import ORDER_WORDS, top_files
+from commands.archive_manager import compress_folder, extract_archive
+from commands.folder_sync import sync_folder
+from commands.metadata_extractor import extract_folder_metadata
+from commands.result_sets import ResultSet, ResultSetStore, apply_follow_up, parse_follow_up
 from commands.reminder_handler import set_reminder
 
 
@@ -129,6 +155,8 @@ class JarvisCore:
         self.sound_player = get_sound_player()
         self.db = get_db_manager()
         self.memory_manager = get_memory_manager()
+        # Results of recent searches and listings, for follow-up commands
+        self.result_sets = ResultSetStore()
 
         # Setup sounds directory
         self.sounds_dir = os.path.join(os.path.dirname(__file__), "sounds")
@@ -166,6 +194,17 @@ class JarvisCore:
             # Start memory monitoring
             self.memory_manager.start_monitoring()
 
+            # Enforce recycle bin size and age limits in the background
+            get_recycle_bin().start_purge_worker()
+            # Thin out old file versions and their chunks in the background
+            get_version_store().start_gc_worker()
+            # Version marked files whenever they change
+            get_auto_versioner().start()
+            # Keep tags and metadata on files other programs move in the workspace;
+            # polling the whole workspace would cost more than it saves
+            if get_file_watcher().backend_name == "inotify":
+                get_identity_map().watch(os.getcwd())
+
             logger.info("Jarvis core initialized successfully")
             return True
 
@@ -184,6 +223,13 @@ class JarvisCore:
         if self.wake_word_detector:
             self.wake_word_detector.stop()
         self.memory_manager.stop_monitoring()
+        get_recycle_bin().stop_purge_worker()
+        get_auto_versioner().stop()
+        get_identity_map().stop()
+        # Saves changes the content index picked up from file events
+        get_content_index().unwatch()
+        get_version_store().stop_gc_worker()
+        get_file_watcher().stop()
         logger.info("Jarvis stopped")
 
     def get_greeting(self) -> str:
@@ -198,6 +244,21 @@ class JarvisCore:
         ]
         return random.choice(greetings)
 
+    def show_results(self, result_set: ResultSet) -> None:
+        """Print the current page of a result set"""
+        for path in result_set.page():
+            print(path)
+
+    def resolve_file(self, spoken: str) -> str:
+        """Map a spoken file name to an existing path, fuzzily if needed"""
+        spoken = spoken.strip()
+        path = resolve_path(spoken)
+        if path is None:
+            return spoken
+        if path != spoken:
+            speak(f"I think you mean {os.path.basename(path)}.")
+        return path
+
     @transactional
     def process_command(self, command: str, transaction: Transaction = None) -> str:
         """Process a voice command with transaction support"""
@@ -214,7 +275,7 @@ class JarvisCore:
                 response = open_application(command)
                 return response
 
-            elif "search" in command:
+            elif "search" in command and "search file" not in command:
                 query = command.replace("search", "").strip()
                 search_type = "web"
                 if "image" in command:
@@ -229,11 +290,222 @@ class JarvisCore:
                 return response
 
             # === File Management ===
+            # Follow-ups on the last results, e.g. "sort those by size",
+            # "tag those as work", "delete the first three"
+            elif self.result_sets.current() is not None and parse_follow_up(command):
+                action, selection, argument = parse_follow_up(command)
+                return apply_follow_up(
+                    self.result_sets.current(), action, selection, argument, transaction
+                )
+
+            elif "next page" in command or "more results" in command or "previous page" in command:
+                results = self.result_sets.current()
+                if results is None:
+                    return "There are no results to page through."
+                if "previous" in command:
+                    page = results.previous_page()
+                else:
+                    page = results.next_page()
+                if not page:
+                    return "That's all the results."
+                self.show_results(results)
+                return f"Showing results {results.cursor + 1} to {results.cursor + len(page)} of {len(results)}."
+
+            # e.g. "move all pdfs from downloads to documents",
+            # "tag all pdfs in reports as work"
+            elif re.match(r"(delete|move|copy|tag) all ", command):
+                match = re.match(
+                    r"(delete|move|copy|tag) all (.+?) (?:from|in) (\S+)(?: (?:to|as) (.+))?$",
+                    command,
+                )
+                if not match:
+                    return "Please say which files, the folder and, if needed, the destination."
+                action, files, folder, target = match.groups()
+                return batch_operation(
+                    action,
+                    folder,
+                    selector_from_words(files),
+                    target.strip() if target else None,
+                    transaction=transaction,
+                )
+
+            # e.g. "rename all jpgs in vacation by date",
+            # "rename all pdfs in reports to invoice",
+            # "rename all files in notes replacing draft with final"
+            elif re.match(r"rename all ", command):
+                match = re.match(
+                    r"rename all (.+?) (?:from|in) (\S+) "
+                    r"(?:(by date)|to (.+)|replacing (.+?) with (.*))$",
+                    command,
+                )
+                if not match:
+                    return "Please say which files, the folder and by date, to a name, or replacing a word."
+                files, folder, by_date, name, old, new = match.groups()
+                selector = selector_from_words(files)
+                if by_date:
+                    return batch_rename(folder, "{date}", selector, number_duplicates=True,
+                                        transaction=transaction)
+                if name:
+                    return batch_rename(folder, name.strip().replace(" ", "_") + "_{n:03}",
+                                        selector, transaction=transaction)
+                return batch_rename(folder, new.strip().replace("\\", "\\\\"), selector,
+                                    pattern=re.escape(old.strip()), transaction=transaction)
+
+            elif "index files" in command or "update content index" in command:
+                folder = command.split("index files", 1)[-1].replace("in ", "", 1).strip()
+                if "update content index" in command:
+                    folder = ""
+                return index_folder(folder or ".", watch=True)
+
+            elif "extract metadata" in command or "read metadata" in command:
+                folder = re.split(r"(?:extract|read) metadata", command, 1)[1].strip()
+                folder = re.sub(r"^(?:in|of|for)\s+", "", folder)
+                return extract_folder_metadata(folder or ".")
+
+            elif "snapshot folder" in command:
+                folder = command.split("snapshot folder", 1)[1].strip()
+                return snapshot_folder(folder or ".")
+
+            elif "list snapshots" in command:
+                folder = command.split("list snapshots", 1)[1].strip()
+                folder = re.sub(r"^(?:of|for|in)\s+", "", folder)
+                return describe_snapshots(folder or ".")
+
+            elif "restore snapshot" in command:
+                match = re.search(r"restore snapshot\s+(\d+)(?:\s+of\s+(.+))?", command)
+                if not match:
+                    return "Please say the snapshot number, like 'restore snapshot 2 of docs'."
+                return restore_folder_snapshot(match.group(2) or ".", match.group(1))
+
+            elif "track changes in" in command or "record state of" in command:
+                folder = re.split(r"track changes in|record state of", command, 1)[1].strip()
+                return snapshot_folder_state(folder or ".")
+
+            elif "what changed in version" in command:
+                match = re.search(r"what changed in version\s+(\w+)(?:\s+of\s+(.+))?", command)
+                if not match:
+                    return "Please say the version number, like 'what changed in version 3'."
+                file = match.group(2)
+                if not file:
+                    speak("Which file?")
+                    file = recognize_speech()
+                if not file:
+                    return "Failed to get the file name."
+                return describe_version_changes(self.resolve_file(file), match.group(1))
+
+            elif "what changed" in command:
+                rest = command.split("what changed", 1)[1].strip()
+                folder, since = rest, ""
+                if " since " in f" {rest}":
+                    folder, since = (part.strip() for part in f" {rest}".split(" since ", 1))
+                folder = re.sub(r"^(?:in|to)\s+", "", folder)
+                return describe_changes(folder or ".", since)
+
+            elif "files containing" in command:
+                query = command.split("files containing", 1)[1].strip().strip("\"'")
+                if not query:
+                    return "Please say what text to look for."
+                files = []
+                index = get_content_index()
+                if index.covers("."):
+                    if not index.is_current("."):
+                        index.update(".")
+                        index.save()
+                        index.watch(".")
+                    hits = index.search(query, ".", max_results=20)
+                else:
+                    hits = iter_content_matches(".", query, max_results=20)
+                for hit in hits:
+                    print(f"{hit['path']}:{hit['line_number']}: {hit['line']}")
+                    if hit["path"] not in files:
+                        files.append(hit["path"])
+                if files:
+                    self.result_sets.add(ResultSet(files, description=f"files containing {query}"))
+                    return f"I found {len(files)} file(s) containing {query}."
+                return f"No files contain {query}."
+
+            elif re.search(r"\b(biggest|largest|smallest|newest|latest|recent|oldest) files\b",
+                           command):
+                match = re.search(r"(?:(\w+) )?(biggest|largest|smallest|newest|latest|recent|oldest) files",
+                                  command)
+                count = SPOKEN_WORDS.get(match.group(1), match.group(1) or "")
+                k = int(count) if count.isdigit() else 10
+                order = ORDER_WORDS[match.group(2)]
+                files = top_files(".", k, order)
+                if not files:
+                    return "No files found."
+                self.result_sets.add(ResultSet.from_records(
+                    ((item["path"], int(item["modified"].timestamp() * 1e9), item["size"])
+                     for item in files),
+                    f"{order} files",
+                ))
+                for item in files:
+                    print(f"{format_size(item['size']):>10}  {item['modified']:%Y-%m-%d %H:%M}  "
+                          f"{item['path']}")
+                return f"Here are your {len(files)} {order} files."
+
+            elif "compress folder" in command or "zip folder" in command:
+                folder = re.split(r"(?:compress|zip) folder", command, 1)[1].strip()
+                if not folder:
+                    return "Please say which folder to compress."
+                method = "lzma" if "lzma" in command else "deflate"
+                folder = folder.replace("with lzma", "").replace("using lzma", "").strip()
+                return compress_folder(self.resolve_file(folder), method=method)
+
+            elif re.match(r"(?:sync|mirror) folder ", command):
+                folders = re.split(r"(?:sync|mirror) folder", command, 1)[1].strip()
+                if " to " not in folders:
+                    return "Please say which folder to sync to which, like sync folder A to B."
+                source, target = (part.strip() for part in folders.split(" to ", 1))
+                return sync_folder(self.resolve_file(source), target)
+
+            elif "extract archive" in command or "unzip" in command:
+                archive = re.split(r"extract archive|unzip", command, 1)[1].strip()
+                if not archive:
+                    return "Please say which archive to extract."
+                destination = None
+                if " to " in archive:
+                    archive, destination = (part.strip() for part in archive.split(" to ", 1))
+                return extract_archive(self.resolve_file(archive), destination)
+
+            elif "disk space" in command or "disk usage" in command:
+                folder = "."
+                if " in " in command:
+                    folder = command.split(" in ", 1)[1].strip() or "."
+                return disk_usage_summary(folder)
+
+            elif "duplicate" in command:
+                folder = "."
+                if " in " in command:
+                    folder = command.split(" in ", 1)[1].strip() or "."
+                # "delete" trashes the copies; "link" keeps them as hardlinks
+                remove_copies = any(word in command for word in ("remove", "delete"))
+                deduplicate = "link" in command
+                return find_duplicate_files(folder, deduplicate, transaction, remove_copies)
+
             elif "create folder" in command:
                 folder_name = command.replace("create folder", "").strip()
                 response = create_folder(folder_name)
                 return response
 
+            elif "empty recycle bin" in command:
+                count = get_recycle_bin().empty()
+                return f"Recycle bin emptied. Deleted {count} item(s)."
+
+            elif "restore" in command and "recycle bin" in command:
+                item_name = re.sub(r"\brestore\b|\bfrom (?:the )?recycle bin\b", "", command).strip()
+                response = restore_item(item_name)
+                return response
+
+            elif "recycle bin" in command:
+                items = list_recycle_bin(limit=10)
+                if not items:
+                    return "The recycle bin is empty."
+                for item in items:
+                    deleted = datetime.fromtimestamp(item["deleted_at"])
+                    print(f"{item['original_path']} — deleted {deleted:%Y-%m-%d %H:%M}")
+                return f"There are {len(items)} recently deleted item(s) in the recycle bin."
+
             elif "delete" in command:
                 path = command.replace("delete", "").strip()
                 response = delete_file_or_folder(path)
@@ -246,19 +518,32 @@ class JarvisCore:
                     speak("Now say the new name.")
                     new = recognize_speech()
                     if new:
-                        response = rename_item(old.strip(), new.strip())
+                        response = rename_item(self.resolve_file(old), new.strip())
                         return response
                     else:
                         return "Failed to hear the new name."
                 else:
                     return "Failed to hear the old name."
 
+            # Before "show files", which would take it for a folder listing
+            elif "show files tagged" in command:
+                query = command.replace("show files tagged", "").strip()
+                if query:
+                    # A single tag, or e.g. "work and 2024 not draft"
+                    return find_tagged_files(query)
+                else:
+                    return "Please specify the tag."
+
             elif "list files" in command or "show files" in command:
                 folder = (
                     command.replace("list files", "").replace("show files", "").strip()
                     or "."
                 )
                 response = list_items(folder)
+                try:
+                    self.result_sets.add(ResultSet.from_directory(folder))
+                except (OSError, ValueError) as e:
+                    logger.debug("Could not keep listing of %s: %s", folder, str(e))
                 return response
 
             elif "move" in command:
@@ -268,7 +553,7 @@ class JarvisCore:
                     speak("Now say the destination folder.")
                     destination = recognize_speech()
                     if destination:
-                        response = move_item(source.strip(), destination.strip())
+                        response = move_item(self.resolve_file(source), destination.strip())
                         return response
                     else:
                         return "Failed to hear the destination folder."
@@ -282,13 +567,24 @@ class JarvisCore:
                     speak("Now say the destination folder.")
                     destination = recognize_speech()
                     if destination:
-                        response = copy_item(source.strip(), destination.strip())
+                        response = copy_item(self.resolve_file(source), destination.strip())
                         return response
                     else:
                         return "Failed to hear the destination folder."
                 else:
                     return "Failed to hear the source."
 
+            # Before the recycle bin "restore"
+            elif "restore version" in command:
+                speak("Please say the file name.")
+                file = recognize_speech()
+                if file:
+                    speak("Now say the version number from the list.")
+                    ts = recognize_speech()
+                    if ts:
+                        response = restore_version(self.resolve_file(file), ts.strip())
+                        speak(response)
+
             elif "restore" in command:
                 item_name = command.replace("restore", "").strip()
                 response = restore_item(item_name)
@@ -306,6 +602,9 @@ class JarvisCore:
                     after_date = datetime.strptime(date_str, "%Y-%m-%d")
                 files_found = search_files(".", name, file_type, after_date)
                 if files_found:
+                    results = ResultSet(files_found, description=command)
+                    self.result_sets.add(results)
+                    self.show_results(results)
                     return f"I found {len(files_found)} files."
                 else:
                     return "No files found matching your criteria."
@@ -317,11 +616,12 @@ class JarvisCore:
                     sort_by = "date"
                 elif "size" in command:
                     sort_by = "size"
-                sorted_files = sort_files(files_found, sort_by=sort_by, reverse=reverse)
-                if sorted_files:
-                    return f"Here are the sorted files by {sort_by}."
-                else:
-                    return "No files to sort."
+                results = self.result_sets.current()
+                if results is None or not len(results):
+                    return "No files to sort. Search or list some files first."
+                results.sort(sort_by, reverse)
+                self.show_results(results)
+                return f"Here are the sorted files by {sort_by}."
 
             elif "tag file" in command:
                 speak("Please say the file name to tag.")
@@ -330,23 +630,17 @@ class JarvisCore:
                     speak("Now say the tag.")
                     tag = recognize_speech()
                     if tag:
-                        response = tag_file(file_name.strip(), tag.strip().lower())
+                        response = tag_file(self.resolve_file(file_name), tag.strip().lower())
                         return response
                     else:
                         return "Failed to get the tag name."
                 else:
                     return "Failed to get the file name."
 
-            elif "show files tagged" in command:
-                tag = command.replace("show files tagged", "").strip()
-                if tag:
-                    files = get_files_by_tag(tag)
-                    if files:
-                        return f"I found {len(files)} files tagged with {tag}"
-                    else:
-                        return f"No files found with the tag {tag}"
-                else:
-                    return "Please specify the tag."
+            elif "rebuild tag index" in command:
+                # "rebuild tag index" or "rebuild tag index of projects"
+                folder = re.sub(r"^.*rebuild tag index(?: (?:of|in|for))?", "", command).strip()
+                return rebuild_tag_index(self.resolve_file(folder) if folder else ".")
 
             elif "mark private" in command:
                 speak("Please say the file name you want to protect.")
@@ -372,36 +666,52 @@ class JarvisCore:
                     speak("Failed to get filename or PIN.")
 
             # === File Versioning ===
+            # Not "stop ...": any command with "stop" in it exits
+            elif "disable auto versioning" in command:
+                speak("Which file or folder should I stop versioning?")
+                target = recognize_speech()
+                if target:
+                    speak(get_auto_versioner().disable(self.resolve_file(target)))
+
+            elif "list auto versioned" in command:
+                paths = list_auto_versioned()
+                if paths:
+                    speak(f"{len(paths)} path(s) are versioned automatically:")
+                    for path in paths:
+                        print(path)
+                        speak(os.path.basename(path) or path)
+                else:
+                    speak("Nothing is versioned automatically.")
+
+            elif "auto version" in command:
+                speak("Which file or folder should I version automatically?")
+                target = recognize_speech()
+                if target:
+                    speak(get_auto_versioner().enable(self.resolve_file(target)))
+
             elif "save version" in command:
                 speak("Please say the file name to version.")
                 file = recognize_speech()
                 if file:
-                    response = save_version(file.strip())
+                    response = save_version(self.resolve_file(file))
                     speak(response)
 
             elif "list versions" in command:
                 speak("Please say the file name.")
                 file = recognize_speech()
                 if file:
-                    versions = list_versions(file.strip())
+                    path = self.resolve_file(file)
+                    versions = get_version_store().history(path)
                     if versions:
                         speak("Here are the saved versions:")
-                        for v in versions:
-                            print(v)
-                            speak(v)
+                        for number, version in enumerate(versions, 1):
+                            print(version_name(path, version["version_id"]))
+                            speak(f"Version {number}, saved "
+                                  f"{version['saved_at']:%B %d at %H:%M}, "
+                                  f"{format_size(version['size'])}.")
                     else:
                         speak("No versions found.")
 
-            elif "restore version" in command:
-                speak("Please say the file name.")
-                file = recognize_speech()
-                if file:
-                    speak("Now say the version timestamp (e.g., 20240505123000).")
-                    ts = recognize_speech()
-                    if ts:
-                        response = restore_version(file.strip(), ts.strip())
-                        speak(response)
-
             # === Smart Search & Auto Sort ===
             elif "search file" in command:
                 speak("What do you want to search?")
@@ -0,0 +1,170 @@
+"""Tests for archive creation and extraction."""
+
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+import zipfile
+import zlib
+from unittest.mock import patch
+
+import commands.archive_manager as archive_manager
+import utils.database as database
+from commands.archive_manager import (
+    compress_folder,
+    crc32_combine,
+    extract,
+    extract_archive,
+    write_zip,
+)
+from utils.database import DatabaseManager
+
+
+class TestArchiveManager(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.folder = os.path.join(self.test_dir, "project")
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+
+        self.contents = {
+            "README.md": b"# Project\n" * 50,
+            "src/main.py": b"print('hello')\n" * 2000,
+            "src/empty.txt": b"",
+            "data/blob.bin": os.urandom(300 * 1024),
+            "data/photo.jpg": os.urandom(5000),
+            "data/text.log": b"".join(b"line %d\n" % i for i in range(200000)),
+        }
+        for name, data in self.contents.items():
+            path = os.path.join(self.folder, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(data)
+        os.makedirs(os.path.join(self.folder, "empty_dir"))
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def check_zip(self, archive):
+        """Check an archive holds exactly the test contents."""
+        with zipfile.ZipFile(archive) as zf:
+            self.assertIsNone(zf.testzip())
+            names = set(zf.namelist())
+            for name, data in self.contents.items():
+                self.assertEqual(zf.read(name), data)
+            self.assertIn("empty_dir/", names)
+            return {info.filename: info for info in zf.infolist()}
+
+    def test_crc32_combine(self):
+        """Test combined CRCs match the CRC of the concatenation."""
+        a, b = os.urandom(1000), os.urandom(12345)
+        self.assertEqual(crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)), zlib.crc32(a + b))
+        self.assertEqual(crc32_combine(zlib.crc32(a), 0, 0), zlib.crc32(a))
+        self.assertEqual(crc32_combine(0, zlib.crc32(b), len(b)), zlib.crc32(b))
+
+    def test_write_zip_deflate(self):
+        """Test a deflated archive is valid and stores media uncompressed."""
+        archive = os.path.join(self.test_dir, "out.zip")
+        with patch.object(archive_manager, "CHUNK_SIZE", 64 * 1024):
+            result = write_zip(self.folder, archive, max_workers=4)
+        self.assertEqual(result["files"], len(self.contents))
+        self.assertLess(result["bytes_out"], result["bytes_in"])
+        infos = self.check_zip(archive)
+        self.assertEqual(infos["data/photo.jpg"].compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(infos["data/text.log"].compress_type, zipfile.ZIP_DEFLATED)
+        self.assertFalse(os.path.exists(archive + ".part"))
+
+    def test_chunked_ratio_close_to_single_stream(self):
+        """Test priming chunks with the previous window keeps the ratio."""
+        archive = os.path.join(self.test_dir, "out.zip")
+        with patch.object(archive_manager, "CHUNK_SIZE", 64 * 1024):
+            write_zip(self.folder, archive)
+        data = self.contents["data/text.log"]
+        single = len(zlib.compress(data, 6))
+        with zipfile.ZipFile(archive) as zf:
+            chunked = zf.getinfo("data/text.log").compress_size
+        self.assertLess(chunked, single * 1.1)
+
+    def test_write_zip_lzma(self):
+        """Test an LZMA archive is valid."""
+        archive = os.path.join(self.test_dir, "out.zip")
+        write_zip(self.folder, archive, method="lzma", max_workers=2)
+        infos = self.check_zip(archive)
+        self.assertEqual(infos["src/main.py"].compress_type, zipfile.ZIP_LZMA)
+
+    def test_archive_inside_folder_is_skipped(self):
+        """Test an archive written into its own folder does not include itself."""
+        archive = os.path.join(self.folder, "self.zip")
+        write_zip(self.folder, archive)
+        with zipfile.ZipFile(archive) as zf:
+            self.assertNotIn("self.zip", zf.namelist())
+            self.assertNotIn("self.zip.part", zf.namelist())
+
+    def test_extract_zip_roundtrip(self):
+        """Test extracting restores contents and reports progress."""
+        archive = os.path.join(self.test_dir, "out.zip")
+        write_zip(self.folder, archive)
+        seen = []
+        result = extract(archive, os.path.join(self.test_dir, "restored"), max_workers=3,
+                         progress=lambda done, total: seen.append((done, total)))
+        self.assertEqual(result["files"], len(self.contents))
+        for name, data in self.contents.items():
+            with open(os.path.join(self.test_dir, "restored", name), "rb") as f:
+                self.assertEqual(f.read(), data)
+        self.assertTrue(os.path.isdir(os.path.join(self.test_dir, "restored", "empty_dir")))
+        self.assertEqual(seen[-1][0], seen[-1][1])
+
+    def test_extract_tar(self):
+        """Test tar archives are extracted as a stream."""
+        archive = os.path.join(self.test_dir, "out.tar.gz")
+        with tarfile.open(archive, "w:gz") as tf:
+            tf.add(self.folder, arcname=".")
+        result = extract(archive)
+        self.assertEqual(result["destination"], os.path.join(self.test_dir, "out"))
+        with open(os.path.join(self.test_dir, "out", "src", "main.py"), "rb") as f:
+            self.assertEqual(f.read(), self.contents["src/main.py"])
+
+    def test_zip_slip_refused(self):
+        """Test members escaping the destination are refused."""
+        archive = os.path.join(self.test_dir, "evil.zip")
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("../escaped.txt", b"nope")
+        message = extract_archive(archive, os.path.join(self.test_dir, "dest"))
+        self.assertIn("outside", message)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "escaped.txt")))
+
+    def test_tar_slip_refused(self):
+        """Test tar members escaping the destination are refused."""
+        archive = os.path.join(self.test_dir, "evil.tar")
+        with tarfile.open(archive, "w") as tf:
+            info = tarfile.TarInfo("../escaped.txt")
+            info.size = 4
+            tf.addfile(info, io.BytesIO(b"nope"))
+        message = extract_archive(archive, os.path.join(self.test_dir, "dest"))
+        self.assertIn("outside", message)
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "escaped.txt")))
+
+    def test_commands(self):
+        """Test the compress and extract command messages."""
+        message = compress_folder(self.folder)
+        self.assertIn(f"Compressed {len(self.contents)} file(s) into project.zip", message)
+        self.assertIn("already exists", compress_folder(self.folder))
+        shutil.rmtree(self.folder)
+        message = extract_archive(os.path.join(self.test_dir, "project.zip"))
+        self.assertIn(f"Extracted {len(self.contents)} file(s) to project", message)
+        self.assertTrue(os.path.exists(os.path.join(self.folder, "src", "main.py")))
+        self.assertIn("does not exist", extract_archive(os.path.join(self.test_dir, "no.zip")))
+
+
+if __name__ == "__main__":
+    unittest.main()
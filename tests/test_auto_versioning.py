@@ -0,0 +1,130 @@
+"""Tests for automatic versioning of changed files."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import utils.database as database
+from commands.auto_versioning import AutoVersioner, list_auto_versioned
+from commands.file_versioning import VersionStore
+from utils.database import DatabaseManager
+from utils.file_watcher import CREATED, DELETED, MODIFIED, ChangeEvent, FileWatcher, PollingBackend
+
+
+class TestAutoVersioning(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.watcher = FileWatcher(debounce=0.05, max_delay=1.0,
+                                   backend=PollingBackend(interval=0.05))
+        self.watcher_patch = patch("commands.auto_versioning.get_file_watcher",
+                                   return_value=self.watcher)
+        self.watcher_patch.start()
+        self.store = VersionStore()
+        self.versioners = []
+        self.root = os.path.join(self.test_dir, "project")
+        os.makedirs(self.root)
+        self.notes = self.write("notes.txt", "first draft")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        for versioner in self.versioners:
+            versioner.stop()
+        self.watcher.stop()
+        self.watcher_patch.stop()
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, content):
+        """Write a file in the project folder."""
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def versioner(self, **kwargs):
+        """Create a versioner that is stopped on teardown."""
+        versioner = AutoVersioner(self.store, **kwargs)
+        self.versioners.append(versioner)
+        return versioner
+
+    def test_enable_saves_a_baseline_and_persists(self):
+        """Test marking a file versions it and records the mark."""
+        versioner = self.versioner()
+        self.assertIn("automatically", versioner.enable(self.notes))
+        versioner.flush()
+        self.assertEqual(len(self.store.history(self.notes)), 1)
+        self.assertEqual(list_auto_versioned(), [self.notes])
+
+        self.assertIn("Stopped", versioner.disable(self.notes))
+        self.assertEqual(list_auto_versioned(), [])
+        self.assertIn("not versioned", versioner.disable(self.notes))
+
+    def test_bursts_make_one_version(self):
+        """Test repeated changes before the quiet time are saved once."""
+        versioner = self.versioner()
+        versioner.enable(self.root)
+        for i in range(5):
+            self.write("notes.txt", f"draft {i}")
+            versioner.queue_changes([ChangeEvent(self.notes, MODIFIED)])
+        self.assertEqual(versioner.flush(), 1)
+        self.assertEqual(len(self.store.history(self.notes)), 1)
+
+    def test_unchanged_content_is_skipped(self):
+        """Test a touched or rewritten but identical file makes no version."""
+        versioner = self.versioner()
+        versioner.enable(self.notes)
+        versioner.flush()
+        versioner.queue_changes([ChangeEvent(self.notes, MODIFIED)])
+        versioner.flush()
+        self.write("notes.txt", "first draft")
+        os.utime(self.notes, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        versioner.queue_changes([ChangeEvent(self.notes, MODIFIED)])
+        versioner.flush()
+        self.assertEqual((versioner.saved, versioner.skipped), (1, 2))
+        self.assertEqual(len(self.store.history(self.notes)), 1)
+
+    def test_only_marked_files_are_versioned(self):
+        """Test siblings of a marked file, deletions and the chunk store are ignored."""
+        versioner = self.versioner()
+        versioner.enable(self.notes)
+        other = self.write("other.txt", "not marked")
+        gone = self.write("sub/gone.txt", "deleted soon")
+        versioner.enable(os.path.join(self.root, "sub"))
+        versioner.flush()
+        chunk = self.write("sub/file_chunks/ab/cdef", "chunk")
+        versioner.queue_changes([ChangeEvent(other, CREATED), ChangeEvent(gone, CREATED),
+                                 ChangeEvent(chunk, CREATED)])
+        os.remove(gone)
+        versioner.queue_changes([ChangeEvent(gone, DELETED)])
+        self.assertEqual(versioner.flush(), 0)
+        self.assertEqual(self.store.history(other), [])
+
+    def test_worker_versions_watched_changes(self):
+        """Test an edit is picked up by the watcher and saved in the background."""
+        versioner = self.versioner(quiet=0.1)
+        versioner.enable(self.root)
+        versioner.start()
+        self.write("notes.txt", "second draft")
+        deadline = time.monotonic() + 10
+        while not self.store.history(self.notes) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(self.store.history(self.notes)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
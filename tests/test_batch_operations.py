@@ -0,0 +1,156 @@
+"""Tests for batch file operations."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import commands.recycle_bin as recycle_bin
+import utils.database as database
+from commands.batch_operations import (
+    batch_operation,
+    execute_batch,
+    plan_batch,
+    select_files,
+    selector_from_words,
+)
+from commands.file_manager import tag_manager
+from commands.recycle_bin import RecycleBin
+from utils.database import DatabaseManager
+from utils.retry import Transaction
+from utils.tag_index import TagIndex
+
+
+class TestBatchOperations(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.test_dir, "downloads")
+        self.target = os.path.join(self.test_dir, "documents")
+        os.makedirs(self.source)
+
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.patches = [
+            patch.object(database, "_db_manager", self.db),
+            patch.object(recycle_bin, "_recycle_bin",
+                         RecycleBin(os.path.join(self.test_dir, "bin"), db=self.db)),
+            patch.object(tag_manager, "tag_file", os.path.join(self.test_dir, "tags.json")),
+            patch.object(tag_manager, "index", TagIndex()),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def tearDown(self):
+        """Clean up test environment."""
+        for p in self.patches:
+            p.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def create_files(self, names):
+        """Create test files in the source folder."""
+        paths = []
+        for name in names:
+            path = os.path.join(self.source, name)
+            with open(path, "w") as f:
+                f.write(name)
+            paths.append(path)
+        return paths
+
+    def test_selector_from_words(self):
+        """Test spoken descriptions become globs."""
+        self.assertEqual(selector_from_words("pdfs"), "*.pdf")
+        self.assertEqual(selector_from_words("pdf files"), "*.pdf")
+        self.assertEqual(selector_from_words("files"), "*")
+        self.assertEqual(selector_from_words("report*"), "report*")
+
+    def test_select_files_glob_and_regex(self):
+        """Test selecting by glob and by regex."""
+        self.create_files(["a.pdf", "b.PDF", "c.txt", "report_2024.txt"])
+        self.assertEqual(len(select_files(self.source, "*.pdf")), 2)
+        names = [p.name for p in select_files(self.source, r"_\d{4}\.", use_regex=True)]
+        self.assertEqual(names, ["report_2024.txt"])
+
+    def test_batch_move(self):
+        """Test moving all matching files."""
+        self.create_files(["a.pdf", "b.pdf", "c.txt"])
+        result = batch_operation("move", self.source, "*.pdf", self.target)
+        self.assertIn("Moved 2 file(s)", result)
+        self.assertIn("ops/sec", result)
+        self.assertEqual(sorted(os.listdir(self.target)), ["a.pdf", "b.pdf"])
+        self.assertEqual(os.listdir(self.source), ["c.txt"])
+
+    def test_batch_copy(self):
+        """Test copying all matching files."""
+        self.create_files(["a.pdf", "b.pdf"])
+        batch_operation("copy", self.source, "*.pdf", self.target)
+        self.assertEqual(len(os.listdir(self.target)), 2)
+        self.assertEqual(len(os.listdir(self.source)), 2)
+
+    def test_batch_delete_and_restore(self):
+        """Test batch delete records every item in the recycle bin."""
+        paths = self.create_files(["a.log", "b.log"])
+        result = batch_operation("delete", self.source, "*.log")
+        self.assertIn("Deleted 2 file(s)", result)
+        self.assertEqual(os.listdir(self.source), [])
+        self.assertEqual(len(self.db.list_recycle_entries()), 2)
+        recycle_bin.get_recycle_bin().restore(paths[0])
+        self.assertTrue(os.path.exists(paths[0]))
+
+    def test_batch_tag(self):
+        """Test tagging all matching files."""
+        self.create_files(["a.pdf", "b.pdf"])
+        batch_operation("tag", self.source, "*.pdf", "work")
+        self.assertEqual(len(tag_manager.get_files_by_tag("work")), 2)
+
+    def test_collision_detected_up_front(self):
+        """Test nothing is moved when any destination already exists."""
+        self.create_files(["a.pdf", "b.pdf"])
+        os.makedirs(self.target)
+        with open(os.path.join(self.target, "b.pdf"), "w") as f:
+            f.write("existing")
+
+        result = batch_operation("move", self.source, "*.pdf", self.target)
+        self.assertIn("already exist", result)
+        self.assertEqual(len(os.listdir(self.source)), 2)
+
+    def test_failure_rolls_back_everything(self):
+        """Test a failing operation undoes the completed ones."""
+        paths = [Path(p) for p in self.create_files([f"f{i}.txt" for i in range(20)])]
+        os.makedirs(self.target)
+        plan = plan_batch("move", paths, self.target)
+        os.remove(paths[10])
+
+        with self.assertRaises(OSError):
+            execute_batch(plan, max_workers=4)
+        self.assertEqual(os.listdir(self.target), [])
+        self.assertEqual(len(os.listdir(self.source)), 19)
+
+    def test_enclosing_transaction_rollback(self):
+        """Test rolling back the enclosing transaction undoes the batch."""
+        paths = [Path(p) for p in self.create_files(["a.pdf", "b.pdf"])]
+        os.makedirs(self.target)
+        transaction = Transaction()
+        execute_batch(plan_batch("move", paths, self.target), transaction)
+        self.assertEqual(len(os.listdir(self.target)), 2)
+
+        transaction.rollback()
+        self.assertEqual(os.listdir(self.target), [])
+        self.assertEqual(len(os.listdir(self.source)), 2)
+
+    def test_batch_throughput(self):
+        """Test a batch of 1000 moves runs well within a second."""
+        paths = [Path(p) for p in self.create_files([f"file_{i}.txt" for i in range(1000)])]
+        os.makedirs(self.target)
+        result = execute_batch(plan_batch("move", paths, self.target))
+        self.assertEqual(result["count"], 1000)
+        self.assertLess(result["seconds"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""Tests for batch renaming."""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import commands.batch_rename as batch_rename_module
+import utils.database as database
+from commands.batch_rename import (
+    RenameStep,
+    batch_rename,
+    execute_renames,
+    new_names,
+    plan_renames,
+)
+from commands.metadata_extractor import extract_metadata
+from utils.database import DatabaseManager
+from utils.retry import Transaction
+
+
+def exif_jpeg(taken: str) -> bytes:
+    """Build a JPEG whose Exif block holds DateTimeOriginal."""
+    value = taken.encode() + b"\x00"
+    # TIFF header, IFD0 with one entry pointing at the Exif IFD, then the
+    # Exif IFD with DateTimeOriginal and the string it points at
+    exif_ifd = 8 + 2 + 12 + 4
+    string = exif_ifd + 2 + 12 + 4
+    tiff = (b"II*\x00" + struct.pack("<I", 8)
+            + struct.pack("<H", 1) + struct.pack("<HHII", 0x8769, 4, 1, exif_ifd)
+            + struct.pack("<I", 0)
+            + struct.pack("<H", 1) + struct.pack("<HHII", 0x9003, 2, len(value), string)
+            + struct.pack("<I", 0) + value)
+    app1 = b"Exif\x00\x00" + tiff
+    sof = struct.pack(">BHHB", 8, 480, 640, 3) + b"\x01\x22\x00" * 3
+    return (b"\xff\xd8" + b"\xff\xe1" + struct.pack(">H", len(app1) + 2) + app1
+            + b"\xff\xc0" + struct.pack(">H", len(sof) + 2) + sof + b"\xff\xd9")
+
+
+class TestBatchRename(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "photos")
+        os.makedirs(self.root)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data=None, mtime=None):
+        """Write a file whose contents default to its own name."""
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data if data is not None else name.encode())
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return Path(path)
+
+    def contents(self):
+        """Map each file name in the folder to its contents."""
+        result = {}
+        for name in os.listdir(self.root):
+            with open(os.path.join(self.root, name), "rb") as f:
+                result[name] = f.read()
+        return result
+
+    def test_template_fields(self):
+        """Test name, extension, numbering and regex group fields."""
+        sources = [self.write(name) for name in ("img10.jpg", "img2.jpg", "img1.png")]
+        renames = new_names(sources, "holiday_{n:02}")
+        self.assertEqual([(s.name, t.name) for s, t in renames],
+                         [("img1.png", "holiday_01.png"), ("img2.jpg", "holiday_02.jpg"),
+                          ("img10.jpg", "holiday_03.jpg")])
+        renames = new_names(sources, "{name}-x.{ext}")
+        self.assertEqual(renames[0][1].name, "img1-x.png")
+        renames = new_names(sources, "photo{1:>03}", pattern=r"img(\d+)")
+        self.assertEqual(sorted(t.name for _, t in renames),
+                         ["photo001.png", "photo002.jpg", "photo010.jpg"])
+        with self.assertRaises(ValueError):
+            new_names(sources, "{unknown}")
+
+    def test_regex_replacement(self):
+        """Test a template without fields is a regex replacement."""
+        sources = [self.write("draft_report.txt"), self.write("notes.txt")]
+        renames = new_names(sources, r"final_\1", pattern=r"draft_(\w+)")
+        self.assertEqual([(s.name, t.name) for s, t in renames],
+                         [("draft_report.txt", "final_report.txt")])
+
+    def test_date_template_uses_exif_then_mtime(self):
+        """Test {date} prefers the Exif date and numbers in date order."""
+        photo = self.write("b.jpg", exif_jpeg("2021:06:05 14:30:00"), mtime=2_000_000_000)
+        other = self.write("a.png", mtime=datetime(2020, 1, 2, 3, 4, 5).timestamp())
+        self.assertEqual(extract_metadata(str(photo))["taken"], "2021-06-05T14:30:00")
+        renames = new_names([photo, other], "{date}_{n}")
+        self.assertEqual([t.name for _, t in renames],
+                         ["2020-01-02_030405_1.png", "2021-06-05_143000_2.jpg"])
+        with self.assertRaisesRegex(ValueError, "not a plain file name"):
+            new_names([photo], "{date:%Y}/x")
+
+    def test_number_duplicates(self):
+        """Test names given more than once get a counter."""
+        sources = [self.write(name, mtime=1_600_000_000) for name in ("a.jpg", "b.jpg", "c.jpg")]
+        stamp = datetime.fromtimestamp(1_600_000_000).strftime(batch_rename_module.DATE_FORMAT)
+        renames = new_names(sources, "{date}", number_duplicates=True)
+        self.assertEqual([t.name for _, t in renames],
+                         [f"{stamp}.jpg", f"{stamp}_2.jpg", f"{stamp}_3.jpg"])
+
+    def test_collisions_refused_up_front(self):
+        """Test duplicate and existing targets are refused before any rename."""
+        a, b = self.write("a.txt"), self.write("b.txt")
+        self.write("taken.txt")
+        with self.assertRaisesRegex(ValueError, "would both become"):
+            plan_renames([(a, a.with_name("same.txt")), (b, b.with_name("same.txt"))])
+        with self.assertRaisesRegex(ValueError, "already exists"):
+            plan_renames([(a, a.with_name("taken.txt"))])
+        self.assertIn("Cannot rename", batch_rename(self.root, "same"))
+        self.assertEqual(sorted(self.contents()), ["a.txt", "b.txt", "taken.txt"])
+
+    def test_swap_cycle(self):
+        """Test a swap is resolved through a temporary name."""
+        a, b = self.write("a.txt"), self.write("b.txt")
+        steps = plan_renames([(a, b), (b, a)])
+        self.assertEqual(len(steps), 3)
+        execute_renames(steps)
+        self.assertEqual(self.contents(), {"a.txt": b"b.txt", "b.txt": b"a.txt"})
+
+    def test_chain_and_rotation(self):
+        """Test chains run from their free end and rotations close."""
+        files = [self.write(f"{i}.txt") for i in range(4)]
+        # 0->1->2->3->0 is a rotation; x->y is independent
+        x = self.write("x.txt")
+        renames = [(files[i], files[(i + 1) % 4]) for i in range(4)] + [(x, x.with_name("y.txt"))]
+        execute_renames(plan_renames(renames))
+        self.assertEqual(self.contents(), {"1.txt": b"0.txt", "2.txt": b"1.txt",
+                                           "3.txt": b"2.txt", "0.txt": b"3.txt",
+                                           "y.txt": b"x.txt"})
+        # A chain onto a free name: 1->new, 0->1
+        steps = plan_renames([(files[0], files[1]), (files[1], files[1].with_name("new.txt"))])
+        self.assertEqual([os.path.basename(step.target) for step in steps], ["new.txt", "1.txt"])
+
+    def test_failure_rolls_back(self):
+        """Test a failed rename undoes the renames before it."""
+        sources = [self.write(f"{i}.txt") for i in range(5)]
+        steps = plan_renames(new_names(sources, "renamed_{n}"))
+        real_rename = os.rename
+        calls = []
+
+        def flaky(source, target):
+            calls.append(source)
+            if len(calls) == 3:
+                raise PermissionError("denied")
+            real_rename(source, target)
+
+        with patch.object(batch_rename_module.os, "rename", side_effect=flaky):
+            with self.assertRaises(PermissionError):
+                execute_renames(steps)
+        self.assertEqual(sorted(self.contents()), [f"{i}.txt" for i in range(5)])
+
+    def test_transaction_rollback(self):
+        """Test the enclosing transaction undoes a finished batch."""
+        self.write("a.txt")
+        self.write("b.txt")
+        transaction = Transaction()
+        message = batch_rename(self.root, "{name}_old", transaction=transaction)
+        self.assertIn("Renamed 2 file(s)", message)
+        self.assertEqual(sorted(self.contents()), ["a_old.txt", "b_old.txt"])
+        transaction.rollback()
+        self.assertEqual(sorted(self.contents()), ["a.txt", "b.txt"])
+
+    def test_clobber_guard(self):
+        """Test a target created after planning is not overwritten."""
+        a = self.write("a.txt")
+        steps = [RenameStep(str(a), str(a.with_name("late.txt")))]
+        self.write("late.txt")
+        with self.assertRaises(FileExistsError):
+            execute_renames(steps)
+        self.assertEqual(self.contents(), {"a.txt": b"a.txt", "late.txt": b"late.txt"})
+
+
+if __name__ == "__main__":
+    unittest.main()
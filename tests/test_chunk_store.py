@@ -0,0 +1,104 @@
+"""Tests for the content-defined chunk store."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import utils.chunk_store as chunk_store
+from utils.chunk_store import (
+    AVG_CHUNK,
+    MAX_CHUNK,
+    MIN_CHUNK,
+    ChunkStore,
+    cut_points,
+    iter_chunks,
+)
+
+
+def random_bytes(size, seed=0):
+    """Build reproducible random data."""
+    return random.Random(seed).randbytes(size)
+
+
+class TestChunkStore(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.store = ChunkStore(os.path.join(self.test_dir, "chunks"))
+
+    def tearDown(self):
+        """Clean up test environment."""
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data):
+        """Write a file in the test folder."""
+        path = os.path.join(self.test_dir, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_chunk_sizes(self):
+        """Test chunks cover the data within the size limits."""
+        data = random_bytes(4 * 1024 * 1024)
+        chunks = [chunk for _, chunk in iter_chunks(data, len(data))]
+        self.assertEqual(sum(chunk.length for chunk in chunks), len(data))
+        self.assertTrue(all(MIN_CHUNK <= chunk.length <= MAX_CHUNK for chunk in chunks[:-1]))
+        average = len(data) / len(chunks)
+        self.assertTrue(AVG_CHUNK / 2 < average < AVG_CHUNK * 2, average)
+
+    def test_cut_points_do_not_depend_on_the_scan_start(self):
+        """Test scanning in pieces finds the same cut points as one scan."""
+        data = random_bytes(2 * 1024 * 1024, seed=1)
+        whole = cut_points(data, 0, len(data))
+        pieces = cut_points(data, 0, 700_001) + cut_points(data, 700_001, len(data))
+        self.assertEqual(whole, pieces)
+
+    def test_insertion_keeps_other_chunks(self):
+        """Test an insertion only changes the chunks around it."""
+        data = random_bytes(3 * 1024 * 1024, seed=2)
+        edited = data[:1_000_000] + b"inserted text" + data[1_000_000:]
+        before = {chunk.digest for _, chunk in iter_chunks(data, len(data))}
+        after = [chunk for _, chunk in iter_chunks(edited, len(edited))]
+        changed = [chunk for chunk in after if chunk.digest not in before]
+        self.assertLessEqual(len(changed), 2)
+
+    def test_previous_chunks_are_reused_without_scanning(self):
+        """Test unchanged regions are matched by hash instead of scanned."""
+        data = random_bytes(3 * 1024 * 1024, seed=3)
+        previous = [chunk for _, chunk in iter_chunks(data, len(data))]
+        edited = bytearray(data)
+        edited[2_000_000:2_000_010] = b"0123456789"
+        edited = bytes(edited)
+        with patch.object(chunk_store, "cut_points", wraps=cut_points) as scan:
+            reused = [chunk for _, chunk in iter_chunks(edited, len(edited), previous)]
+        self.assertEqual(scan.call_count, 1)
+        self.assertEqual(reused, [chunk for _, chunk in iter_chunks(edited, len(edited))])
+
+    def test_store_and_read_back(self):
+        """Test a file round-trips and shared chunks are stored once."""
+        data = random_bytes(1024 * 1024, seed=4) + b"\x00" * 300_000
+        chunks, stats = self.store.store_file(self.write("a.bin", data))
+        self.assertEqual(b"".join(self.store.read_chunks(chunks)), data)
+        self.assertEqual(stats["new_chunks"], len(set(chunks)))
+        # Runs of zeros compress
+        self.assertLess(stats["written"], len(data))
+
+        _, again = self.store.store_file(self.write("b.bin", data + b"tail"), chunks)
+        self.assertEqual(again["new_chunks"], 1)
+
+    def test_corrupt_chunk(self):
+        """Test a damaged chunk is detected when read."""
+        chunks, _ = self.store.store_file(self.write("a.bin", random_bytes(50_000, seed=5)))
+        path = self.store._path(chunks[0].digest)
+        with open(path, "r+b") as f:
+            f.seek(10)
+            f.write(b"XX")
+        with self.assertRaises(ValueError):
+            list(self.store.read_chunks(chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,160 @@
+"""Tests for the trigram content index."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import commands.content_index as content_index
+from commands.content_index import (
+    TrigramIndex,
+    decode_postings,
+    encode_postings,
+    extract_trigrams,
+    query_trigrams,
+)
+from utils.file_watcher import CREATED, DELETED, MODIFIED, ChangeEvent
+
+
+class TestTrigramIndex(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.docs_dir = os.path.join(self.test_dir, "docs")
+        os.makedirs(self.docs_dir)
+        self.index_file = os.path.join(self.test_dir, "index.bin")
+        self.write("a.txt", "The quarterly Budget review\n")
+        self.write("b.txt", "grocery list: milk, eggs\n")
+        self.write("c.md", "budgeting tips\nsave more\n")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, content):
+        """Write a file into the indexed folder."""
+        path = os.path.join(self.docs_dir, name)
+        with open(path, "w") as f:
+            f.write(content)
+        return path
+
+    def test_postings_round_trip(self):
+        """Test varint delta encoding of posting lists."""
+        ids = [0, 1, 5, 130, 20000, 20001]
+        self.assertEqual(list(decode_postings(encode_postings(ids))), ids)
+
+    def test_trigram_extraction(self):
+        """Test trigrams are lowercased and the query's are a subset."""
+        self.assertTrue(query_trigrams("BUD") <= extract_trigrams(b"my budget"))
+        self.assertEqual(query_trigrams("ab"), set())
+
+    def test_candidates_narrowed_by_postings(self):
+        """Test only files containing every query trigram are candidates."""
+        index = TrigramIndex(self.index_file)
+        stats = index.update(self.docs_dir)
+        self.assertEqual(stats["added"], 3)
+
+        names = sorted(os.path.basename(p) for p in index.candidates("budget"))
+        self.assertEqual(names, ["a.txt", "c.md"])
+        self.assertEqual(index.candidates("nonexistent phrase"), [])
+
+    def test_search_verifies_candidates(self):
+        """Test search returns verified hits."""
+        index = TrigramIndex(self.index_file)
+        index.update(self.docs_dir)
+        hits = index.search("budget review")
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]["line"], "The quarterly Budget review")
+
+    def test_oversized_files_are_always_verified(self):
+        """Test text files too large to index are still found, before and after a reload."""
+        index = TrigramIndex(self.index_file, max_file_size=1000)
+        self.write("small.txt", "a needle\n")
+        big = self.write("big.txt", "hay\n" * 500 + "another needle\n")
+        index.update(self.docs_dir)
+        self.assertIn(big, index.candidates("needle"))
+        found = sorted(os.path.basename(hit["path"]) for hit in index.search("needle"))
+        self.assertEqual(found, ["big.txt", "small.txt"])
+        self.assertEqual(index.search("budget review")[0]["line"], "The quarterly Budget review")
+        index.save()
+        reloaded = TrigramIndex(self.index_file, max_file_size=1000)
+        self.assertEqual(len(reloaded.search("another needle")), 1)
+        # Shrunk below the limit, it is indexed like any other file
+        self.write("big.txt", "small now\n")
+        reloaded.update(self.docs_dir)
+        self.assertNotIn(big, reloaded.candidates("needle"))
+
+    def test_persistence(self):
+        """Test the index survives a save and reload."""
+        index = TrigramIndex(self.index_file)
+        index.update(self.docs_dir)
+        self.assertTrue(index.save())
+
+        reloaded = TrigramIndex(self.index_file)
+        self.assertEqual(len(reloaded), 3)
+        self.assertTrue(reloaded.covers(self.docs_dir))
+        self.assertEqual(len(reloaded.candidates("milk")), 1)
+
+    def test_incremental_update(self):
+        """Test only changed, new and removed files are processed."""
+        index = TrigramIndex(self.index_file)
+        index.update(self.docs_dir)
+
+        stats = index.update(self.docs_dir)
+        self.assertEqual(stats, {"added": 0, "updated": 0, "removed": 0})
+
+        path = self.write("b.txt", "grocery list: bread and budget cheese\n")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        self.write("d.txt", "new budget file\n")
+        os.remove(os.path.join(self.docs_dir, "c.md"))
+        stats = index.update(self.docs_dir)
+        self.assertEqual(stats, {"added": 1, "updated": 1, "removed": 1})
+
+        names = sorted(os.path.basename(p) for p in index.candidates("budget"))
+        self.assertEqual(names, ["a.txt", "b.txt", "d.txt"])
+        self.assertEqual(index.candidates("milk"), [])
+
+        # Compaction on save drops the replaced entries
+        index.save()
+        reloaded = TrigramIndex(self.index_file)
+        self.assertEqual(len(reloaded.paths), 3)
+        names = sorted(os.path.basename(p) for p in reloaded.candidates("budget"))
+        self.assertEqual(names, ["a.txt", "b.txt", "d.txt"])
+
+    def test_apply_change_events(self):
+        """Test watcher events update the index without a rescan."""
+        index = TrigramIndex(self.index_file)
+        index.update(self.docs_dir)
+        changed = self.write("b.txt", "grocery list: budget bread\n")
+        os.utime(changed, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        added = self.write("d.txt", "new budget file\n")
+        removed = os.path.join(self.docs_dir, "c.md")
+        os.remove(removed)
+        stats = index.apply_changes([ChangeEvent(changed, MODIFIED), ChangeEvent(added, CREATED),
+                                     ChangeEvent(removed, DELETED)])
+        self.assertEqual(stats, {"added": 1, "updated": 1, "removed": 1})
+        names = sorted(os.path.basename(p) for p in index.candidates("budget"))
+        self.assertEqual(names, ["a.txt", "b.txt", "d.txt"])
+        self.assertEqual(index.update(self.docs_dir), {"added": 0, "updated": 0, "removed": 0})
+
+    def test_event_changes_are_saved_in_batches(self):
+        """Test changes from events are saved once, after a delay."""
+        index = TrigramIndex(self.index_file)
+        index.update(self.docs_dir)
+        index.save()
+        with patch.object(content_index, "SAVE_DELAY_SECONDS", 60):
+            for name in ("d.txt", "e.txt"):
+                added = self.write(name, "budget notes\n")
+                index.apply_changes([ChangeEvent(added, CREATED)])
+        self.assertEqual(len(TrigramIndex(self.index_file)), 3)
+        timer = index._save_timer
+        self.assertIsNotNone(timer)
+        self.assertTrue(index.flush())
+        self.assertTrue(timer.finished.is_set())
+        self.assertEqual(len(TrigramIndex(self.index_file)), 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
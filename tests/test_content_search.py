@@ -0,0 +1,108 @@
+"""Tests for content search functionality."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import commands.content_search as content_search
+from commands.content_search import iter_content_matches, scan_file, search_file_contents, compile_query
+
+
+class TestContentSearch(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.write("notes.txt", "first line\nthe Budget is due\nlast line\n")
+        self.write("todo.md", "buy milk\nreview budget\n")
+        self.write("other.txt", "nothing here\n")
+        self.write("image.bin", b"\x89PNG\x00\x00budget")
+        self.write(".git/config", "budget\n")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        shutil.rmtree(self.test_dir)
+
+    def write(self, rel, content):
+        """Write a test file."""
+        path = os.path.join(self.test_dir, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = "wb" if isinstance(content, bytes) else "w"
+        with open(path, mode) as f:
+            f.write(content)
+        return path
+
+    def test_finds_matches_with_context(self):
+        """Test hits include the line number, line and context."""
+        hits = search_file_contents(self.test_dir, "budget")
+        by_name = {os.path.basename(hit["path"]): hit for hit in hits}
+        self.assertEqual(set(by_name), {"notes.txt", "todo.md"})
+
+        hit = by_name["notes.txt"]
+        self.assertEqual(hit["line_number"], 2)
+        self.assertEqual(hit["line"], "the Budget is due")
+        self.assertEqual(hit["before"], ["first line"])
+        self.assertEqual(hit["after"], ["last line"])
+        self.assertEqual(by_name["todo.md"]["after"], [])
+
+    def test_case_sensitive_literal(self):
+        """Test a case-sensitive search uses the exact bytes."""
+        hits = search_file_contents(self.test_dir, "Budget", ignore_case=False)
+        self.assertEqual([os.path.basename(h["path"]) for h in hits], ["notes.txt"])
+
+    def test_regex(self):
+        """Test regular expression queries."""
+        hits = search_file_contents(self.test_dir, r"^(buy|review) \w+$", use_regex=True)
+        self.assertEqual(len(hits), 2)
+
+    def test_skips_binary_files(self):
+        """Test files with NUL bytes are not reported."""
+        path = os.path.join(self.test_dir, "image.bin")
+        self.assertEqual(scan_file(path, compile_query("budget")), [])
+
+    def test_large_file_is_memory_mapped(self):
+        """Test files above the mmap threshold are searched correctly."""
+        lines = [f"line {i}" for i in range(1000)]
+        lines[700] = "needle in a haystack"
+        path = self.write("big.log", "\n".join(lines) + "\n")
+        with patch.object(content_search, "MMAP_THRESHOLD", 100):
+            hits = scan_file(path, compile_query("needle"))
+        self.assertEqual(len(hits), 1)
+        self.assertEqual(hits[0]["line_number"], 701)
+        self.assertEqual(hits[0]["before"], ["line 699"])
+
+    def test_stops_at_max_results(self):
+        """Test the search stops once enough hits are found."""
+        for i in range(30):
+            self.write(f"many/file_{i}.txt", "match\n")
+        hits = list(iter_content_matches(self.test_dir, "match", max_results=5))
+        self.assertEqual(len(hits), 5)
+
+    def test_time_budget(self):
+        """Test an exhausted time budget returns without scanning."""
+        hits = search_file_contents(self.test_dir, "budget", time_budget=0)
+        self.assertEqual(hits, [])
+
+    def test_time_budget_does_not_wait_for_running_scans(self):
+        """Test the search returns on time while slow scans are still running."""
+        release = threading.Event()
+
+        def slow_scan(*args, **kwargs):
+            release.wait(10)
+            return []
+
+        start = time.monotonic()
+        try:
+            with patch.object(content_search, "scan_file", slow_scan):
+                hits = search_file_contents(self.test_dir, "budget", time_budget=0.2)
+        finally:
+            release.set()
+        self.assertEqual(hits, [])
+        self.assertLess(time.monotonic() - start, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+"""Tests for the disk usage analyzer."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import utils.database as database
+from commands.disk_usage import (
+    analyze_disk_usage,
+    disk_usage_summary,
+    file_category,
+    format_size,
+)
+from utils.database import DatabaseManager
+
+
+class TestDiskUsage(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "home")
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+
+        self.write("notes.txt", 100)
+        self.write("photos/a.jpg", 5000)
+        self.write("photos/b.png", 3000)
+        self.write("photos/2023/c.jpg", 7000)
+        self.write("code/main.py", 200)
+        self.write("code/build/app.bin", 20000)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, size):
+        """Create a file of a given size under the test root."""
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        return path
+
+    def test_file_category(self):
+        """Test categories come from the auto-sort extensions."""
+        self.assertEqual(file_category("a.JPG"), "Images")
+        self.assertEqual(file_category("main.py"), "Code")
+        self.assertEqual(file_category("app.bin"), "Others")
+
+    def test_totals(self):
+        """Test subtree totals and file counts."""
+        report = analyze_disk_usage(self.root)
+        self.assertEqual(report.total_bytes, 35300)
+        self.assertEqual(report.file_count, 6)
+        self.assertEqual(report.totals[os.path.join(self.root, "photos")], 15000)
+        self.assertEqual(report.totals[os.path.join(self.root, "photos", "2023")], 7000)
+
+    def test_largest_dirs_and_files(self):
+        """Test the top-N answers."""
+        report = analyze_disk_usage(self.root)
+        dirs = report.largest_dirs(2)
+        self.assertEqual([os.path.basename(path) for path, _ in dirs], ["code", "build"])
+        files = report.largest_files(2)
+        self.assertEqual([(os.path.basename(path), size) for path, size in files],
+                         [("app.bin", 20000), ("c.jpg", 7000)])
+
+    def test_by_category(self):
+        """Test the size breakdown by category."""
+        categories = analyze_disk_usage(self.root).by_category()
+        self.assertEqual(categories, {"Others": 20000, "Images": 15000,
+                                      "Code": 200, "Documents": 100})
+        self.assertEqual(next(iter(categories)), "Others")
+
+    def test_rerun_only_lists_changed_directories(self):
+        """Test unchanged directories come from the cache."""
+        first = analyze_disk_usage(self.root)
+        self.assertEqual(first.rescanned, 5)
+
+        second = analyze_disk_usage(self.root)
+        self.assertEqual(second.rescanned, 0)
+        self.assertEqual(second.total_bytes, first.total_bytes)
+
+        self.write("photos/2023/d.jpg", 1000)
+        third = analyze_disk_usage(self.root)
+        self.assertEqual(third.rescanned, 1)
+        self.assertEqual(third.total_bytes, 36300)
+        self.assertEqual(third.totals[os.path.join(self.root, "photos")], 16000)
+
+    def test_removed_directories_leave_the_cache(self):
+        """Test deleted subtrees are dropped from the totals and the cache."""
+        analyze_disk_usage(self.root)
+        shutil.rmtree(os.path.join(self.root, "code"))
+        report = analyze_disk_usage(self.root)
+        self.assertEqual(report.total_bytes, 15100)
+        self.assertEqual(report.rescanned, 1)
+        self.assertNotIn(os.path.join(self.root, "code", "build"),
+                         self.db.get_dir_usage(self.root))
+
+    def test_summary(self):
+        """Test the spoken summary."""
+        message = disk_usage_summary(self.root)
+        self.assertIn(format_size(35300), message)
+        self.assertIn("largest folder is code", message)
+        self.assertIn("others", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+"""Tests for the duplicate file finder."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.duplicate_finder as duplicate_finder
+import utils.database as database
+from commands.duplicate_finder import (
+    PARTIAL_BYTES,
+    find_duplicate_files,
+    find_duplicates,
+    full_hash,
+    hardlink_duplicates,
+    partial_hash,
+    trash_duplicates,
+)
+from commands.recycle_bin import RecycleBin
+from utils.database import DatabaseManager
+from utils.retry import Transaction
+
+
+class TestDuplicateFinder(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "files")
+        os.makedirs(self.root)
+
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data):
+        """Create a file under the test root."""
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def test_small_duplicates(self):
+        """Test identical small files are grouped."""
+        a = self.write("a.txt", b"same content")
+        b = self.write("sub/b.txt", b"same content")
+        self.write("c.txt", b"different!!!")
+        result = find_duplicates(self.root)
+        self.assertEqual(result["groups"], [sorted([a, b])])
+        self.assertEqual(result["wasted_bytes"], len(b"same content"))
+        self.assertEqual(result["full_hashed"], 0)
+
+    def test_large_files_differing_in_the_middle(self):
+        """Test files with equal head and tail are told apart by the full hash."""
+        size = 3 * PARTIAL_BYTES
+        base = bytearray(os.urandom(size))
+        a = self.write("a.bin", bytes(base))
+        b = self.write("b.bin", bytes(base))
+        base[size // 2] ^= 0xFF
+        self.write("c.bin", bytes(base))
+
+        self.assertEqual(partial_hash(a, size), partial_hash(os.path.join(self.root, "c.bin"), size))
+        self.assertNotEqual(full_hash(a), full_hash(os.path.join(self.root, "c.bin")))
+        result = find_duplicates(self.root)
+        self.assertEqual(result["groups"], [[a, b]])
+        self.assertEqual(result["full_hashed"], 3)
+
+    def test_unique_sizes_are_never_read(self):
+        """Test files with a unique size are not hashed."""
+        self.write("a.txt", b"1")
+        self.write("b.txt", b"22")
+        result = find_duplicates(self.root)
+        self.assertEqual(result["partial_hashed"], 0)
+        self.assertEqual(result["groups"], [])
+
+    def test_rerun_uses_cache(self):
+        """Test a rerun only hashes changed files."""
+        data = os.urandom(3 * PARTIAL_BYTES)
+        self.write("a.bin", data)
+        b = self.write("b.bin", data)
+        first = find_duplicates(self.root)
+        self.assertEqual(first["full_hashed"], 2)
+
+        second = find_duplicates(self.root)
+        self.assertEqual(second["partial_hashed"], 0)
+        self.assertEqual(second["full_hashed"], 0)
+        self.assertEqual(second["groups"], first["groups"])
+
+        with open(b, "r+b") as f:
+            f.seek(PARTIAL_BYTES + 10)
+            f.write(b"changed")
+        os.utime(b, ns=(0, 10 ** 9))
+        third = find_duplicates(self.root)
+        self.assertEqual(third["partial_hashed"], 1)
+        self.assertEqual(third["full_hashed"], 1)
+        self.assertEqual(third["groups"], [])
+
+    def test_process_pool_hashing(self):
+        """Test full hashing through the process pool gives the same groups."""
+        data = os.urandom(3 * PARTIAL_BYTES)
+        a = self.write("a.bin", data)
+        b = self.write("b.bin", data)
+        with patch.object(duplicate_finder, "PROCESS_POOL_THRESHOLD", 0):
+            result = find_duplicates(self.root, processes=2, use_cache=False)
+        self.assertEqual(result["groups"], [[a, b]])
+
+    def test_hardlinks_are_not_duplicates(self):
+        """Test hardlinks of one file are reported once."""
+        a = self.write("a.txt", b"content")
+        os.link(a, os.path.join(self.root, "b.txt"))
+        self.assertEqual(find_duplicates(self.root)["groups"], [])
+
+    def test_hardlink_duplicates_and_rollback(self):
+        """Test deduplication links copies and rollback separates them again."""
+        a = self.write("a.txt", b"content")
+        b = self.write("b.txt", b"content")
+        os.chmod(b, 0o600)
+        transaction = Transaction()
+        result = hardlink_duplicates([[a, b]], transaction)
+        self.assertEqual(result, {"linked": 1, "skipped": 0, "bytes_saved": 7})
+        self.assertEqual(os.stat(a).st_ino, os.stat(b).st_ino)
+
+        transaction.rollback()
+        self.assertNotEqual(os.stat(a).st_ino, os.stat(b).st_ino)
+        self.assertEqual(os.stat(b).st_mode & 0o777, 0o600)
+        with open(b, "rb") as f:
+            self.assertEqual(f.read(), b"content")
+
+    def test_changed_files_are_not_linked(self):
+        """Test a file edited after hashing keeps its own contents."""
+        a = self.write("a.txt", b"content")
+        b = self.write("b.txt", b"content")
+        c = self.write("c.txt", b"content")
+        result = find_duplicates(self.root)
+        self.write("b.txt", b"edited!")
+        os.utime(b, ns=(0, 0))
+        with open(c, "ab") as f:
+            f.write(b" and more")
+        linked = hardlink_duplicates(result["groups"], stamps=result["stamps"])
+        self.assertEqual((linked["linked"], linked["skipped"]), (0, 2))
+        with open(b, "rb") as f:
+            self.assertEqual(f.read(), b"edited!")
+        self.assertNotEqual(os.stat(a).st_ino, os.stat(c).st_ino)
+
+    def test_trash_duplicates(self):
+        """Test deleting duplicates moves the copies to the recycle bin."""
+        recycle_bin = RecycleBin(os.path.join(self.test_dir, "bin"), db=self.db)
+        a = self.write("a.txt", b"content")
+        b = self.write("b.txt", b"content")
+        c = self.write("c.txt", b"content")
+        result = find_duplicates(self.root)
+        self.write("c.txt", b"changed")
+        transaction = Transaction()
+        with patch("commands.batch_operations.get_recycle_bin", return_value=recycle_bin):
+            trashed = trash_duplicates(result["groups"], transaction, result["stamps"])
+            self.assertEqual(trashed, {"trashed": 1, "skipped": 1, "bytes_freed": 7})
+            self.assertFalse(os.path.exists(b))
+            self.assertTrue(os.path.exists(a) and os.path.exists(c))
+            self.assertEqual([item["original_path"] for item in recycle_bin.list_items()], [b])
+            transaction.rollback()
+        self.assertTrue(os.path.exists(b))
+
+    def test_find_duplicate_files_message(self):
+        """Test the spoken summary."""
+        self.assertIn("No duplicate files", find_duplicate_files(self.root))
+        self.write("a.txt", b"content")
+        self.write("b.txt", b"content")
+        self.assertIn("1 group(s)", find_duplicate_files(self.root))
+        self.assertIn("Linked 1 copies", find_duplicate_files(self.root, deduplicate=True))
+        self.write("c.txt", b"content")
+        recycle_bin = RecycleBin(os.path.join(self.test_dir, "bin"), db=self.db)
+        with patch("commands.batch_operations.get_recycle_bin", return_value=recycle_bin):
+            message = find_duplicate_files(self.root, remove_copies=True)
+        self.assertIn("Moved 1 copies to the recycle bin", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
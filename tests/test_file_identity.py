@@ -0,0 +1,170 @@
+"""Tests for following files across renames and moves."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.file_manager as file_manager
+import utils.database as database
+from commands.file_manager import (
+    access_private_file,
+    mark_file_private,
+    move_item,
+    rename_item,
+    tag_manager,
+)
+from commands.file_versioning import VersionStore
+from commands.metadata_extractor import refresh_metadata
+from utils.database import DatabaseManager
+from utils.file_identity import IdentityMap, fingerprint, get_identity_map
+from utils.file_watcher import CREATED, DELETED, MODIFIED, ChangeEvent
+from utils.tag_index import TagIndex
+
+
+class TestFileIdentity(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = os.path.realpath(tempfile.mkdtemp())
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.index_patch = patch.object(tag_manager, "index", TagIndex())
+        self.index_patch.start()
+        self.private_patch = patch.dict(file_manager.private_files, clear=True)
+        self.private_patch.start()
+        self.identities = get_identity_map()
+        for name in ("report.txt", "docs/a.txt", "docs/sub/b.txt", "docs2/c.txt"):
+            self.write(name, name * 100)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.private_patch.stop()
+        self.index_patch.stop()
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def path(self, name):
+        """Build an absolute path inside the test folder."""
+        return os.path.join(self.test_dir, *name.split("/"))
+
+    def write(self, name, content):
+        """Write a file, creating its folder."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+    def test_rename_keeps_tags_and_metadata(self):
+        """Test a renamed file keeps its tags and metadata record."""
+        tag_manager.add_tag("report.txt", "work")
+        self.db.update_file_metadata(self.path("report.txt"), {"name": "report.txt", "size": 1})
+        self.assertTrue(rename_item("report.txt", "final.txt"))
+        self.assertEqual(tag_manager.get_tags_for_file("final.txt"), ["work"])
+        self.assertEqual(tag_manager.get_files_by_tag("work"), [self.path("final.txt")])
+        self.assertEqual(self.db.get_file_metadata(self.path("final.txt"))["name"], "final.txt")
+        self.assertIsNone(self.db.get_file_metadata(self.path("report.txt")))
+        # A fresh index reads the re-keyed rows
+        self.assertEqual(TagIndex().tags_for(self.path("final.txt")), ["work"])
+
+    def test_folder_move_rekeys_paths_below(self):
+        """Test moving a folder re-keys its files but not similarly named siblings."""
+        tag_manager.add_tag_to_files(["docs/a.txt", "docs/sub/b.txt", "docs2/c.txt"], "project")
+        self.db.add_auto_versioned_path(self.path("docs/sub"), 0)
+        os.mkdir(self.path("archive"))
+        self.assertTrue(move_item("docs", "archive"))
+        self.assertEqual(tag_manager.get_files_by_tag("project"), [
+            self.path("archive/docs/a.txt"),
+            self.path("archive/docs/sub/b.txt"),
+            self.path("docs2/c.txt"),
+        ])
+        self.assertEqual(self.db.get_auto_versioned_paths(), [self.path("archive/docs/sub")])
+
+    def test_external_rename_is_followed(self):
+        """Test a rename seen by the watcher moves the tags by inode."""
+        tag_manager.add_tag("report.txt", "work")
+        os.rename(self.path("report.txt"), self.path("moved.txt"))
+        moves = self.identities.apply_changes([
+            ChangeEvent(self.path("report.txt"), DELETED),
+            ChangeEvent(self.path("moved.txt"), CREATED),
+        ])
+        self.assertEqual(moves, 1)
+        self.assertEqual(tag_manager.get_tags_for_file("moved.txt"), ["work"])
+
+    def test_external_rename_keeps_versions_and_metadata(self):
+        """Test untagged files with versions or metadata are followed too."""
+        store = VersionStore(self.db)
+        store.save(self.path("report.txt"))
+        refresh_metadata(self.path("docs"))
+        self.write("report.txt", "edited")
+        os.rename(self.path("report.txt"), self.path("moved.txt"))
+        os.rename(self.path("docs/a.txt"), self.path("docs/renamed.txt"))
+        moves = self.identities.apply_changes([
+            ChangeEvent(self.path("report.txt"), DELETED),
+            ChangeEvent(self.path("moved.txt"), CREATED),
+            ChangeEvent(self.path("docs/a.txt"), DELETED),
+            ChangeEvent(self.path("docs/renamed.txt"), CREATED),
+        ])
+        self.assertEqual(moves, 2)
+        self.assertEqual(len(store.history(self.path("moved.txt"))), 1)
+        self.assertEqual(self.db.get_file_metadata(self.path("docs/renamed.txt"))["name"], "renamed.txt")
+        self.assertIsNone(self.db.get_file_metadata(self.path("docs/a.txt")))
+
+    def test_copy_then_delete_is_followed_by_fingerprint(self):
+        """Test a move that changes the inode is matched by contents."""
+        tag_manager.add_tag("report.txt", "work")
+        shutil.copy2(self.path("report.txt"), self.path("copy.txt"))
+        events = [ChangeEvent(self.path("copy.txt"), CREATED)]
+        # The original still exists: a copy is not a move
+        self.assertEqual(self.identities.apply_changes(events), 0)
+        os.remove(self.path("report.txt"))
+        events.insert(0, ChangeEvent(self.path("report.txt"), DELETED))
+        self.assertEqual(self.identities.apply_changes(events), 1)
+        self.assertEqual(tag_manager.get_tags_for_file("copy.txt"), ["work"])
+
+    def test_safe_save_retracks(self):
+        """Test replacing a file at the same path records its new inode."""
+        tag_manager.add_tag("report.txt", "work")
+        self.write("tmp.txt", "rewritten")
+        os.replace(self.path("tmp.txt"), self.path("report.txt"))
+        self.identities.apply_changes([ChangeEvent(self.path("report.txt"), MODIFIED)])
+        record = self.db.get_file_identity(self.path("report.txt"))
+        self.assertEqual(record["inode"], os.stat(self.path("report.txt")).st_ino)
+        self.assertEqual(record["fingerprint"], fingerprint(self.path("report.txt")))
+        self.assertEqual(tag_manager.get_tags_for_file("report.txt"), ["work"])
+
+    def test_private_marker_follows_rename(self):
+        """Test a private file stays private under its new name."""
+        mark_file_private("report.txt", "1234")
+        self.assertTrue(rename_item("report.txt", "secret.txt"))
+        self.assertEqual(access_private_file("secret.txt", "1234"), "Access granted to secret.txt.")
+        self.assertEqual(access_private_file("report.txt", "1234"), "File is not marked as private.")
+
+    def test_fingerprint_reads_both_ends(self):
+        """Test the fingerprint changes with the first and last bytes only."""
+        self.write("big.bin", "a" * 20000)
+        before = fingerprint(self.path("big.bin"))
+        self.write("big.bin", "a" * 10000 + "b" + "a" * 9999)
+        self.assertEqual(fingerprint(self.path("big.bin")), before)
+        self.write("big.bin", "a" * 19999 + "b")
+        self.assertNotEqual(fingerprint(self.path("big.bin")), before)
+
+    def test_listeners_receive_moves(self):
+        """Test move listeners get the pairs applied."""
+        identities = IdentityMap(self.db)
+        seen = []
+        identities.on_move(seen.append)
+        identities.moved_many([(self.path("a"), self.path("b")), (self.path("b"), self.path("c"))])
+        self.assertEqual(seen, [[(self.path("a"), self.path("b")), (self.path("b"), self.path("c"))]])
+
+
+if __name__ == "__main__":
+    unittest.main()
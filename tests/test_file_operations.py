@@ -5,7 +5,10 @@ import tempfile
 from pathlib import Path
 import time
 from typing import List
+from unittest.mock import patch
 
+import commands.file_manager as file_manager
+import utils.database as database
 from commands.file_manager import (
     create_folder,
     delete_file_or_folder,
@@ -14,20 +17,37 @@ from commands.file_manager import (
     copy_item,
     search_files,
 )
-from utils.database import get_db_manager
+from commands.recycle_bin import RecycleBin
+from utils.database import DatabaseManager
 from utils.retry import Transaction, transactional, retry
 
 
-class TestFileOperations(unittest.TestCase):
+class IsolatedTestCase(unittest.TestCase):
+    """Runs each test against a temporary database and recycle bin."""
+
     def setUp(self):
         """Set up test environment"""
         self.test_dir = tempfile.mkdtemp()
-        self.db = get_db_manager()
+        # Keep the database and recycle bin out of the working directory
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.bin = RecycleBin(os.path.join(self.test_dir, ".recycle_bin"), db=self.db)
+        self.bin_patch = patch.object(file_manager, "get_recycle_bin", return_value=self.bin)
+        self.bin_patch.start()
 
     def tearDown(self):
         """Clean up test environment"""
+        self.bin_patch.stop()
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
         shutil.rmtree(self.test_dir)
 
+
+class TestFileOperations(IsolatedTestCase):
     def create_test_files(self, count: int) -> List[str]:
         """Create test files"""
         files = []
@@ -123,14 +143,7 @@ class TestFileOperations(unittest.TestCase):
         self.assertEqual(attempts, 3)
 
 
-class TestFileOperationsPerformance(unittest.TestCase):
-    def setUp(self):
-        self.test_dir = tempfile.mkdtemp()
-        self.db = get_db_manager()
-
-    def tearDown(self):
-        shutil.rmtree(self.test_dir)
-
+class TestFileOperationsPerformance(IsolatedTestCase):
     def test_large_directory_performance(self):
         """Test performance with large directory"""
         start_time = time.time()
@@ -0,0 +1,128 @@
+"""Tests for the file query engine."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.file_query import FileQuery, IgnoreRules, PathPattern, find_files
+
+
+class TestPathPattern(unittest.TestCase):
+    def test_basename_pattern_matches_at_any_depth(self):
+        """Test patterns without a slash match the name anywhere."""
+        pattern = PathPattern("*.log")
+        self.assertTrue(pattern.matches("app.log"))
+        self.assertTrue(pattern.matches("logs/2024/app.log"))
+        self.assertFalse(pattern.matches("app.log.txt"))
+
+    def test_anchored_pattern(self):
+        """Test patterns with a slash are anchored to the base."""
+        pattern = PathPattern("/build")
+        self.assertTrue(pattern.matches("build", is_dir=True))
+        self.assertFalse(pattern.matches("src/build", is_dir=True))
+        self.assertTrue(PathPattern("docs/*.md").matches("docs/a.md"))
+        self.assertFalse(PathPattern("docs/*.md").matches("docs/sub/a.md"))
+
+    def test_double_star(self):
+        """Test ** matches any number of directories."""
+        self.assertTrue(PathPattern("**/*.pdf").matches("a.pdf"))
+        self.assertTrue(PathPattern("**/*.pdf").matches("a/b/c.pdf"))
+        self.assertTrue(PathPattern("src/**/test_*.py").matches("src/test_a.py"))
+        self.assertTrue(PathPattern("src/**/test_*.py").matches("src/x/y/test_a.py"))
+        self.assertTrue(PathPattern("out/**").matches("out/a/b"))
+
+    def test_dir_only(self):
+        """Test a trailing slash only matches directories."""
+        pattern = PathPattern("cache/")
+        self.assertTrue(pattern.matches("cache", is_dir=True))
+        self.assertFalse(pattern.matches("cache", is_dir=False))
+
+    def test_negation_last_match_wins(self):
+        """Test a later negated rule re-includes a path."""
+        rules = IgnoreRules(["*.log", "!keep.log", "# comment", ""])
+        self.assertTrue(rules.match("debug.log"))
+        self.assertFalse(rules.match("keep.log"))
+        self.assertIsNone(rules.match("notes.txt"))
+
+
+class TestFileQuery(unittest.TestCase):
+    def setUp(self):
+        """Set up a small project tree."""
+        self.test_dir = tempfile.mkdtemp()
+        for rel in [
+            "main.py",
+            "notes.txt",
+            "debug.log",
+            ".git/objects/ab/cdef",
+            "node_modules/pkg/index.js",
+            "env/pyvenv.cfg",
+            "env/lib/site.py",
+            "src/app.py",
+            "src/build/out.py",
+            "src/keep.log",
+            "docs/guide.md",
+        ]:
+            path = os.path.join(self.test_dir, rel)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(rel)
+        with open(os.path.join(self.test_dir, ".jarvisignore"), "w") as f:
+            f.write("*.log\n")
+        with open(os.path.join(self.test_dir, "src", ".gitignore"), "w") as f:
+            f.write("build/\n!keep.log\n")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        shutil.rmtree(self.test_dir)
+
+    def rel_files(self, query: FileQuery):
+        """Walk the tree and return sorted relative file paths."""
+        return sorted(rel for rel, _ in query.walk(self.test_dir))
+
+    def test_default_excludes_and_ignore_files(self):
+        """Test VCS folders, node_modules, virtualenvs and ignored files are skipped."""
+        files = self.rel_files(FileQuery())
+        self.assertEqual(files, [
+            ".jarvisignore",
+            "docs/guide.md",
+            "main.py",
+            "notes.txt",
+            "src/.gitignore",
+            "src/app.py",
+            "src/keep.log",
+        ])
+
+    def test_pruned_dirs_are_not_scanned(self):
+        """Test excluded directories are never listed."""
+        query = FileQuery()
+        list(query.walk(self.test_dir))
+        # root, docs, src, and env (scanned once to detect pyvenv.cfg)
+        self.assertEqual(query.stats["dirs"], 4)
+
+    def test_include_patterns(self):
+        """Test include globs select files."""
+        files = self.rel_files(FileQuery(include=["**/*.py"]))
+        self.assertEqual(files, ["main.py", "src/app.py"])
+
+    def test_extra_excludes(self):
+        """Test caller-supplied exclusions."""
+        files = self.rel_files(FileQuery(include=["*.md", "*.py"], exclude=["docs/"]))
+        self.assertEqual(files, ["main.py", "src/app.py"])
+
+    def test_without_default_excludes(self):
+        """Test everything is walked when defaults and ignore files are off."""
+        files = find_files(self.test_dir, use_default_excludes=False, ignore_files=())
+        self.assertEqual(len(files), 13)
+
+    def test_non_recursive(self):
+        """Test walking a single directory."""
+        files = self.rel_files(FileQuery(include=["*.py", "*.txt"]))
+        top = sorted(rel for rel, _ in FileQuery(include=["*.py", "*.txt"]).walk(
+            self.test_dir, recursive=False))
+        self.assertEqual(top, ["main.py", "notes.txt"])
+        self.assertIn("src/app.py", files)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,14 +1,22 @@
 """Tests for file tagging functionality."""
 
 import os
-import json
 import pytest
 from pathlib import Path
+import commands.file_manager as file_manager
+import utils.database as database
 from commands.file_manager import tag_file, get_files_by_tag, TAG_FILE
+from utils.database import DatabaseManager
+from utils.tag_index import TagIndex
 
 @pytest.fixture
-def cleanup():
-    """Clean up test files after each test."""
+def cleanup(tmp_path, monkeypatch):
+    """Use a temporary database and clean up test files after each test."""
+    monkeypatch.setattr(DatabaseManager, "_instance", None)
+    monkeypatch.setattr(DatabaseManager, "_initialized", False)
+    db = DatabaseManager(db_path=str(tmp_path / "test.db"))
+    monkeypatch.setattr(database, "_db_manager", db)
+    monkeypatch.setattr(file_manager.tag_manager, "index", TagIndex(db))
     yield
     if os.path.exists(TAG_FILE):
         os.remove(TAG_FILE)
@@ -25,11 +33,9 @@ def test_tag_file(cleanup):
     result = tag_file("test_file.txt", "important")
     assert "Tagged" in result
     
-    # Verify tag was saved
-    with open(TAG_FILE, "r") as f:
-        tags = json.load(f)
-    assert "important" in tags
-    assert any("test_file.txt" in path for path in tags["important"])
+    # Verify tag was saved to the tag index
+    tags = TagIndex().tags_for(str(Path("test_file.txt").resolve()))
+    assert tags == ["important"]
 
 def test_get_files_by_tag(cleanup):
     """Test retrieving files by tag."""
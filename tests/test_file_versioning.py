@@ -3,9 +3,23 @@
 import os
 import shutil
 import tempfile
+import time
 import unittest
 from datetime import datetime
-from commands.file_versioning import save_version, list_versions, restore_version, VERSION_FOLDER
+from unittest.mock import patch
+
+import utils.database as database
+from commands.file_versioning import (
+    CHUNK_FOLDER,
+    VERSION_FOLDER,
+    VersionStore,
+    expired_versions,
+    get_version_store,
+    list_versions,
+    restore_version,
+    save_version,
+)
+from utils.database import DatabaseManager
 
 class TestFileVersioning(unittest.TestCase):
     def setUp(self):
@@ -14,6 +28,12 @@ class TestFileVersioning(unittest.TestCase):
         self.original_cwd = os.getcwd()
         os.chdir(self.test_dir)
         
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+
         # Create test file
         self.test_file = "test_file.txt"
         with open(self.test_file, "w") as f:
@@ -21,6 +41,9 @@ class TestFileVersioning(unittest.TestCase):
 
     def tearDown(self):
         """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
         os.chdir(self.original_cwd)
         shutil.rmtree(self.test_dir)
 
@@ -33,12 +56,10 @@ class TestFileVersioning(unittest.TestCase):
         """Test saving a file version."""
         result = save_version(self.test_file)
         self.assertIn("Version saved:", result)
-        
-        # Verify version folder exists
-        self.assertTrue(os.path.exists(VERSION_FOLDER))
-        
-        # Verify version file exists
-        versions = os.listdir(VERSION_FOLDER)
+
+        # Verify the version is indexed and its contents stored
+        self.assertTrue(os.path.exists(CHUNK_FOLDER))
+        versions = list_versions(self.test_file)
         self.assertEqual(len(versions), 1)
         self.assertTrue(versions[0].startswith("test_file.txt_"))
 
@@ -61,7 +82,8 @@ class TestFileVersioning(unittest.TestCase):
         self.assertEqual(len(versions), 2)
         for version in versions:
             self.assertTrue(version.startswith("test_file.txt_"))
-            self.assertTrue(len(version.split("_")[-1]) == 14)  # timestamp length
+            self.assertTrue(version.split("_")[-1].isdigit())  # nanosecond version id
+        self.assertLess(versions[0], versions[1])
 
     def test_restore_version(self):
         """Test restoring a file version."""
@@ -86,4 +108,75 @@ class TestFileVersioning(unittest.TestCase):
     def test_restore_nonexistent_version(self):
         """Test restoring a nonexistent version."""
         result = restore_version(self.test_file, "20240101000000")
-        self.assertIn("version not found", result.lower()) 
\ No newline at end of file
+        self.assertIn("version not found", result.lower()) 
+
+    def test_versions_share_chunks(self):
+        """Test a small edit to a large file only stores the changed chunks."""
+        data = os.urandom(2 * 1024 * 1024)
+        with open(self.test_file, "wb") as f:
+            f.write(data)
+        save_version(self.test_file)
+        with open(self.test_file, "r+b") as f:
+            f.seek(1_000_000)
+            f.write(b"small edit")
+        result = save_version(self.test_file)
+        self.assertRegex(result, r"\((1|2) of \d+ chunk\(s\) new")
+
+        first = list_versions(self.test_file)[0]
+        self.assertIn("restored successfully",
+                      restore_version(self.test_file, first.split("_")[-1]).lower())
+        with open(self.test_file, "rb") as f:
+            self.assertEqual(f.read(), data)
+
+    def test_restore_plain_copy_version(self):
+        """Test versions saved as whole copies are still restored."""
+        os.makedirs(VERSION_FOLDER)
+        with open(os.path.join(VERSION_FOLDER, "test_file.txt_20200101000000"), "w") as f:
+            f.write("old copy")
+        result = restore_version(self.test_file, "20200101000000")
+        self.assertIn("restored successfully", result.lower())
+        with open(self.test_file) as f:
+            self.assertEqual(f.read(), "old copy")
+
+    def test_same_second_versions_and_positions(self):
+        """Test versions saved at once get distinct ids and can be picked by position."""
+        start = time.monotonic()
+        for content in ("one", "two", "three"):
+            with open(self.test_file, "w") as f:
+                f.write(content)
+            save_version(self.test_file)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertEqual(len(set(list_versions(self.test_file))), 3)
+        self.assertIn("restored successfully", restore_version(self.test_file, "2").lower())
+        with open(self.test_file) as f:
+            self.assertEqual(f.read(), "two")
+        self.assertEqual(restore_version(self.test_file, "4"), "Version not found.")
+
+    def test_retention_policy(self):
+        """Test old versions are thinned out to one per hour, then per day."""
+        hour, day = 3600 * 10 ** 9, 24 * 3600 * 10 ** 9
+        now = 100 * day
+        ages = [0, hour // 2, 2 * day, 2 * day + hour // 4, 2 * day + hour // 2,
+                10 * day - hour, 10 * day, 40 * day]
+        versions = sorted((now - age, "/a") for age in ages) + [(now - 50 * day, "/b")]
+        expired = expired_versions(versions, now)
+        # Within a day: all kept; within a week: the newest per clock hour;
+        # within a month: the newest per day; older: deleted, unless it is
+        # the newest version of its file
+        self.assertEqual(sorted(expired), sorted([
+            now - 2 * day - hour // 2, now - 10 * day, now - 40 * day,
+        ]))
+
+    def test_collect_garbage_deletes_unused_chunks(self):
+        """Test chunks of expired versions are deleted and others kept."""
+        store = VersionStore()
+        for content in (b"a" * 100_000, os.urandom(100_000)):
+            with open(self.test_file, "wb") as f:
+                f.write(content)
+            store.save(self.test_file)
+        first = store.history(self.test_file)[0]["version_id"]
+        with patch("commands.file_versioning.CHUNK_GRACE_SECONDS", -60):
+            result = store.collect_garbage(now_ns=first + 365 * 24 * 3600 * 10 ** 9)
+        self.assertEqual((result["versions"], result["chunks"]), (1, 1))
+        self.assertEqual(len(store.history(self.test_file)), 1)
+        self.assertIn("restored successfully", restore_version(self.test_file, "1").lower())
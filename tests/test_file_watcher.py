@@ -0,0 +1,210 @@
+"""Tests for the file change event bus."""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from utils.file_watcher import (
+    CREATED,
+    DELETED,
+    MODIFIED,
+    ChangeEvent,
+    FileWatcher,
+    InotifyBackend,
+    PollingBackend,
+    coalesce,
+)
+
+
+def inotify_available():
+    """Check whether an inotify instance can be opened here."""
+    try:
+        InotifyBackend().close()
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class Collector:
+    """Subscriber recording the events it receives."""
+
+    def __init__(self):
+        self.events = []
+        self.batches = 0
+        self.changed = threading.Condition()
+
+    def __call__(self, events):
+        with self.changed:
+            self.events.extend(events)
+            self.batches += 1
+            self.changed.notify_all()
+
+    def wait_for(self, predicate, timeout=5.0):
+        """Wait until the received events satisfy a predicate."""
+        with self.changed:
+            return self.changed.wait_for(lambda: predicate(self.events), timeout)
+
+    def kinds(self):
+        """Map each reported path to its latest kind."""
+        return {event.path: event.kind for event in self.events}
+
+
+class TestFileWatcher(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "watched")
+        os.makedirs(os.path.join(self.root, "sub"))
+        self.watchers = []
+
+    def tearDown(self):
+        """Clean up test environment."""
+        for watcher in self.watchers:
+            watcher.stop()
+        shutil.rmtree(self.test_dir)
+
+    def path(self, *parts):
+        """Build a path inside the watched folder."""
+        return os.path.join(self.root, *parts)
+
+    def write(self, name, content="data"):
+        """Write a file inside the watched folder."""
+        with open(self.path(name), "w") as f:
+            f.write(content)
+
+    def watcher(self, backend):
+        """Create a fast watcher that is stopped on teardown."""
+        watcher = FileWatcher(debounce=0.05, max_delay=1.0, backend=backend)
+        self.watchers.append(watcher)
+        return watcher
+
+    @staticmethod
+    def kind_map(events):
+        """Map each reported path to its latest kind."""
+        return {event.path: event.kind for event in events}
+
+    def test_coalesce(self):
+        """Test kinds seen for one path merge into what changed overall."""
+        self.assertEqual(coalesce(None, CREATED), CREATED)
+        self.assertEqual(coalesce(CREATED, MODIFIED), CREATED)
+        self.assertIsNone(coalesce(CREATED, DELETED))
+        self.assertEqual(coalesce(DELETED, CREATED), MODIFIED)
+        self.assertEqual(coalesce(MODIFIED, DELETED), DELETED)
+
+    def test_polling_backend(self):
+        """Test polling reports created, modified and deleted files."""
+        self.write("old.txt")
+        backend = PollingBackend(interval=0)
+        backend.add_root(self.root)
+        self.assertEqual(backend.read(0), [])
+        self.write("new.txt")
+        self.write("old.txt", "longer contents")
+        os.rmdir(self.path("sub"))
+        events = {event.path: event.kind for event in backend.read(0)}
+        self.assertEqual(events, {self.path("new.txt"): CREATED,
+                                  self.path("old.txt"): MODIFIED,
+                                  self.path("sub"): DELETED})
+        backend.close()
+
+    def test_polling_watcher_delivers_batches(self):
+        """Test the polling fallback feeds subscribers."""
+        collector = Collector()
+        watcher = self.watcher(PollingBackend(interval=0.05))
+        watcher.subscribe(self.root, collector)
+        self.write("a.txt")
+        self.assertTrue(collector.wait_for(lambda events: any(
+            e.path == self.path("a.txt") for e in events)))
+
+    @unittest.skipUnless(inotify_available(), "inotify is not available")
+    def test_inotify_debounces_and_coalesces(self):
+        """Test a burst of writes arrives as one coalesced batch."""
+        collector = Collector()
+        watcher = self.watcher(InotifyBackend())
+        watcher.subscribe(self.root, collector)
+        for i in range(20):
+            self.write("burst.txt", "x" * i)
+        self.write("temp.txt")
+        os.remove(self.path("temp.txt"))
+        self.assertTrue(collector.wait_for(lambda events: events))
+        time.sleep(0.2)
+        self.assertEqual(collector.batches, 1)
+        self.assertEqual(collector.events, [ChangeEvent(self.path("burst.txt"), CREATED)])
+
+    @unittest.skipUnless(inotify_available(), "inotify is not available")
+    def test_inotify_new_directories_are_watched(self):
+        """Test files inside newly created folders are reported."""
+        collector = Collector()
+        watcher = self.watcher(InotifyBackend())
+        watcher.subscribe(self.root, collector)
+        os.makedirs(self.path("new", "deeper"))
+        self.write(os.path.join("new", "deeper", "file.txt"))
+        self.assertTrue(collector.wait_for(
+            lambda events: self.path("new", "deeper", "file.txt") in self.kind_map(events)))
+        self.write(os.path.join("sub", "later.txt"))
+        self.assertTrue(collector.wait_for(
+            lambda events: self.path("sub", "later.txt") in self.kind_map(events)))
+
+    @unittest.skipUnless(inotify_available(), "inotify is not available")
+    def test_shared_watches_and_filters(self):
+        """Test subscribers share kernel watches and get only matching events."""
+        backend = InotifyBackend()
+        watcher = self.watcher(backend)
+        everything, python = Collector(), Collector()
+        first = watcher.subscribe(self.root, everything)
+        watches = dict(backend.watches)
+        self.assertEqual(set(watches), {self.root, self.path("sub")})
+        second = watcher.subscribe(self.path("sub"), python, patterns=["*.py"])
+        self.assertEqual(backend.watches, watches)
+
+        self.write(os.path.join("sub", "script.py"))
+        self.write(os.path.join("sub", "notes.txt"))
+        self.assertTrue(everything.wait_for(lambda events: len(events) == 2))
+        self.assertTrue(python.wait_for(lambda events: events))
+        self.assertEqual([e.path for e in python.events], [self.path("sub", "script.py")])
+
+        # The nested folder stays watched while the outer subscription lives
+        watcher.unsubscribe(second)
+        self.assertEqual(backend.watches, watches)
+        watcher.unsubscribe(first)
+        self.assertIsNone(watcher._thread)
+
+    def test_roots_change_while_polling(self):
+        """Test adding roots during polls neither kills the thread nor reports old files."""
+        other = os.path.join(self.test_dir, "other")
+        os.makedirs(other)
+        for i in range(200):
+            open(os.path.join(other, "%d.txt" % i), "w").close()
+        watcher = self.watcher(PollingBackend(interval=0))
+        watcher.subscribe(self.root, Collector())
+        collector = Collector()
+        for _ in range(20):
+            watcher.unsubscribe(watcher.subscribe(other, collector))
+        watcher.subscribe(other, collector)
+        time.sleep(0.2)
+        self.assertTrue(watcher._thread.is_alive())
+        self.assertEqual(collector.events, [])
+        open(os.path.join(other, "new.txt"), "w").close()
+        self.assertTrue(collector.wait_for(lambda events: events))
+        self.assertEqual(collector.kinds(), {os.path.join(other, "new.txt"): CREATED})
+
+    def test_failing_subscriber_does_not_stop_others(self):
+        """Test an exception in one callback does not block delivery."""
+        collector = Collector()
+        watcher = self.watcher(PollingBackend(interval=60))
+
+        def broken(events):
+            raise RuntimeError("boom")
+
+        watcher.subscribe(self.root, broken)
+        watcher.subscribe(self.root, collector)
+        watcher._queue([ChangeEvent(self.path("x.txt"), CREATED)])
+        watcher.flush()
+        self.assertTrue(collector.wait_for(lambda events: events))
+        self.assertEqual(collector.kinds(), {self.path("x.txt"): CREATED})
+
+
+if __name__ == "__main__":
+    unittest.main()
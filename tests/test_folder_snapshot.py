@@ -0,0 +1,152 @@
+"""Tests for hard link farm folder snapshots."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.folder_snapshot as folder_snapshot
+import utils.database as database
+from commands.folder_snapshot import (
+    SNAPSHOT_FOLDER,
+    create_snapshot,
+    describe_snapshots,
+    list_snapshots,
+    restore_folder_snapshot,
+    restore_snapshot,
+    snapshot_folder,
+)
+from commands.file_versioning import CHUNK_FOLDER, VersionStore
+from commands.recycle_bin import RecycleBin
+from utils.database import DatabaseManager
+
+
+class TestFolderSnapshot(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.bin = RecycleBin(os.path.join(self.test_dir, ".recycle_bin"), db=self.db)
+        self.bin_patch = patch.object(folder_snapshot, "get_recycle_bin", return_value=self.bin)
+        self.bin_patch.start()
+        self.root = os.path.join(self.test_dir, "project")
+        for name in ("a.txt", "src/main.py", "src/lib/util.py", "docs/readme.md"):
+            self.write(name)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.bin_patch.stop()
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def path(self, name):
+        """Build a path inside the project."""
+        return os.path.join(self.root, *name.split("/"))
+
+    def write(self, name, content=None):
+        """Write a file whose contents default to its own name."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content if content is not None else name)
+
+    def read(self, name):
+        """Read a project file."""
+        with open(self.path(name)) as f:
+            return f.read()
+
+    def test_unchanged_files_are_hard_linked(self):
+        """Test a second snapshot links unchanged files and copies changed ones."""
+        first = create_snapshot(self.root)
+        self.assertEqual((first["files"], first["linked"], first["copied"]), (4, 0, 4))
+        self.write("src/main.py", "print('changed')")
+        second = create_snapshot(self.root)
+        self.assertEqual((second["files"], second["linked"], second["copied"]), (4, 3, 1))
+        self.assertEqual(second["bytes_copied"], len("print('changed')"))
+
+        old_util = os.stat(os.path.join(first["path"], "src", "lib", "util.py"))
+        new_util = os.stat(os.path.join(second["path"], "src", "lib", "util.py"))
+        self.assertEqual(old_util.st_ino, new_util.st_ino)
+        with open(os.path.join(first["path"], "src", "main.py")) as f:
+            self.assertEqual(f.read(), "src/main.py")
+        # The source is never linked into a snapshot
+        self.assertEqual(os.stat(self.path("a.txt")).st_nlink, 1)
+
+    def test_snapshot_store_inside_folder_is_skipped(self):
+        """Test snapshotting the workspace does not copy earlier snapshots."""
+        create_snapshot(self.test_dir)
+        result = create_snapshot(self.test_dir)
+        snapshot_root = os.path.join(result["path"], SNAPSHOT_FOLDER)
+        self.assertFalse(os.path.exists(snapshot_root))
+        self.assertEqual(result["copied"] + result["linked"], result["files"])
+
+    def test_restore(self):
+        """Test restoring undoes edits, deletions and additions."""
+        create_snapshot(self.root)
+        self.write("a.txt", "edited")
+        os.remove(self.path("src/lib/util.py"))
+        self.write("new.txt")
+        self.write("extra/deep/file.txt")
+        snapshot = list_snapshots(self.root)[0]
+        result = restore_snapshot(self.root, snapshot)
+        self.assertEqual(result, {"restored": 2, "unchanged": 2, "removed": 2, "errors": 0})
+        self.assertEqual(self.read("a.txt"), "a.txt")
+        self.assertEqual(self.read("src/lib/util.py"), "src/lib/util.py")
+        self.assertFalse(os.path.exists(self.path("new.txt")))
+        self.assertFalse(os.path.exists(self.path("extra")))
+        self.assertEqual(len(self.bin.list_items()), 2)
+        # Restored files are copies: editing them leaves the snapshot intact
+        self.write("a.txt", "edited again")
+        with open(os.path.join(snapshot["path"], "a.txt")) as f:
+            self.assertEqual(f.read(), "a.txt")
+
+    def test_workspace_restore_keeps_app_state(self):
+        """Test restoring the workspace leaves the database and chunk store alone."""
+        store = VersionStore()
+        notes = self.path("notes.txt")
+        self.write("notes.txt", "first")
+        store.save(notes)
+        snapshot_folder(".")
+        snapshot = list_snapshots(".")[0]
+        self.assertFalse(os.path.exists(os.path.join(snapshot["path"], "test.db")))
+        self.assertFalse(os.path.exists(os.path.join(snapshot["path"], CHUNK_FOLDER)))
+
+        self.write("notes.txt", "second")
+        store.save(notes)
+        self.assertIn("restored", restore_folder_snapshot(".", "1"))
+        self.assertEqual(self.read("notes.txt"), "first")
+        self.assertEqual(len(store.history(notes)), 2)
+        store.restore(store.find(notes, "2"), notes)
+        self.assertEqual(self.read("notes.txt"), "second")
+
+    def test_prune_keeps_newest(self):
+        """Test snapshots beyond the limit are deleted oldest first."""
+        with patch.object(folder_snapshot, "MAX_FOLDER_SNAPSHOTS", 2):
+            paths = [create_snapshot(self.root)["path"] for _ in range(3)]
+        self.assertEqual([s["path"] for s in list_snapshots(self.root)], paths[1:])
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertEqual(self.read("a.txt"), "a.txt")
+
+    def test_messages(self):
+        """Test the spoken messages."""
+        self.assertIn("no snapshots", describe_snapshots(self.root))
+        self.assertIn("4 file(s)", snapshot_folder(self.root))
+        self.assertIn("1. ", describe_snapshots(self.root))
+        self.assertEqual(restore_folder_snapshot(self.root, "2"), "Snapshot not found.")
+        self.write("a.txt", "edited")
+        self.assertIn("1 file(s) restored", restore_folder_snapshot(self.root, "1"))
+        self.assertIn("not a folder", snapshot_folder(self.path("a.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+"""Tests for one-way folder sync."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.folder_sync as folder_sync
+import utils.database as database
+from commands.folder_sync import compute_delta, delta_copy, sync_folder, sync_folders
+from utils.database import DatabaseManager
+
+
+def rebuild(ops, source, target):
+    """Rebuild the new file from delta operations."""
+    return b"".join(
+        source[op.position:op.position + op.length] if op.old_offset == -1
+        else target[op.old_offset:op.old_offset + op.length]
+        for op in ops
+    )
+
+
+class TestFolderSync(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.test_dir, "source")
+        self.target = os.path.join(self.test_dir, "backup")
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.rng = random.Random(7)
+
+        self.files = {
+            "notes.txt": b"remember the milk\n",
+            "docs/report.md": b"# Report\n" * 100,
+            "docs/deep/data.bin": self.rng.randbytes(20000),
+        }
+        for name, data in self.files.items():
+            self.write(name, data)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data):
+        """Write a file in the source folder."""
+        path = os.path.join(self.source, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def read_target(self, name):
+        """Read a file from the target folder."""
+        with open(os.path.join(self.target, name), "rb") as f:
+            return f.read()
+
+    def test_compute_delta_in_place_edit(self):
+        """Test an edit within a block only leaves that block literal."""
+        old = self.rng.randbytes(64 * 1024)
+        new = bytearray(old)
+        new[20000:20010] = b"x" * 10
+        new = bytes(new)
+        ops = compute_delta(new, old, block_size=4096)
+        self.assertEqual(rebuild(ops, new, old), new)
+        literal = sum(op.length for op in ops if op.old_offset == -1)
+        self.assertEqual(literal, 4096)
+        self.assertTrue(all(op.old_offset in (-1, op.position) for op in ops))
+
+    def test_compute_delta_shifted_data(self):
+        """Test blocks are found again after an insertion shifts them."""
+        old = self.rng.randbytes(64 * 1024)
+        new = old[:10000] + b"inserted text" + old[10000:]
+        ops = compute_delta(new, old, block_size=4096)
+        self.assertEqual(rebuild(ops, new, old), new)
+        literal = sum(op.length for op in ops if op.old_offset == -1)
+        self.assertLess(literal, 2 * 4096)
+
+    def test_compute_delta_unrelated_data(self):
+        """Test a file with nothing in common is all literal."""
+        old, new = self.rng.randbytes(30000), self.rng.randbytes(30001)
+        with patch.object(folder_sync, "SEARCH_LIMIT", 5000):
+            ops = compute_delta(new, old, block_size=1024)
+        self.assertEqual(ops, [folder_sync.DeltaOp(0, len(new), -1)])
+
+    def test_delta_copy_writes_changed_blocks(self):
+        """Test delta copies read only changed blocks and replace the copy whole."""
+        old = self.rng.randbytes(256 * 1024)
+        target = os.path.join(self.test_dir, "copy.bin")
+        with open(target, "wb") as f:
+            f.write(old)
+
+        edited = old[:100000] + b"EDIT" + old[100004:] + b"tail"
+        source = self.write("big.bin", edited)
+        inode = os.stat(target).st_ino
+        result = delta_copy(source, target, block_size=8192)
+        self.assertEqual(result["bytes_copied"], 8192 + 4)
+        self.assertEqual(result["bytes_written"], len(edited))
+        # A new file was renamed over the copy; the old one was not patched
+        self.assertNotEqual(os.stat(target).st_ino, inode)
+        self.assertFalse(os.path.exists(target + folder_sync.TEMP_SUFFIX))
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), edited)
+
+        shifted = b"header" + edited[:-50000]
+        self.write("big.bin", shifted)
+        result = delta_copy(source, target, block_size=8192)
+        self.assertGreater(result["bytes_matched"], len(shifted) - 2 * 8192)
+        with open(target, "rb") as f:
+            self.assertEqual(f.read(), shifted)
+
+    def test_first_and_second_sync(self):
+        """Test a second sync only transfers what changed."""
+        first = sync_folders(self.source, self.target)
+        self.assertEqual(first["copied"], 3)
+        for name, data in self.files.items():
+            self.assertEqual(self.read_target(name), data)
+
+        second = sync_folders(self.source, self.target)
+        self.assertEqual((second["copied"], second["updated"], second["unchanged"]), (0, 0, 3))
+        self.assertEqual(second["bytes_copied"], 0)
+
+        path = self.write("notes.txt", b"remember the eggs\n")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+        self.write("new.txt", b"new")
+        third = sync_folders(self.source, self.target)
+        self.assertEqual((third["copied"], third["updated"], third["unchanged"]), (1, 1, 2))
+        self.assertEqual(self.read_target("notes.txt"), b"remember the eggs\n")
+
+    def test_large_files_use_delta(self):
+        """Test changed files above the threshold are delta-transferred."""
+        data = self.rng.randbytes(200 * 1024)
+        path = self.write("video.raw", data)
+        with patch.object(folder_sync, "DELTA_THRESHOLD", 100 * 1024):
+            sync_folders(self.source, self.target)
+            with open(path, "r+b") as f:
+                f.seek(1000)
+                f.write(b"changed")
+            os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 10**9))
+            result = sync_folders(self.source, self.target)
+        self.assertEqual(result["delta_files"], 1)
+        self.assertEqual(result["bytes_copied"], folder_sync.BLOCK_SIZE)
+        self.assertEqual(self.read_target("video.raw"), open(path, "rb").read())
+
+    def test_deleted_files_are_removed(self):
+        """Test files removed from the source are removed from the target only if synced."""
+        sync_folders(self.source, self.target)
+        with open(os.path.join(self.target, "mine.txt"), "wb") as f:
+            f.write(b"not from the source")
+        shutil.rmtree(os.path.join(self.source, "docs"))
+        result = sync_folders(self.source, self.target)
+        self.assertEqual(result["deleted"], 2)
+        self.assertFalse(os.path.exists(os.path.join(self.target, "docs", "deep")))
+        self.assertTrue(os.path.exists(os.path.join(self.target, "mine.txt")))
+        self.assertEqual(self.db.get_sync_manifest(self.source, self.target).keys(),
+                         {"notes.txt"})
+
+    def test_target_changes_are_repaired(self):
+        """Test a copy deleted from the target is written again."""
+        sync_folders(self.source, self.target)
+        os.remove(os.path.join(self.target, "notes.txt"))
+        result = sync_folders(self.source, self.target)
+        self.assertEqual(result["updated"], 1)
+        self.assertEqual(self.read_target("notes.txt"), self.files["notes.txt"])
+
+    def test_target_inside_source(self):
+        """Test a backup inside its own source is not copied into itself."""
+        target = os.path.join(self.source, "backup")
+        sync_folders(self.source, target)
+        sync_folders(self.source, target)
+        self.assertFalse(os.path.exists(os.path.join(target, "backup")))
+
+    def test_sync_folder_messages(self):
+        """Test the command messages."""
+        message = sync_folder(self.source, self.target)
+        self.assertIn("3 new, 0 updated, 0 removed, 0 unchanged", message)
+        self.assertIn("not a folder", sync_folder(os.path.join(self.test_dir, "nope"),
+                                                  self.target))
+        self.assertIn("same folder", sync_folder(self.source, self.source))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests for the fuzzy file name resolver."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.fuzzy_resolver as fuzzy_resolver
+from commands.fuzzy_resolver import (
+    FuzzyResolver,
+    edit_distance,
+    normalize_name,
+    phonetic_key,
+    resolve_path,
+)
+from utils.file_watcher import CREATED, DELETED, ChangeEvent
+
+
+class TestFuzzyResolver(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.files = {}
+        for name in ["report2.docx", "meeting_notes.txt", "budget-2024.xlsx",
+                     "holiday photo.jpg", "Thesis Draft.pdf"]:
+            path = os.path.join(self.test_dir, name)
+            with open(path, "w") as f:
+                f.write(name)
+            self.files[name] = path
+        self.resolver = FuzzyResolver()
+        self.resolver.build(self.test_dir)
+        # resolve_path's resolvers are rebuilt on a miss instead of watched
+        self.resolvers_patch = patch.dict(fuzzy_resolver._resolvers, clear=True)
+        self.resolvers_patch.start()
+        self.watcher_patch = patch.object(fuzzy_resolver, "get_file_watcher")
+        self.watcher_patch.start().return_value.backend_name = "polling"
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.watcher_patch.stop()
+        self.resolvers_patch.stop()
+        shutil.rmtree(self.test_dir)
+
+    def best(self, spoken):
+        """Get the name of the best match."""
+        results = self.resolver.resolve(spoken)
+        return os.path.basename(results[0][0]) if results else None
+
+    def test_normalize_name(self):
+        """Test spoken numbers and separators are normalized."""
+        self.assertEqual(normalize_name("report too"), "report2")
+        self.assertEqual(normalize_name("report2.docx"), "report2docx")
+        self.assertEqual(normalize_name("Meeting_Notes"), "meetingnotes")
+
+    def test_number_words_only_where_digits_fit(self):
+        """Test words like "to" and "for" stay words inside a name."""
+        self.assertEqual(normalize_name("notes for review"), "notesforreview")
+        self.assertEqual(normalize_name("ready to go"), "readytogo")
+        self.assertEqual(normalize_name("chapter for dot pdf"), "chapter4pdf")
+        self.assertEqual(normalize_name("two oh one"), "201")
+
+    def test_edit_distance(self):
+        """Test Levenshtein distance with and without a limit."""
+        self.assertEqual(edit_distance("kitten", "sitting"), 3)
+        self.assertEqual(edit_distance("abc", "abc"), 0)
+        self.assertEqual(edit_distance("abcdef", "x", limit=2), 3)
+
+    def test_phonetic_key(self):
+        """Test similar sounding words share a key."""
+        self.assertEqual(phonetic_key("thesis"), phonetic_key("theesis"))
+
+    def test_exact_normalized_matches(self):
+        """Test spoken variants of exact names."""
+        self.assertEqual(self.best("report too"), "report2.docx")
+        self.assertEqual(self.best("report two dot docx"), "report2.docx")
+        self.assertEqual(self.best("meeting notes"), "meeting_notes.txt")
+        self.assertEqual(self.best("budget 2024"), "budget-2024.xlsx")
+
+    def test_misheard_names(self):
+        """Test names with recognition errors."""
+        self.assertEqual(self.best("meating notes"), "meeting_notes.txt")
+        self.assertEqual(self.best("holliday foto"), "holiday photo.jpg")
+        self.assertEqual(self.best("theesis draft"), "Thesis Draft.pdf")
+
+    def test_no_close_match(self):
+        """Test unrelated names return nothing."""
+        self.assertEqual(self.resolver.resolve("quantum chromodynamics"), [])
+
+    def test_remove(self):
+        """Test removed paths are no longer returned."""
+        self.resolver.remove(self.files["report2.docx"])
+        self.assertNotEqual(self.best("report too"), "report2.docx")
+
+    def test_resolve_path_prefers_existing_path(self):
+        """Test an existing spoken path is returned unchanged."""
+        path = self.files["report2.docx"]
+        self.assertEqual(resolve_path(path, self.test_dir), path)
+        self.assertEqual(resolve_path("report too", self.test_dir), path)
+
+    def test_resolve_path_sees_new_and_vanished_files(self):
+        """Test files created or removed after the first lookup."""
+        self.assertIsNotNone(resolve_path("meeting notes", self.test_dir))
+        created = os.path.join(self.test_dir, "notes for review.txt")
+        with open(created, "w") as f:
+            f.write("new")
+        self.assertEqual(resolve_path("notes for review", self.test_dir), created)
+        # The best match is gone; the next candidate is tried
+        copy = os.path.join(self.test_dir, "meeting_notes2.txt")
+        shutil.copy(self.files["meeting_notes.txt"], copy)
+        os.remove(self.files["meeting_notes.txt"])
+        self.assertEqual(resolve_path("meeting notes", self.test_dir), copy)
+
+    def test_watcher_events_update_index(self):
+        """Test created and deleted files reach the index from events."""
+        created = os.path.join(self.test_dir, "quarterly plan.txt")
+        self.resolver.apply_changes([ChangeEvent(created, CREATED),
+                                     ChangeEvent(self.files["report2.docx"], DELETED)])
+        self.assertEqual(self.best("quarterly plan"), "quarterly plan.txt")
+        self.assertNotEqual(self.best("report too"), "report2.docx")
+
+
+if __name__ == "__main__":
+    unittest.main()
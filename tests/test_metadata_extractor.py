@@ -0,0 +1,184 @@
+"""Tests for metadata extraction and metadata search."""
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import wave
+import zlib
+from unittest.mock import patch
+
+import commands.metadata_extractor as metadata_extractor
+import utils.database as database
+from commands.file_tagging import parse_search, smart_search_files
+from commands.metadata_extractor import extract_folder_metadata, extract_metadata, refresh_metadata
+from utils.database import DatabaseManager
+
+
+def png_bytes(width, height):
+    """Build a PNG header with an IHDR chunk."""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    return (b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + chunk
+            + struct.pack(">I", zlib.crc32(chunk)))
+
+
+def jpeg_bytes(width, height):
+    """Build a JPEG header with an APP0 segment before the frame header."""
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    sof = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00" * 3
+    return (b"\xff\xd8" + b"\xff\xe0" + struct.pack(">H", len(app0) + 2) + app0
+            + b"\xff\xc0" + struct.pack(">H", len(sof) + 2) + sof + b"\xff\xd9")
+
+
+def pdf_bytes(pages):
+    """Build a small PDF with a page tree."""
+    kids = " ".join(f"{i + 3} 0 R" for i in range(pages))
+    objects = [b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj",
+               f"2 0 obj << /Type /Pages /Kids [{kids}] /Count {pages} >> endobj".encode()]
+    objects += [f"{i + 3} 0 obj << /Type /Page /Parent 2 0 R >> endobj".encode()
+                for i in range(pages)]
+    return b"%PDF-1.4\n" + b"\n".join(objects) + b"\ntrailer << /Root 1 0 R >>\n%%EOF\n"
+
+
+class TestMetadataExtractor(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "files")
+        os.makedirs(self.root)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+
+        self.write("wide.png", png_bytes(2560, 1440))
+        self.write("small.png", png_bytes(64, 48))
+        self.write("photo.jpg", jpeg_bytes(1920, 1080))
+        self.write("anim.gif", b"GIF89a" + struct.pack("<HH", 320, 200) + b"\x00" * 10)
+        self.write("report.pdf", pdf_bytes(12))
+        self.write("memo.pdf", pdf_bytes(2))
+        self.write("notes.txt", b"one\ntwo\nthree")
+        self.write("blob.bin", os.urandom(100))
+        with wave.open(os.path.join(self.root, "clip.wav"), "wb") as w:
+            w.setnchannels(2)
+            w.setsampwidth(2)
+            w.setframerate(8000)
+            w.writeframes(b"\x00\x00" * 2 * 8000 * 3)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, data):
+        """Write a file in the test folder."""
+        path = os.path.join(self.root, name)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+
+    def meta(self, name):
+        """Extract the metadata of a test file."""
+        return extract_metadata(os.path.join(self.root, name))
+
+    def test_extractors(self):
+        """Test each format's header is decoded."""
+        self.assertEqual(self.meta("wide.png"), {"width": 2560, "height": 1440})
+        self.assertEqual(self.meta("photo.jpg"), {"width": 1920, "height": 1080})
+        self.assertEqual(self.meta("anim.gif"), {"width": 320, "height": 200})
+        self.assertEqual(self.meta("clip.wav"),
+                         {"channels": 2, "sample_rate": 8000, "duration": 3.0})
+        self.assertEqual(self.meta("report.pdf"), {"pdf_version": "1.4", "pages": 12})
+        self.assertEqual(self.meta("notes.txt"), {"lines": 3})
+        self.assertEqual(self.meta("blob.bin"), {})
+
+    def test_corrupt_headers(self):
+        """Test files that do not match their extension yield nothing."""
+        self.write("fake.png", b"not a png at all, really")
+        self.write("cut.jpg", b"\xff\xd8\xff\xe0\x00")
+        self.assertEqual(self.meta("fake.png"), {})
+        self.assertEqual(self.meta("cut.jpg"), {})
+
+    def test_pdf_page_tree_in_tail(self):
+        """Test the page count is found beyond the head of a large PDF."""
+        data = b"%PDF-1.7\n" + b"%" * 5000 + b"\n2 0 obj << /Count 40 /Type /Pages >> endobj"
+        self.write("big.pdf", data)
+        with patch.object(metadata_extractor, "PDF_SCAN_BYTES", 1024):
+            self.assertEqual(self.meta("big.pdf")["pages"], 40)
+
+    def test_refresh_only_changed_files(self):
+        """Test files are read again only when their size or mtime changes."""
+        first = refresh_metadata(self.root)
+        self.assertEqual(first["extracted"], 9)
+        with patch.object(metadata_extractor, "extract_metadata") as extract:
+            second = refresh_metadata(self.root)
+        extract.assert_not_called()
+        self.assertEqual((second["extracted"], second["unchanged"]), (0, 9))
+
+        path = self.write("notes.txt", b"one\ntwo\nthree\nfour\n")
+        os.utime(path, (1, 1))
+        os.remove(os.path.join(self.root, "blob.bin"))
+        third = refresh_metadata(self.root)
+        self.assertEqual((third["extracted"], third["removed"]), (1, 1))
+        record = self.db.get_file_metadata(path)
+        self.assertEqual(record["metadata"], {"lines": 4})
+        self.assertEqual(record["file_type"], "txt")
+
+    def test_refresh_keeps_tags(self):
+        """Test re-extraction does not clear stored tags."""
+        refresh_metadata(self.root)
+        path = os.path.join(self.root, "photo.jpg")
+        with self.db.get_connection() as conn:
+            conn.execute("UPDATE file_metadata SET tags = ? WHERE path = ?", ('["trip"]', path))
+            conn.commit()
+        os.utime(path, (1, 1))
+        refresh_metadata(self.root)
+        self.assertEqual(self.db.get_file_metadata(path)["tags"], ["trip"])
+
+    def test_database_filters(self):
+        """Test metadata filters in DatabaseManager.search_files."""
+        refresh_metadata(self.root)
+        wide = self.db.search_files(None, [("width", ">=", 1920)], self.root)
+        self.assertEqual(sorted(r["name"] for r in wide), ["photo.jpg", "wide.png"])
+        self.assertEqual(len(self.db.search_files("png", [("width", "<", 100)])), 1)
+        with self.assertRaises(ValueError):
+            self.db.search_files(None, [("width); DROP TABLE x; --", ">", 1)])
+        with self.assertRaises(ValueError):
+            self.db.search_files(None, [("width", "LIKE", 1)])
+
+    def test_parse_search(self):
+        """Test spoken filters are split from the search text."""
+        self.assertEqual(parse_search("report with more than 10 pages"),
+                         ("report", [("pages", ">", 10)]))
+        self.assertEqual(parse_search("photos wider than 1920"),
+                         ("photos", [("width", ">", 1920)]))
+        self.assertEqual(parse_search("width >= 800 and height < 600"),
+                         (None, [("width", ">=", 800), ("height", "<", 600)]))
+        self.assertEqual(parse_search("notes"), ("notes", []))
+
+    def test_smart_search(self):
+        """Test smart search refreshes metadata and applies filters."""
+        results = smart_search_files("pdfs with more than 5 pages", self.root)
+        self.assertEqual([os.path.basename(path) for path, _ in results], ["report.pdf"])
+        self.assertEqual(smart_search_files("pngs with more than 5 pages", self.root), [])
+        self.assertIn("pages 12", results[0][1])
+        results = smart_search_files("photos wider than 1000", self.root)
+        self.assertEqual(sorted(os.path.basename(path) for path, _ in results),
+                         ["photo.jpg", "wide.png"])
+        results = smart_search_files("notes", self.root)
+        self.assertEqual([os.path.basename(path) for path, _ in results], ["notes.txt"])
+
+    def test_extract_folder_metadata(self):
+        """Test the command message."""
+        self.assertIn("Read metadata of 9 file(s)", extract_folder_metadata(self.root))
+        self.assertIn("0 file(s)", extract_folder_metadata(self.root))
+        self.assertIn("not a folder", extract_folder_metadata(os.path.join(self.root, "x")))
+
+
+if __name__ == "__main__":
+    unittest.main()
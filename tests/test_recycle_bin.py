@@ -0,0 +1,188 @@
+"""Tests for recycle bin functionality."""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from commands.recycle_bin import RecycleBin, find_mount_point, get_trash_dir_name
+from utils.database import DatabaseManager
+
+
+class TestRecycleBin(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        # Reset the singleton instance
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.bin = RecycleBin(os.path.join(self.test_dir, "bin"), db=self.db)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.bin.stop_purge_worker()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def create_file(self, name: str, size: int = 10) -> Path:
+        """Create a test file of the given size."""
+        path = Path(self.test_dir) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+        return path
+
+    def test_trash_records_entry(self):
+        """Test trashing a file records its original path and size."""
+        path = self.create_file("docs/report.txt", size=42)
+        self.assertTrue(self.bin.trash(path))
+        self.assertFalse(path.exists())
+
+        items = self.bin.list_items()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["original_path"], str(path))
+        self.assertEqual(items[0]["size"], 42)
+        self.assertTrue(os.path.exists(items[0]["trash_path"]))
+
+    def test_restore_to_original_path(self):
+        """Test restoring by original path puts the file back where it was."""
+        path = self.create_file("docs/report.txt")
+        self.bin.trash(path)
+        shutil.rmtree(path.parent)
+
+        result = self.bin.restore(str(path))
+        self.assertIn("restored successfully", result)
+        self.assertTrue(path.exists())
+        self.assertEqual(self.bin.list_items(), [])
+
+    def test_restore_same_name_twice(self):
+        """Test items with the same name are kept apart and restored newest first."""
+        first = self.create_file("a/notes.txt", size=1)
+        second = self.create_file("b/notes.txt", size=2)
+        self.bin.trash(first)
+        self.bin.trash(second)
+
+        self.bin.restore("notes.txt")
+        self.assertTrue(second.exists())
+        self.assertFalse(first.exists())
+        self.bin.restore("notes.txt")
+        self.assertTrue(first.exists())
+
+    def test_restore_existing_target(self):
+        """Test restore refuses to overwrite an existing file."""
+        path = self.create_file("report.txt")
+        self.bin.trash(path)
+        self.create_file("report.txt")
+        result = self.bin.restore(str(path))
+        self.assertIn("already exists", result)
+
+    def test_restore_missing_item(self):
+        """Test restoring an item that was never trashed."""
+        result = self.bin.restore("nonexistent.txt")
+        self.assertEqual(result, "No such item in recycle bin.")
+
+    def test_purge_by_size_evicts_oldest(self):
+        """Test purge removes the oldest items until under the size limit."""
+        paths = [self.create_file(f"file_{i}.bin", size=100) for i in range(3)]
+        for path in paths:
+            self.bin.trash(path)
+
+        purged = self.bin.purge(max_bytes=150)
+        self.assertEqual(purged, 2)
+        items = self.bin.list_items()
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]["original_path"], str(paths[2]))
+
+    def test_folder_size_is_measured_by_purge(self):
+        """Test trashing a folder does not walk it; the purge measures it."""
+        for i in range(3):
+            self.create_file(f"project/src/file_{i}.bin", size=100)
+        with patch("commands.recycle_bin.get_item_size") as measure:
+            self.bin.trash(Path(self.test_dir) / "project")
+        measure.assert_not_called()
+        self.assertIsNone(self.bin.list_items()[0]["size"])
+        self.assertEqual(self.bin.purge(max_bytes=1000), 0)
+        self.assertEqual(self.bin.list_items()[0]["size"], 300)
+        self.assertEqual(self.bin.purge(max_bytes=200), 1)
+
+    def test_purge_by_age(self):
+        """Test purge removes items older than the age limit."""
+        path = self.create_file("old.txt")
+        self.bin.trash(path)
+        time.sleep(0.05)
+        self.assertEqual(self.bin.purge(max_age_seconds=0.01), 1)
+        self.assertEqual(self.bin.list_items(), [])
+
+    def test_empty(self):
+        """Test emptying the recycle bin."""
+        for i in range(3):
+            self.bin.trash(self.create_file(f"file_{i}.txt"))
+        self.assertEqual(self.bin.empty(), 3)
+        self.assertEqual(os.listdir(self.bin.bin_dir), [])
+
+    def test_failed_deletes_are_not_counted(self):
+        """Test items that cannot be deleted stay listed and are not counted."""
+        paths = [self.create_file(f"file_{i}.bin", size=100) for i in range(3)]
+        for path in paths:
+            self.bin.trash(path)
+        unlink = Path.unlink
+
+        def stuck(path, *args, **kwargs):
+            if path.name == "file_0.bin":
+                raise PermissionError("busy")
+            unlink(path, *args, **kwargs)
+
+        with patch.object(Path, "unlink", stuck):
+            # The stuck oldest item frees nothing, so the next one goes too
+            self.assertEqual(self.bin.purge(max_bytes=250), 1)
+            self.assertEqual(len(self.bin.list_items()), 2)
+            self.assertEqual(self.bin.empty(), 1)
+        self.assertEqual([item["name"] for item in self.bin.list_items()], ["file_0.bin"])
+
+    def test_find_mount_point(self):
+        """Test the mount point is an ancestor on the same device."""
+        mount = find_mount_point(Path(self.test_dir))
+        self.assertTrue(Path(self.test_dir).resolve().is_relative_to(mount))
+        self.assertEqual(mount.stat().st_dev, os.stat(self.test_dir).st_dev)
+
+    def test_same_device_uses_main_bin(self):
+        """Test items on the bin's filesystem go to the main bin."""
+        path = self.create_file("report.txt")
+        self.bin.trash(path)
+        entry = self.bin.list_items()[0]
+        self.assertEqual(Path(entry["trash_path"]).parent, Path(self.bin.bin_dir).resolve())
+
+    def test_other_device_uses_mount_trash(self):
+        """Test items on another filesystem go to that filesystem's trash folder."""
+        mount = Path(self.test_dir) / "mnt"
+        path = self.create_file("mnt/data/report.txt")
+        home_device = os.stat(self.test_dir).st_dev
+
+        with patch("commands.recycle_bin.find_mount_point", return_value=mount):
+            trash_dir = self.bin.trash_dir_for(home_device + 1, path)
+        # The fake device does not match the folder, so the main bin is used
+        self.assertEqual(trash_dir, Path(self.bin.bin_dir).resolve())
+
+        self.bin._trash_dirs[home_device + 1] = mount / get_trash_dir_name() / "files"
+        trash_dir = self.bin.trash_dir_for(home_device + 1, path)
+        self.assertEqual(trash_dir, mount / get_trash_dir_name() / "files")
+
+    def test_restore_unindexed_across_trash_dirs(self):
+        """Test restoring a name-only item searches every trash folder."""
+        other = Path(self.test_dir) / "mnt" / get_trash_dir_name() / "files"
+        other.mkdir(parents=True)
+        (other / "orphan.txt").write_text("data")
+        self.bin._trash_dirs[12345] = other
+
+        target = os.path.join(self.test_dir, "orphan.txt")
+        result = self.bin.restore("orphan.txt", target)
+        self.assertIn("restored successfully", result)
+        self.assertTrue(os.path.exists(target))
+
+
+if __name__ == "__main__":
+    unittest.main()
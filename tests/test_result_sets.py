@@ -0,0 +1,170 @@
+"""Tests for result sets and follow-up commands."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+import commands.recycle_bin as recycle_bin
+import utils.database as database
+from commands.file_manager import search_files, tag_manager
+from commands.recycle_bin import RecycleBin
+from commands.result_sets import (
+    ResultSet,
+    ResultSetStore,
+    apply_follow_up,
+    parse_follow_up,
+    parse_selection,
+)
+from utils.database import DatabaseManager
+from utils.retry import Transaction
+from utils.tag_index import TagIndex
+
+
+class TestResultSets(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "files")
+        os.makedirs(self.root)
+
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.patches = [
+            patch.object(database, "_db_manager", self.db),
+            patch.object(recycle_bin, "_recycle_bin",
+                         RecycleBin(os.path.join(self.test_dir, "bin"), db=self.db)),
+            patch.object(tag_manager, "tag_file", os.path.join(self.test_dir, "tags.json")),
+            patch.object(tag_manager, "index", TagIndex()),
+        ]
+        for p in self.patches:
+            p.start()
+
+        # name -> (size, mtime in seconds)
+        self.paths = {}
+        for name, size, mtime in [("c.txt", 30, 1000), ("a.txt", 10, 3000),
+                                  ("b.log", 20, 2000), ("d.txt", 40, 4000)]:
+            path = os.path.join(self.root, name)
+            with open(path, "wb") as f:
+                f.write(b"x" * size)
+            os.utime(path, (mtime, mtime))
+            self.paths[name] = path
+
+    def tearDown(self):
+        """Clean up test environment."""
+        for p in self.patches:
+            p.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def result_set(self, page_size=10):
+        """Build a result set of the test files in name order."""
+        return ResultSet(sorted(self.paths.values()), page_size=page_size)
+
+    def names(self, paths):
+        """Get the base names of paths."""
+        return [os.path.basename(path) for path in paths]
+
+    def test_parse_selection(self):
+        """Test spoken references to results."""
+        self.assertEqual(parse_selection("those"), slice(None))
+        self.assertEqual(parse_selection("all of them"), slice(None))
+        self.assertEqual(parse_selection("the first three"), slice(0, 3))
+        self.assertEqual(parse_selection("top 5 files"), slice(0, 5))
+        self.assertEqual(parse_selection("the last two"), slice(-2, None))
+        self.assertEqual(parse_selection("first one"), slice(0, 1))
+        self.assertEqual(parse_selection("the second one"), slice(1, 2))
+        self.assertIsNone(parse_selection("report.txt"))
+        self.assertIsNone(parse_selection("files"))
+
+    def test_parse_follow_up(self):
+        """Test follow-up commands are told apart from ordinary ones."""
+        self.assertEqual(parse_follow_up("tag those as work"), ("tag", slice(None), "work"))
+        self.assertEqual(parse_follow_up("delete the first three"), ("delete", slice(0, 3), None))
+        self.assertEqual(parse_follow_up("move the last two to archive"),
+                         ("move", slice(-2, None), "archive"))
+        self.assertEqual(parse_follow_up("sort those by size desc"),
+                         ("sort", slice(None), "size desc"))
+        self.assertIsNone(parse_follow_up("delete report.txt"))
+        self.assertIsNone(parse_follow_up("list files"))
+        self.assertIsNone(parse_follow_up("tag file"))
+
+    def test_sort_uses_stored_records(self):
+        """Test sorting stats unknown records once and reuses known ones."""
+        results = self.result_set()
+        results.sort("size", reverse=True)
+        self.assertEqual(self.names(results.paths), ["d.txt", "c.txt", "b.log", "a.txt"])
+        with patch("commands.result_sets.os.stat") as stat:
+            results.sort("date")
+        stat.assert_not_called()
+        self.assertEqual(self.names(results.paths), ["c.txt", "b.log", "a.txt", "d.txt"])
+        results.sort("name")
+        self.assertEqual(self.names(results.paths), ["a.txt", "b.log", "c.txt", "d.txt"])
+
+    def test_paging(self):
+        """Test the cursor moves page by page and stops at the end."""
+        results = self.result_set(page_size=3)
+        self.assertEqual(len(results.page()), 3)
+        self.assertEqual(self.names(results.next_page()), ["d.txt"])
+        self.assertEqual(results.next_page(), [])
+        self.assertEqual(len(results.previous_page()), 3)
+        self.assertEqual(results.cursor, 0)
+
+    def test_from_directory(self):
+        """Test a listing keeps sizes and times without restat-ing."""
+        results = ResultSet.from_directory(self.root)
+        self.assertEqual(self.names(results.paths), ["a.txt", "b.log", "c.txt", "d.txt"])
+        self.assertEqual(list(results.sizes), [10, 20, 30, 40])
+
+    def test_store_lru_eviction(self):
+        """Test the least recently used result set is evicted."""
+        store = ResultSetStore(max_sets=2)
+        first = store.add(ResultSet(["1"]))
+        second = store.add(ResultSet(["2"]))
+        self.assertEqual(store.current().paths, ["2"])
+        store.get(first)
+        store.add(ResultSet(["3"]))
+        self.assertIsNotNone(store.get(first))
+        self.assertIsNone(store.get(second))
+        self.assertEqual(len(store), 2)
+
+    def test_follow_up_tag(self):
+        """Test tagging part of the results."""
+        results = self.result_set()
+        message = apply_follow_up(results, "tag", slice(0, 2), "work")
+        self.assertIn("Tagged 2 file(s)", message)
+        self.assertEqual(sorted(tag_manager.get_files_by_tag("work")), results.paths[:2])
+
+    def test_follow_up_delete(self):
+        """Test deleting results sends them to the recycle bin and drops them."""
+        results = self.result_set()
+        first_three = results.paths[:3]
+        self.assertIn("Deleted 3 file(s)", apply_follow_up(results, "delete", slice(0, 3)))
+        self.assertFalse(any(os.path.exists(path) for path in first_three))
+        self.assertEqual(self.names(results.paths), ["d.txt"])
+
+    def test_follow_up_move_and_rollback(self):
+        """Test moved results follow their files and roll back with the transaction."""
+        results = self.result_set()
+        archive = os.path.join(self.test_dir, "archive")
+        transaction = Transaction()
+        apply_follow_up(results, "move", slice(-1, None), archive, transaction)
+        self.assertEqual(results.paths[-1], os.path.join(archive, "d.txt"))
+        self.assertTrue(os.path.exists(results.paths[-1]))
+        transaction.rollback()
+        self.assertTrue(os.path.exists(self.paths["d.txt"]))
+
+    def test_search_files_filters(self):
+        """Test the type and date filters of search_files."""
+        self.assertEqual(self.names(sorted(search_files(self.root, file_type="log"))),
+                         ["b.log"])
+        recent = search_files(self.root, modified_after=datetime.fromtimestamp(2500))
+        self.assertEqual(self.names(sorted(recent)), ["a.txt", "d.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
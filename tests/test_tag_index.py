@@ -0,0 +1,79 @@
+"""Tests for the inverted tag index."""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from utils.database import DatabaseManager
+from utils.tag_index import TagIndex, tokenize_query
+
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.index = TagIndex(self.db)
+        self.index.add(["/a", "/b", "/c"], "work")
+        self.index.add(["/b", "/c", "/d"], "2024")
+        self.index.add(["/c"], "draft")
+
+    def tearDown(self):
+        """Clean up test environment."""
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def test_both_directions(self):
+        """Test lookups by tag and by path."""
+        self.assertEqual(self.index.paths_for("work"), ["/a", "/b", "/c"])
+        self.assertEqual(self.index.tags_for("/c"), ["2024", "draft", "work"])
+        self.assertEqual(self.index.tag_counts(), {"2024": 3, "draft": 1, "work": 3})
+
+    def test_add_and_remove_report_changes(self):
+        """Test only new pairs are added and only existing ones removed."""
+        self.assertEqual(self.index.add(["/a", "/e", "/e"], "work"), ["/e"])
+        self.assertEqual(self.index.remove(["/c", "/z"], "draft"), ["/c"])
+        self.assertNotIn("draft", self.index.tag_counts())
+        self.assertEqual(self.index.tags_for("/c"), ["2024", "work"])
+
+    def test_persisted(self):
+        """Test a new index over the same database sees the tags."""
+        self.index.remove(["/a"], "work")
+        self.assertEqual(TagIndex(self.db).paths_for("work"), ["/b", "/c"])
+
+    def test_queries(self):
+        """Test boolean queries evaluate as set operations."""
+        query = self.index.query
+        self.assertEqual(query("work AND 2024 NOT draft"), ["/b"])
+        self.assertEqual(query("work and 2024"), ["/b", "/c"])
+        self.assertEqual(query("work 2024"), ["/b", "/c"])
+        self.assertEqual(query("draft or (work and not 2024)"), ["/a", "/c"])
+        self.assertEqual(query("not work"), ["/d"])
+        self.assertEqual(query("work but not 2024"), ["/a"])
+        self.assertEqual(query("missing"), [])
+        for bad in ("", "work and", "(work", "work )", "or work"):
+            with self.assertRaises(ValueError):
+                query(bad)
+
+    def test_tokenize(self):
+        """Test operators are recognised in any case and parentheses split."""
+        self.assertEqual(tokenize_query("(Work OR x)AND NOT y"),
+                         ["(", "Work", "or", "x", ")", "and", "not", "y"])
+
+    def test_import_json(self):
+        """Test a tag file of earlier releases is imported and removed."""
+        tag_file = os.path.join(self.test_dir, "tags.json")
+        with open(tag_file, "w") as f:
+            json.dump({"work": ["/a", "/x"], "home": ["/y"]}, f)
+        self.assertEqual(self.index.import_json(tag_file), 2)
+        self.assertFalse(os.path.exists(tag_file))
+        self.assertEqual(self.index.query("work or home"), ["/a", "/b", "/c", "/x", "/y"])
+
+
+if __name__ == "__main__":
+    unittest.main()
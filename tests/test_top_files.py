@@ -0,0 +1,125 @@
+"""Tests for top-k file queries."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.content_index as content_index
+from commands.content_index import TrigramIndex
+from commands.file_manager import sort_files
+from commands.top_files import iter_file_records, top_files, top_k
+
+
+class TestTopFiles(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "files")
+        self.index = TrigramIndex(os.path.join(self.test_dir, "index.bin"))
+        self.index_patch = patch.object(content_index, "_content_index", self.index)
+        self.index_patch.start()
+        # name -> (size, mtime in seconds)
+        self.specs = {
+            "a.txt": (300, 1000),
+            "b.txt": (100, 5000),
+            "sub/c.txt": (500, 3000),
+            "sub/d.txt": (200, 4000),
+            "sub/deep/e.txt": (400, 2000),
+        }
+        for name, (size, mtime) in self.specs.items():
+            self.write(name, size, mtime)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.index_patch.stop()
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, size, mtime):
+        """Create a file with a given size and modification time."""
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def names(self, files):
+        """Get the base names of query results."""
+        return [os.path.basename(item["path"]) for item in files]
+
+    def test_top_k_orders(self):
+        """Test each order keeps the right records, best first."""
+        records = list(iter_file_records(self.root))
+        self.assertEqual([os.path.basename(r[0]) for r in top_k(records, 2, "largest")],
+                         ["c.txt", "e.txt"])
+        self.assertEqual([os.path.basename(r[0]) for r in top_k(records, 2, "smallest")],
+                         ["b.txt", "d.txt"])
+        self.assertEqual([os.path.basename(r[0]) for r in top_k(records, 2, "newest")],
+                         ["b.txt", "d.txt"])
+        self.assertEqual([os.path.basename(r[0]) for r in top_k(records, 2, "oldest")],
+                         ["a.txt", "e.txt"])
+
+    def test_top_k_edge_cases(self):
+        """Test k larger than the input, k of zero and ties."""
+        records = [("x", 1, 10), ("y", 2, 10), ("z", 3, 5)]
+        self.assertEqual(len(top_k(records, 10, "largest")), 3)
+        self.assertEqual(top_k(records, 0, "largest"), [])
+        self.assertEqual(top_k(records, 1, "largest"), [("x", 1, 10)])
+        with self.assertRaises(ValueError):
+            top_k(records, 1, "alphabetical")
+
+    def test_top_k_consumes_lazily(self):
+        """Test records are streamed rather than collected."""
+        records = ((str(i), i, i) for i in range(100000))
+        self.assertEqual(top_k(records, 3, "newest")[0], ("99999", 99999, 99999))
+
+    def test_top_files_walk(self):
+        """Test walking queries, recursive and not."""
+        self.assertEqual(self.names(top_files(self.root, 3, "largest", use_index=False)),
+                         ["c.txt", "e.txt", "a.txt"])
+        self.assertEqual(self.names(top_files(self.root, 5, "newest", recursive=False)),
+                         ["b.txt", "a.txt"])
+        result = top_files(self.root, 1, "newest")[0]
+        self.assertEqual(result["size"], 100)
+        self.assertEqual(result["modified"].timestamp(), 5000)
+
+    def test_top_files_from_index(self):
+        """Test watched indexed directories are answered without walking."""
+        self.index.update(self.root)
+        with patch("commands.content_index.get_file_watcher"):
+            self.index.watch(self.root)
+        with patch("commands.top_files.iter_file_records") as walk:
+            files = top_files(self.root, 2, "largest")
+        walk.assert_not_called()
+        self.assertEqual(self.names(files), ["c.txt", "e.txt"])
+
+        os.remove(os.path.join(self.root, "sub", "c.txt"))
+        self.assertEqual(self.names(top_files(self.root, 2, "largest")),
+                         ["e.txt", "a.txt"])
+
+    def test_unwatched_or_incomplete_index_is_walked(self):
+        """Test a stale or incomplete index is not trusted."""
+        self.index.update(self.root)
+        # Not watched: a file added since the update must still be found
+        self.write("new.txt", 900, 6000)
+        self.assertEqual(self.names(top_files(self.root, 1, "largest")), ["new.txt"])
+
+        with patch("commands.content_index.get_file_watcher"):
+            self.index.watch(self.root)
+        self.index.unreadable.add(os.path.join(self.root, "locked.txt"))
+        with patch("commands.top_files.iter_file_records", return_value=iter([])) as walk:
+            top_files(self.root, 1, "largest")
+        walk.assert_called_once()
+
+    def test_sort_files_limit(self):
+        """Test sort_files selects with a heap when limited."""
+        files = [os.path.join(self.root, name) for name in self.specs]
+        by_size = sort_files(files, "size", reverse=True, limit=2)
+        self.assertEqual([os.path.basename(p) for p in by_size], ["c.txt", "e.txt"])
+        self.assertEqual(sort_files(files, "size", reverse=True)[:2], by_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
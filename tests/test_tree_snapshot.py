@@ -0,0 +1,174 @@
+"""Tests for folder tree snapshots and Merkle diffs."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import commands.tree_snapshot as tree_snapshot
+import utils.database as database
+from commands.tree_snapshot import (
+    ADDED,
+    MODIFIED,
+    MOVED,
+    REMOVED,
+    NodeStore,
+    TreeChange,
+    build_tree,
+    changes_since,
+    describe_changes,
+    diff_trees,
+    parse_since,
+    take_snapshot,
+)
+from utils.database import DatabaseManager
+
+
+class TestTreeSnapshot(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.root = os.path.join(self.test_dir, "project")
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        for name in ("a/one.txt", "a/two.txt", "b/deep/three.txt", "top.txt"):
+            self.write(name)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        shutil.rmtree(self.test_dir)
+
+    def path(self, name):
+        """Build a path inside the test tree."""
+        return os.path.join(self.root, *name.split("/"))
+
+    def write(self, name, content=None):
+        """Write a file whose contents default to its own name."""
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content if content is not None else name)
+
+    def changes(self):
+        """Diff the tree against its latest snapshot."""
+        return changes_since(self.root)[1]
+
+    def test_unchanged_tree(self):
+        """Test an unchanged tree has the same root hash and no changes."""
+        self.assertEqual(build_tree(self.root).root_hash, build_tree(self.root).root_hash)
+        take_snapshot(self.root)
+        self.assertEqual(self.changes(), [])
+
+    def test_added_removed_modified(self):
+        """Test files are reported under the right kind."""
+        take_snapshot(self.root)
+        self.write("a/new.txt")
+        self.write("c/d/e.txt")
+        os.remove(self.path("top.txt"))
+        self.write("a/one.txt", "changed contents")
+        self.assertEqual(self.changes(), [
+            TreeChange(ADDED, os.path.join("a", "new.txt")),
+            TreeChange(MODIFIED, os.path.join("a", "one.txt")),
+            TreeChange(ADDED, os.path.join("c", "d", "e.txt")),
+            TreeChange(REMOVED, "top.txt"),
+        ])
+
+    def test_moves(self):
+        """Test renamed files and folders are reported as moves."""
+        take_snapshot(self.root)
+        os.rename(self.path("top.txt"), self.path("a/renamed.txt"))
+        os.rename(self.path("b/deep"), self.path("a/deeper"))
+        self.write("a/deeper/extra.txt")
+        self.assertEqual(self.changes(), [
+            TreeChange(MOVED, os.path.join("a", "deeper"), os.path.join("b", "deep"), True),
+            TreeChange(ADDED, os.path.join("a", "deeper", "extra.txt")),
+            TreeChange(MOVED, os.path.join("a", "renamed.txt"), "top.txt"),
+        ])
+
+    def test_unchanged_subtrees_are_skipped(self):
+        """Test the diff only loads the nodes on the path to a change."""
+        for i in range(20):
+            self.write(f"many/dir{i}/file.txt")
+        old = build_tree(self.root)
+        self.write("b/deep/three.txt", "edited!")
+        new = build_tree(self.root)
+        store = NodeStore({**old.nodes, **new.nodes})
+        loaded = []
+
+        def load(digest):
+            loaded.append(digest)
+            return store.load(digest)
+
+        changes = diff_trees(old.root_hash, new.root_hash, load)
+        self.assertEqual(changes, [TreeChange(MODIFIED, os.path.join("b", "deep", "three.txt"))])
+        # root, b and b/deep on both sides
+        self.assertEqual(len(loaded), 6)
+
+    def test_snapshots_share_nodes(self):
+        """Test a second snapshot stores only the changed folders."""
+        take_snapshot(self.root)
+        with self.db.get_connection() as conn:
+            first = conn.execute("SELECT COUNT(*) FROM tree_nodes").fetchone()[0]
+        self.write("b/deep/new.txt")
+        take_snapshot(self.root)
+        with self.db.get_connection() as conn:
+            second = conn.execute("SELECT COUNT(*) FROM tree_nodes").fetchone()[0]
+        # The root, b and b/deep changed; a did not
+        self.assertEqual((first, second), (4, 7))
+
+    def test_prune_sweeps_unreachable_nodes(self):
+        """Test old snapshots and the nodes only they used are dropped."""
+        with patch.object(tree_snapshot, "MAX_SNAPSHOTS", 1):
+            take_snapshot(self.root)
+            self.write("top.txt", "v2")
+            take_snapshot(self.root)
+        self.assertEqual(len(self.db.get_tree_snapshots(self.root)), 1)
+        with self.db.get_connection() as conn:
+            nodes = conn.execute("SELECT COUNT(*) FROM tree_nodes").fetchone()[0]
+        self.assertEqual(nodes, 4)
+        self.assertEqual(self.changes(), [])
+
+    def test_since_picks_snapshot(self):
+        """Test "since yesterday" compares against the snapshot of that time."""
+        take_snapshot(self.root)
+        with self.db.get_connection() as conn:
+            conn.execute("UPDATE tree_snapshots SET created_at = created_at - 3 * 86400")
+            conn.commit()
+        self.write("later.txt")
+        take_snapshot(self.root)
+        self.write("latest.txt")
+        _, changes = changes_since(self.root, parse_since("yesterday"))
+        self.assertEqual([c.path for c in changes], ["later.txt", "latest.txt"])
+        self.assertEqual([c.path for c in self.changes()], ["latest.txt"])
+
+    def test_parse_since(self):
+        """Test spoken periods."""
+        now = datetime(2024, 5, 10, 15, 30)
+        self.assertIsNone(parse_since("", now))
+        self.assertEqual(parse_since("yesterday", now), now - timedelta(days=1))
+        self.assertEqual(parse_since("today", now), datetime(2024, 5, 10))
+        self.assertEqual(parse_since("3 hours ago", now), now - timedelta(hours=3))
+        with self.assertRaises(ValueError):
+            parse_since("the dawn of time", now)
+
+    def test_describe_changes(self):
+        """Test the spoken summary."""
+        self.assertIn("no record", describe_changes(self.root))
+        take_snapshot(self.root)
+        self.assertIn("Nothing changed", describe_changes(self.root))
+        self.write("new.txt")
+        message = describe_changes(self.root, "yesterday")
+        self.assertIn("1 added", message)
+        self.assertIn("added new.txt", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""Tests for line-level diffs between file versions."""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import commands.version_diff as version_diff
+import utils.database as database
+from commands.file_versioning import VersionStore
+from commands.version_diff import describe_version_changes, diff_versions
+from utils.chunk_store import ChunkStore
+from utils.database import DatabaseManager
+
+
+def numbered_lines(count, seed=0):
+    """Build reproducible text lines of varying length."""
+    rng = random.Random(seed)
+    return [f"line {i} {'x' * rng.randrange(80)}\n" for i in range(count)]
+
+
+class TestVersionDiff(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.store = ChunkStore(os.path.join(self.test_dir, "chunks"))
+
+    def tearDown(self):
+        """Clean up test environment."""
+        shutil.rmtree(self.test_dir)
+
+    def chunks(self, lines):
+        """Store text and return its chunk list."""
+        path = os.path.join(self.test_dir, "file.txt")
+        with open(path, "w") as f:
+            f.writelines(lines)
+        return self.store.store_file(path)[0]
+
+    def test_small_edit(self):
+        """Test added, removed and replaced lines are counted and quoted."""
+        old = ["alpha\n", "beta\n", "gamma\n", "delta\n"]
+        new = ["alpha\n", "BETA\n", "gamma\n", "epsilon\n", "delta\n"]
+        result = diff_versions(self.chunks(old), self.chunks(new), self.store)
+        self.assertEqual((result.added, result.removed), (2, 1))
+        self.assertEqual(result.added_lines, ["BETA", "epsilon"])
+        self.assertEqual(result.removed_lines, ["beta"])
+
+    def test_against_empty_version(self):
+        """Test every line of a first version counts as added."""
+        result = diff_versions([], self.chunks(["one\n", "two"]), self.store)
+        self.assertEqual((result.added, result.removed), (2, 0))
+        self.assertEqual(result.added_lines, ["one", "two"])
+
+    def test_only_changed_chunks_are_read(self):
+        """Test an edit in a large file reads a few chunks, not the whole file."""
+        lines = numbered_lines(200_000)
+        old = self.chunks(lines)
+        lines[100_000] = "edited line\n"
+        del lines[150_000]
+        new = self.chunks(lines)
+        size = sum(chunk.length for chunk in new)
+        result = diff_versions(old, new, self.store)
+        self.assertEqual((result.added, result.removed), (1, 2))
+        self.assertEqual(result.added_lines, ["edited line"])
+        self.assertEqual(result.regions, 2)
+        self.assertLess(result.bytes_read, size / 5)
+
+    def test_line_across_chunk_boundary(self):
+        """Test a changed line straddling a cut is reported as one line."""
+        lines = numbered_lines(50_000, seed=1)
+        old = self.chunks(lines)
+        boundary = old[0].length
+        text = "".join(lines)
+        start = text.rfind("\n", 0, boundary - 5) + 1
+        end = text.find("\n", boundary + 5)
+        edited = text[:start] + "x" * (end - start) + text[end:]
+        result = diff_versions(old, self.chunks([edited]), self.store)
+        self.assertEqual((result.added, result.removed), (1, 1))
+
+    def test_large_block_is_counted_not_matched(self):
+        """Test a block over the matching limit counts as replaced whole."""
+        old = ["same\n"] + [f"old {i}\n" for i in range(30)] + ["end\n"]
+        new = (["same\n"] + [f"old {i}\n" for i in range(10)]
+               + [f"new {i}\n" for i in range(40)] + ["end\n"])
+        wrapped = patch.object(version_diff, "SequenceMatcher", wraps=version_diff.SequenceMatcher)
+        with patch.object(version_diff, "MAX_MATCHED_LINES", 20), wrapped as matcher:
+            result = diff_versions(self.chunks(old), self.chunks(new), self.store)
+        # Only the chunk lists were matched
+        self.assertEqual(matcher.call_count, 1)
+        self.assertEqual((result.added, result.removed), (40, 20))
+        self.assertEqual(result.added_lines, [f"new {i}" for i in range(5)])
+
+    def test_binary(self):
+        """Test binary contents are not diffed line by line."""
+        result = diff_versions(self.chunks(["a\0b\n"]), self.chunks(["a\0c\n"]), self.store)
+        self.assertTrue(result.binary)
+
+
+class TestDescribeVersionChanges(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.store = VersionStore()
+        self.file = "notes.txt"
+        for content in ("first\nsecond\n", "first\nsecond\nthird\n", "first\nsecond\nthird\n"):
+            with open(self.file, "w") as f:
+                f.write(content)
+            self.store.save(self.file)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def test_describe(self):
+        """Test versions are compared with the one before them."""
+        message = describe_version_changes(self.file, "2", self.store)
+        self.assertIn("added 1 line(s) and removed 0 line(s)", message)
+        self.assertIn("+ third", message)
+        self.assertIn("added 2 line(s)", describe_version_changes(self.file, "1", self.store))
+        self.assertIn("same lines", describe_version_changes(self.file, "3", self.store))
+        self.assertEqual(describe_version_changes(self.file, "9", self.store),
+                         "Version not found.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""Tests for tags stored in extended attributes."""
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import utils.database as database
+from commands.file_manager import TagManager
+from utils.database import DatabaseManager
+from utils.tag_index import TagIndex
+from utils.xattr_tags import XATTR_NAME, XATTRS_AVAILABLE, XattrTagIndex, read_tags, write_tags
+
+
+def xattrs_supported(path):
+    """Check whether a folder's file system takes user attributes."""
+    if not XATTRS_AVAILABLE:
+        return False
+    probe = os.path.join(path, ".xattr-probe")
+    open(probe, "w").close()
+    try:
+        os.setxattr(probe, XATTR_NAME, b"probe")
+        return True
+    except OSError:
+        return False
+    finally:
+        os.remove(probe)
+
+
+class TestXattrTags(unittest.TestCase):
+    def setUp(self):
+        """Set up test environment."""
+        self.test_dir = os.path.realpath(tempfile.mkdtemp())
+        if not xattrs_supported(self.test_dir):
+            shutil.rmtree(self.test_dir)
+            self.skipTest("user extended attributes are not supported here")
+        self.original_cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        self.db = DatabaseManager(db_path=os.path.join(self.test_dir, "test.db"))
+        self.db_patch = patch.object(database, "_db_manager", self.db)
+        self.db_patch.start()
+        self.index = XattrTagIndex()
+        self.manager = TagManager(index=self.index)
+        self.files = []
+        for name in ("a.txt", "b.txt", "sub/c.txt"):
+            path = os.path.join(self.test_dir, *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(name)
+            self.files.append(path)
+
+    def tearDown(self):
+        """Clean up test environment."""
+        self.db_patch.stop()
+        DatabaseManager._instance = None
+        DatabaseManager._initialized = False
+        os.chdir(self.original_cwd)
+        shutil.rmtree(self.test_dir)
+
+    def test_tags_are_stored_on_the_file(self):
+        """Test tagging writes the attribute and the cache."""
+        self.assertEqual(self.manager.add_tag_to_files(self.files[:2], "work"), self.files[:2])
+        self.manager.add_tag("a.txt", "urgent")
+        self.assertEqual(read_tags(self.files[0]), ["urgent", "work"])
+        self.assertEqual(self.manager.get_files_by_tag("work"), self.files[:2])
+        self.assertEqual(self.manager.find_files("work not urgent"), [self.files[1]])
+        self.manager.remove_tag("a.txt", "urgent")
+        self.manager.remove_tag("a.txt", "work")
+        self.assertIsNone(read_tags(self.files[0]))
+
+    def test_reads_need_no_database(self):
+        """Test a file's tags are read from its attribute alone."""
+        write_tags(self.files[0], ["photo", "2024"])
+        with patch.object(self.db, "get_file_tags", side_effect=AssertionError("db read")):
+            self.assertEqual(self.manager.get_tags_for_file("a.txt"), ["2024", "photo"])
+
+    def test_tags_travel_with_the_file(self):
+        """Test a file moved behind Jarvis's back keeps its tags."""
+        self.manager.add_tag("a.txt", "work")
+        moved = os.path.join(self.test_dir, "sub", "moved.txt")
+        os.rename(self.files[0], moved)
+        self.assertEqual(self.manager.get_tags_for_file(moved), ["work"])
+
+    def test_rebuild(self):
+        """Test a rebuild picks up new attributes and drops stale entries."""
+        self.manager.add_tag_to_files(self.files, "work")
+        write_tags(self.files[2], ["home"])
+        os.remove(self.files[1])
+        self.assertEqual(self.manager.rebuild_index(self.test_dir), 2)
+        self.assertEqual(self.manager.get_files_by_tag("work"), [self.files[0]])
+        self.assertEqual(self.manager.get_files_by_tag("home"), [self.files[2]])
+
+    def test_rebuild_skips_unreadable_files(self):
+        """Test one unreadable file keeps its cached tags and does not stop the scan."""
+        self.manager.add_tag_to_files(self.files, "work")
+        write_tags(self.files[1], ["home"])
+        getxattr = os.getxattr
+
+        def denied(path, *args, **kwargs):
+            if path == self.files[0]:
+                raise PermissionError(13, "Permission denied", path)
+            return getxattr(path, *args, **kwargs)
+
+        with patch("utils.xattr_tags.os.getxattr", denied):
+            self.assertEqual(self.manager.rebuild_index(self.test_dir), 3)
+        self.assertEqual(self.manager.get_files_by_tag("work"), [self.files[0], self.files[2]])
+        self.assertEqual(self.manager.get_files_by_tag("home"), [self.files[1]])
+
+    def test_cached_tags_migrate_on_write(self):
+        """Test tags from before the backend move into the attribute on change."""
+        self.db.add_file_tags([("old", self.files[0])])
+        index = XattrTagIndex()
+        self.assertEqual(index.tags_for(self.files[0]), ["old"])
+        index.add([self.files[0]], "new")
+        self.assertEqual(read_tags(self.files[0]), ["new", "old"])
+
+    def test_index_backend_cannot_rebuild(self):
+        """Test rebuilding needs the attribute backend."""
+        with self.assertRaises(ValueError):
+            TagManager(index=TagIndex()).rebuild_index(self.test_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -6,3 +6,4 @@ from .retry import retry, transactional, Transaction
 from .logging_config import setup_logging
 from .sound_player import get_sound_player
 from .create_sound import create_wake_sound
+from .file_watcher import get_file_watcher
@@ -0,0 +1,299 @@
+"""Content-addressed chunk store with content-defined chunking.
+
+Files are cut into chunks at positions chosen by their content, so an
+insertion or deletion only changes the chunks around it and every other
+chunk keeps its boundaries and hash. Each chunk is stored once under its
+SHA-256, compressed with zlib when that helps, and a file is described by
+its list of (hash, length) pairs.
+
+Cut points follow FastCDC's normalized chunking: a position qualifies when
+a hash of the bytes before it meets a condition. The condition is stricter
+before the average chunk size and looser after it, within minimum and
+maximum sizes. The per-position hash XORs one random byte table per byte
+of an 8-byte window. It is computed for megabytes at a time with
+bytes.translate and big-integer XOR, which runs at C speed where a
+per-byte Python rolling hash would not.
+
+When the chunks of a previous version are known, each one is first
+checked at its old offset, or at the same offset shifted by the change in
+file size, by hashing alone. A chunk's end depends only on where it starts
+and on its own bytes, so an identical chunk found there ends where the
+chunker would have cut it. Unchanged regions of a file are therefore only
+hashed, and scanning for cut points is limited to the regions around
+edits.
+"""
+
+import hashlib
+import logging
+import mmap
+import os
+import zlib
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MIN_CHUNK = 16 * 1024
+AVG_CHUNK = 64 * 1024
+MAX_CHUNK = 256 * 1024
+# Bytes scanned for cut points at a time
+SEGMENT_SIZE = 4 * 1024 * 1024
+WINDOW = 8
+COMPRESS_LEVEL = 6
+
+_RAW = b"r"
+_ZLIB = b"z"
+# One random table per window position; fixed forever, since changing them
+# moves every cut point
+_TABLES = [hashlib.shake_256(b"jarvis-cdc-%d" % i).digest(256) for i in range(WINDOW)]
+
+
+class Chunk(NamedTuple):
+    """A chunk of a file by hash and length."""
+
+    digest: str
+    length: int
+
+
+def cut_points(data, start: int, end: int) -> List[Tuple[int, bool]]:
+    """Find the candidate cut points in part of a buffer.
+
+    Args:
+        data: Buffer, e.g. bytes or an mmap
+        start: Only cut points after this offset are returned
+        end: Only cut points up to this offset are returned
+
+    Returns:
+        List[Tuple[int, bool]]: (offset, strict) for each candidate, where
+        strict candidates meet the condition used before AVG_CHUNK
+    """
+    # A cut at c depends on the hashes of bytes c-3 to c-1, and each hash
+    # on the WINDOW bytes ending there
+    low = max(0, start - 2 - WINDOW)
+    buffer = bytes(data[low:end])
+    count = len(buffer) - (WINDOW - 1)
+    if count < 3:
+        return []
+    acc = 0
+    for i, table in enumerate(_TABLES):
+        offset = WINDOW - 1 - i
+        acc ^= int.from_bytes(buffer[offset:offset + count].translate(table), "little")
+    hashes = acc.to_bytes(count, "little")
+    base = low + WINDOW - 1
+
+    points = []
+    k = hashes.find(0)
+    while k != -1 and k + 2 < count:
+        # Loose: 1 in 2**14 positions; strict: 1 in 2**18
+        if hashes[k + 1] < 4:
+            cut = base + k + 3
+            if cut > start:
+                points.append((cut, hashes[k + 1] == 0 and hashes[k + 2] < 64))
+        k = hashes.find(0, k + 1)
+    return points
+
+
+class _Chunker:
+    """Cuts a buffer into content-defined chunks, scanning a segment at a time."""
+
+    def __init__(self, data, size: int):
+        self.data = data
+        self.size = size
+        self.points: List[Tuple[int, bool]] = []
+        self.offsets: List[int] = []
+        self.scanned = (0, 0)
+
+    def next_cut(self, position: int) -> int:
+        """Get where the chunk starting at a position ends."""
+        limit = min(position + MAX_CHUNK, self.size)
+        if limit - position <= MIN_CHUNK:
+            return limit
+        start, end = self.scanned
+        if position < start or limit > end:
+            end = min(self.size, max(limit, position + SEGMENT_SIZE))
+            self.points = cut_points(self.data, position, end)
+            self.offsets = [cut for cut, _ in self.points]
+            self.scanned = (position, end)
+        for cut, strict in self.points[bisect_left(self.offsets, position + MIN_CHUNK):]:
+            if cut > limit:
+                break
+            if strict or cut >= position + AVG_CHUNK:
+                return cut
+        return limit
+
+
+def iter_chunks(data, size: int, previous: Optional[List[Chunk]] = None
+                ) -> Iterator[Tuple[int, Chunk]]:
+    """Cut a buffer into content-defined chunks.
+
+    Args:
+        data: Buffer, e.g. bytes or an mmap
+        size: Number of bytes to chunk
+        previous: Chunks of an earlier version, reused where unchanged
+
+    Yields:
+        Tuple[int, Chunk]: Offset and chunk
+    """
+    previous = previous or []
+    starts: Dict[int, int] = {}
+    offset = 0
+    for i, chunk in enumerate(previous):
+        starts[offset] = i
+        offset += chunk.length
+    shifts = [0] if size == offset else [0, size - offset]
+
+    chunker = _Chunker(data, size)
+    position = 0
+    while position < size:
+        found = None
+        for shift in shifts:
+            i = starts.get(position - shift)
+            if i is None:
+                continue
+            old = previous[i]
+            end = position + old.length
+            # The last chunk was cut by the end of the file, not its content
+            if end > size or (i == len(previous) - 1 and end != size):
+                continue
+            if hashlib.sha256(data[position:end]).hexdigest() == old.digest:
+                found = old
+                # Later edits are most likely past this one: try its shift first
+                shifts.remove(shift)
+                shifts.insert(0, shift)
+                break
+        if found is None:
+            end = chunker.next_cut(position)
+            found = Chunk(hashlib.sha256(data[position:end]).hexdigest(), end - position)
+        yield position, found
+        position += found.length
+
+
+class ChunkStore:
+    """Stores chunks once each by hash, in a folder fanned out by hash prefix."""
+
+    def __init__(self, root: str):
+        """Initialize the store.
+
+        Args:
+            root: Folder holding the chunks; created on first write
+        """
+        self.root = root
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def has(self, digest: str) -> bool:
+        """Check whether a chunk is stored."""
+        return os.path.exists(self._path(digest))
+
+    def put(self, digest: str, data: bytes) -> int:
+        """Store a chunk unless it is already stored.
+
+        Args:
+            digest: SHA-256 of the data
+            data: Chunk contents
+
+        Returns:
+            int: Bytes written, 0 if the chunk was already stored
+        """
+        path = self._path(digest)
+        if os.path.exists(path):
+            return 0
+        compressed = zlib.compress(data, COMPRESS_LEVEL)
+        payload = _ZLIB + compressed if len(compressed) < len(data) else _RAW + data
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(payload)
+        os.replace(temp_path, path)
+        return len(payload)
+
+    def get(self, digest: str) -> bytes:
+        """Read a chunk, checking it against its hash.
+
+        Raises:
+            FileNotFoundError: If the chunk is not stored
+            ValueError: If the chunk is corrupt
+        """
+        with open(self._path(digest), "rb") as f:
+            payload = f.read()
+        try:
+            data = zlib.decompress(payload[1:]) if payload[:1] == _ZLIB else payload[1:]
+        except zlib.error as e:
+            raise ValueError(f"Chunk {digest} is corrupt: {str(e)}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Chunk {digest} is corrupt")
+        return data
+
+    def store_file(self, path: str, previous: Optional[List[Chunk]] = None
+                   ) -> Tuple[List[Chunk], Dict[str, int]]:
+        """Chunk a file and store the chunks not stored yet.
+
+        Args:
+            path: File to store
+            previous: Chunks of an earlier version of the file, which makes
+                unchanged regions cost one hash each
+
+        Returns:
+            Tuple[List[Chunk], Dict[str, int]]: The file's chunks, and the
+            number of new chunks and bytes written
+        """
+        chunks: List[Chunk] = []
+        stats = {"new_chunks": 0, "written": 0}
+        known = set(chunk.digest for chunk in previous or [])
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return chunks, stats
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                for offset, chunk in iter_chunks(data, size, previous):
+                    chunks.append(chunk)
+                    if chunk.digest in known:
+                        continue
+                    known.add(chunk.digest)
+                    written = self.put(chunk.digest, data[offset:offset + chunk.length])
+                    if written:
+                        stats["new_chunks"] += 1
+                        stats["written"] += written
+        return chunks, stats
+
+    def read_chunks(self, chunks: Iterable[Chunk]) -> Iterator[bytes]:
+        """Stream the contents described by a list of chunks."""
+        for chunk in chunks:
+            data = self.get(chunk.digest)
+            if len(data) != chunk.length:
+                raise ValueError(f"Chunk {chunk.digest} has the wrong length")
+            yield data
+
+    def sweep(self, keep: Iterable[str], older_than: float) -> Tuple[int, int]:
+        """Delete the stored chunks no longer referenced.
+
+        Args:
+            keep: Hashes of the chunks still referenced
+            older_than: Only files written before this Unix time are deleted,
+                so the chunks of a version being saved are left alone
+
+        Returns:
+            Tuple[int, int]: Number of chunks deleted and bytes freed
+        """
+        keep = set(keep)
+        deleted = freed = 0
+        if not os.path.isdir(self.root):
+            return deleted, freed
+        for prefix in os.scandir(self.root):
+            if not prefix.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(prefix.path):
+                if prefix.name + entry.name in keep:
+                    continue
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                    if st.st_mtime >= older_than:
+                        continue
+                    os.remove(entry.path)
+                except OSError as e:
+                    logger.error("Failed to delete chunk %s: %s", entry.path, str(e))
+                    continue
+                deleted += 1
+                freed += st.st_size
+        return deleted, freed
@@ -6,11 +6,14 @@ import os
 import sqlite3
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, Iterable, List, Any, Optional
 from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
+# Comparison operators allowed in metadata filters
+METADATA_OPERATORS = ("=", "<", "<=", ">", ">=")
+
 class DatabaseManager:
     """Singleton class for managing SQLite database operations."""
     
@@ -84,6 +87,163 @@ class DatabaseManager:
                 )
             """)
 
+            # Recycle bin index
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS recycle_bin (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    trash_path TEXT UNIQUE NOT NULL,
+                    original_path TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    deleted_at REAL NOT NULL,
+                    size INTEGER,
+                    device INTEGER,
+                    is_directory BOOLEAN
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recycle_bin_original "
+                "ON recycle_bin (original_path)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_recycle_bin_deleted "
+                "ON recycle_bin (deleted_at)"
+            )
+
+            # Content hashes keyed by file identity, reused while unchanged
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_hashes (
+                    device INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    partial_hash TEXT,
+                    full_hash TEXT,
+                    PRIMARY KEY (device, inode)
+                )
+            """)
+
+            # Per-directory disk usage, reused while the directory is unchanged
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS dir_usage (
+                    path TEXT PRIMARY KEY,
+                    mtime_ns INTEGER NOT NULL,
+                    file_bytes INTEGER NOT NULL,
+                    file_count INTEGER NOT NULL,
+                    subdirs TEXT,
+                    categories TEXT,
+                    largest TEXT
+                )
+            """)
+
+            # Source file state as of the last sync of a folder pair
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_manifest (
+                    source TEXT NOT NULL,
+                    target TEXT NOT NULL,
+                    rel_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    PRIMARY KEY (source, target, rel_path)
+                )
+            """)
+
+            # Folder tree snapshots; nodes are shared by hash between snapshots
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS tree_snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    root TEXT NOT NULL,
+                    root_hash BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    files INTEGER,
+                    dirs INTEGER
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_tree_snapshots_root "
+                "ON tree_snapshots (root, created_at)"
+            )
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS tree_nodes (
+                    hash BLOB PRIMARY KEY,
+                    entries BLOB NOT NULL
+                ) WITHOUT ROWID
+            """)
+
+            # File versions by path; ids are nanosecond timestamps, strictly increasing
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_versions (
+                    version_id INTEGER PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    mode INTEGER NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    chunks TEXT NOT NULL
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_file_versions_path "
+                "ON file_versions (path, version_id)"
+            )
+
+            # Tags by tag and, through the second index, by path
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_tags (
+                    tag TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (tag, path)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_file_tags_path ON file_tags (path, tag)"
+            )
+
+            # Point-in-time copies of folders; unchanged files are hard links
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS folder_snapshots (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    root TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    files INTEGER,
+                    linked INTEGER,
+                    copied INTEGER,
+                    bytes_copied INTEGER
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_folder_snapshots_root "
+                "ON folder_snapshots (root, created_at)"
+            )
+
+            # Files and folders versioned automatically when they change
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS auto_versioned_paths (
+                    path TEXT PRIMARY KEY,
+                    added_at REAL NOT NULL
+                )
+            """)
+
+            # Inode and content fingerprint of tracked files, to follow them across moves
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS file_identities (
+                    path TEXT PRIMARY KEY,
+                    device INTEGER NOT NULL,
+                    inode INTEGER NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    fingerprint TEXT NOT NULL
+                )
+            """)
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_file_identities_inode "
+                "ON file_identities (device, inode)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_file_identities_fingerprint "
+                "ON file_identities (fingerprint)"
+            )
+
             conn.commit()
 
     def update_file_metadata(self, file_path: str, metadata: Dict[str, Any]):
@@ -149,6 +309,67 @@ class DatabaseManager:
             logger.error(f"Error getting file metadata: {str(e)}")
             return None
 
+    def get_metadata_stamps(self, directory: str) -> Dict[str, tuple]:
+        """Get the size and modification time recorded for files under a folder.
+
+        Args:
+            directory: Absolute folder path
+
+        Returns:
+            Dict[str, tuple]: (size, modified_at) by path
+        """
+        prefix = directory.rstrip(os.sep) + os.sep
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT path, size, modified_at FROM file_metadata WHERE substr(path, 1, ?) = ?",
+                (len(prefix), prefix),
+            )
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def save_file_metadata(self, records: List[Dict[str, Any]]):
+        """Insert or update many file records in a single transaction.
+
+        Tags already stored for a file are kept.
+
+        Args:
+            records: File records as taken by update_file_metadata
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO file_metadata
+                (path, name, size, created_at, modified_at, file_type, is_directory, tags, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?, '[]', ?)
+                ON CONFLICT(path) DO UPDATE SET
+                    name = excluded.name,
+                    size = excluded.size,
+                    created_at = excluded.created_at,
+                    modified_at = excluded.modified_at,
+                    file_type = excluded.file_type,
+                    is_directory = excluded.is_directory,
+                    metadata = excluded.metadata
+            """, [(
+                record["path"],
+                record["name"],
+                record.get("size", 0),
+                record.get("created_at"),
+                record.get("modified_at"),
+                record.get("file_type"),
+                record.get("is_directory", False),
+                json.dumps(record.get("metadata", {})),
+            ) for record in records])
+            conn.commit()
+
+    def remove_file_metadata(self, paths: Iterable[str]):
+        """Delete the records of files that no longer exist."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "DELETE FROM file_metadata WHERE path = ?", [(path,) for path in paths]
+            )
+            conn.commit()
+
     def log_operation(self, operation: str, source_path: str, target_path: str, status: str, error: str = None):
         """Log a file operation."""
         with self.get_connection() as conn:
@@ -160,6 +381,21 @@ class DatabaseManager:
             """, (operation, source_path, target_path, status, error))
             conn.commit()
 
+    def log_operations(self, operations: List[tuple]):
+        """Log several file operations in a single transaction.
+
+        Args:
+            operations: Tuples of (operation, source_path, target_path, status, error)
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO operation_log 
+                (operation, source_path, target_path, status, error)
+                VALUES (?, ?, ?, ?, ?)
+            """, operations)
+            conn.commit()
+
     def log_performance(self, operation: str, duration_ms: int, memory_usage: int):
         """Log performance metrics."""
         with self.get_connection() as conn:
@@ -171,17 +407,44 @@ class DatabaseManager:
             """, (operation, duration_ms, memory_usage))
             conn.commit()
 
-    def search_files(self, query: str) -> List[Dict[str, Any]]:
-        """Search files by name, tags, or metadata."""
-        if query is None:
+    def search_files(self, query: Optional[str], filters: Optional[List[tuple]] = None,
+                     directory: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Search files by name, tags, or metadata.
+
+        Args:
+            query: Text matched against names, tags and metadata, or None
+            filters: Optional (attribute, operator, value) conditions on the
+                extracted metadata, e.g. ("width", ">=", 1920)
+            directory: Optional folder the files must be under
+
+        Returns:
+            List[Dict[str, Any]]: Matching file records
+
+        Raises:
+            ValueError: If a filter has an unknown operator or attribute
+        """
+        if query is None and not filters:
             return []
-            
+
+        clauses, params = [], []
+        if query is not None:
+            clauses.append("(name LIKE ? OR tags LIKE ? OR metadata LIKE ?)")
+            params.extend([f"%{query}%"] * 3)
+        for attribute, operator, value in filters or ():
+            if operator not in METADATA_OPERATORS or not attribute.isidentifier():
+                raise ValueError(f"Invalid metadata filter: {attribute} {operator}")
+            clauses.append(f"json_extract(metadata, ?) {operator} ?")
+            params.extend([f"$.{attribute}", value])
+        if directory:
+            prefix = directory.rstrip(os.sep) + os.sep
+            clauses.append("substr(path, 1, ?) = ?")
+            params.extend([len(prefix), prefix])
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM file_metadata 
-                WHERE name LIKE ? OR tags LIKE ? OR metadata LIKE ?
-            """, (f"%{query}%", f"%{query}%", f"%{query}%"))
+            cursor.execute(
+                "SELECT * FROM file_metadata WHERE " + " AND ".join(clauses), params
+            )
 
             results = []
             for row in cursor.fetchall():
@@ -198,6 +461,640 @@ class DatabaseManager:
                 })
             return results
 
+    def add_recycle_entry(self, entry: Dict[str, Any]) -> int:
+        """Record an item moved into the recycle bin.
+
+        Args:
+            entry: Item details (trash_path, original_path, name, deleted_at,
+                size, device, is_directory)
+
+        Returns:
+            int: Row id of the new entry
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO recycle_bin
+                (trash_path, original_path, name, deleted_at, size, device, is_directory)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                entry["trash_path"],
+                entry["original_path"],
+                entry["name"],
+                entry["deleted_at"],
+                entry.get("size", 0),
+                entry.get("device"),
+                entry.get("is_directory", False),
+            ))
+            conn.commit()
+            return cursor.lastrowid
+
+    def add_recycle_entries(self, entries: List[Dict[str, Any]]):
+        """Record several recycle bin items in a single transaction."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO recycle_bin
+                (trash_path, original_path, name, deleted_at, size, device, is_directory)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    entry["trash_path"],
+                    entry["original_path"],
+                    entry["name"],
+                    entry["deleted_at"],
+                    entry.get("size", 0),
+                    entry.get("device"),
+                    entry.get("is_directory", False),
+                )
+                for entry in entries
+            ])
+            conn.commit()
+
+    def find_recycle_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        """Find the most recently deleted item matching a path or name.
+
+        The key is matched against the original path first, then against
+        the path inside the recycle bin and finally against the item name.
+
+        Args:
+            key: Original path, trash path or item name
+
+        Returns:
+            Optional[Dict[str, Any]]: The entry, or None if nothing matches
+        """
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            for column in ("original_path", "trash_path", "name"):
+                cursor.execute(
+                    f"SELECT * FROM recycle_bin WHERE {column} = ? "
+                    "ORDER BY deleted_at DESC LIMIT 1",
+                    (key,),
+                )
+                row = cursor.fetchone()
+                if row:
+                    return dict(row)
+            return None
+
+    def list_recycle_entries(self, oldest_first: bool = False,
+                             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """List recycle bin entries ordered by deletion time.
+
+        Args:
+            oldest_first: Return the oldest entries first instead of newest
+            limit: Optional maximum number of entries
+
+        Returns:
+            List[Dict[str, Any]]: Recycle bin entries
+        """
+        order = "ASC" if oldest_first else "DESC"
+        query = f"SELECT * FROM recycle_bin ORDER BY deleted_at {order}"
+        params: tuple = ()
+        if limit is not None:
+            query += " LIMIT ?"
+            params = (limit,)
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def remove_recycle_entry(self, entry_id: int):
+        """Remove a recycle bin entry by id."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM recycle_bin WHERE id = ?", (entry_id,))
+            conn.commit()
+
+    def remove_recycle_entry_by_path(self, trash_path: str):
+        """Remove a recycle bin entry by its path inside the bin."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM recycle_bin WHERE trash_path = ?", (trash_path,))
+            conn.commit()
+
+    def get_recycle_bin_size(self) -> int:
+        """Get the total size in bytes of all items in the recycle bin."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(SUM(size), 0) FROM recycle_bin")
+            return cursor.fetchone()[0]
+
+    def set_recycle_entry_sizes(self, sizes: List[tuple]):
+        """Record the sizes of recycle bin items measured after trashing.
+
+        Args:
+            sizes: (entry id, size in bytes) pairs
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("UPDATE recycle_bin SET size = ? WHERE id = ?",
+                               [(size, entry_id) for entry_id, size in sizes])
+            conn.commit()
+
+    def get_file_hashes(self) -> Dict[tuple, Dict[str, Any]]:
+        """Get every cached file hash.
+
+        Returns:
+            Dict[tuple, Dict[str, Any]]: Rows keyed by (device, inode)
+        """
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM file_hashes")
+            return {(row["device"], row["inode"]): dict(row) for row in cursor.fetchall()}
+
+    def save_file_hashes(self, rows: List[Dict[str, Any]]):
+        """Store file hashes in a single transaction.
+
+        Args:
+            rows: Dicts with device, inode, size, mtime_ns, partial_hash and full_hash
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO file_hashes
+                (device, inode, size, mtime_ns, partial_hash, full_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    row["device"],
+                    row["inode"],
+                    row["size"],
+                    row["mtime_ns"],
+                    row.get("partial_hash"),
+                    row.get("full_hash"),
+                )
+                for row in rows
+            ])
+            conn.commit()
+
+    def get_dir_usage(self, root: str) -> Dict[str, Dict[str, Any]]:
+        """Get the cached disk usage of a directory and everything below it.
+
+        Args:
+            root: Absolute directory path
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Rows keyed by path, with subdirs,
+            categories and largest decoded from JSON
+        """
+        prefix = root.rstrip(os.sep) + os.sep
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM dir_usage WHERE path = ? OR substr(path, 1, ?) = ?",
+                (root, len(prefix), prefix),
+            )
+            rows = {}
+            for row in cursor.fetchall():
+                record = dict(row)
+                for column in ("subdirs", "categories", "largest"):
+                    record[column] = json.loads(record[column] or "null")
+                rows[record["path"]] = record
+            return rows
+
+    def save_dir_usage(self, rows: List[Dict[str, Any]], removed: Iterable[str] = ()):
+        """Store directory usage rows and drop vanished directories in one transaction.
+
+        Args:
+            rows: Dicts with path, mtime_ns, file_bytes, file_count, subdirs,
+                categories and largest
+            removed: Paths of directories that no longer exist
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO dir_usage
+                (path, mtime_ns, file_bytes, file_count, subdirs, categories, largest)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    row["path"],
+                    row["mtime_ns"],
+                    row["file_bytes"],
+                    row["file_count"],
+                    json.dumps(row["subdirs"]),
+                    json.dumps(row["categories"]),
+                    json.dumps(row["largest"]),
+                )
+                for row in rows
+            ])
+            cursor.executemany("DELETE FROM dir_usage WHERE path = ?",
+                               [(path,) for path in removed])
+            conn.commit()
+
+    def get_sync_manifest(self, source: str, target: str) -> Dict[str, tuple]:
+        """Get the manifest of the last sync from one folder to another.
+
+        Args:
+            source: Absolute source folder
+            target: Absolute target folder
+
+        Returns:
+            Dict[str, tuple]: (size, mtime_ns) of each synced file by relative path
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT rel_path, size, mtime_ns FROM sync_manifest "
+                "WHERE source = ? AND target = ?",
+                (source, target),
+            )
+            return {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+
+    def save_sync_manifest(self, source: str, target: str, rows: List[tuple],
+                           removed: Iterable[str] = ()):
+        """Update the manifest of a folder pair in a single transaction.
+
+        Args:
+            source: Absolute source folder
+            target: Absolute target folder
+            rows: (rel_path, size, mtime_ns) of files synced
+            removed: Relative paths of files deleted from the target
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO sync_manifest
+                (source, target, rel_path, size, mtime_ns)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(source, target, rel_path, size, mtime_ns)
+                  for rel_path, size, mtime_ns in rows])
+            cursor.executemany(
+                "DELETE FROM sync_manifest WHERE source = ? AND target = ? AND rel_path = ?",
+                [(source, target, rel_path) for rel_path in removed],
+            )
+            conn.commit()
+
+    def save_tree_snapshot(self, root: str, root_hash: bytes, nodes: Dict[bytes, bytes],
+                           files: int, dirs: int, created_at: float) -> int:
+        """Record a tree snapshot and its new nodes in a single transaction.
+
+        Args:
+            root: Absolute folder
+            root_hash: Hash of the root node
+            nodes: Compressed nodes not stored yet, by hash
+            files: Number of files in the tree
+            dirs: Number of folders in the tree
+            created_at: When the tree was recorded, as a Unix time
+
+        Returns:
+            int: Snapshot id
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("INSERT OR IGNORE INTO tree_nodes (hash, entries) VALUES (?, ?)",
+                               list(nodes.items()))
+            cursor.execute("""
+                INSERT INTO tree_snapshots (root, root_hash, created_at, files, dirs)
+                VALUES (?, ?, ?, ?, ?)
+            """, (root, root_hash, created_at, files, dirs))
+            conn.commit()
+            return cursor.lastrowid
+
+    def get_tree_snapshots(self, root: str) -> List[Dict[str, Any]]:
+        """List the snapshots of a folder, oldest first."""
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM tree_snapshots WHERE root = ? ORDER BY created_at, id", (root,)
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_tree_node(self, digest: bytes) -> Optional[bytes]:
+        """Get a compressed tree node by hash."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT entries FROM tree_nodes WHERE hash = ?", (digest,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def get_existing_tree_nodes(self, digests: List[bytes]) -> set:
+        """Get which of the given node hashes are stored."""
+        found = set()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for i in range(0, len(digests), 500):
+                chunk = digests[i:i + 500]
+                cursor.execute(
+                    f"SELECT hash FROM tree_nodes WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                )
+                found.update(row[0] for row in cursor.fetchall())
+        return found
+
+    def get_tree_root_hashes(self) -> List[bytes]:
+        """Get the root hash of every stored snapshot."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT root_hash FROM tree_snapshots")
+            return [row[0] for row in cursor.fetchall()]
+
+    def delete_tree_snapshots(self, snapshot_ids: Iterable[int]):
+        """Delete snapshots; their nodes stay until swept."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM tree_snapshots WHERE id = ?",
+                               [(snapshot_id,) for snapshot_id in snapshot_ids])
+            conn.commit()
+
+    def delete_unreachable_tree_nodes(self, reachable: set) -> int:
+        """Delete every tree node not in a set of hashes.
+
+        Returns:
+            int: Number of nodes deleted
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT hash FROM tree_nodes")
+            unreachable = [(row[0],) for row in cursor.fetchall() if row[0] not in reachable]
+            cursor.executemany("DELETE FROM tree_nodes WHERE hash = ?", unreachable)
+            conn.commit()
+            return len(unreachable)
+
+    def add_file_version(self, record: Dict[str, Any], version_id: Optional[int] = None,
+                         keep_id: bool = False) -> int:
+        """Record a file version under a new, strictly increasing id.
+
+        Args:
+            record: Version details (path, size, mtime_ns, mode, content_hash,
+                chunks as a list of [digest, length])
+            version_id: Minimum id, normally the current time in nanoseconds
+            keep_id: Use the given id, or the next free one, even if newer
+                versions exist; for importing old versions
+
+        Returns:
+            int: The version id
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            # Take the write lock before reading the last id
+            cursor.execute("BEGIN IMMEDIATE")
+            if keep_id:
+                cursor.execute(
+                    "SELECT version_id FROM file_versions WHERE version_id >= ? "
+                    "ORDER BY version_id", (version_id,)
+                )
+                for (taken,) in cursor.fetchall():
+                    if taken != version_id:
+                        break
+                    version_id += 1
+            else:
+                cursor.execute("SELECT MAX(version_id) FROM file_versions")
+                last = cursor.fetchone()[0] or 0
+                version_id = max(version_id or 0, last + 1)
+            cursor.execute("""
+                INSERT INTO file_versions
+                (version_id, path, size, mtime_ns, mode, content_hash, chunks)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (
+                version_id,
+                record["path"],
+                record["size"],
+                record["mtime_ns"],
+                record["mode"],
+                record["content_hash"],
+                json.dumps(record["chunks"], separators=(",", ":")),
+            ))
+            conn.commit()
+            return version_id
+
+    def get_file_versions(self, path: str) -> List[Dict[str, Any]]:
+        """List the versions of a file, oldest first, without their chunk lists."""
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT version_id, path, size, mtime_ns, mode, content_hash
+                FROM file_versions WHERE path = ? ORDER BY version_id
+            """, (path,))
+            return [dict(row) for row in cursor.fetchall()]
+
+    def _version_row(self, query: str, params: tuple) -> Optional[Dict[str, Any]]:
+        """Fetch one version with its chunk list decoded."""
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        version = dict(row)
+        version["chunks"] = json.loads(version["chunks"])
+        return version
+
+    def get_file_version(self, version_id: int) -> Optional[Dict[str, Any]]:
+        """Get a version, including its chunk list, by id."""
+        return self._version_row("SELECT * FROM file_versions WHERE version_id = ?",
+                                 (version_id,))
+
+    def get_latest_file_version(self, path: str) -> Optional[Dict[str, Any]]:
+        """Get the newest version of a file, including its chunk list."""
+        return self._version_row(
+            "SELECT * FROM file_versions WHERE path = ? ORDER BY version_id DESC LIMIT 1",
+            (path,),
+        )
+
+    def list_all_file_versions(self) -> List[tuple]:
+        """Get (version_id, path) of every version, by path and then id."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version_id, path FROM file_versions ORDER BY path, version_id")
+            return cursor.fetchall()
+
+    def get_version_chunk_lists(self) -> Iterable[str]:
+        """Yield the JSON chunk list of every version."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT chunks FROM file_versions")
+            for row in cursor:
+                yield row[0]
+
+    def delete_file_versions(self, version_ids: Iterable[int]):
+        """Delete versions by id; their chunks stay until collected."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM file_versions WHERE version_id = ?",
+                               [(version_id,) for version_id in version_ids])
+            conn.commit()
+
+    def get_file_tags(self) -> List[tuple]:
+        """Get every (tag, path) pair."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT tag, path FROM file_tags")
+            return cursor.fetchall()
+
+    def add_file_tags(self, rows: List[tuple]):
+        """Add (tag, path) pairs in a single transaction."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("INSERT OR IGNORE INTO file_tags (tag, path) VALUES (?, ?)", rows)
+            conn.commit()
+
+    def remove_file_tags(self, rows: List[tuple]):
+        """Remove (tag, path) pairs in a single transaction."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM file_tags WHERE tag = ? AND path = ?", rows)
+            conn.commit()
+
+    def add_folder_snapshot(self, snapshot: Dict[str, Any]) -> int:
+        """Record a completed folder snapshot.
+
+        Args:
+            snapshot: root, path, created_at, files, linked, copied and bytes_copied
+
+        Returns:
+            int: Id of the snapshot
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO folder_snapshots
+                (root, path, created_at, files, linked, copied, bytes_copied)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (snapshot["root"], snapshot["path"], snapshot["created_at"],
+                  snapshot["files"], snapshot["linked"], snapshot["copied"],
+                  snapshot["bytes_copied"]))
+            conn.commit()
+            return cursor.lastrowid
+
+    def get_folder_snapshots(self, root: str) -> List[Dict[str, Any]]:
+        """Get the snapshots of a folder, oldest first."""
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT * FROM folder_snapshots WHERE root = ? ORDER BY created_at, id",
+                (root,),
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    def delete_folder_snapshot(self, snapshot_id: int):
+        """Forget a folder snapshot; its files are removed by the caller."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM folder_snapshots WHERE id = ?", (snapshot_id,))
+            conn.commit()
+
+    def add_auto_versioned_path(self, path: str, added_at: float):
+        """Mark a file or folder for automatic versioning."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT OR IGNORE INTO auto_versioned_paths (path, added_at) VALUES (?, ?)",
+                (path, added_at),
+            )
+            conn.commit()
+
+    def remove_auto_versioned_path(self, path: str) -> bool:
+        """Stop versioning a file or folder automatically.
+
+        Returns:
+            bool: Whether the path was marked
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM auto_versioned_paths WHERE path = ?", (path,))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def get_auto_versioned_paths(self) -> List[str]:
+        """Get the paths marked for automatic versioning, in the order added."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT path FROM auto_versioned_paths ORDER BY added_at, path")
+            return [row[0] for row in cursor.fetchall()]
+
+    def save_file_identities(self, rows: List[Dict[str, Any]]):
+        """Record the identity of files in a single transaction.
+
+        Args:
+            rows: path, device, inode, size, mtime_ns and fingerprint of each file
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT OR REPLACE INTO file_identities
+                (path, device, inode, size, mtime_ns, fingerprint)
+                VALUES (:path, :device, :inode, :size, :mtime_ns, :fingerprint)
+            """, rows)
+            conn.commit()
+
+    def _identity_rows(self, query: str, params: tuple) -> List[Dict[str, Any]]:
+        with self.get_connection() as conn:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_file_identity(self, path: str) -> Optional[Dict[str, Any]]:
+        """Get the recorded identity of a path."""
+        rows = self._identity_rows("SELECT * FROM file_identities WHERE path = ?", (path,))
+        return rows[0] if rows else None
+
+    def find_file_identities(self, device: int, inode: int) -> List[Dict[str, Any]]:
+        """Get the tracked paths recorded with an inode."""
+        return self._identity_rows(
+            "SELECT * FROM file_identities WHERE device = ? AND inode = ?", (device, inode)
+        )
+
+    def find_file_identities_by_fingerprint(self, fingerprint: str) -> List[Dict[str, Any]]:
+        """Get the tracked paths recorded with a content fingerprint."""
+        return self._identity_rows(
+            "SELECT * FROM file_identities WHERE fingerprint = ?", (fingerprint,)
+        )
+
+    def delete_file_identities(self, paths: Iterable[str]):
+        """Stop tracking paths."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("DELETE FROM file_identities WHERE path = ?",
+                               [(path,) for path in paths])
+            conn.commit()
+
+    def rename_paths(self, moves: List[tuple]) -> int:
+        """Re-key everything stored by path after files or folders moved.
+
+        Each (old, new) pair renames the path itself and, for a folder,
+        every path below it, in the tags, metadata, versions, automatic
+        versioning and identity tables. Pairs are applied in order in a
+        single transaction, so chains of renames resolve as on disk.
+
+        Args:
+            moves: (old, new) absolute path pairs
+
+        Returns:
+            int: Number of rows re-keyed
+        """
+        tables = ("file_identities", "file_tags", "file_metadata",
+                  "file_versions", "auto_versioned_paths")
+        changed = 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            for old, new in moves:
+                # Paths below old sort between old + sep and the next character
+                low, high = old + os.sep, old + chr(ord(os.sep) + 1)
+                for table in tables:
+                    cursor.execute(f"UPDATE OR REPLACE {table} SET path = ? WHERE path = ?",
+                                   (new, old))
+                    changed += cursor.rowcount
+                    cursor.execute(
+                        f"UPDATE OR REPLACE {table} SET path = ? || substr(path, ?) "
+                        "WHERE path > ? AND path < ?",
+                        (new, len(old) + 1, low, high),
+                    )
+                    changed += cursor.rowcount
+                cursor.execute("UPDATE file_metadata SET name = ? WHERE path = ?",
+                               (os.path.basename(new), new))
+            conn.commit()
+        return changed
+
 # Global instance
 _db_manager = None
 
@@ -0,0 +1,269 @@
+"""File identity that survives renames and moves.
+
+Tags, metadata and versions are stored by absolute path, so a file that is
+renamed would lose them. Wherever such a record is written (tagging,
+private markers, metadata extraction and version saves) the file is also
+tracked by its (st_dev, st_ino) pair, which a rename on the same file
+system keeps, and by a content fingerprint (the size and the first and
+last 4 KiB), which a copy to another file system keeps.
+
+Moves made by Jarvis are reported through moved(), which re-keys every
+path-keyed table in one indexed UPDATE per table; a folder move re-keys
+the paths below it through the same range scan. Moves made by other
+programs arrive from the file watcher as a deleted and a created path:
+the created path's inode is looked up, and when the inode is new the
+fingerprint is matched against tracked paths that no longer exist.
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .database import DatabaseManager, get_db_manager
+from .file_watcher import CREATED, DELETED, MODIFIED, ChangeEvent, get_file_watcher
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from each end of a file for its fingerprint
+FINGERPRINT_BYTES = 4096
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+MoveCallback = Callable[[List[Tuple[str, str]]], None]
+
+
+def fingerprint(path: str, size: Optional[int] = None) -> str:
+    """Hash a file's size and its first and last bytes.
+
+    Args:
+        path: File to fingerprint
+        size: Size of the file, if already known
+
+    Returns:
+        str: Hex digest
+    """
+    size = os.path.getsize(path) if size is None else size
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_BYTES))
+        if size > 2 * FINGERPRINT_BYTES:
+            f.seek(-FINGERPRINT_BYTES, os.SEEK_END)
+            digest.update(f.read(FINGERPRINT_BYTES))
+        elif size > FINGERPRINT_BYTES:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _identity(path: str) -> Optional[Dict[str, Any]]:
+    """Build the identity record of a path, None if it cannot be read."""
+    try:
+        st = os.stat(path)
+        return _identity_from_stat(path, st)
+    except OSError as e:
+        logger.debug("Not tracking %s: %s", path, str(e))
+        return None
+
+
+def _identity_from_stat(path: str, st: os.stat_result) -> Dict[str, Any]:
+    """Build the identity record of a path from its stat result."""
+    is_dir = os.path.isdir(path)
+    return {
+        "path": path,
+        "device": st.st_dev,
+        "inode": st.st_ino,
+        "size": 0 if is_dir else st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "fingerprint": "" if is_dir else fingerprint(path, st.st_size),
+    }
+
+
+class IdentityMap:
+    """Keeps path-keyed records attached to files as they move."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        """Initialize the map.
+
+        Args:
+            db: Database to use; defaults to the global database
+        """
+        self._db = db
+        self._lock = threading.Lock()
+        self._listeners: List[MoveCallback] = []
+        self._subscriptions: Dict[str, int] = {}
+
+    @property
+    def db(self) -> DatabaseManager:
+        return self._db or get_db_manager()
+
+    def on_move(self, callback: MoveCallback) -> None:
+        """Register a callback receiving the (old, new) pairs of each move.
+
+        Used to re-key in-memory state after the database was updated.
+        """
+        self._listeners.append(callback)
+
+    def track(self, paths: Iterable[str]) -> int:
+        """Record the identity of files and folders so they can be followed.
+
+        Args:
+            paths: Absolute paths; missing ones are skipped
+
+        Returns:
+            int: Number of paths recorded
+        """
+        paths = list(paths)
+        if len(paths) > 1:
+            # Fingerprints read files; read them concurrently
+            with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as executor:
+                rows = [row for row in executor.map(_identity, paths) if row is not None]
+        else:
+            rows = [row for row in map(_identity, paths) if row is not None]
+        if rows:
+            self.db.save_file_identities(rows)
+        return len(rows)
+
+    def forget(self, paths: Iterable[str]) -> None:
+        """Stop following paths."""
+        self.db.delete_file_identities(paths)
+
+    def moved(self, old: str, new: str) -> None:
+        """Report that a file or folder was moved or renamed."""
+        self.moved_many([(old, new)])
+
+    def moved_many(self, moves: List[Tuple[str, str]]) -> None:
+        """Report moves, applied in order, e.g. a batch of renames.
+
+        Args:
+            moves: (old, new) absolute path pairs
+        """
+        moves = [(os.path.abspath(old), os.path.abspath(new)) for old, new in moves]
+        if not moves:
+            return
+        with self._lock:
+            try:
+                self.db.rename_paths(moves)
+                # A move across file systems gives the file a new inode
+                stale = []
+                for _, new in moves:
+                    record = self.db.get_file_identity(new)
+                    if record is not None and not self._same_inode(record, new):
+                        stale.append(new)
+                self.track(stale)
+            except Exception as e:
+                logger.error("Error updating moved paths: %s", str(e))
+                return
+        self._notify(moves)
+
+    def _notify(self, moves: List[Tuple[str, str]]) -> None:
+        for callback in self._listeners:
+            try:
+                callback(moves)
+            except Exception as e:
+                logger.error("Error in move listener: %s", str(e))
+
+    @staticmethod
+    def _same_inode(record: Dict[str, Any], path: str) -> bool:
+        """Check whether a path still holds the inode recorded for it."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        return (st.st_dev, st.st_ino) == (record["device"], record["inode"])
+
+    def _moved_from(self, path: str, st: os.stat_result,
+                    deleted: set) -> Optional[str]:
+        """Find the tracked path a newly appeared path was moved from.
+
+        Args:
+            path: Path that appeared
+            st: Its stat result
+            deleted: Paths reported deleted in the same batch
+
+        Returns:
+            Optional[str]: The old path, or None if the file is not tracked
+        """
+        candidates = self.db.find_file_identities(st.st_dev, st.st_ino)
+        for record in candidates:
+            if record["path"] == path:
+                return None
+            # The inode may have been freed and reused by an unrelated file,
+            # unless the old path went away in the same batch
+            unchanged = (record["size"], record["mtime_ns"]) == (st.st_size, st.st_mtime_ns)
+            if (not self._same_inode(record, record["path"])
+                    and (record["path"] in deleted or unchanged or os.path.isdir(path)
+                         or record["fingerprint"] == fingerprint(path, st.st_size))):
+                return record["path"]
+        if os.path.isdir(path):
+            return None
+        # A copy to another file system keeps the contents but not the inode
+        records = self.db.find_file_identities_by_fingerprint(fingerprint(path, st.st_size))
+        if any(record["path"] == path for record in records):
+            return None
+        for record in records:
+            if record["path"] in deleted or not os.path.lexists(record["path"]):
+                return record["path"]
+        return None
+
+    def apply_changes(self, events: List[ChangeEvent]) -> int:
+        """File watcher callback: follow tracked files moved by other programs.
+
+        Args:
+            events: Changes of one batch
+
+        Returns:
+            int: Number of moves found
+        """
+        deleted = {event.path for event in events if event.kind == DELETED}
+        moves = []
+        retrack = []
+        for event in events:
+            if event.kind not in (CREATED, MODIFIED):
+                continue
+            try:
+                st = os.stat(event.path)
+            except OSError:
+                continue
+            try:
+                old = self._moved_from(event.path, st, deleted)
+                if old is not None:
+                    # Apply at once so the moved folder's files resolve to it
+                    self.moved(old, event.path)
+                    moves.append((old, event.path))
+                    continue
+                # Safe saves replace a file with a new inode at the same path
+                record = self.db.get_file_identity(event.path)
+                if record is not None and (record["device"], record["inode"]) != (st.st_dev, st.st_ino):
+                    retrack.append(event.path)
+            except OSError as e:
+                logger.debug("Could not identify %s: %s", event.path, str(e))
+        if retrack:
+            self.track(retrack)
+        for old, new in moves:
+            logger.info("Followed move of %s to %s", old, new)
+        return len(moves)
+
+    def watch(self, root: str) -> None:
+        """Follow tracked files moved under a folder by other programs."""
+        root = os.path.abspath(root)
+        if root not in self._subscriptions:
+            self._subscriptions[root] = get_file_watcher().subscribe(root, self.apply_changes)
+
+    def stop(self) -> None:
+        """Stop watching every folder."""
+        while self._subscriptions:
+            _, sub_id = self._subscriptions.popitem()
+            get_file_watcher().unsubscribe(sub_id)
+
+
+# Global instance
+_identity_map = None
+
+
+def get_identity_map() -> IdentityMap:
+    """Get the global IdentityMap instance."""
+    global _identity_map
+    if _identity_map is None:
+        _identity_map = IdentityMap()
+    return _identity_map
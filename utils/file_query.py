@@ -0,0 +1,320 @@
+"""File query module for walking directory trees with pattern filters.
+
+Patterns use gitignore syntax: ``*`` and ``?`` never cross a ``/``, ``**``
+matches any number of directories, a leading ``/`` or an inner ``/`` anchors
+the pattern to the directory it was declared in, a trailing ``/`` only
+matches directories and ``!`` re-includes a previously excluded path.
+
+Exclusions are checked before descending, so ignored directories such as
+``.git``, ``node_modules`` or a virtualenv are pruned as a whole instead of
+being walked and filtered afterwards. ``.gitignore`` and ``.jarvisignore``
+files found during the walk are applied to their own subtree.
+"""
+
+import logging
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Ignore files honoured during a walk
+IGNORE_FILES = (".gitignore", ".jarvisignore")
+
+# Directories that are never worth descending into
+DEFAULT_EXCLUDES = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    "node_modules/",
+    "__pycache__/",
+    ".venv/",
+    "venv/",
+    ".tox/",
+    ".nox/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+    ".ruff_cache/",
+    ".recycle_bin/",
+    ".Trash-*/",
+    "file_versions/",
+    "file_chunks/",
+    ".folder_snapshots/",
+)
+
+# Marker file of a Python virtual environment
+VENV_MARKER = "pyvenv.cfg"
+
+
+def glob_to_regex(pattern: str) -> str:
+    """Translate a gitignore-style glob into a regular expression.
+
+    Args:
+        pattern: Glob without negation, anchoring or trailing slash
+
+    Returns:
+        str: Regular expression matching the whole relative path
+    """
+    regex = []
+    i = 0
+    n = len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == "*":
+            if pattern[i:i + 2] == "**":
+                at_start = i == 0 or pattern[i - 1] == "/"
+                if at_start and pattern[i + 2:i + 3] == "/":
+                    regex.append("(?:.*/)?")
+                    i += 3
+                    continue
+                if at_start and i + 2 == n:
+                    regex.append(".*")
+                    i += 2
+                    continue
+                regex.append("[^/]*")
+                i += 2
+                continue
+            regex.append("[^/]*")
+        elif char == "?":
+            regex.append("[^/]")
+        elif char == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                regex.append(f"[{body.replace(chr(92), chr(92) * 2)}]")
+                i = end
+        elif char == "\\" and i + 1 < n:
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(char))
+        i += 1
+    return "".join(regex)
+
+
+class PathPattern:
+    """A single compiled gitignore-style pattern."""
+
+    __slots__ = ("pattern", "negated", "dir_only", "anchored", "_regex")
+
+    def __init__(self, pattern: str, ignore_case: bool = False):
+        """Compile a pattern.
+
+        Args:
+            pattern: gitignore-style pattern
+            ignore_case: Match case-insensitively
+        """
+        self.pattern = pattern
+        self.negated = pattern.startswith("!")
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        self.anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        flags = re.IGNORECASE if ignore_case else 0
+        self._regex = re.compile(glob_to_regex(pattern) + r"\Z", flags)
+
+    def matches(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Check whether a path matches the pattern.
+
+        Args:
+            rel_path: Path relative to the pattern's base, "/"-separated
+            is_dir: Whether the path is a directory
+
+        Returns:
+            bool: True if the path matches (negation is not applied)
+        """
+        if self.dir_only and not is_dir:
+            return False
+        if self.anchored:
+            return self._regex.match(rel_path) is not None
+        return self._regex.match(rel_path.rsplit("/", 1)[-1]) is not None
+
+
+class IgnoreRules:
+    """Ordered set of gitignore-style rules where the last match wins."""
+
+    def __init__(self, patterns: Iterable[str] = (), ignore_case: bool = False):
+        """Compile rules.
+
+        Args:
+            patterns: Lines of an ignore file; blanks and comments are skipped
+            ignore_case: Match case-insensitively
+        """
+        self.rules: List[PathPattern] = []
+        for line in patterns:
+            line = line.rstrip("\n")
+            if line.endswith(" ") and not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            self.rules.append(PathPattern(line, ignore_case))
+
+    @classmethod
+    def from_file(cls, path: str) -> "IgnoreRules":
+        """Load rules from an ignore file.
+
+        Args:
+            path: Path to a .gitignore-style file
+
+        Returns:
+            IgnoreRules: The rules, empty if the file cannot be read
+        """
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return cls(f.readlines())
+        except OSError as e:
+            logger.warning("Could not read ignore file %s: %s", path, str(e))
+            return cls()
+
+    def __bool__(self) -> bool:
+        return bool(self.rules)
+
+    def match(self, rel_path: str, is_dir: bool = False) -> Optional[bool]:
+        """Evaluate the rules against a path.
+
+        Args:
+            rel_path: Path relative to the rules' base, "/"-separated
+            is_dir: Whether the path is a directory
+
+        Returns:
+            Optional[bool]: True if excluded, False if re-included by a
+            negated rule, None if no rule matches
+        """
+        for rule in reversed(self.rules):
+            if rule.matches(rel_path, is_dir):
+                return not rule.negated
+        return None
+
+
+class FileQuery:
+    """Walks directory trees, pruning excluded subtrees before descending."""
+
+    def __init__(self, include: Optional[Iterable[str]] = None,
+                 exclude: Optional[Iterable[str]] = None,
+                 use_default_excludes: bool = True,
+                 ignore_files: Iterable[str] = IGNORE_FILES,
+                 include_hidden: bool = True,
+                 follow_symlinks: bool = False,
+                 ignore_case: bool = True):
+        """Initialize the query.
+
+        Args:
+            include: Patterns a file must match to be returned (any of them);
+                None returns every file that is not excluded
+            exclude: Extra exclusion patterns applied from the walk root
+            use_default_excludes: Also exclude DEFAULT_EXCLUDES and virtualenvs
+            ignore_files: Names of ignore files to honour during the walk
+            include_hidden: Whether to return and descend into dot entries
+            follow_symlinks: Whether to descend into symlinked directories
+            ignore_case: Match include patterns case-insensitively
+        """
+        self.include = IgnoreRules(include or (), ignore_case) if include else None
+        patterns = list(DEFAULT_EXCLUDES) if use_default_excludes else []
+        patterns.extend(exclude or ())
+        self.exclude = IgnoreRules(patterns)
+        self.skip_venvs = use_default_excludes
+        self.ignore_files = tuple(ignore_files)
+        self.include_hidden = include_hidden
+        self.follow_symlinks = follow_symlinks
+        self.stats: Dict[str, int] = {"dirs": 0, "entries": 0, "pruned": 0}
+
+    def _is_excluded(self, rel_path: str, is_dir: bool,
+                     scopes: List[Tuple[str, IgnoreRules]]) -> bool:
+        """Check a path against the root rules and every enclosing ignore file."""
+        excluded = self.exclude.match(rel_path, is_dir)
+        for base, rules in scopes:
+            result = rules.match(rel_path[len(base):], is_dir)
+            if result is not None:
+                excluded = result
+        return bool(excluded)
+
+    def _is_included(self, rel_path: str) -> bool:
+        """Check a file against the include patterns."""
+        return self.include is None or bool(self.include.match(rel_path))
+
+    def walk(self, root: str, yield_files: bool = True, yield_dirs: bool = False,
+             recursive: bool = True) -> Iterator[Tuple[str, os.DirEntry]]:
+        """Walk a tree, yielding matching entries.
+
+        Args:
+            root: Directory to walk
+            yield_files: Yield files matching the include patterns
+            yield_dirs: Yield directories that are not excluded
+            recursive: Descend into subdirectories
+
+        Yields:
+            Tuple[str, os.DirEntry]: "/"-separated path relative to root and
+            the directory entry (its stat result is cached by scandir)
+        """
+        self.stats = {"dirs": 0, "entries": 0, "pruned": 0}
+        # Each pending directory carries the ignore files in effect for it
+        pending: List[Tuple[str, str, List[Tuple[str, IgnoreRules]]]] = [(root, "", [])]
+        while pending:
+            path, rel_dir, scopes = pending.pop()
+            try:
+                with os.scandir(path) as it:
+                    entries = list(it)
+            except OSError as e:
+                logger.debug("Cannot scan %s: %s", path, str(e))
+                continue
+            self.stats["dirs"] += 1
+            self.stats["entries"] += len(entries)
+
+            names = {entry.name for entry in entries}
+            if self.skip_venvs and rel_dir and VENV_MARKER in names:
+                self.stats["pruned"] += 1
+                continue
+            local_scopes = scopes
+            for ignore_name in self.ignore_files:
+                if ignore_name in names:
+                    rules = IgnoreRules.from_file(os.path.join(path, ignore_name))
+                    if rules:
+                        if local_scopes is scopes:
+                            local_scopes = list(scopes)
+                        local_scopes.append((rel_dir, rules))
+
+            subdirs = []
+            for entry in entries:
+                if not self.include_hidden and entry.name.startswith("."):
+                    continue
+                rel_path = rel_dir + entry.name
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=self.follow_symlinks)
+                except OSError:
+                    continue
+                if self._is_excluded(rel_path, is_dir, local_scopes):
+                    if is_dir:
+                        self.stats["pruned"] += 1
+                    continue
+                if is_dir:
+                    subdirs.append((entry.path, rel_path + "/", local_scopes))
+                    if yield_dirs:
+                        yield rel_path, entry
+                elif yield_files and self._is_included(rel_path):
+                    yield rel_path, entry
+            if recursive:
+                # Reverse so directories are visited in scandir order
+                pending.extend(reversed(subdirs))
+
+
+def find_files(root: str, include: Optional[Iterable[str]] = None,
+               exclude: Optional[Iterable[str]] = None, **kwargs) -> List[str]:
+    """Find files under a directory.
+
+    Args:
+        root: Directory to search
+        include: Patterns a file must match (any of them), None for all
+        exclude: Extra exclusion patterns
+        **kwargs: Further FileQuery options
+
+    Returns:
+        List[str]: Paths of the matching files
+    """
+    query = FileQuery(include=include, exclude=exclude, **kwargs)
+    return [entry.path for _, entry in query.walk(root)]
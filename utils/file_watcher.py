@@ -0,0 +1,541 @@
+"""File change event bus shared by everything that caches file state.
+
+One watcher thread turns file system changes into ChangeEvents and hands
+them to subscribers registered for a folder, optionally narrowed by glob
+patterns. On Linux the kernel reports changes through inotify, called
+directly with ctypes. Elsewhere, or when inotify is unavailable, folders
+are polled and their (mtime, size) snapshots compared. Each directory is
+watched once however many subscribers cover it. Events for the same path
+are coalesced (created then modified is created, created then deleted is
+nothing) and delivered in batches once the folder has been quiet for the
+debounce interval, or after max_delay at the latest.
+
+Subscribing and unsubscribing change a backend's roots from the caller's
+thread while the watcher thread reads; each backend guards its state with
+its own lock, taken around root changes and around translating a batch,
+but not while waiting for the next one.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from .file_query import FileQuery, IgnoreRules
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = 0.2
+MAX_DELAY_SECONDS = 2.0
+POLL_INTERVAL = 1.0
+
+CREATED = "created"
+MODIFIED = "modified"
+DELETED = "deleted"
+# The watcher lost events (queue overflow); subscribers should rescan
+RESCAN = "rescan"
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+              | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+class ChangeEvent(NamedTuple):
+    """A change to one path."""
+
+    path: str
+    kind: str
+    is_dir: bool = False
+
+
+ChangeCallback = Callable[[List[ChangeEvent]], None]
+
+
+def coalesce(previous: Optional[str], kind: str) -> Optional[str]:
+    """Merge a new event kind into the pending kind for the same path.
+
+    Args:
+        previous: Pending kind, or None
+        kind: Newly observed kind
+
+    Returns:
+        Optional[str]: Kind to report, or None if the changes cancel out
+    """
+    if previous is None or previous == kind:
+        return kind
+    if RESCAN in (previous, kind):
+        return RESCAN
+    if previous == CREATED:
+        return None if kind == DELETED else CREATED
+    if previous == DELETED:
+        # Deleted and recreated: the contents changed
+        return MODIFIED
+    return kind
+
+
+def _under(path: str, root: str) -> bool:
+    """Check whether a path is a root or lies inside it."""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+def _watched_dirs(root: str) -> Iterable[str]:
+    """Yield a root and the directories under it worth watching."""
+    yield root
+    for _, entry in FileQuery().walk(root, yield_files=False, yield_dirs=True):
+        yield entry.path
+
+
+class PollingBackend:
+    """Detects changes by comparing (mtime, size) snapshots of folders."""
+
+    name = "polling"
+
+    def __init__(self, interval: float = POLL_INTERVAL):
+        """Initialize the backend.
+
+        Args:
+            interval: Seconds between polls
+        """
+        self.interval = interval
+        self.roots: List[str] = []
+        self._snapshot: Dict[str, tuple] = {}
+        self._next_poll = 0.0
+        self._lock = threading.Lock()
+
+    def _scan(self) -> Dict[str, tuple]:
+        """Snapshot every file and folder under the outermost roots."""
+        snapshot = {}
+        outer = [root for root in self.roots
+                 if not any(other != root and _under(root, other) for other in self.roots)]
+        for root in outer:
+            for _, entry in FileQuery().walk(root, yield_dirs=True):
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                is_dir = entry.is_dir(follow_symlinks=False)
+                # A folder's own mtime changes with its entries; only its
+                # existence matters here
+                snapshot[entry.path] = (is_dir, 0 if is_dir else st.st_mtime_ns,
+                                        0 if is_dir else st.st_size)
+        return snapshot
+
+    def add_root(self, root: str) -> None:
+        """Start watching a folder."""
+        with self._lock:
+            self.roots.append(root)
+            self._snapshot = self._scan()
+
+    def remove_root(self, root: str) -> None:
+        """Stop watching a folder."""
+        with self._lock:
+            self.roots.remove(root)
+            self._snapshot = self._scan()
+
+    def fileno(self) -> Optional[int]:
+        """Polling has no file descriptor to wait on."""
+        return None
+
+    def read(self, timeout: float) -> List[ChangeEvent]:
+        """Wait up to a timeout for the next poll and report what changed."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            time.sleep(min(timeout, self._next_poll - now))
+            if time.monotonic() < self._next_poll:
+                return []
+        self._next_poll = time.monotonic() + self.interval
+        # A root added during the scan would be reported as created
+        with self._lock:
+            snapshot = self._scan()
+            events = []
+            for path, state in snapshot.items():
+                old = self._snapshot.get(path)
+                if old is None:
+                    events.append(ChangeEvent(path, CREATED, state[0]))
+                elif old != state:
+                    events.append(ChangeEvent(path, MODIFIED, state[0]))
+            for path, state in self._snapshot.items():
+                if path not in snapshot:
+                    events.append(ChangeEvent(path, DELETED, state[0]))
+            self._snapshot = snapshot
+        return events
+
+    def close(self) -> None:
+        """Release resources."""
+        with self._lock:
+            self.roots = []
+            self._snapshot = {}
+
+
+class InotifyBackend:
+    """Receives changes from the Linux kernel through inotify."""
+
+    name = "inotify"
+
+    def __init__(self):
+        """Open an inotify instance.
+
+        Raises:
+            OSError: If inotify is not available
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self.fd = fd
+        self.roots: List[str] = []
+        self.paths: Dict[int, str] = {}
+        self.watches: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _watch(self, path: str) -> bool:
+        """Add a kernel watch for one directory, once."""
+        if path in self.watches:
+            return True
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            if code == errno.ENOSPC:
+                logger.warning("inotify watch limit reached; %s is not watched "
+                               "(raise fs.inotify.max_user_watches)", path)
+            elif code not in (errno.ENOENT, errno.ENOTDIR):
+                logger.debug("Cannot watch %s: %s", path, os.strerror(code))
+            return False
+        self.watches[path] = wd
+        self.paths[wd] = path
+        return True
+
+    def _unwatch(self, directory: str) -> None:
+        """Remove the watches of a directory and everything below it."""
+        for path in [p for p in self.watches if _under(p, directory)]:
+            if any(_under(path, root) for root in self.roots):
+                continue
+            wd = self.watches.pop(path)
+            self.paths.pop(wd, None)
+            self._rm_watch(self.fd, wd)
+
+    def _forget(self, directory: str) -> None:
+        """Drop the watches of a directory that was moved or deleted."""
+        for path in [p for p in self.watches if _under(p, directory)]:
+            wd = self.watches.pop(path)
+            self.paths.pop(wd, None)
+            self._rm_watch(self.fd, wd)
+
+    def add_root(self, root: str) -> None:
+        """Watch a folder and the directories below it."""
+        with self._lock:
+            self.roots.append(root)
+            for path in _watched_dirs(root):
+                self._watch(path)
+
+    def remove_root(self, root: str) -> None:
+        """Stop watching a folder unless another root covers it."""
+        with self._lock:
+            self.roots.remove(root)
+            self._unwatch(root)
+
+    def fileno(self) -> Optional[int]:
+        """The inotify file descriptor, for select."""
+        return self.fd
+
+    def _new_directory(self, path: str) -> List[ChangeEvent]:
+        """Watch a directory that appeared, reporting what is already in it.
+
+        Files created before the watch was added would otherwise be missed.
+        """
+        events = []
+        if FileQuery().exclude.match(os.path.basename(path), True) or not self._watch(path):
+            return events
+        for _, entry in FileQuery().walk(path, yield_dirs=True):
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if is_dir:
+                self._watch(entry.path)
+            events.append(ChangeEvent(entry.path, CREATED, is_dir))
+        return events
+
+    def read(self, timeout: float) -> List[ChangeEvent]:
+        """Wait up to a timeout for kernel events and translate them."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        with self._lock:
+            try:
+                data = os.read(self.fd, _READ_SIZE)
+            except BlockingIOError:
+                return []
+            return self._translate(data)
+
+    def _translate(self, data: bytes) -> List[ChangeEvent]:
+        """Turn raw inotify records into events; call locked."""
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            raw_name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length]
+            offset += _EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                events.extend(ChangeEvent(root, RESCAN, True) for root in self.roots)
+                continue
+            directory = self.paths.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                self.watches.pop(directory, None)
+                self.paths.pop(wd, None)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                # Reported to the parent as well; nothing to add here
+                continue
+            name = raw_name.rstrip(b"\0")
+            path = os.path.join(directory, os.fsdecode(name))
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                events.append(ChangeEvent(path, CREATED, is_dir))
+                if is_dir:
+                    events.extend(self._new_directory(path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append(ChangeEvent(path, DELETED, is_dir))
+                if is_dir:
+                    self._forget(path)
+            elif not is_dir:
+                events.append(ChangeEvent(path, MODIFIED, False))
+        return events
+
+    def close(self) -> None:
+        """Close the inotify instance, removing every watch."""
+        with self._lock:
+            if self.fd >= 0:
+                os.close(self.fd)
+                self.fd = -1
+            self.roots, self.paths, self.watches = [], {}, {}
+
+
+def create_backend(poll_interval: float = POLL_INTERVAL):
+    """Create the inotify backend where available, else the polling one."""
+    try:
+        return InotifyBackend()
+    except (OSError, AttributeError) as e:
+        logger.info("Using polling file watcher: %s", str(e))
+        return PollingBackend(poll_interval)
+
+
+class _Subscription(NamedTuple):
+    root: str
+    callback: ChangeCallback
+    patterns: Optional[IgnoreRules]
+
+
+class FileWatcher:
+    """Delivers debounced file change events to subscribers."""
+
+    def __init__(self, debounce: float = DEBOUNCE_SECONDS,
+                 max_delay: float = MAX_DELAY_SECONDS, backend=None,
+                 poll_interval: float = POLL_INTERVAL):
+        """Initialize the watcher; it starts with the first subscription.
+
+        Args:
+            debounce: Quiet time in seconds before pending events are delivered
+            max_delay: Longest time in seconds an event is held back
+            backend: Optional backend, InotifyBackend or PollingBackend
+            poll_interval: Seconds between polls when polling
+        """
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._poll_interval = poll_interval
+        self._backend = backend
+        self._lock = threading.RLock()
+        self._subscriptions: Dict[int, _Subscription] = {}
+        self._roots: Counter = Counter()
+        self._next_id = 1
+        self._pending: Dict[str, ChangeEvent] = {}
+        self._first_pending = 0.0
+        self._last_event = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def backend_name(self) -> str:
+        """Name of the backend in use."""
+        return self._get_backend().name
+
+    def _get_backend(self):
+        if self._backend is None:
+            self._backend = create_backend(self._poll_interval)
+        return self._backend
+
+    def subscribe(self, root: str, callback: ChangeCallback,
+                  patterns: Optional[Iterable[str]] = None) -> int:
+        """Register a callback for changes under a folder.
+
+        Args:
+            root: Folder to watch, recursively
+            callback: Called from the watcher thread with a list of events
+            patterns: Optional globs (relative to the root) a path must match
+
+        Returns:
+            int: Subscription id for unsubscribe
+        """
+        root = os.path.abspath(root)
+        rules = IgnoreRules(patterns) if patterns else None
+        with self._lock:
+            if self._roots[root] == 0:
+                self._get_backend().add_root(root)
+            self._roots[root] += 1
+            sub_id = self._next_id
+            self._next_id += 1
+            self._subscriptions[sub_id] = _Subscription(root, callback, rules)
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="file-watcher",
+                                                daemon=True)
+                self._thread.start()
+        return sub_id
+
+    def unsubscribe(self, sub_id: int) -> None:
+        """Remove a subscription; the watcher stops with the last one."""
+        with self._lock:
+            subscription = self._subscriptions.pop(sub_id, None)
+            if subscription is None:
+                return
+            self._roots[subscription.root] -= 1
+            if self._roots[subscription.root] == 0:
+                del self._roots[subscription.root]
+                self._backend.remove_root(subscription.root)
+            last = not self._subscriptions
+        if last:
+            self.stop()
+
+    def stop(self) -> None:
+        """Stop the watcher thread and release the backend."""
+        thread = self._thread
+        if thread is not None:
+            self._stop.set()
+            if thread is not threading.current_thread():
+                thread.join()
+        with self._lock:
+            self._thread = None
+            self._subscriptions.clear()
+            self._roots.clear()
+            self._pending.clear()
+            if self._backend is not None:
+                self._backend.close()
+                self._backend = None
+
+    def _queue(self, events: List[ChangeEvent]) -> None:
+        """Coalesce new events into the pending batch."""
+        now = time.monotonic()
+        with self._lock:
+            if not self._pending:
+                self._first_pending = now
+            self._last_event = now
+            for event in events:
+                previous = self._pending.get(event.path)
+                kind = coalesce(previous.kind if previous else None, event.kind)
+                if kind is None:
+                    del self._pending[event.path]
+                else:
+                    self._pending[event.path] = event._replace(kind=kind)
+
+    def flush(self) -> int:
+        """Deliver pending events now.
+
+        Returns:
+            int: Number of events delivered
+        """
+        with self._lock:
+            events = list(self._pending.values())
+            self._pending.clear()
+            subscriptions = list(self._subscriptions.values())
+        for subscription in subscriptions:
+            matching = [event for event in events if self._matches(subscription, event)]
+            if not matching:
+                continue
+            try:
+                subscription.callback(matching)
+            except Exception as e:
+                logger.error("File change subscriber failed: %s", str(e))
+        return len(events)
+
+    @staticmethod
+    def _matches(subscription: _Subscription, event: ChangeEvent) -> bool:
+        """Check an event against a subscription's folder and patterns."""
+        if event.kind == RESCAN:
+            return _under(event.path, subscription.root) or _under(subscription.root, event.path)
+        if not _under(event.path, subscription.root):
+            return False
+        if subscription.patterns is None:
+            return True
+        rel_path = os.path.relpath(event.path, subscription.root).replace(os.sep, "/")
+        return bool(subscription.patterns.match(rel_path, event.is_dir))
+
+    def _run(self) -> None:
+        """Watcher thread: read events and deliver them when due."""
+        while not self._stop.is_set():
+            with self._lock:
+                backend = self._backend
+                pending = bool(self._pending)
+            if backend is None:
+                break
+            timeout = self.debounce if pending else 0.5
+            try:
+                events = backend.read(timeout)
+            except Exception as e:
+                # Keep watching: a dead thread would silently stop all delivery
+                if self._stop.is_set():
+                    break
+                logger.error("File watcher failed: %s", str(e))
+                time.sleep(timeout)
+                continue
+            if events:
+                self._queue(events)
+            now = time.monotonic()
+            with self._lock:
+                due = self._pending and (now - self._last_event >= self.debounce
+                                         or now - self._first_pending >= self.max_delay)
+            if due:
+                self.flush()
+
+
+# Global instance
+_file_watcher = None
+
+
+def get_file_watcher() -> FileWatcher:
+    """Get the global file watcher instance."""
+    global _file_watcher
+    if _file_watcher is None:
+        _file_watcher = FileWatcher()
+    return _file_watcher
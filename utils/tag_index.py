@@ -0,0 +1,251 @@
+"""Inverted tag index with boolean queries.
+
+Tags are stored one (tag, path) row each in the file_tags table, whose
+primary key serves tag -> paths lookups and a second index path -> tags,
+so tagging a batch of files is one executemany in one transaction. The
+rows are also loaded once into two in-memory dicts of sets, so membership
+tests, tags of a file and queries never scan.
+
+Queries combine tags with AND, OR, NOT and parentheses, e.g.
+"work and 2024 not draft". Adjacent tags are ANDed and "a NOT b" means a
+AND NOT b; each operator is one set operation.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from .database import DatabaseManager, get_db_manager
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\(|\)|[^\s()]+")
+_OPERATORS = {"and": "and", "&": "and", "but": "and", "or": "or", "|": "or", "not": "not"}
+
+
+def tokenize_query(query: str) -> List[str]:
+    """Split a tag query into tags, parentheses and lowercase operators."""
+    return [_OPERATORS.get(token.lower(), token) for token in _TOKEN.findall(query)]
+
+
+class _QueryParser:
+    """Recursive descent parser evaluating a tag query to a set of paths.
+
+    Grammar: expr := term (OR term)*; term := factor ((AND | NOT)? factor)*;
+    factor := NOT factor | "(" expr ")" | tag
+    """
+
+    def __init__(self, tokens: List[str], lookup, universe):
+        self.tokens = tokens
+        self.position = 0
+        self.lookup = lookup
+        self.universe = universe
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self) -> str:
+        token = self.tokens[self.position]
+        self.position += 1
+        return token
+
+    def parse(self) -> Set[str]:
+        if not self.tokens:
+            raise ValueError("empty tag query")
+        result = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f"unexpected '{self.peek()}' in tag query")
+        return result
+
+    def expr(self) -> Set[str]:
+        result = self.term()
+        while self.peek() == "or":
+            self.take()
+            result = result | self.term()
+        return result
+
+    def term(self) -> Set[str]:
+        result = self.factor()
+        while self.peek() not in (None, "or", ")"):
+            if self.peek() == "and":
+                self.take()
+                result = result & self.factor()
+            elif self.peek() == "not":
+                self.take()
+                result = result - self.factor()
+            else:
+                result = result & self.factor()
+        return result
+
+    def factor(self) -> Set[str]:
+        token = self.peek()
+        if token is None:
+            raise ValueError("tag query ends too early")
+        self.take()
+        if token == "not":
+            return self.universe() - self.factor()
+        if token == "(":
+            result = self.expr()
+            if self.peek() != ")":
+                raise ValueError("missing ')' in tag query")
+            self.take()
+            return result
+        if token in ("and", "or", ")"):
+            raise ValueError(f"unexpected '{token}' in tag query")
+        return set(self.lookup(token))
+
+
+class TagIndex:
+    """Bidirectional tag index persisted in SQLite."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None):
+        """Initialize the index; rows are loaded on first use.
+
+        Args:
+            db: Database to use; defaults to the global database
+        """
+        self._db = db
+        self._lock = threading.RLock()
+        self._loaded_from: Optional[DatabaseManager] = None
+        self._by_tag: Dict[str, Set[str]] = defaultdict(set)
+        self._by_path: Dict[str, Set[str]] = defaultdict(set)
+
+    @property
+    def db(self) -> DatabaseManager:
+        return self._db or get_db_manager()
+
+    def _load(self) -> None:
+        """Load the rows of the current database, once per database; call locked."""
+        db = self.db
+        if self._loaded_from is db:
+            return
+        self._by_tag.clear()
+        self._by_path.clear()
+        for tag, path in db.get_file_tags():
+            self._by_tag[tag].add(path)
+            self._by_path[path].add(tag)
+        self._loaded_from = db
+
+    def add(self, paths: Iterable[str], tag: str) -> List[str]:
+        """Tag files.
+
+        Args:
+            paths: Absolute paths
+            tag: Tag to add
+
+        Returns:
+            List[str]: Paths that did not have the tag before
+        """
+        with self._lock:
+            self._load()
+            tagged = self._by_tag.get(tag, set())
+            added = list(dict.fromkeys(path for path in paths if path not in tagged))
+            if added:
+                self.db.add_file_tags([(tag, path) for path in added])
+                self._by_tag[tag].update(added)
+                for path in added:
+                    self._by_path[path].add(tag)
+            return added
+
+    def remove(self, paths: Iterable[str], tag: str) -> List[str]:
+        """Untag files.
+
+        Args:
+            paths: Absolute paths
+            tag: Tag to remove
+
+        Returns:
+            List[str]: Paths that had the tag
+        """
+        with self._lock:
+            self._load()
+            tagged = self._by_tag.get(tag, set())
+            removed = list(dict.fromkeys(path for path in paths if path in tagged))
+            if removed:
+                self.db.remove_file_tags([(tag, path) for path in removed])
+                tagged.difference_update(removed)
+                if not tagged:
+                    del self._by_tag[tag]
+                for path in removed:
+                    self._by_path[path].discard(tag)
+                    if not self._by_path[path]:
+                        del self._by_path[path]
+            return removed
+
+    def paths_moved(self, moves: List[Tuple[str, str]]) -> None:
+        """Re-key the loaded tags after files moved; the rows were already renamed.
+
+        Args:
+            moves: (old, new) absolute path pairs, in the order applied
+        """
+        with self._lock:
+            if self._loaded_from is None:
+                return
+            for old, new in moves:
+                if os.path.isdir(new):
+                    # Paths below a folder are not indexed by prefix; reload lazily
+                    self._loaded_from = None
+                    return
+                tags = self._by_path.pop(old, None)
+                for tag in tags or ():
+                    self._by_tag[tag].discard(old)
+                    self._by_tag[tag].add(new)
+                if tags:
+                    self._by_path[new].update(tags)
+
+    def paths_for(self, tag: str) -> List[str]:
+        """Get the paths with a tag, sorted."""
+        with self._lock:
+            self._load()
+            return sorted(self._by_tag.get(tag, ()))
+
+    def tags_for(self, path: str) -> List[str]:
+        """Get the tags of a path, sorted."""
+        with self._lock:
+            self._load()
+            return sorted(self._by_path.get(path, ()))
+
+    def tag_counts(self) -> Dict[str, int]:
+        """Get every tag with its number of paths."""
+        with self._lock:
+            self._load()
+            return {tag: len(paths) for tag, paths in sorted(self._by_tag.items())}
+
+    def query(self, expression: str) -> List[str]:
+        """Find the paths matching a boolean tag query.
+
+        Args:
+            expression: Tags combined with and, or, not and parentheses
+
+        Returns:
+            List[str]: Matching paths, sorted
+
+        Raises:
+            ValueError: If the query is malformed
+        """
+        with self._lock:
+            self._load()
+            parser = _QueryParser(tokenize_query(expression),
+                                  lambda tag: self._by_tag.get(tag, ()),
+                                  lambda: set(self._by_path))
+            return sorted(parser.parse())
+
+    def import_json(self, tag_file: str) -> int:
+        """Import a {tag: [paths]} JSON file written by earlier releases.
+
+        Args:
+            tag_file: Path of the file; it is removed once imported
+
+        Returns:
+            int: Number of (tag, path) pairs added
+        """
+        with open(tag_file, "r") as f:
+            tags = json.load(f)
+        added = sum(len(self.add(paths, tag)) for tag, paths in tags.items())
+        os.remove(tag_file)
+        logger.info("Imported %d tag(s) from %s", added, tag_file)
+        return added
@@ -0,0 +1,233 @@
+"""Tags stored on the files themselves, in extended attributes.
+
+Each file's tags are kept in its user.jarvis.tags attribute, one tag per
+line, so reading them is one getxattr with no database lookup, and they
+stay with the inode when the file is renamed or moved on the same file
+system (and, with shutil.copy2, when it is copied). The tag index is kept
+alongside as a cache that serves tag -> files queries; rebuild() scans a
+folder and refreshes the cache from the attributes, reading them from a
+pool of threads as the walk finds them.
+
+Files whose file system has no user attributes, and files tagged before
+this backend was enabled, fall back to the index. Their tags move into
+the attribute the next time they change.
+"""
+
+import errno
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional, Set, Tuple
+
+from .database import DatabaseManager
+from .file_query import FileQuery
+from .tag_index import TagIndex
+
+logger = logging.getLogger(__name__)
+
+XATTR_NAME = "user.jarvis.tags"
+# os.getxattr and friends exist on Linux only
+XATTRS_AVAILABLE = hasattr(os, "getxattr")
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+# Paths read by one task during a rebuild
+SCAN_BATCH = 512
+
+# The file has no attribute, its file system has none, or it is gone
+_NO_TAGS = {errno.ENODATA, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOENT}
+# The file system has no user attributes, or refuses them on this file type
+_NOT_WRITABLE = {errno.ENOTSUP, errno.EOPNOTSUPP, errno.EPERM, errno.ENOENT}
+
+
+def read_tags(path: str) -> Optional[List[str]]:
+    """Read the tags stored on a file.
+
+    Args:
+        path: File or folder
+
+    Returns:
+        Optional[List[str]]: The tags, or None if nothing is stored on the file
+    """
+    try:
+        value = os.getxattr(path, XATTR_NAME)
+    except OSError as e:
+        if e.errno in _NO_TAGS:
+            return None
+        raise
+    return [tag for tag in value.decode("utf-8").split("\n") if tag]
+
+
+def write_tags(path: str, tags: Iterable[str]) -> bool:
+    """Store tags on a file, removing the attribute when there are none.
+
+    Args:
+        path: File or folder
+        tags: Tags to store
+
+    Returns:
+        bool: False if the file cannot hold the attribute
+    """
+    value = "\n".join(sorted(set(tags))).encode("utf-8")
+    try:
+        if value:
+            os.setxattr(path, XATTR_NAME, value)
+        else:
+            os.removexattr(path, XATTR_NAME)
+    except OSError as e:
+        if e.errno == errno.ENODATA:
+            return True
+        if e.errno in _NOT_WRITABLE:
+            return False
+        raise
+    return True
+
+
+def _scan(paths: List[str]) -> List[Tuple[str, Optional[List[str]]]]:
+    """Read the tags of a batch of paths.
+
+    A path whose attribute cannot be read counts as unknown (None), so its
+    cached tags are kept.
+    """
+    found = []
+    for path in paths:
+        try:
+            found.append((path, read_tags(path)))
+        except OSError as e:
+            logger.warning("Cannot read tags of %s: %s", path, str(e))
+            found.append((path, None))
+    return found
+
+
+class XattrTagIndex(TagIndex):
+    """Tag index whose source of truth is the files' extended attributes."""
+
+    def __init__(self, db: Optional[DatabaseManager] = None,
+                 max_workers: int = DEFAULT_WORKERS):
+        """Initialize the index.
+
+        Args:
+            db: Database holding the cache; defaults to the global database
+            max_workers: Threads reading and writing attributes
+        """
+        super().__init__(db)
+        self.max_workers = max_workers
+
+    def _stored_tags(self, path: str) -> Set[str]:
+        """Tags of a file, from its attribute or else the cache; call locked."""
+        tags = read_tags(path)
+        return set(self._by_path.get(path, ()) if tags is None else tags)
+
+    def _update(self, paths: List[str], change: Callable[[Set[str]], bool]) -> List[bool]:
+        """Rewrite the attribute of each file, in parallel; call locked.
+
+        Args:
+            paths: Files to update
+            change: Edits a file's tag set in place, returning whether it changed
+
+        Returns:
+            List[bool]: Whether each file's tags changed
+        """
+        def update(path: str) -> bool:
+            tags = self._stored_tags(path)
+            if not change(tags):
+                return False
+            if not write_tags(path, tags):
+                logger.debug("No tag attribute on %s; keeping its tags in the index", path)
+            return True
+
+        if len(paths) == 1:
+            return [update(paths[0])]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(update, paths))
+
+    def add(self, paths: Iterable[str], tag: str) -> List[str]:
+        """Tag files, writing each file's attribute and then the cache.
+
+        Returns:
+            List[str]: Paths that did not have the tag before
+        """
+        def adding(tags: Set[str]) -> bool:
+            if tag in tags:
+                return False
+            tags.add(tag)
+            return True
+
+        paths = list(dict.fromkeys(paths))
+        with self._lock:
+            self._load()
+            changed = self._update(paths, adding)
+            super().add(paths, tag)
+            return [path for path, was_added in zip(paths, changed) if was_added]
+
+    def remove(self, paths: Iterable[str], tag: str) -> List[str]:
+        """Untag files, writing each file's attribute and then the cache.
+
+        Returns:
+            List[str]: Paths that had the tag
+        """
+        def removing(tags: Set[str]) -> bool:
+            if tag not in tags:
+                return False
+            tags.discard(tag)
+            return True
+
+        paths = list(dict.fromkeys(paths))
+        with self._lock:
+            self._load()
+            changed = self._update(paths, removing)
+            super().remove(paths, tag)
+            return [path for path, was_removed in zip(paths, changed) if was_removed]
+
+    def tags_for(self, path: str) -> List[str]:
+        """Get the tags of a path from its attribute, without the database."""
+        tags = read_tags(path)
+        if tags is None:
+            return super().tags_for(path)
+        return sorted(tags)
+
+    def rebuild(self, root: str) -> int:
+        """Refresh the cache of a folder from the attributes of its files.
+
+        Cached tags of files that have no attribute are kept; those of
+        files that no longer exist are dropped.
+
+        Args:
+            root: Folder to scan
+
+        Returns:
+            int: Number of tagged files found
+        """
+        root = os.path.abspath(root)
+        below = root + os.sep
+        found = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = []
+            batch = [root]
+            for _, entry in FileQuery().walk(root, yield_dirs=True):
+                batch.append(entry.path)
+                if len(batch) == SCAN_BATCH:
+                    futures.append(executor.submit(_scan, batch))
+                    batch = []
+            futures.append(executor.submit(_scan, batch))
+            for future in futures:
+                found.update(future.result())
+
+        with self._lock:
+            self._load()
+            cached = {(tag, path) for path, tags in self._by_path.items()
+                      if path == root or path.startswith(below) for tag in tags}
+            current = set()
+            for tag, path in cached:
+                # Keep what only the cache knows, for files still there
+                if path in found and found[path] is None:
+                    current.add((tag, path))
+                elif path not in found and os.path.lexists(path):
+                    current.add((tag, path))
+            current.update((tag, path) for path, tags in found.items() for tag in tags or ())
+            if cached - current:
+                self.db.remove_file_tags(sorted(cached - current))
+            if current - cached:
+                self.db.add_file_tags(sorted(current - cached))
+            self._loaded_from = None
+        tagged = {path for _, path in current}
+        logger.info("Rebuilt tag index of %s: %d tagged file(s)", root, len(tagged))
+        return len(tagged)